@@ -0,0 +1 @@
+# Benchmarks for the X-Ray library.
@@ -0,0 +1,83 @@
+# Cross-run analytics benchmark: initial catalog scan of many trace files (one process vs. a
+# process pool), an incremental refresh after a few new runs, and the aggregate queries.
+#
+#   python -m benchmarks.bench_analytics [trace count ...]
+
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from xray.analytics import TraceAnalytics
+from xray.catalog import CATALOG_FILENAME, TraceCatalog
+from benchmarks.bench_memory import build_evaluation
+from benchmarks.synthetic import generate_candidates, filter_thresholds
+
+CANDIDATES_PER_TRACE = 500
+REGIONS = ("IN", "US", "EU", "JP")
+
+
+def write_traces(directory: Path, start: int, count: int) -> None:
+    # NDJSON traces written directly, shaped like the demo pipeline's filter step.
+    rng = random.Random(start)
+    pool = generate_candidates(5_000)
+    thresholds = filter_thresholds()
+    for i in range(start, start + count):
+        with open(directory / f"run_{i:06d}.ndjson", "w", encoding="utf-8") as f:
+            def write(record: dict) -> None:
+                f.write(json.dumps(record, separators=(",", ":")) + "\n")
+
+            write({"type": "session", "trace_id": f"t{i}", "name": "competitor_selection",
+                   "started_at": f"2026-10-{1 + i % 28:02d}T00:00:00", "metadata": {"region": rng.choice(REGIONS)}})
+            write({"type": "step_start", "step_id": "f", "name": "apply_filters", "step_type": "filter"})
+            for candidate in rng.sample(pool, CANDIDATES_PER_TRACE):
+                write({**build_evaluation(candidate, thresholds).to_dict(), "type": "evaluation", "step_id": "f"})
+            write({"type": "step", "step_id": "f", "name": "apply_filters", "step_type": "filter",
+                   "status": "completed", "duration_ns": rng.randint(1_000_000, 50_000_000), "parent_id": None})
+            write({"type": "session_end", "trace_id": f"t{i}", "completed_at": None})
+
+
+def timed(fn) -> tuple:
+    started = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - started
+
+
+def run(count: int, directory: Path) -> list[tuple[str, float]]:
+    write_traces(directory, 0, count)
+    results = []
+    workers = os.cpu_count() or 1
+    for i, (label, pool_size) in enumerate((("initial scan, 1 process", 1),
+                                            (f"initial scan, {workers} processes", workers))):
+        catalog = TraceCatalog(directory, path=directory / f"{i}{CATALOG_FILENAME}")
+        _, elapsed = timed(lambda: catalog.refresh(workers=pool_size))
+        catalog.close()
+        results.append((label, elapsed))
+
+    analytics = TraceAnalytics(directory, workers=workers)
+    analytics.refresh()
+    write_traces(directory, count, 10)
+    _, elapsed = timed(analytics.refresh)
+    results.append(("refresh after 10 new traces", elapsed))
+    _, elapsed = timed(lambda: analytics.report(group_by="region", refresh=False))
+    results.append(("report grouped by region", elapsed))
+    _, elapsed = timed(lambda: analytics.filter_rates(step="apply_filters", metadata={"region": "IN"}))
+    results.append(("filter rates, one region", elapsed))
+    return results
+
+
+def main(argv: list[str] = None) -> None:
+    argv = sys.argv[1:] if argv is None else argv
+    counts = [int(a) for a in argv] or [2_000]
+    print(f"{'traces':>8}  {'operation':<32} {'seconds':>8}")
+    for count in counts:
+        with tempfile.TemporaryDirectory() as tmp:
+            for label, elapsed in run(count, Path(tmp)):
+                print(f"{count:>8}  {label:<32} {elapsed:>8.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+# Per-candidate tracing overhead: per-row Evaluation/FilterResult recording vs. the batch API.
+#
+#   python -m benchmarks.bench_batch [count ...]
+#
+# "untraced" is the bare filter loop; every other mode reports its cost per candidate on top
+# of that. Batch modes defer detail strings, so their serialization cost is reported separately.
+
+import sys
+import time
+
+from xray.core import Step
+from benchmarks.bench_memory import build_evaluation
+from benchmarks.synthetic import generate_candidates, filter_thresholds
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+def untraced(candidates: list[dict], t: dict) -> int:
+    qualified = 0
+    for c in candidates:
+        if (t["min_price"] <= c["price"] <= t["max_price"] and c["rating"] >= t["min_rating"]
+                and c["reviews"] >= t["min_reviews"] and "Water Bottles" in c["category"]):
+            qualified += 1
+    return qualified
+
+
+def per_row(candidates: list[dict], t: dict) -> Step:
+    step = Step("apply_filters_and_rank", step_type="filter")
+    for c in candidates:
+        step.add_evaluation(build_evaluation(c, t))
+    return step
+
+
+def batch(candidates: list[dict], t: dict, use_numpy: bool = False) -> Step:
+    step = Step("apply_filters_and_rank", step_type="filter")
+    ids = [c["asin"] for c in candidates]
+    prices = [c["price"] for c in candidates]
+    ratings = [c["rating"] for c in candidates]
+    reviews = [c["reviews"] for c in candidates]
+    categories = [c["category"] for c in candidates]
+    if use_numpy:
+        prices, ratings, reviews = np.array(prices), np.array(ratings), np.array(reviews)
+    step.add_candidates(ids, columns={
+        "asin": ids, "title": [c["title"] for c in candidates],
+        "price": prices, "rating": ratings, "reviews": reviews, "category": categories
+    })
+    step.add_threshold_filter("price_range", ids, prices, minimum=t["min_price"], maximum=t["max_price"],
+                              actual_format="INR {:.0f}", detail="INR {actual:.0f} checked against {expected}")
+    step.add_threshold_filter("min_rating", ids, ratings, minimum=t["min_rating"], actual_format="{}",
+                              detail="Rating {actual} vs {expected}")
+    step.add_threshold_filter("min_reviews", ids, reviews, minimum=t["min_reviews"], actual_format="{}",
+                              detail="{actual} reviews vs {expected}")
+    step.add_filter_batch("category_match", ids, ["Water Bottles" in c for c in categories],
+                          expected="Water Bottles category", actual=categories,
+                          detail=("Product is in Water Bottles category", "Product is an accessory, not a water bottle"))
+    return step
+
+
+def timed(fn, *args) -> tuple:
+    started = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - started
+
+
+def run(count: int) -> list[dict]:
+    candidates = generate_candidates(count)
+    t = filter_thresholds()
+    _, base = timed(untraced, candidates, t)
+    results = [{"mode": "untraced", "record_s": base, "serialize_s": 0.0}]
+
+    modes = [("per-row", lambda: per_row(candidates, t)), ("batch", lambda: batch(candidates, t))]
+    if np is not None:
+        modes.append(("batch+numpy", lambda: batch(candidates, t, use_numpy=True)))
+    for mode, fn in modes:
+        step, record_s = timed(fn)
+        _, serialize_s = timed(step.to_dict)
+        results.append({"mode": mode, "record_s": record_s, "serialize_s": serialize_s})
+    return results
+
+
+def main(argv: list[str] = None) -> None:
+    argv = sys.argv[1:] if argv is None else argv
+    counts = [int(a) for a in argv] or [10_000, 1_000_000]
+    print(f"{'candidates':>10}  {'mode':<12} {'record s':>9} {'us/cand':>8} {'overhead us':>12} {'to_dict s':>10}")
+    for count in counts:
+        results = run(count)
+        base = results[0]["record_s"]
+        for r in results:
+            print(
+                f"{count:>10}  {r['mode']:<12} {r['record_s']:>9.3f} {r['record_s'] / count * 1e6:>8.2f} "
+                f"{(r['record_s'] - base) / count * 1e6:>12.2f} {r['serialize_s']:>10.3f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+# Trace format benchmark: indented JSON vs. the memory-mapped binary container.
+#
+# Reports file size, write time, time-to-first-step (open the file and read one candidate of
+# the filter step) and full load time.
+#
+#   python -m benchmarks.bench_binary [count ...]
+
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from xray import XRaySession, load_trace, open_trace, save_trace
+from benchmarks.bench_memory import build_evaluation
+from benchmarks.synthetic import generate_candidates, filter_thresholds
+
+
+def build_session(count: int) -> XRaySession:
+    candidates = generate_candidates(count)
+    t = filter_thresholds()
+    with XRaySession("bench_binary") as session:
+        with session.step("candidate_search", step_type="search") as step:
+            step.set_output({"candidates_fetched": count})
+        with session.step("apply_filters", step_type="filter") as step:
+            for candidate in candidates:
+                step.add_evaluation(build_evaluation(candidate, t))
+    return session
+
+
+def timed(fn) -> tuple:
+    started = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - started
+
+
+def run(count: int, directory: Path) -> list[dict]:
+    session = build_session(count)
+    results = []
+
+    json_path = directory / f"bench_{count}.json"
+    _, write_s = timed(lambda: save_trace(session, json_path))
+    _, first_s = timed(lambda: load_trace(json_path)["steps"][1]["evaluations"][0])
+    _, load_s = timed(lambda: load_trace(json_path))
+    results.append({"label": "json", "bytes": os.path.getsize(json_path),
+                    "write": write_s, "first": first_s, "load": load_s})
+
+    binary_path = directory / f"bench_{count}.xrb"
+    _, write_s = timed(lambda: save_trace(session, binary_path))
+
+    def first_step():
+        with open_trace(binary_path) as trace:
+            return trace.step("apply_filters")[0]
+
+    _, first_s = timed(first_step)
+    _, load_s = timed(lambda: load_trace(binary_path))
+    results.append({"label": "binary", "bytes": os.path.getsize(binary_path),
+                    "write": write_s, "first": first_s, "load": load_s})
+    return results
+
+
+def main(argv: list[str] = None) -> None:
+    argv = sys.argv[1:] if argv is None else argv
+    counts = [int(a) for a in argv] or [10_000, 100_000]
+    print(f"{'candidates':>10}  {'format':<7} {'size MB':>8} {'write s':>8} {'first step ms':>14} {'load s':>7}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for count in counts:
+            for result in run(count, Path(tmp)):
+                print(
+                    f"{count:>10}  {result['label']:<7} {result['bytes'] / 1e6:>8.1f} "
+                    f"{result['write']:>8.2f} {result['first'] * 1000:>14.2f} {result['load']:>7.2f}"
+                )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+# Trace catalog benchmark: indexed lookups and list_traces() over many catalogued traces.
+#
+# Rows are inserted directly for empty placeholder files (no trace content), then common
+# dashboard queries are timed, both against the catalog and through list_traces(), which also
+# brings the catalog up to date with the directory first.
+#
+#   python -m benchmarks.bench_catalog [count ...]
+
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from xray.catalog import TraceCatalog
+from xray.serializer import list_traces
+
+
+def populate(catalog: TraceCatalog, count: int, seed: int = 7) -> None:
+    rng = random.Random(seed)
+    origin = datetime(2026, 1, 1)
+    entries = []
+    for index in range(count):
+        filepath = catalog.directory / f"trace_{index:07d}.json"
+        filepath.touch()
+        evaluated = rng.randint(10, 5000)
+        qualified = rng.randint(0, evaluated)
+        entries.append((filepath, {
+            "trace_id": f"{index:032x}",
+            "name": rng.choice(["competitor_selection", "listing_match", "price_watch"]),
+            "started_at": (origin + timedelta(seconds=index * 30)).isoformat(),
+            "completed_at": (origin + timedelta(seconds=index * 30 + 5)).isoformat(),
+            "metadata": {"reference_asin": f"B{rng.randrange(1000):04d}"},
+            "step_count": 3,
+            "status": rng.choices(["completed", "failed", "running"], [0.979, 0.02, 0.001])[0],
+            "evaluated": evaluated,
+            "qualified": qualified,
+            "rejected": evaluated - qualified
+        }, os.stat(filepath)))
+    catalog.add_many(entries)
+
+
+def new_file(directory: str) -> None:
+    # A file the catalog has not seen (and will record as unreadable).
+    (Path(directory) / f"new_{time.perf_counter_ns()}.json").touch()
+
+
+def timed(fn, repeat: int = 200) -> float:
+    fn()
+    started = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - started) / repeat
+
+
+def main(argv: list[str] = None) -> None:
+    argv = sys.argv[1:] if argv is None else argv
+    counts = [int(a) for a in argv] or [100_000]
+    queries = {
+        "newest 50": lambda c: c.query(limit=50),
+        "page 100 of 50": lambda c: c.query(limit=50, offset=5000),
+        "by name, newest 50": lambda c: c.query(name="price_watch", limit=50),
+        "by reference_asin": lambda c: c.query(metadata={"reference_asin": "B0042"}),
+        "failed in one day": lambda c: c.query(status="failed", since="2026-01-10", until="2026-01-11"),
+        "count by name": lambda c: c.count(name="listing_match"),
+    }
+    listings = {
+        "list_traces newest 50": (lambda d: list_traces(d, limit=50), 200),
+        "list_traces, new file": (lambda d: (new_file(d), list_traces(d, limit=50)), 50),
+        "list_traces rescan": (lambda d: list_traces(d, limit=50, rescan=True), 3),
+    }
+    print(f"{'traces':>8}  {'query':<24} {'ms':>8}")
+    for count in counts:
+        with tempfile.TemporaryDirectory() as tmp:
+            catalog = TraceCatalog(tmp)
+            started = time.perf_counter()
+            populate(catalog, count)
+            print(f"{count:>8}  {'populate':<24} {(time.perf_counter() - started) * 1000:>8.0f}")
+            for label, query in queries.items():
+                print(f"{count:>8}  {label:<24} {timed(lambda: query(catalog)) * 1000:>8.3f}")
+            for label, (listing, repeat) in listings.items():
+                print(f"{count:>8}  {label:<24} {timed(lambda: listing(tmp), repeat) * 1000:>8.3f}")
+            catalog.close()
+
+
+if __name__ == "__main__":
+    main()
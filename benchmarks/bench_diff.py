@@ -0,0 +1,81 @@
+# Trace diff benchmark: xray-diff on two NDJSON traces of the same candidates, the second run with
+# a tighter min_rating, a wider price range, 1% of candidates dropped and as many new ones added.
+#
+# The diff runs in a child process that reports its own peak RSS (VmHWM, which unlike
+# ru_maxrss does not carry over the parent's memory from before exec).
+#
+#   python -m benchmarks.bench_diff [count ...]
+
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from benchmarks.bench_memory import build_evaluation
+from benchmarks.synthetic import generate_candidates, filter_thresholds
+
+
+CHILD = '''
+import sys
+from xray.compare import main
+main(sys.argv[1:] + ["--json", "--limit", "0"])
+status = open("/proc/self/status").read()
+print(status.split("VmHWM:")[1].split()[0], file=sys.stderr)
+'''
+
+
+def write_run(path: Path, candidates: list[dict], thresholds: dict, name: str) -> None:
+    with open(path, "w", encoding="utf-8") as f:
+        def write(record: dict) -> None:
+            f.write(json.dumps(record, separators=(",", ":")) + "\n")
+
+        write({"type": "session", "trace_id": name, "name": "bench_diff", "started_at": None, "metadata": {}})
+        write({"type": "step_start", "step_id": "filter", "name": "apply_filters", "step_type": "filter",
+               "started_at": None})
+        for candidate in candidates:
+            write({**build_evaluation(candidate, thresholds).to_dict(), "type": "evaluation", "step_id": "filter"})
+        write({"type": "step", "step_id": "filter", "name": "apply_filters", "step_type": "filter",
+               "input_data": {"filter_config": thresholds}, "output_data": {}, "status": "completed",
+               "evaluation_count": len(candidates)})
+        write({"type": "session_end", "trace_id": name, "completed_at": None})
+
+
+def run(count: int, directory: Path) -> dict:
+    candidates = generate_candidates(count)
+    before = filter_thresholds()
+    after = {**before, "min_rating": 4.2, "max_price": before["max_price"] * 1.2}
+    changed = [c for i, c in enumerate(candidates) if i % 100] + generate_candidates(count // 100, seed=7)
+    for i, candidate in enumerate(changed[-(count // 100):]):
+        candidate["asin"] = f"B0NEW{i:08d}"
+
+    path_a, path_b = directory / "a.ndjson", directory / "b.ndjson"
+    write_run(path_a, candidates, before, "a")
+    write_run(path_b, changed, after, "b")
+    del candidates, changed
+
+    started = time.perf_counter()
+    child = subprocess.run(
+        [sys.executable, "-c", CHILD, str(path_a), str(path_b)], check=True, capture_output=True, text=True
+    )
+    diff_s = time.perf_counter() - started
+    report = json.loads(child.stdout)
+    return {"bytes": os.path.getsize(path_a) + os.path.getsize(path_b), "diff": diff_s,
+            "peak_mb": int(child.stderr.split()[0]) / 1024, "changes": report["change_count"]}
+
+
+def main(argv: list[str] = None) -> None:
+    argv = sys.argv[1:] if argv is None else argv
+    counts = [int(a) for a in argv] or [1_000_000]
+    print(f"{'candidates':>10}  {'traces MB':>9} {'diff s':>7} {'peak RSS MB':>11} {'changes':>8}")
+    for count in counts:
+        with tempfile.TemporaryDirectory() as tmp:
+            result = run(count, Path(tmp))
+        print(f"{count:>10}  {result['bytes'] / 1e6:>9.0f} {result['diff']:>7.1f} "
+              f"{result['peak_mb']:>11.0f} {result['changes']:>8}")
+
+
+if __name__ == "__main__":
+    main()
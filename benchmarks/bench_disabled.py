@@ -0,0 +1,90 @@
+# Disabled tracing: traced code run with tracing disabled, next to the same work with no
+# tracing code at all and traced. Disabled runs go through the shared no-op session and step.
+#   per-row       the hand-written filter loop plus add_evaluation(lambda: ...) per candidate;
+#                 the lambda is never called, so the remaining cost is one no-op call per row
+#   per-row, guarded  the same loop with the add_evaluation call under "if step.enabled"
+#   engine        the demo's FilterRankEngine on a step (disabled: its short-circuit pass),
+#                 against the same engine filtering into a bare EvaluationTable
+#
+#   python -m benchmarks.bench_disabled [count ...]
+
+import sys
+import time
+
+from xray import XRaySession
+from xray.columnar import EvaluationTable
+from demo.competitor_selection import CompetitorSelectionPipeline, build_engine
+from demo.mock_data import REFERENCE_PRODUCT
+from benchmarks.bench_batch import untraced
+from benchmarks.bench_memory import build_evaluation
+from benchmarks.synthetic import generate_candidates, filter_thresholds
+
+REPEAT = 5
+
+
+def per_row(session: XRaySession, candidates: list[dict], t: dict, guarded: bool = False) -> int:
+    qualified = 0
+    with session.step("apply_filters_and_rank", step_type="filter") as step:
+        step.set_input(lambda: {"candidates_count": len(candidates), "thresholds": dict(t)})
+        record = step.enabled or not guarded
+        for c in candidates:
+            if (t["min_price"] <= c["price"] <= t["max_price"] and c["rating"] >= t["min_rating"]
+                    and c["reviews"] >= t["min_reviews"] and "Water Bottles" in c["category"]):
+                qualified += 1
+            if record:
+                step.add_evaluation(lambda: build_evaluation(c, t))
+    return qualified
+
+
+def engine_step(session: XRaySession, engine, candidates: list[dict]) -> int:
+    with session.step("apply_filters_and_rank", step_type="filter") as step:
+        step.set_input(lambda: {"candidates_count": len(candidates), "weights": engine.weights()})
+        return engine.filter(step, candidates)["passed"]
+
+
+def best(fn, *args) -> tuple:
+    times = []
+    for _ in range(REPEAT):
+        started = time.perf_counter()
+        result = fn(*args)
+        times.append(time.perf_counter() - started)
+    return result, min(times)
+
+
+def run(count: int) -> list[tuple[str, float, int]]:
+    candidates = generate_candidates(count)
+    t = filter_thresholds()
+    engine = build_engine(REFERENCE_PRODUCT, CompetitorSelectionPipeline(REFERENCE_PRODUCT).filter_config)
+    # one explain pass first, so every engine run below uses the same learned filter order
+    engine.filter(EvaluationTable(), candidates, explain=True)
+    disabled = XRaySession("bench_disabled", enabled=False)
+    runs = [
+        ("untraced loop", untraced, candidates, t),
+        ("per-row, disabled", per_row, disabled, candidates, t),
+        ("per-row, disabled, guarded", per_row, disabled, candidates, t, True),
+        ("engine, untraced", lambda: engine.filter(EvaluationTable(), candidates, False)["passed"]),
+        ("engine, disabled", engine_step, disabled, engine, candidates),
+        ("per-row, traced", lambda: per_row(XRaySession("bench_disabled"), candidates, t)),
+        ("engine, traced", lambda: engine_step(XRaySession("bench_disabled"), engine, candidates)),
+    ]
+    results = []
+    for mode, fn, *args in runs:
+        qualified, elapsed = best(fn, *args)
+        results.append((mode, elapsed, qualified))
+    return results
+
+
+def main(argv: list[str] = None) -> None:
+    argv = sys.argv[1:] if argv is None else argv
+    counts = [int(a) for a in argv] or [200_000]
+    print(f"{'candidates':>10}  {'seconds':>8} {'vs untraced':>11} {'qualified':>9}  mode")
+    for count in counts:
+        results = run(count)
+        untraced_s = {"per-row": results[0][1], "engine": results[3][1]}
+        for mode, elapsed, qualified in results:
+            baseline = untraced_s["engine" if mode.startswith("engine") else "per-row"]
+            print(f"{count:>10}  {elapsed:>8.3f} {elapsed / baseline - 1:>+11.1%} {qualified:>9}  {mode}")
+
+
+if __name__ == "__main__":
+    main()
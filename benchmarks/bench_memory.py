@@ -0,0 +1,111 @@
+# Memory benchmark: list[Evaluation] (one object graph per candidate) vs. the columnar EvaluationTable.
+#
+#   python -m benchmarks.bench_memory [count ...]
+
+import gc
+import sys
+import time
+import tracemalloc
+
+from xray.core import Evaluation, FilterResult
+from xray.columnar import EvaluationTable
+from benchmarks.synthetic import generate_candidates, filter_thresholds
+
+
+def build_evaluation(candidate: dict, t: dict) -> Evaluation:
+    # Mirrors what CompetitorSelectionPipeline._step3_apply_filters_and_rank records per candidate.
+    evaluation = Evaluation(
+        candidate_id=candidate["asin"],
+        candidate_data={
+            "asin": candidate["asin"],
+            "title": candidate["title"],
+            "price": candidate["price"],
+            "rating": candidate["rating"],
+            "reviews": candidate["reviews"],
+            "category": candidate["category"]
+        }
+    )
+    price_passed = t["min_price"] <= candidate["price"] <= t["max_price"]
+    evaluation.add_filter_result(FilterResult(
+        filter_name="price_range",
+        passed=price_passed,
+        detail=f"INR {candidate['price']:.0f} checked against INR {t['min_price']:.0f} - INR {t['max_price']:.0f}",
+        expected=f"INR {t['min_price']:.0f} - INR {t['max_price']:.0f}",
+        actual=f"INR {candidate['price']:.0f}"
+    ))
+    rating_passed = candidate["rating"] >= t["min_rating"]
+    evaluation.add_filter_result(FilterResult(
+        filter_name="min_rating",
+        passed=rating_passed,
+        detail=f"Rating {candidate['rating']} vs {t['min_rating']} threshold",
+        expected=f">= {t['min_rating']}",
+        actual=str(candidate["rating"])
+    ))
+    reviews_passed = candidate["reviews"] >= t["min_reviews"]
+    evaluation.add_filter_result(FilterResult(
+        filter_name="min_reviews",
+        passed=reviews_passed,
+        detail=f"{candidate['reviews']} reviews vs {t['min_reviews']} minimum",
+        expected=f">= {t['min_reviews']}",
+        actual=str(candidate["reviews"])
+    ))
+    category_passed = "Water Bottles" in candidate["category"]
+    evaluation.add_filter_result(FilterResult(
+        filter_name="category_match",
+        passed=category_passed,
+        detail="Product is in Water Bottles category" if category_passed else "Product is an accessory, not a water bottle",
+        expected="Water Bottles category",
+        actual=candidate["category"]
+    ))
+    evaluation.qualified = price_passed and rating_passed and reviews_passed and category_passed
+    if evaluation.qualified:
+        evaluation.metadata = {"score": 0.5}
+    return evaluation
+
+
+def measure(label: str, build) -> dict:
+    gc.collect()
+    tracemalloc.start()
+    started = time.perf_counter()
+    container = build()
+    elapsed = time.perf_counter() - started
+    gc.collect()
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del container
+    return {"label": label, "retained_bytes": retained, "peak_bytes": peak, "seconds": elapsed}
+
+
+def run(count: int) -> list[dict]:
+    candidates = generate_candidates(count)
+    t = filter_thresholds()
+
+    def as_list():
+        return [build_evaluation(c, t) for c in candidates]
+
+    def as_table():
+        table = EvaluationTable()
+        for c in candidates:
+            table.append(build_evaluation(c, t))
+        # what closing the step does
+        table.compact()
+        return table
+
+    return [measure("list[Evaluation]", as_list), measure("EvaluationTable", as_table)]
+
+
+def main(argv: list[str] = None) -> None:
+    argv = sys.argv[1:] if argv is None else argv
+    counts = [int(a) for a in argv] or [10_000, 100_000, 200_000]
+    print(f"{'candidates':>10}  {'storage':<18} {'retained MB':>12} {'peak MB':>9} {'B/cand':>8} {'seconds':>8}")
+    for count in counts:
+        for result in run(count):
+            print(
+                f"{count:>10}  {result['label']:<18} "
+                f"{result['retained_bytes'] / 1e6:>12.1f} {result['peak_bytes'] / 1e6:>9.1f} "
+                f"{result['retained_bytes'] / count:>8.0f} {result['seconds']:>8.2f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
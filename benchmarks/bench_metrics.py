@@ -0,0 +1,49 @@
+# Metrics overhead: the cost per evaluation of feeding an xray.metrics.Metrics registry, in
+# sampled and unsampled runs.
+#   per-row   the hand-written filter loop with add_evaluation(lambda: ...) per candidate; with
+#             metrics on, an unsampled run now builds each evaluation to count it
+#   engine    the demo's FilterRankEngine step (explain when sampled, short-circuit when not)
+#
+#   python -m benchmarks.bench_metrics [count ...]
+
+import sys
+import time
+
+from xray import Metrics, XRaySession
+from demo.competitor_selection import CompetitorSelectionPipeline, build_engine
+from demo.mock_data import REFERENCE_PRODUCT
+from benchmarks.bench_disabled import engine_step, per_row
+from benchmarks.synthetic import generate_candidates, filter_thresholds
+
+REPEAT = 5
+
+
+def best_of(fn) -> float:
+    times = []
+    for _ in range(REPEAT):
+        started = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - started)
+    return min(times)
+
+
+def main(argv: list[str] = None) -> None:
+    argv = sys.argv[1:] if argv is None else argv
+    counts = [int(arg) for arg in argv] or [10_000, 100_000]
+    engine = build_engine(REFERENCE_PRODUCT, CompetitorSelectionPipeline(REFERENCE_PRODUCT).filter_config)
+    metrics = Metrics()
+    print(f"{'candidates':>10} {'path':<8} {'run':<10} {'no metrics ms':>14} {'metrics ms':>11} {'ns/eval':>8}")
+    for count in counts:
+        candidates = generate_candidates(count)
+        t = filter_thresholds()
+        for label, fn in (("per-row", lambda s: per_row(s, candidates, t)),
+                          ("engine", lambda s: engine_step(s, engine, candidates))):
+            for run, rate in (("sampled", 1.0), ("unsampled", 0.0)):
+                without = best_of(lambda: fn(XRaySession("bench_metrics", sample_rate=rate)))
+                with_metrics = best_of(lambda: fn(XRaySession("bench_metrics", sample_rate=rate, metrics=metrics)))
+                print(f"{count:>10} {label:<8} {run:<10} {without * 1e3:>14.1f} {with_metrics * 1e3:>11.1f} "
+                      f"{(with_metrics - without) / count * 1e9:>8.0f}")
+
+
+if __name__ == "__main__":
+    main()
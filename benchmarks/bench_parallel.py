@@ -0,0 +1,74 @@
+# Sharded filter step: the demo's filter-and-rank engine over N candidates, serially and
+# through xray.parallel with 1, 2, 4 and 8 worker processes. "record s" covers sharding, the
+# workers and the merge; "serialize s" is step.to_dict() afterwards (workers pre-render callable
+# details, so serialization gets cheaper as recording moves off the main process).
+#
+#   python -m benchmarks.bench_parallel [count ...]
+
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from xray.core import Step
+from xray.parallel import map_candidates
+from demo.competitor_selection import CompetitorSelectionPipeline, build_engine
+from demo.mock_data import REFERENCE_PRODUCT
+from benchmarks.synthetic import generate_candidates
+
+WORKER_COUNTS = (1, 2, 4, 8)
+
+
+def filter_and_score(table, candidates: list[dict], config: dict) -> None:
+    engine = build_engine(REFERENCE_PRODUCT, config)
+    engine.rank(table, candidates, engine.filter(table, candidates, explain=True))
+
+
+def run(count: int) -> list[dict]:
+    candidates = generate_candidates(count)
+    config = CompetitorSelectionPipeline(REFERENCE_PRODUCT).filter_config
+    results = []
+
+    step = Step("apply_filters_and_rank", step_type="filter")
+    started = time.perf_counter()
+    filter_and_score(step.evaluations, candidates, config)
+    record_s = time.perf_counter() - started
+    started = time.perf_counter()
+    step.to_dict()
+    results.append({"mode": "serial", "record_s": record_s, "serialize_s": time.perf_counter() - started})
+    expected = (bytes(step.evaluations.qualified), step.evaluations.filter_counts())
+
+    for workers in WORKER_COUNTS:
+        # the pool is started outside the timing, as a long-running pipeline would keep it
+        with ProcessPoolExecutor(workers) as pool:
+            pool.submit(int).result()
+            step = Step("apply_filters_and_rank", step_type="filter")
+            started = time.perf_counter()
+            merged = map_candidates(step, candidates, filter_and_score, config, workers=workers, executor=pool, top_k=10)
+            record_s = time.perf_counter() - started
+        started = time.perf_counter()
+        step.to_dict()
+        serialize_s = time.perf_counter() - started
+        if (bytes(step.evaluations.qualified), step.evaluations.filter_counts()) != expected:
+            raise AssertionError(f"{workers} workers: merged step differs from the serial run")
+        results.append({"mode": f"{workers} process(es)", "record_s": record_s, "serialize_s": serialize_s,
+                        "top": merged["top"][0]})
+    return results
+
+
+def main(argv: list[str] = None) -> None:
+    argv = sys.argv[1:] if argv is None else argv
+    counts = [int(a) for a in argv] or [200_000]
+    print(f"{os.cpu_count()} CPUs")
+    print(f"{'candidates':>10}  {'mode':<14} {'record s':>9} {'serialize s':>11} {'speedup':>8}")
+    for count in counts:
+        results = run(count)
+        serial = results[0]["record_s"] + results[0]["serialize_s"]
+        for result in results:
+            total = result["record_s"] + result["serialize_s"]
+            print(f"{count:>10}  {result['mode']:<14} {result['record_s']:>9.3f} {result['serialize_s']:>11.3f} "
+                  f"{serial / total:>7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+# Step profiling overhead: the demo's filter step over N synthetic candidates with no profiler
+# and with each hook of xray.profiling on its own, then all of them together.
+#
+#   python -m benchmarks.bench_profiling [count ...]
+
+import sys
+import time
+
+from xray import StepProfiler, XRaySession
+from demo.competitor_selection import CompetitorSelectionPipeline, build_engine
+from demo.mock_data import REFERENCE_PRODUCT
+from benchmarks.synthetic import generate_candidates
+
+REPEAT = 5
+
+PROFILERS = {
+    "off": None,
+    "gc": StepProfiler(cprofile=False, memory=False, sample_interval=None),
+    "sampling": StepProfiler(cprofile=False, memory=False, gc_stats=False),
+    "cprofile": StepProfiler(memory=False, gc_stats=False, sample_interval=None),
+    "tracemalloc": StepProfiler(cprofile=False, gc_stats=False, sample_interval=None),
+    "all": StepProfiler(),
+}
+
+
+def filter_step(engine, candidates: list[dict], profile) -> None:
+    session = XRaySession("bench_profiling")
+    with session.step("apply_filters_and_rank", step_type="filter", profile=profile) as step:
+        engine.rank(step, candidates, engine.filter(step, candidates), top_k=3)
+
+
+def best_of(engine, candidates: list[dict], profile) -> float:
+    times = []
+    for _ in range(REPEAT):
+        started = time.perf_counter()
+        filter_step(engine, candidates, profile)
+        times.append(time.perf_counter() - started)
+    return min(times)
+
+
+def main(argv: list[str] = None) -> None:
+    argv = sys.argv[1:] if argv is None else argv
+    counts = [int(arg) for arg in argv] or [1_000, 10_000, 50_000]
+    engine = build_engine(REFERENCE_PRODUCT, CompetitorSelectionPipeline(REFERENCE_PRODUCT).filter_config)
+    print(f"{'candidates':>10} {'profiler':<12} {'ms':>9} {'overhead':>9}")
+    for count in counts:
+        candidates = generate_candidates(count)
+        best_of(engine, candidates, None)
+        baseline = None
+        for label, profile in PROFILERS.items():
+            seconds = best_of(engine, candidates, profile)
+            baseline = baseline or seconds
+            print(f"{count:>10} {label:<12} {seconds * 1e3:>9.1f} {seconds / baseline - 1:>+8.0%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+# Evaluation query benchmark: first-page latency of TraceQuery on binary and JSON traces.
+#
+# Opening includes reading (binary) or building (JSON) the step's indexes; each query is timed
+# cold (first call) and for the page after it.
+#
+#   python -m benchmarks.bench_query [count ...]
+
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from xray import save_trace
+from xray.query import TraceQuery
+from benchmarks.bench_binary import build_session, timed
+
+
+QUERIES = [
+    ("all rows", {}),
+    ("qualified", {"qualified": True}),
+    ("failed min_rating", {"failed": "min_rating"}),
+    ("price range", {"ranges": {"price": (500, 900)}}),
+    ("search id", {"search": "n00042"}),
+    ("top score", {"sort": "score"}),
+    ("rejected, 2 filters, range, by price", {"qualified": False, "failed": ["min_rating", "price_range"],
+                                              "ranges": {"rating": (3.0, 4.0)}, "sort": "price"}),
+]
+
+
+def run(count: int, directory: Path) -> list[dict]:
+    session = build_session(count)
+    results = []
+    for label in ("xrb", "json"):
+        path = directory / f"bench_{count}.{label}"
+        save_trace(session, path, catalog=False)
+        query, open_s = timed(lambda: TraceQuery(path))
+        _, index_s = timed(lambda: query.index("apply_filters"))
+        results.append({"format": label, "query": "open + index", "first": open_s + index_s, "next": 0.0,
+                        "total": count})
+        for name, kwargs in QUERIES:
+            page, first_s = timed(lambda: query.evaluations("apply_filters", **kwargs))
+            _, next_s = timed(lambda: query.evaluations("apply_filters", cursor=page["next_cursor"], **kwargs))
+            results.append({"format": label, "query": name, "first": first_s, "next": next_s,
+                            "total": page["total"]})
+        query.close()
+    return results
+
+
+def main(argv: list[str] = None) -> None:
+    argv = sys.argv[1:] if argv is None else argv
+    counts = [int(a) for a in argv] or [100_000]
+    print(f"{'candidates':>10}  {'format':<6} {'query':<38} {'matches':>8} {'first ms':>9} {'next ms':>8}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for count in counts:
+            for result in run(count, Path(tmp)):
+                print(
+                    f"{count:>10}  {result['format']:<6} {result['query']:<38} {result['total']:>8} "
+                    f"{result['first'] * 1000:>9.2f} {result['next'] * 1000:>8.2f}"
+                )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+# Deferred rendering benchmark: per-candidate cost of recording FilterResults with eager
+# f-strings vs. templates + raw values vs. callables, and what serializing costs afterwards.
+#
+#   python -m benchmarks.bench_render [count ...]
+
+import json
+import sys
+import time
+
+from xray import XRaySession, Evaluation, FilterResult
+from benchmarks.bench_memory import build_evaluation
+from benchmarks.synthetic import generate_candidates, filter_thresholds
+
+
+PRICE_DETAIL = "INR {price:.0f} checked against INR {min_price:.0f} - INR {max_price:.0f}"
+PRICE_EXPECTED = "INR {min_price:.0f} - INR {max_price:.0f}"
+PRICE_ACTUAL = "INR {price:.0f}"
+RATING_DETAIL = "Rating {rating} vs {min_rating} threshold"
+REVIEWS_DETAIL = "{reviews} reviews vs {min_reviews} minimum"
+
+
+def build_templated(candidate: dict, t: dict) -> Evaluation:
+    # build_evaluation() with every string left as a template over raw values.
+    evaluation = Evaluation(
+        candidate_id=candidate["asin"],
+        candidate_data={
+            "asin": candidate["asin"],
+            "title": candidate["title"],
+            "price": candidate["price"],
+            "rating": candidate["rating"],
+            "reviews": candidate["reviews"],
+            "category": candidate["category"]
+        }
+    )
+    price_passed = t["min_price"] <= candidate["price"] <= t["max_price"]
+    evaluation.add_filter_result(FilterResult(
+        "price_range", price_passed, PRICE_DETAIL, PRICE_EXPECTED, PRICE_ACTUAL,
+        values={"price": candidate["price"], "min_price": t["min_price"], "max_price": t["max_price"]}
+    ))
+    rating_passed = candidate["rating"] >= t["min_rating"]
+    evaluation.add_filter_result(FilterResult(
+        "min_rating", rating_passed, RATING_DETAIL, ">= {min_rating}", "{rating}",
+        values={"rating": candidate["rating"], "min_rating": t["min_rating"]}
+    ))
+    reviews_passed = candidate["reviews"] >= t["min_reviews"]
+    evaluation.add_filter_result(FilterResult(
+        "min_reviews", reviews_passed, REVIEWS_DETAIL, ">= {min_reviews}", "{reviews}",
+        values={"reviews": candidate["reviews"], "min_reviews": t["min_reviews"]}
+    ))
+    category_passed = "Water Bottles" in candidate["category"]
+    evaluation.add_filter_result(FilterResult(
+        "category_match", category_passed,
+        "Product is in Water Bottles category" if category_passed else "Product is an accessory, not a water bottle",
+        expected="Water Bottles category",
+        actual=candidate["category"]
+    ))
+    evaluation.qualified = price_passed and rating_passed and reviews_passed and category_passed
+    if evaluation.qualified:
+        evaluation.metadata = {"score": 0.5}
+    return evaluation
+
+
+def build_callable(candidate: dict, t: dict) -> Evaluation:
+    # build_evaluation() with each numeric filter's strings behind one detail callable.
+    evaluation = Evaluation(
+        candidate_id=candidate["asin"],
+        candidate_data={
+            "asin": candidate["asin"],
+            "title": candidate["title"],
+            "price": candidate["price"],
+            "rating": candidate["rating"],
+            "reviews": candidate["reviews"],
+            "category": candidate["category"]
+        }
+    )
+    price, rating, reviews = candidate["price"], candidate["rating"], candidate["reviews"]
+    price_passed = t["min_price"] <= price <= t["max_price"]
+    evaluation.add_filter_result(FilterResult(
+        "price_range", price_passed, lambda: PRICE_DETAIL.format(price=price, **t),
+        expected=t["price_expected"], actual=lambda: f"INR {price:.0f}"
+    ))
+    rating_passed = rating >= t["min_rating"]
+    evaluation.add_filter_result(FilterResult(
+        "min_rating", rating_passed, lambda: RATING_DETAIL.format(rating=rating, **t),
+        expected=t["rating_expected"], actual=rating
+    ))
+    reviews_passed = reviews >= t["min_reviews"]
+    evaluation.add_filter_result(FilterResult(
+        "min_reviews", reviews_passed, lambda: REVIEWS_DETAIL.format(reviews=reviews, **t),
+        expected=t["reviews_expected"], actual=reviews
+    ))
+    category_passed = "Water Bottles" in candidate["category"]
+    evaluation.add_filter_result(FilterResult(
+        "category_match", category_passed,
+        "Product is in Water Bottles category" if category_passed else "Product is an accessory, not a water bottle",
+        expected="Water Bottles category",
+        actual=candidate["category"]
+    ))
+    evaluation.qualified = price_passed and rating_passed and reviews_passed and category_passed
+    if evaluation.qualified:
+        evaluation.metadata = {"score": 0.5}
+    return evaluation
+
+
+def run(count: int) -> list[dict]:
+    candidates = generate_candidates(count)
+    t = filter_thresholds()
+    # shared expected strings, computed once per run like a pipeline would
+    t.update(price_expected=PRICE_EXPECTED.format(**t), rating_expected=f">= {t['min_rating']}",
+             reviews_expected=f">= {t['min_reviews']}")
+    results = []
+    for label, build, render in [("eager f-strings", build_evaluation, True),
+                                 ("callables", build_callable, True),
+                                 ("templates", build_templated, True),
+                                 ("templates, compact", build_templated, False)]:
+        with XRaySession("bench_render") as session:
+            with session.step("apply_filters", step_type="filter") as step:
+                started = time.perf_counter()
+                for candidate in candidates:
+                    step.add_evaluation(build(candidate, t))
+                record_s = time.perf_counter() - started
+        started = time.perf_counter()
+        payload = json.dumps(session.to_dict(render=render))
+        serialize_s = time.perf_counter() - started
+        results.append({"label": label, "record": record_s, "serialize": serialize_s, "bytes": len(payload)})
+    return results
+
+
+def main(argv: list[str] = None) -> None:
+    argv = sys.argv[1:] if argv is None else argv
+    counts = [int(a) for a in argv] or [100_000]
+    print(f"{'candidates':>10}  {'filter results':<20} {'record us/cand':>14} {'serialize s':>11} {'JSON MB':>8}")
+    for count in counts:
+        for result in run(count):
+            print(
+                f"{count:>10}  {result['label']:<20} {result['record'] / count * 1e6:>14.2f} "
+                f"{result['serialize']:>11.2f} {result['bytes'] / 1e6:>8.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,42 @@
+# Batch runner throughput: demo.batch over N synthetic products with simulated LLM and search
+# latency, at increasing concurrency, with the filter step on a process and on a thread pool.
+# Concurrency 1 is the one-product-at-a-time baseline.
+#
+#   python -m benchmarks.bench_runner [products] [llm latency s] [search latency s]
+
+import asyncio
+import sys
+
+from demo.batch import BatchRunner, simulated_llm, simulated_search, synthetic_catalog
+
+CONCURRENCY = (1, 8, 32, 128)
+
+
+def run(products: int, llm_latency: float, search_latency: float) -> list[tuple[str, int, dict]]:
+    results = []
+    for executor in ("process", "thread"):
+        for concurrency in CONCURRENCY:
+            runner = BatchRunner(llm=simulated_llm(llm_latency), search=simulated_search(search_latency),
+                                 concurrency=concurrency, executor=executor)
+            report = asyncio.run(runner.run(synthetic_catalog(products)))
+            results.append((executor, concurrency, report))
+    return results
+
+
+def main(argv: list[str] = None) -> None:
+    argv = sys.argv[1:] if argv is None else argv
+    products = int(argv[0]) if argv else 100
+    llm_latency = float(argv[1]) if len(argv) > 1 else 0.05
+    search_latency = float(argv[2]) if len(argv) > 2 else 0.02
+    print(f"{products} products, LLM {llm_latency * 1e3:.0f} ms, search {search_latency * 1e3:.0f} ms")
+    print(f"{'pool':<8} {'concurrency':>11} {'seconds':>8} {'runs/s':>8} {'p50 ms':>7} {'p95 ms':>7} {'speedup':>8}")
+    results = run(products, llm_latency, search_latency)
+    baseline = {executor: report["runs_per_s"] for executor, concurrency, report in results if concurrency == 1}
+    for executor, concurrency, report in results:
+        print(f"{executor:<8} {concurrency:>11} {report['seconds']:>8.2f} {report['runs_per_s']:>8.1f} "
+              f"{report['latency_p50_s'] * 1e3:>7.0f} {report['latency_p95_s'] * 1e3:>7.0f} "
+              f"{report['runs_per_s'] / baseline[executor]:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
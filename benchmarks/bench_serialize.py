@@ -0,0 +1,79 @@
+# Trace serialization: json.dump(session.to_dict(), indent=2), the previous save_trace, against
+# the streaming encoder in xray.encoder with each backend, compact and indented. Peak memory is
+# the tracemalloc peak during the write, measured in a second pass since tracing slows it down.
+#
+#   python -m benchmarks.bench_serialize [count ...]
+
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+from xray import XRaySession
+from xray.core import Step
+from xray.encoder import BACKEND, write_session_json
+from demo.competitor_selection import CompetitorSelectionPipeline, build_engine
+from demo.mock_data import REFERENCE_PRODUCT
+from benchmarks.synthetic import generate_candidates
+
+
+def build_session(count: int) -> XRaySession:
+    candidates = generate_candidates(count)
+    engine = build_engine(REFERENCE_PRODUCT, CompetitorSelectionPipeline(REFERENCE_PRODUCT).filter_config)
+    session = XRaySession("bench_serialize", metadata={"size": count})
+    step = Step("apply_filters_and_rank", step_type="filter")
+    engine.rank(step, candidates, engine.filter(step, candidates, explain=True), top_k=10)
+    step.complete()
+    session.add_step(step)
+    session.completed_at = datetime.now().isoformat()
+    return session
+
+
+def dict_tree(session: XRaySession, path: str) -> None:
+    with open(path, "w") as f:
+        json.dump(session.to_dict(), f, indent=2)
+
+
+def streamed(backend: str, indent):
+    def write(session: XRaySession, path: str) -> None:
+        with open(path, "wb") as f:
+            write_session_json(session, f, indent=indent, backend=backend)
+    return write
+
+
+def measure(write, session: XRaySession, path: str) -> dict:
+    started = time.perf_counter()
+    write(session, path)
+    seconds = time.perf_counter() - started
+    tracemalloc.start()
+    write(session, path)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {"seconds": seconds, "peak_mb": peak / 1e6, "size_mb": os.path.getsize(path) / 1e6}
+
+
+def run(count: int) -> list[tuple[str, dict]]:
+    session = build_session(count)
+    modes = [("to_dict + json.dump, indent=2", dict_tree)]
+    for backend in ["json"] + (["orjson"] if BACKEND == "orjson" else []):
+        modes += [(f"streamed {backend}, indent=2", streamed(backend, 2)),
+                  (f"streamed {backend}, compact", streamed(backend, None))]
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "trace.json")
+        return [(mode, measure(write, session, path)) for mode, write in modes]
+
+
+def main(argv: list[str] = None) -> None:
+    argv = sys.argv[1:] if argv is None else argv
+    counts = [int(a) for a in argv] or [100_000]
+    print(f"{'candidates':>10}  {'seconds':>8} {'peak MB':>8} {'file MB':>8}  mode")
+    for count in counts:
+        for mode, result in run(count):
+            print(f"{count:>10}  {result['seconds']:>8.3f} {result['peak_mb']:>8.1f} {result['size_mb']:>8.1f}  {mode}")
+
+
+if __name__ == "__main__":
+    main()
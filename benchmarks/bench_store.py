@@ -0,0 +1,116 @@
+# Trace storage over a synthetic month: disk used by the demo pipeline's traces in each layout a
+# TraceStore can write, then a retention purge. Each day runs the pipeline R times against
+# reference products drawn from a small catalog; each search returns C candidates sampled from a
+# shared pool, so the same candidate_data repeats across runs as it does in production.
+#   pretty     save_trace(indent=2), the format before the streaming encoder
+#   compact    the current default
+#   gzip/zstd  TraceStore compression, without and with the blob side store (dedupe)
+#
+#   python -m benchmarks.bench_store [runs_per_day [candidates]]
+
+import asyncio
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from xray import TraceStore, load_trace, save_trace
+from xray.compression import ZSTD_AVAILABLE
+from demo.batch import simulated_llm, synthetic_catalog
+from demo.competitor_selection import CompetitorSelectionPipeline
+from benchmarks.synthetic import generate_candidates
+
+DAYS = 30
+POOL = 3000
+REFERENCES = 40
+
+
+def layouts() -> dict:
+    # name -> TraceStore keyword arguments; None is the uncompressed pretty-printed file
+    options = {"pretty": None, "compact": {"compression": None, "dedupe": False}}
+    for compression in ("gzip", "zstd") if ZSTD_AVAILABLE else ("gzip",):
+        options[compression] = {"compression": compression, "dedupe": False}
+        options[f"{compression}+dedupe"] = {"compression": compression, "dedupe": True}
+    return options
+
+
+def month_of_sessions(runs_per_day: int, candidates: int):
+    # (day, session) for every run, in order
+    rng = random.Random(11)
+    pool = generate_candidates(POOL)
+    references = list(synthetic_catalog(REFERENCES))
+
+    async def search(keywords: list[str]) -> list[dict]:
+        return rng.sample(pool, candidates)
+
+    async def runs():
+        llm = simulated_llm()
+        for day in range(DAYS):
+            for _ in range(runs_per_day):
+                pipeline = CompetitorSelectionPipeline(rng.choice(references), trace_path=None)
+                result = await pipeline.run_async(llm, search)
+                yield day, result["session"]
+
+    async def collect() -> list:
+        return [item async for item in runs()]
+
+    return asyncio.run(collect())
+
+
+def main(argv: list[str] = None) -> None:
+    argv = sys.argv[1:] if argv is None else argv
+    runs_per_day = int(argv[0]) if argv else 24
+    candidates = int(argv[1]) if len(argv) > 1 else 200
+    sessions = month_of_sessions(runs_per_day, candidates)
+    root = Path(tempfile.mkdtemp(prefix="xray_bench_store_"))
+    print(f"{DAYS} days x {runs_per_day} runs, {candidates} of {POOL} candidates each: {len(sessions)} traces")
+    print(f"{'layout':<13} {'traces MB':>10} {'blobs MB':>9} {'total MB':>9} {'vs pretty':>10} "
+          f"{'save ms':>8} {'load ms':>8}")
+    now = time.time()
+    baseline = None
+    try:
+        for name, options in layouts().items():
+            directory = root / name
+            store = TraceStore(directory, **(options or {"compression": None, "dedupe": False}))
+            paths = []
+            started = time.perf_counter()
+            for day, session in sessions:
+                if options is None:
+                    path = save_trace(session, store.path_for(session), indent=2)
+                else:
+                    path = store.save(session)
+                paths.append((day, path))
+            saved = time.perf_counter() - started
+            started = time.perf_counter()
+            for _, path in paths[::10]:
+                load_trace(path)
+            loaded = (time.perf_counter() - started) / len(paths[::10])
+            for day, path in paths:
+                # age the files as if written over the month, day 0 oldest
+                mtime = now - (DAYS - day) * 86400
+                os.utime(path, (mtime, mtime))
+            usage = store.usage()
+            baseline = baseline or usage["total_bytes"]
+            print(f"{name:<13} {usage['trace_bytes'] / 1e6:>10.2f} {usage['blob_bytes'] / 1e6:>9.2f} "
+                  f"{usage['total_bytes'] / 1e6:>9.2f} {usage['total_bytes'] / baseline:>10.1%} "
+                  f"{saved / len(paths) * 1e3:>8.2f} {loaded * 1e3:>8.2f}")
+        # retention on the last (smallest) layout: keep a week, then halve the budget
+        store.max_age = 7 * 86400
+        started = time.perf_counter()
+        purged = store.purge(now)
+        print(f"\npurge max_age=7d: removed {purged['removed']} traces, {purged['bytes_freed'] / 1e6:.2f} MB, "
+              f"{purged['blobs_removed']} blobs in {(time.perf_counter() - started) * 1e3:.0f} ms; "
+              f"{store.usage()['total_bytes'] / 1e6:.2f} MB left")
+        store.max_bytes = store.usage()["total_bytes"] // 2
+        purged = store.purge(now)
+        print(f"purge max_bytes={store.max_bytes / 1e6:.2f} MB: removed {purged['removed']} traces, "
+              f"{purged['blobs_removed']} blobs; {store.usage()['total_bytes'] / 1e6:.2f} MB left")
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
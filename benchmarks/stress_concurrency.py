@@ -0,0 +1,120 @@
+# Stress check: many threads and asyncio tasks recording into one XRaySession.
+#
+#   python -m benchmarks.stress_concurrency [threads] [tasks] [evaluations_per_step]
+#
+# Exits non-zero if any step or evaluation was lost, duplicated or mis-parented.
+
+import asyncio
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from xray import XRaySession, Evaluation, FilterResult, NDJSONSink, load_trace
+from xray.core import propagate_context
+from xray.serializer import iter_steps
+
+
+def record(step, prefix: str, count: int) -> None:
+    for i in range(count):
+        evaluation = Evaluation(candidate_id=f"{prefix}-{i}", candidate_data={"i": i})
+        evaluation.add_filter_result(FilterResult("even", i % 2 == 0, "parity"))
+        step.add_evaluation(evaluation)
+
+
+def thread_worker(session: XRaySession, shared_step, index: int, per_step: int) -> None:
+    with session.step(f"thread_{index}", step_type="worker") as step:
+        record(step, f"t{index}", per_step)
+        # and a few into the shared parent step from every thread at once
+        record(shared_step, f"shared-t{index}", per_step)
+
+
+async def task_worker(session: XRaySession, index: int, per_step: int) -> None:
+    with session.step(f"task_{index}", step_type="worker") as step:
+        for chunk in range(4):
+            record(step, f"a{index}-{chunk}", per_step // 4)
+            await asyncio.sleep(0)
+
+
+def check(session: XRaySession, threads: int, tasks: int, per_step: int) -> list[str]:
+    problems = []
+    all_steps = list(session.iter_steps())
+    by_name = {step.name: step for step in all_steps}
+    expected_steps = threads + tasks + 2
+    if len(all_steps) != expected_steps:
+        problems.append(f"expected {expected_steps} steps, found {len(all_steps)}")
+    sequences = sorted(step.sequence for step in all_steps)
+    if sequences != list(range(len(all_steps))):
+        problems.append("step sequence numbers are not unique and dense")
+    fan_out, gather = by_name["thread_fan_out"], by_name["task_fan_out"]
+    if len(fan_out.children) != threads or len(gather.children) != tasks:
+        problems.append(f"fan-out steps have {len(fan_out.children)} / {len(gather.children)} children")
+    if gather.child_ns > gather.duration_ns or fan_out.self_ns < 0:
+        problems.append("child time exceeds span duration")
+    for step in all_steps:
+        if step.name.startswith("thread_") and step is not fan_out:
+            if step.parent_id != fan_out.step_id:
+                problems.append(f"{step.name} has parent {step.parent_id}")
+            if len(step.evaluations) != per_step:
+                problems.append(f"{step.name} has {len(step.evaluations)} evaluations")
+        if step.name.startswith("task_") and step is not gather:
+            if step.parent_id != gather.step_id:
+                problems.append(f"{step.name} has parent {step.parent_id}")
+            if len(step.evaluations) != per_step // 4 * 4:
+                problems.append(f"{step.name} has {len(step.evaluations)} evaluations")
+        if step.end_ns is None or step.start_ns is None or step.end_ns < step.start_ns:
+            problems.append(f"{step.name} has bad timestamps {step.start_ns}..{step.end_ns}")
+    shared_ids = fan_out.evaluations.candidate_ids
+    if len(shared_ids) != threads * per_step or len(set(shared_ids)) != len(shared_ids):
+        problems.append(f"shared step has {len(shared_ids)} evaluations, {len(set(shared_ids))} unique")
+    return problems
+
+
+def main(argv: list[str] = None) -> None:
+    argv = sys.argv[1:] if argv is None else argv
+    threads = int(argv[0]) if len(argv) > 0 else 32
+    tasks = int(argv[1]) if len(argv) > 1 else 200
+    per_step = int(argv[2]) if len(argv) > 2 else 400
+
+    path = Path(tempfile.mkdtemp()) / "stress.ndjson"
+    started = time.perf_counter()
+    with XRaySession("stress") as session:
+        with session.step("thread_fan_out") as fan_out:
+            with ThreadPoolExecutor(max_workers=threads) as pool:
+                work = propagate_context(thread_worker)
+                for future in [pool.submit(work, session, fan_out, i, per_step) for i in range(threads)]:
+                    future.result()
+
+        async def gather_all():
+            with session.step("task_fan_out"):
+                await asyncio.gather(*(task_worker(session, i, per_step) for i in range(tasks)))
+        asyncio.run(gather_all())
+    elapsed = time.perf_counter() - started
+
+    problems = check(session, threads, tasks, per_step)
+    all_steps = list(session.iter_steps())
+
+    # the same run through the streaming sink must rebuild to the same steps
+    with XRaySession("stress", sink=NDJSONSink(path)) as streamed:
+        with streamed.step("thread_fan_out") as fan_out:
+            with ThreadPoolExecutor(max_workers=threads) as pool:
+                work = propagate_context(thread_worker)
+                for future in [pool.submit(work, streamed, fan_out, i, per_step) for i in range(threads)]:
+                    future.result()
+    rebuilt = load_trace(path)
+    counts = {step["name"]: len(step["evaluations"]) for step in iter_steps(rebuilt)}
+    if counts.get("thread_fan_out") != threads * per_step or len(counts) != threads + 1:
+        problems.append(f"streamed trace lost records: {len(counts)} steps")
+
+    workers = {step.worker for step in all_steps}
+    print(f"{len(all_steps)} steps on {len(workers)} workers in {elapsed:.2f}s")
+    if problems:
+        for problem in problems:
+            print(f"FAIL: {problem}")
+        sys.exit(1)
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,272 @@
+# Tracing overhead suite: what each X-Ray operation costs per evaluation, from 1k to 10M.
+#
+# For every size, a child process records N synthetic evaluations and runs each operation once:
+#   record_per_row   Step.add_evaluation() of one Evaluation + 4 FilterResults per candidate
+#   record_batch     the demo's FilterRankEngine (batch API), in 100k-candidate chunks
+#   step_to_dict     Step.to_dict() of the batch step
+#   session_to_json  XRaySession.to_json()
+#   save_trace       JSON file, including the catalog entry
+#   load_trace       back into a session
+#   list_traces      a directory with the new file (indexes it) and again (cached)
+# Wall time and peak RSS come from one child; tracemalloc allocations from a second one, since
+# tracing allocations slows everything it measures (skipped above --alloc-max).
+#
+# Results are JSON. With a baseline, each wall time, peak RSS and allocation peak is compared
+# and anything more than --threshold worse is flagged; the exit status is 1 when any is.
+#
+#   xray-bench                                   # 1k, 10k, 100k; compare with benchmarks/baseline.json
+#   xray-bench --sizes 1k,100k,1m,10m --output results.json
+#   xray-bench --save-baseline                   # store this run as the baseline
+
+import argparse
+import gc
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Optional
+
+BASELINE = Path(__file__).with_name("baseline.json")
+DEFAULT_SIZES = "1k,10k,100k"
+CHUNK = 100_000
+OPERATIONS = ("record_per_row", "record_batch", "step_to_dict", "session_to_json", "save_trace",
+              "load_trace", "list_traces", "list_traces_cached")
+# metric -> ignore comparisons below this baseline value (timer and allocator noise)
+COMPARED = {"seconds": 0.02, "peak_rss_mb": 1.0, "alloc_peak_mb": 1.0}
+
+
+def parse_size(text: str) -> int:
+    text = text.strip().lower()
+    scale = {"k": 1_000, "m": 1_000_000}.get(text[-1:], 1)
+    return int(float(text.rstrip("km")) * scale)
+
+
+# -- child process --
+
+def _reset_peak_rss() -> bool:
+    # Linux resets VmHWM on writing 5 to clear_refs; elsewhere the peak only ever grows.
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def _peak_rss_mb() -> float:
+    try:
+        with open("/proc/self/status") as f:
+            return int(f.read().split("VmHWM:")[1].split()[0]) / 1024
+    except (OSError, IndexError):
+        # ru_maxrss is in KiB on Linux and bytes on macOS
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / (1024 * 1024 if sys.platform == "darwin" else 1024)
+
+
+def _measure(fn: Callable, allocations: bool) -> tuple:
+    gc.collect()
+    if allocations:
+        tracemalloc.start()
+        base = tracemalloc.get_traced_memory()[0]
+        result = fn()
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        return result, {"alloc_peak_mb": (peak - base) / 1e6, "alloc_net_mb": (current - base) / 1e6}
+    per_op_rss = _reset_peak_rss()
+    started = time.perf_counter()
+    result = fn()
+    elapsed = time.perf_counter() - started
+    return result, {"seconds": elapsed, "peak_rss_mb": _peak_rss_mb(), "per_op_rss": per_op_rss}
+
+
+def run_size(size: int, allocations: bool, workdir: Path) -> dict:
+    # Every operation at one size; {operation: metrics}.
+    from xray import XRaySession, load_trace, save_trace
+    from xray.core import Step
+    from xray.serializer import list_traces
+    from demo.competitor_selection import CompetitorSelectionPipeline, build_engine
+    from demo.mock_data import REFERENCE_PRODUCT
+    from benchmarks.bench_memory import build_evaluation
+    from benchmarks.synthetic import filter_thresholds, iter_candidates, iter_chunks
+
+    results = {}
+
+    def record(name: str, fn: Callable):
+        result, metrics = _measure(fn, allocations)
+        results[name] = metrics
+        return result
+
+    def per_row() -> None:
+        step = Step("apply_filters_and_rank", step_type="filter")
+        t = filter_thresholds()
+        for candidate in iter_candidates(size):
+            step.add_evaluation(build_evaluation(candidate, t))
+
+    record("record_per_row", per_row)
+
+    session = XRaySession("bench_suite", metadata={"size": size})
+    engine = build_engine(REFERENCE_PRODUCT, CompetitorSelectionPipeline(REFERENCE_PRODUCT).filter_config)
+
+    def batch() -> Step:
+        step = Step("apply_filters_and_rank", step_type="filter")
+        for chunk in iter_chunks(size, CHUNK):
+            engine.filter(step, chunk, explain=True)
+        step.complete()
+        return step
+
+    session.add_step(record("record_batch", batch))
+    session.completed_at = datetime.now().isoformat()
+    record("step_to_dict", session.steps[0].to_dict)
+    record("session_to_json", session.to_json)
+    path = workdir / f"trace_{size}.json"
+    record("save_trace", lambda: save_trace(session, path))
+    del session
+    record("load_trace", lambda: load_trace(path))
+    # a directory that has never seen the file, so listing it indexes the trace
+    listed = workdir / "listed"
+    listed.mkdir(exist_ok=True)
+    os.link(path, listed / path.name)
+    record("list_traces", lambda: list_traces(listed))
+    record("list_traces_cached", lambda: list_traces(listed))
+    return results
+
+
+CHILD = '''
+import json, sys
+from pathlib import Path
+from benchmarks.suite import run_size
+print(json.dumps(run_size(int(sys.argv[1]), sys.argv[2] == "alloc", Path(sys.argv[3]))))
+'''
+
+
+def _run_child(size: int, allocations: bool) -> dict:
+    env = dict(os.environ)
+    root = str(Path(__file__).resolve().parents[1])
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [root, env.get("PYTHONPATH")]))
+    with tempfile.TemporaryDirectory() as workdir:
+        child = subprocess.run(
+            [sys.executable, "-c", CHILD, str(size), "alloc" if allocations else "time", workdir],
+            check=True, capture_output=True, text=True, env=env
+        )
+    return json.loads(child.stdout)
+
+
+# -- suite --
+
+def run_suite(sizes: list[int], repeat: int = 3, alloc_max: int = 1_000_000, log=None) -> dict:
+    # Best-of-repeat time and RSS per operation and size, plus allocations up to alloc_max.
+    results = []
+    for size in sizes:
+        runs = []
+        for _ in range(repeat):
+            runs.append(_run_child(size, False))
+            if log:
+                log(f"  {size:>10,}: timed run {len(runs)}/{repeat}")
+        allocations = _run_child(size, True) if size <= alloc_max else {}
+        for operation in OPERATIONS:
+            seconds = min(run[operation]["seconds"] for run in runs)
+            entry = {
+                "operation": operation,
+                "size": size,
+                "seconds": seconds,
+                "us_per_eval": seconds / size * 1e6,
+                "peak_rss_mb": min(run[operation]["peak_rss_mb"] for run in runs),
+            }
+            if operation in allocations:
+                entry.update(allocations[operation])
+            results.append(entry)
+    return {
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        # with a cumulative (not per-operation) peak, RSS can only be compared across whole runs
+        "per_operation_rss": _reset_peak_rss(),
+        "results": results,
+    }
+
+
+def compare(current: dict, baseline: dict, threshold: float = 0.2) -> list[dict]:
+    # One row per (operation, size, metric) present in both; "regression" when current is more
+    # than threshold worse than the baseline.
+    previous = {(entry["operation"], entry["size"]): entry for entry in baseline["results"]}
+    rows = []
+    for entry in current["results"]:
+        before = previous.get((entry["operation"], entry["size"]))
+        if before is None:
+            continue
+        for metric, floor in COMPARED.items():
+            old, new = before.get(metric), entry.get(metric)
+            if old is None or new is None or old < floor:
+                continue
+            change = new / old - 1
+            rows.append({
+                "operation": entry["operation"], "size": entry["size"], "metric": metric,
+                "baseline": old, "current": new, "change": change, "regression": change > threshold,
+            })
+    return rows
+
+
+def format_results(report: dict) -> str:
+    lines = [f"{'operation':<20} {'size':>11} {'seconds':>9} {'us/eval':>9} {'peak RSS MB':>11} {'alloc MB':>9}"]
+    for entry in report["results"]:
+        alloc = entry.get("alloc_peak_mb")
+        lines.append(f"{entry['operation']:<20} {entry['size']:>11,} {entry['seconds']:>9.3f} "
+                     f"{entry['us_per_eval']:>9.2f} {entry['peak_rss_mb']:>11.0f} "
+                     f"{'-' if alloc is None else f'{alloc:.1f}':>9}")
+    return "\n".join(lines)
+
+
+def format_comparison(rows: list[dict]) -> str:
+    lines = [f"{'operation':<20} {'size':>11} {'metric':<14} {'baseline':>10} {'current':>10} {'change':>8}"]
+    for row in rows:
+        flag = "  REGRESSION" if row["regression"] else ""
+        lines.append(f"{row['operation']:<20} {row['size']:>11,} {row['metric']:<14} {row['baseline']:>10.3f} "
+                     f"{row['current']:>10.3f} {row['change']:>+8.1%}{flag}")
+    return "\n".join(lines)
+
+
+def main(argv: Optional[list[str]] = None) -> None:
+    parser = argparse.ArgumentParser(prog="xray-bench", description="Measure X-Ray tracing overhead.")
+    parser.add_argument("--sizes", default=DEFAULT_SIZES, help="comma-separated evaluation counts, e.g. 1k,1m,10m")
+    parser.add_argument("--repeat", type=int, default=3, help="timed runs per size; the best is kept")
+    parser.add_argument("--alloc-max", default="1m", help="largest size to trace allocations for")
+    parser.add_argument("--output", help="write the results JSON here")
+    parser.add_argument("--baseline", default=str(BASELINE), help="results JSON to compare against")
+    parser.add_argument("--save-baseline", action="store_true", help="store this run as the baseline")
+    parser.add_argument("--threshold", type=float, default=0.2, help="relative slowdown that counts as a regression")
+    args = parser.parse_args(argv)
+
+    sizes = [parse_size(size) for size in args.sizes.split(",") if size.strip()]
+    log = lambda message: print(message, file=sys.stderr)
+    report = run_suite(sizes, repeat=args.repeat, alloc_max=parse_size(args.alloc_max), log=log)
+    print(format_results(report))
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, indent=2))
+
+    baseline_path = Path(args.baseline)
+    if args.save_baseline:
+        baseline_path.write_text(json.dumps(report, indent=2))
+        print(f"\nbaseline saved to {baseline_path}")
+        return
+    if not baseline_path.exists():
+        print(f"\nno baseline at {baseline_path}; run with --save-baseline to create one")
+        return
+    rows = compare(report, json.loads(baseline_path.read_text()), args.threshold)
+    print()
+    print(format_comparison(rows))
+    regressions = sum(row["regression"] for row in rows)
+    print(f"\n{regressions} regression(s) over {args.threshold:.0%}")
+    if regressions:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+# Synthetic candidate generator shaped like demo/mock_data.py, at any size.
+
+import random
+from typing import Iterator
+
+from demo.mock_data import REFERENCE_PRODUCT
+
+
+CATEGORIES = [
+    "Home & Kitchen > Water Bottles",
+    "Home & Kitchen > Water Bottles",
+    "Home & Kitchen > Water Bottles",
+    "Home & Kitchen > Bottle Accessories",
+    "Home & Kitchen > Cleaning Supplies",
+    "Sports & Outdoors > Camping",
+]
+
+BRANDS = ["Milton", "Cello", "Borosil", "Prestige", "Solimo", "Pigeon", "Tiger", "Stanley", "Local", "Generic"]
+
+
+def iter_candidates(count: int, seed: int = 42) -> Iterator[dict]:
+    # Deterministic candidates with roughly the demo's pass/fail mix, one at a time.
+    rng = random.Random(seed)
+    for i in range(count):
+        yield {
+            "asin": f"B0SYN{i:08d}",
+            "title": f"{rng.choice(BRANDS)} Steel Bottle {rng.randint(300, 2000)}ml #{i}",
+            "category": rng.choice(CATEGORIES),
+            "price": rng.randint(49, 4999),
+            "rating": round(rng.uniform(2.0, 5.0), 1),
+            "reviews": int(rng.paretovariate(1.2) * 20)
+        }
+
+
+def iter_chunks(count: int, size: int, seed: int = 42) -> Iterator[list[dict]]:
+    # iter_candidates() in lists of up to size, for runs too large to hold as one list.
+    chunk = []
+    for candidate in iter_candidates(count, seed):
+        chunk.append(candidate)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def generate_candidates(count: int, seed: int = 42) -> list[dict]:
+    return list(iter_candidates(count, seed))
+
+
+def filter_thresholds(reference: dict = REFERENCE_PRODUCT) -> dict:
+    # The demo pipeline's default thresholds, resolved against a reference product.
+    return {
+        "min_price": reference["price"] * 0.5,
+        "max_price": reference["price"] * 2.0,
+        "min_rating": 3.8,
+        "min_reviews": 100
+    }
@@ -1,8 +1,14 @@
-import { useState, useEffect } from 'react';
-import type { Trace, Step, Evaluation } from './types/trace';
-import traceData from '../../traces/competitor_selection.json';
+import { useState, useEffect, useRef, useCallback } from 'react';
+import type { Trace, Step, StepProfile, Evaluation, EvaluationPage, TraceSummary, TraceListing, LiveEvent } from './types/trace';
+import { applyLiveEvent, emptyLiveState } from './live';
 import './index.css';
 
+const LIVE_EVENTS = ['session', 'step_start', 'evaluations', 'step', 'session_end'];
+// Live events are buffered and applied to state at most this often.
+const LIVE_FLUSH_MS = 250;
+const PAGE_SIZE = 50;
+const SEARCH_DEBOUNCE_MS = 300;
+
 function formatStepName(name: string): string {
   return name
     .split('_')
@@ -16,6 +22,62 @@ function formatDateTime(isoString: string | null): string {
   return date.toLocaleString();
 }
 
+interface SpanRow {
+  step: Step;
+  depth: number;
+}
+
+function flattenSpans(steps: Step[], depth = 0): SpanRow[] {
+  return steps.flatMap(step => [{ step, depth }, ...flattenSpans(step.children ?? [], depth + 1)]);
+}
+
+function formatNs(ns: number | null | undefined): string {
+  if (ns === null || ns === undefined) return 'N/A';
+  if (ns >= 1e9) return `${(ns / 1e9).toFixed(2)} s`;
+  if (ns >= 1e6) return `${(ns / 1e6).toFixed(2)} ms`;
+  return `${(ns / 1e3).toFixed(1)} us`;
+}
+
+function SpanTree({ spans, selected, onSelect }: {
+  spans: SpanRow[];
+  selected: number;
+  onSelect: (index: number) => void;
+}) {
+  const starts = spans.map(({ step }) => step.start_ns ?? 0);
+  const ends = spans.map(({ step }) => step.end_ns ?? step.start_ns ?? 0);
+  const origin = Math.min(...starts);
+  const total = Math.max(1, Math.max(...ends) - origin);
+
+  return (
+    <div className="span-tree">
+      {spans.map(({ step, depth }, idx) => {
+        const offset = ((step.start_ns ?? origin) - origin) / total * 100;
+        const width = Math.max((step.duration_ns ?? 0) / total * 100, 0.5);
+        return (
+          <div
+            key={step.step_id ?? idx}
+            className={`span-row ${selected === idx ? 'active' : ''}`}
+            onClick={() => onSelect(idx)}
+          >
+            <div className="span-name" style={{ paddingLeft: `${depth * 16}px` }}>
+              {formatStepName(step.name)}
+            </div>
+            <div className="span-bar-track">
+              <div
+                className={`span-bar ${step.status === 'failed' ? 'failed' : ''}`}
+                style={{ left: `${offset}%`, width: `${width}%` }}
+              />
+            </div>
+            <div className="span-timing">
+              {formatNs(step.duration_ns)} total / {formatNs(step.self_ns)} self / {formatNs(step.cpu_ns)} cpu
+            </div>
+          </div>
+        );
+      })}
+    </div>
+  );
+}
+
 function CandidateCard({ evaluation }: { evaluation: Evaluation }) {
   const { candidate_data, filter_results, qualified, metadata } = evaluation;
 
@@ -46,8 +108,17 @@ function CandidateCard({ evaluation }: { evaluation: Evaluation }) {
             Score: {(metadata.score as number).toFixed(3)}
           </span>
         )}
+        {metadata?.rank !== undefined && (
+          <span className="candidate-metric" style={{ color: 'var(--color-accent-cyan)' }}>
+            Rank #{metadata.rank}
+          </span>
+        )}
       </div>
 
+      {metadata?.rank_reason && (
+        <div className="candidate-rank-reason">{metadata.rank_reason}</div>
+      )}
+
       <div className="filter-results">
         {filter_results.map((fr, idx) => (
           <div key={idx} className="filter-result">
@@ -65,18 +136,302 @@ function CandidateCard({ evaluation }: { evaluation: Evaluation }) {
   );
 }
 
-function StepDetail({ step }: { step: Step }) {
-  const [activeTab, setActiveTab] = useState<'input' | 'output' | 'evaluations'>('input');
+function evaluationsUrl(traceId: string, step: Step, params: URLSearchParams): string {
+  const stepKey = encodeURIComponent(step.step_id ?? step.name);
+  return `/api/traces/${encodeURIComponent(traceId)}/steps/${stepKey}/evaluations?${params}`;
+}
+
+function EvaluationBrowser({ traceId, step }: { traceId: string; step: Step }) {
+  const [qualified, setQualified] = useState('');
+  const [failed, setFailed] = useState('');
+  const [search, setSearch] = useState('');
+  const [debouncedSearch, setDebouncedSearch] = useState('');
+  const [sort, setSort] = useState('row');
+  const [field, setField] = useState(step.query?.fields[0] ?? '');
+  const [min, setMin] = useState('');
+  const [max, setMax] = useState('');
+  const [page, setPage] = useState<EvaluationPage | null>(null);
+  const [loading, setLoading] = useState(false);
+  const [error, setError] = useState<string | null>(null);
 
-  const passedCount = step.evaluations.filter(e => e.qualified).length;
-  const failedCount = step.evaluations.length - passedCount;
-  const hasEvaluations = step.evaluations.length > 0;
+  useEffect(() => {
+    const timer = window.setTimeout(() => setDebouncedSearch(search), SEARCH_DEBOUNCE_MS);
+    return () => window.clearTimeout(timer);
+  }, [search]);
+
+  const params = new URLSearchParams({ limit: String(PAGE_SIZE), sort });
+  if (qualified) params.set('qualified', qualified);
+  if (failed) params.set('failed', failed);
+  if (debouncedSearch) params.set('q', debouncedSearch);
+  if (field && min) params.set(`min.${field}`, min);
+  if (field && max) params.set(`max.${field}`, max);
+  const query = params.toString();
+
+  const fetchPage = useCallback(async (cursor: string | null) => {
+    const pageParams = new URLSearchParams(query);
+    if (cursor) pageParams.set('cursor', cursor);
+    setLoading(true);
+    try {
+      const response = await fetch(evaluationsUrl(traceId, step, pageParams));
+      const data = await response.json();
+      if (!response.ok) throw new Error(data.error ?? `HTTP ${response.status}`);
+      setError(null);
+      return data as EvaluationPage;
+    } catch (err) {
+      setError(String(err instanceof Error ? err.message : err));
+      return null;
+    } finally {
+      setLoading(false);
+    }
+  }, [traceId, step, query]);
+
+  useEffect(() => {
+    let cancelled = false;
+    fetchPage(null).then(data => {
+      if (!cancelled) setPage(data);
+    });
+    return () => {
+      cancelled = true;
+    };
+  }, [fetchPage]);
+
+  const loadMore = async () => {
+    if (!page?.next_cursor) return;
+    const next = await fetchPage(page.next_cursor);
+    if (next) {
+      setPage({ ...next, evaluations: [...page.evaluations, ...next.evaluations], rows: [...page.rows, ...next.rows] });
+    }
+  };
+
+  return (
+    <>
+      <div className="evaluation-filters">
+        <input
+          className="filter-input"
+          placeholder="Search ID or title"
+          value={search}
+          onChange={e => setSearch(e.target.value)}
+        />
+        <select className="filter-input" value={qualified} onChange={e => setQualified(e.target.value)}>
+          <option value="">All candidates</option>
+          <option value="true">Qualified</option>
+          <option value="false">Disqualified</option>
+        </select>
+        <select className="filter-input" value={failed} onChange={e => setFailed(e.target.value)}>
+          <option value="">Any filter result</option>
+          {step.query?.filters.map(name => (
+            <option key={name} value={name}>Failed {name.replace('_', ' ')}</option>
+          ))}
+        </select>
+        {step.query && step.query.fields.length > 0 && (
+          <>
+            <select className="filter-input" value={field} onChange={e => setField(e.target.value)}>
+              {step.query.fields.map(name => <option key={name} value={name}>{name}</option>)}
+            </select>
+            <input className="filter-input narrow" placeholder="min" value={min} onChange={e => setMin(e.target.value)} />
+            <input className="filter-input narrow" placeholder="max" value={max} onChange={e => setMax(e.target.value)} />
+          </>
+        )}
+        <select className="filter-input" value={sort} onChange={e => setSort(e.target.value)}>
+          <option value="row">Recorded order</option>
+          {step.query?.fields.map(name => <option key={name} value={name}>Highest {name}</option>)}
+        </select>
+      </div>
+
+      {error && <div className="retention-row">{error}</div>}
+      {page && (
+        <div className="retention-summary">
+          <div className="retention-row">
+            Showing {page.evaluations.length.toLocaleString()} of {page.total.toLocaleString()} matching
+          </div>
+        </div>
+      )}
+
+      <div className="candidate-list">
+        {page?.evaluations.map((evaluation, idx) => (
+          <CandidateCard key={page.rows[idx]} evaluation={evaluation} />
+        ))}
+      </div>
+
+      {page?.next_cursor && (
+        <button className="load-more" onClick={loadMore} disabled={loading}>
+          {loading ? 'Loading...' : `Load ${PAGE_SIZE} more`}
+        </button>
+      )}
+    </>
+  );
+}
+
+interface FlameNode {
+  name: string;
+  samples: number;
+  children: Map<string, FlameNode>;
+}
+
+function buildFlameTree(stacks: Record<string, number>): FlameNode {
+  const root: FlameNode = { name: 'all', samples: 0, children: new Map() };
+  for (const [stack, samples] of Object.entries(stacks)) {
+    root.samples += samples;
+    let node = root;
+    for (const frame of stack.split(';')) {
+      let child = node.children.get(frame);
+      if (!child) {
+        child = { name: frame, samples: 0, children: new Map() };
+        node.children.set(frame, child);
+      }
+      child.samples += samples;
+      node = child;
+    }
+  }
+  return root;
+}
+
+function FlameRows({ node, total }: { node: FlameNode; total: number }) {
+  // an icicle: each frame is as wide as its share of the samples, its callees below it
+  const children = [...node.children.values()].sort((a, b) => b.samples - a.samples);
+  return (
+    <div className="flame-node" style={{ width: `${(node.samples / total) * 100}%` }}>
+      <div className="flame-frame" title={`${node.name}: ${node.samples} samples`}>{node.name}</div>
+      {children.length > 0 && (
+        <div className="flame-children">
+          {children.map(child => (
+            <FlameRows key={child.name} node={child} total={node.samples} />
+          ))}
+        </div>
+      )}
+    </div>
+  );
+}
+
+function ProfileView({ profile }: { profile: StepProfile }) {
+  const flame = profile.stacks && profile.samples ? buildFlameTree(profile.stacks) : null;
+  return (
+    <div className="profile-section">
+      <div className="evaluations-summary">
+        <div className="eval-stat">
+          <div className="eval-stat-value">{profile.wall_ms.toFixed(1)}</div>
+          <div className="eval-stat-label">Profiled ms</div>
+        </div>
+        {profile.memory && (
+          <div className="eval-stat">
+            <div className="eval-stat-value">{Math.round(profile.memory.peak_kb).toLocaleString()}</div>
+            <div className="eval-stat-label">Peak KB ({Math.round(profile.memory.held_kb).toLocaleString()} held)</div>
+          </div>
+        )}
+        {profile.gc && (
+          <div className="eval-stat">
+            <div className="eval-stat-value">{profile.gc.collections}</div>
+            <div className="eval-stat-label">GC pauses ({profile.gc.pause_ms.toFixed(1)} ms)</div>
+          </div>
+        )}
+      </div>
+
+      {profile.skipped && (
+        <div className="retention-summary">
+          <div className="retention-row">
+            No {profile.skipped.join(' or ')} profile: another profiled step was using it
+          </div>
+        </div>
+      )}
+
+      {flame && (
+        <div className="section">
+          <h3 className="section-title">
+            Flame graph ({profile.samples} samples every {profile.sample_interval_ms} ms)
+          </h3>
+          <div className="flame-graph">
+            <FlameRows node={flame} total={flame.samples} />
+          </div>
+        </div>
+      )}
+
+      {profile.functions && profile.functions.length > 0 && (
+        <div className="section">
+          <h3 className="section-title">Top functions</h3>
+          <table className="profile-table">
+            <thead>
+              <tr><th>Cumulative ms</th><th>Own ms</th><th>Calls</th><th>Function</th></tr>
+            </thead>
+            <tbody>
+              {profile.functions.map(row => (
+                <tr key={row.function}>
+                  <td>{row.cumtime_ms.toFixed(2)}</td>
+                  <td>{row.tottime_ms.toFixed(2)}</td>
+                  <td>{row.calls.toLocaleString()}</td>
+                  <td className="profile-function">{row.function}</td>
+                </tr>
+              ))}
+            </tbody>
+          </table>
+        </div>
+      )}
+
+      {profile.memory && profile.memory.top.length > 0 && (
+        <div className="section">
+          <h3 className="section-title">Allocations still held</h3>
+          <table className="profile-table">
+            <thead>
+              <tr><th>KB</th><th>Blocks</th><th>Line</th></tr>
+            </thead>
+            <tbody>
+              {profile.memory.top.map(row => (
+                <tr key={row.line}>
+                  <td>{row.size_kb.toFixed(1)}</td>
+                  <td>{row.count.toLocaleString()}</td>
+                  <td className="profile-function">{row.line}</td>
+                </tr>
+              ))}
+            </tbody>
+          </table>
+        </div>
+      )}
+    </div>
+  );
+}
+
+function StepDetail({ step, traceId }: { step: Step; traceId: string }) {
+  const [activeTab, setActiveTab] = useState<'input' | 'output' | 'evaluations' | 'profile'>('input');
+  const [pagedQualified, setPagedQualified] = useState<number | null>(null);
+
+  const paged = step.query !== undefined;
+  const retention = step.metadata?.retention;
+  const live = step.metadata?.live;
+  const cache = step.metadata?.cache;
+  const profile = step.metadata?.profile;
+  const counts = retention ?? live;
+  const evaluationCount = step.evaluation_count ?? step.evaluations.length;
+
+  useEffect(() => {
+    // outline steps carry no rows; count the qualified ones with an empty page
+    setPagedQualified(null);
+    if (!paged || counts) return;
+    const params = new URLSearchParams({ qualified: 'true', limit: '1' });
+    fetch(evaluationsUrl(traceId, step, params))
+      .then(response => (response.ok ? response.json() : null))
+      .then((data: EvaluationPage | null) => setPagedQualified(data?.total ?? null))
+      .catch(error => console.error('Failed to count evaluations:', error));
+  }, [traceId, step, paged, counts]);
+
+  const totalCount = counts ? counts.evaluated : evaluationCount;
+  const passedCount = counts
+    ? counts.qualified
+    : paged ? pagedQualified ?? 0 : step.evaluations.filter(e => e.qualified).length;
+  const failedCount = totalCount - passedCount;
+  const hasEvaluations = evaluationCount > 0;
 
   return (
     <div className="step-detail">
       <div className="step-detail-header">
         <h2 className="step-detail-title">{formatStepName(step.name)}</h2>
         <span className="step-detail-type">{step.step_type}</span>
+        {cache && (
+          <span
+            className={`step-cache ${cache.hit ? 'hit' : 'miss'}`}
+            title={cache.hit ? `${cache.age_s}s old, looked up in ${cache.lookup_ms}ms` : `computed in ${cache.compute_ms}ms`}
+          >
+            {cache.hit ? `cached: ${cache.backend}` : 'cache miss'}
+          </span>
+        )}
       </div>
 
       {step.reasoning && (
@@ -104,11 +459,21 @@ function StepDetail({ step }: { step: Step }) {
             className={`tab ${activeTab === 'evaluations' ? 'active' : ''}`}
             onClick={() => setActiveTab('evaluations')}
           >
-            Evaluations ({step.evaluations.length})
+            Evaluations ({evaluationCount.toLocaleString()})
+          </button>
+        )}
+        {profile && (
+          <button
+            className={`tab ${activeTab === 'profile' ? 'active' : ''}`}
+            onClick={() => setActiveTab('profile')}
+          >
+            Profile
           </button>
         )}
       </div>
 
+      {activeTab === 'profile' && profile && <ProfileView profile={profile} />}
+
       {activeTab === 'input' && step.input_data && (
         <div className="section">
           <div className="data-block">
@@ -129,7 +494,7 @@ function StepDetail({ step }: { step: Step }) {
         <div className="evaluations-section">
           <div className="evaluations-summary">
             <div className="eval-stat">
-              <div className="eval-stat-value">{step.evaluations.length}</div>
+              <div className="eval-stat-value">{totalCount.toLocaleString()}</div>
               <div className="eval-stat-label">Total Evaluated</div>
             </div>
             <div className="eval-stat">
@@ -142,11 +507,36 @@ function StepDetail({ step }: { step: Step }) {
             </div>
           </div>
 
-          <div className="candidate-list">
-            {step.evaluations.map((evaluation, idx) => (
-              <CandidateCard key={idx} evaluation={evaluation} />
-            ))}
-          </div>
+          {live && !retention && (
+            <div className="retention-summary">
+              <div className="retention-row">
+                Showing the latest {step.evaluations.length.toLocaleString()} of {live.evaluated.toLocaleString()} evaluated
+              </div>
+            </div>
+          )}
+
+          {retention && (
+            <div className="retention-summary">
+              {Object.entries(retention.filters)
+                .filter(([, counts]) => counts.failed > 0)
+                .map(([filterName, counts]) => (
+                  <div key={filterName} className="retention-row">
+                    Showing {counts.retained_failed.toLocaleString()} of {counts.failed.toLocaleString()} rejected
+                    by {filterName.replace('_', ' ')}
+                  </div>
+                ))}
+            </div>
+          )}
+
+          {paged ? (
+            <EvaluationBrowser key={step.step_id} traceId={traceId} step={step} />
+          ) : (
+            <div className="candidate-list">
+              {step.evaluations.map((evaluation, idx) => (
+                <CandidateCard key={idx} evaluation={evaluation} />
+              ))}
+            </div>
+          )}
         </div>
       )}
     </div>
@@ -154,46 +544,119 @@ function StepDetail({ step }: { step: Step }) {
 }
 
 function App() {
-  const [trace, setTrace] = useState<Trace | null>(null);
+  const [runs, setRuns] = useState<TraceSummary[]>([]);
+  const [liveTraces, setLiveTraces] = useState<Record<string, Trace>>({});
+  const [selectedId, setSelectedId] = useState<string | null>(null);
+  const [savedTrace, setSavedTrace] = useState<Trace | null>(null);
   const [selectedStep, setSelectedStep] = useState<number>(0);
   const [loading, setLoading] = useState(true);
+  const [offline, setOffline] = useState(false);
+  const liveState = useRef(emptyLiveState());
+  const pending = useRef<LiveEvent[]>([]);
+
+  const loadRuns = useCallback(async () => {
+    try {
+      const response = await fetch('/api/traces?limit=50');
+      if (!response.ok) throw new Error(`HTTP ${response.status}`);
+      const listing: TraceListing = await response.json();
+      setRuns(listing.traces);
+      setOffline(false);
+    } catch (error) {
+      console.error('Failed to list traces:', error);
+      setOffline(true);
+    } finally {
+      setLoading(false);
+    }
+  }, []);
 
   useEffect(() => {
-    const loadTrace = async () => {
-      try {
-        setTrace(traceData as Trace);
-      } catch (error) {
-        console.error('Failed to load trace:', error);
-      } finally {
-        setLoading(false);
-      }
+    loadRuns();
+  }, [loadRuns]);
+
+  useEffect(() => {
+    const source = new EventSource('/api/live');
+    const receive = (message: MessageEvent) => {
+      pending.current.push(JSON.parse(message.data) as LiveEvent);
     };
+    LIVE_EVENTS.forEach(type => source.addEventListener(type, receive));
 
-    loadTrace();
-  }, []);
+    const timer = window.setInterval(() => {
+      if (pending.current.length === 0) return;
+      const events = pending.current;
+      pending.current = [];
+      const finished = events
+        .map(event => applyLiveEvent(liveState.current, event))
+        .filter((traceId): traceId is string => traceId !== null);
+      setLiveTraces({ ...liveState.current.traces });
+      if (finished.length > 0) loadRuns();
+      // follow a run as it starts when nothing is selected yet
+      setSelectedId(current => current ?? Object.keys(liveState.current.traces)[0] ?? null);
+    }, LIVE_FLUSH_MS);
+
+    return () => {
+      window.clearInterval(timer);
+      source.close();
+    };
+  }, [loadRuns]);
+
+  useEffect(() => {
+    if (!selectedId && runs.length > 0) setSelectedId(runs[0].trace_id);
+  }, [runs, selectedId]);
+
+  const isLive = selectedId !== null && selectedId in liveTraces;
+
+  useEffect(() => {
+    if (!selectedId || isLive) return;
+    let cancelled = false;
+    // the outline has per-step counts; evaluations are paged in by EvaluationBrowser
+    fetch(`/api/traces/${encodeURIComponent(selectedId)}?evaluations=false`)
+      .then(response => (response.ok ? response.json() : null))
+      .then((data: Trace | null) => {
+        if (!cancelled) setSavedTrace(data);
+      })
+      .catch(error => console.error('Failed to load trace:', error));
+    return () => {
+      cancelled = true;
+    };
+  }, [selectedId, isLive]);
+
+  const selectRun = (traceId: string) => {
+    setSelectedId(traceId);
+    setSelectedStep(0);
+  };
 
   if (loading) {
     return (
       <div className="app">
         <div className="loading-state">
           <div className="loading-spinner"></div>
-          <p>Loading trace...</p>
+          <p>Loading traces...</p>
         </div>
       </div>
     );
   }
 
-  if (!trace) {
+  const trace = isLive ? liveTraces[selectedId] : savedTrace?.trace_id === selectedId ? savedTrace : null;
+  const liveRuns = Object.values(liveTraces);
+  const savedRuns = runs.filter(run => !(run.trace_id in liveTraces));
+
+  if (!trace && liveRuns.length === 0 && savedRuns.length === 0) {
     return (
       <div className="app">
         <div className="empty-state">
           <h2 className="empty-state-title">No Trace Found</h2>
-          <p>Run the demo to generate a trace file.</p>
+          {offline ? (
+            <p>Start the trace server with <code>xray-server</code>, then reload.</p>
+          ) : (
+            <p>Run the demo to generate a trace, or start one with <code>--live</code> to watch it here.</p>
+          )}
         </div>
       </div>
     );
   }
 
+  const spans = trace ? flattenSpans(trace.steps) : [];
+
   return (
     <div className="app">
       <header className="header">
@@ -207,44 +670,78 @@ function App() {
       </header>
 
       <main className="main-content">
-        <div className="trace-overview">
-          <div className="trace-header">
-            <div>
-              <h1 className="trace-title">{trace.name.replace('_', ' ').toUpperCase()}</h1>
-              <span className="trace-id">{trace.trace_id}</span>
-            </div>
-            <div className="trace-meta">
-              <div className="trace-meta-item">
-                <span>Started:</span>
-                <strong>{formatDateTime(trace.started_at)}</strong>
+        <div className="run-list">
+          {liveRuns.map(run => (
+            <button
+              key={run.trace_id}
+              className={`run-item ${run.trace_id === selectedId ? 'active' : ''}`}
+              onClick={() => selectRun(run.trace_id)}
+            >
+              <span className="live-badge">Live</span>
+              <span className="run-name">{run.name}</span>
+              <span className="run-meta">{formatDateTime(run.started_at)}</span>
+            </button>
+          ))}
+          {savedRuns.map(run => (
+            <button
+              key={run.trace_id}
+              className={`run-item ${run.trace_id === selectedId ? 'active' : ''}`}
+              onClick={() => selectRun(run.trace_id)}
+            >
+              <span className={`step-status ${run.status === 'failed' ? 'failed' : ''}`}>{run.status}</span>
+              <span className="run-name">{run.name}</span>
+              <span className="run-meta">
+                {formatDateTime(run.started_at)} / {run.evaluated.toLocaleString()} evaluated
+              </span>
+            </button>
+          ))}
+        </div>
+
+        {trace && (
+          <div className="trace-overview">
+            <div className="trace-header">
+              <div>
+                <h1 className="trace-title">
+                  {trace.name.replace('_', ' ').toUpperCase()}
+                  {isLive && <span className="live-badge">Live</span>}
+                </h1>
+                <span className="trace-id">{trace.trace_id}</span>
               </div>
-              <div className="trace-meta-item">
-                <span>Steps:</span>
-                <strong>{trace.steps.length}</strong>
+              <div className="trace-meta">
+                <div className="trace-meta-item">
+                  <span>Started:</span>
+                  <strong>{formatDateTime(trace.started_at)}</strong>
+                </div>
+                <div className="trace-meta-item">
+                  <span>Steps:</span>
+                  <strong>{trace.steps.length}</strong>
+                </div>
               </div>
             </div>
-          </div>
 
-          <div className="step-timeline">
-            {trace.steps.map((step, index) => (
-              <div
-                key={index}
-                className={`step-card ${selectedStep === index ? 'active' : ''}`}
-                onClick={() => setSelectedStep(index)}
-              >
-                <span className="step-number">{index + 1}</span>
-                <div className="step-type">{step.step_type}</div>
-                <div className="step-name">{formatStepName(step.name)}</div>
-                <span className={`step-status ${step.status === 'failed' ? 'failed' : ''}`}>
-                  {step.status}
-                </span>
-              </div>
-            ))}
+            <div className="step-timeline">
+              {trace.steps.map((step, index) => (
+                <div
+                  key={step.step_id ?? index}
+                  className={`step-card ${spans[selectedStep]?.step === step ? 'active' : ''}`}
+                  onClick={() => setSelectedStep(spans.findIndex(span => span.step === step))}
+                >
+                  <span className="step-number">{index + 1}</span>
+                  <div className="step-type">{step.step_type}</div>
+                  <div className="step-name">{formatStepName(step.name)}</div>
+                  <span className={`step-status ${step.status === 'failed' ? 'failed' : ''}`}>
+                    {step.status}
+                  </span>
+                </div>
+              ))}
+            </div>
+
+            <SpanTree spans={spans} selected={selectedStep} onSelect={setSelectedStep} />
           </div>
-        </div>
+        )}
 
-        {trace.steps[selectedStep] && (
-          <StepDetail step={trace.steps[selectedStep]} />
+        {trace && spans[selectedStep] && (
+          <StepDetail key={trace.trace_id} step={spans[selectedStep].step} traceId={trace.trace_id} />
         )}
       </main>
     </div>
@@ -0,0 +1,105 @@
+import type { LiveEvent, Step, Trace } from './types/trace';
+
+// Rows kept per live step; the server already coalesces to its latest rows.
+const MAX_LIVE_ROWS = 200;
+
+export interface LiveState {
+  traces: Record<string, Trace>;
+  steps: Record<string, Step>;
+  // step_id -> trace_id, so a finished session's steps can be dropped
+  owners: Record<string, string>;
+}
+
+export function emptyLiveState(): LiveState {
+  return { traces: {}, steps: {}, owners: {} };
+}
+
+function newStep(event: Extract<LiveEvent, { type: 'step_start' }>): Step {
+  return {
+    name: event.name,
+    step_type: event.step_type,
+    input_data: null,
+    output_data: null,
+    reasoning: null,
+    evaluations: [],
+    status: 'running',
+    started_at: event.started_at,
+    completed_at: null,
+    error: null,
+    metadata: {},
+    step_id: event.step_id,
+    parent_id: event.parent_id,
+    sequence: event.sequence,
+    worker: null,
+    start_ns: null,
+    end_ns: null,
+    duration_ns: null,
+    self_ns: null,
+    child_ns: 0,
+    cpu_ns: null,
+    children: [],
+  };
+}
+
+// Folds one server event into the live state in place; returns the trace_id of a finished session.
+export function applyLiveEvent(state: LiveState, event: LiveEvent): string | null {
+  switch (event.type) {
+    case 'session':
+      state.traces[event.trace_id] = {
+        trace_id: event.trace_id,
+        name: event.name,
+        started_at: event.started_at,
+        completed_at: null,
+        metadata: event.metadata,
+        steps: [],
+      };
+      return null;
+    case 'step_start': {
+      const trace = state.traces[event.trace_id];
+      if (!trace || state.steps[event.step_id]) return null;
+      const step = newStep(event);
+      state.steps[event.step_id] = step;
+      state.owners[event.step_id] = event.trace_id;
+      const parent = event.parent_id ? state.steps[event.parent_id] : undefined;
+      const siblings = parent ? parent.children : trace.steps;
+      siblings.push(step);
+      siblings.sort((a, b) => a.sequence - b.sequence);
+      return null;
+    }
+    case 'evaluations': {
+      const step = state.steps[event.step_id];
+      if (!step) return null;
+      const previous = step.metadata.live;
+      const rows = [...step.evaluations, ...event.rows];
+      step.evaluations = rows.slice(-MAX_LIVE_ROWS);
+      step.metadata = {
+        ...step.metadata,
+        live: {
+          evaluated: event.evaluated,
+          qualified: event.qualified,
+          skipped: (previous?.skipped ?? 0) + event.skipped + Math.max(0, rows.length - MAX_LIVE_ROWS),
+        },
+      };
+      return null;
+    }
+    case 'step': {
+      const step = state.steps[event.step_id];
+      if (!step) return null;
+      const { type: _type, trace_id: _traceId, evaluation_count: _count, metadata, ...fields } = event;
+      Object.assign(step, fields);
+      step.metadata = { ...metadata, live: step.metadata.live };
+      return null;
+    }
+    case 'session_end': {
+      if (!state.traces[event.trace_id]) return null;
+      for (const [stepId, traceId] of Object.entries(state.owners)) {
+        if (traceId === event.trace_id) {
+          delete state.steps[stepId];
+          delete state.owners[stepId];
+        }
+      }
+      delete state.traces[event.trace_id];
+      return event.trace_id;
+    }
+  }
+}
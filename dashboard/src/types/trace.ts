@@ -25,9 +25,86 @@ export interface Evaluation {
             rating_score: number;
             price_proximity: number;
         };
+        rank?: number;
+        cutoff?: number | null;
+        rank_reason?: string;
     };
 }
 
+export interface FilterRetention {
+    passed: number;
+    failed: number;
+    retained_failed: number;
+}
+
+export interface RetentionSummary {
+    policy: {
+        keep_qualified: boolean;
+        rejects_per_filter: number;
+        top_k: number;
+        score_key: string;
+    };
+    evaluated: number;
+    qualified: number;
+    retained: number;
+    filters: Record<string, FilterRetention>;
+}
+
+export interface LiveProgress {
+    evaluated: number;
+    qualified: number;
+    skipped: number;
+}
+
+export interface CacheInfo {
+    hit: boolean;
+    key: string;
+    backend: string;
+    age_s?: number;
+    lookup_ms?: number;
+    compute_ms?: number;
+}
+
+export interface ProfileFunction {
+    function: string;
+    calls: number;
+    primitive_calls: number;
+    tottime_ms: number;
+    cumtime_ms: number;
+}
+
+export interface StepProfile {
+    wall_ms: number;
+    functions?: ProfileFunction[];
+    sample_interval_ms?: number;
+    samples?: number;
+    // collapsed stacks, "outer;inner;leaf" -> samples
+    stacks?: Record<string, number>;
+    memory?: {
+        held_kb: number;
+        peak_kb: number;
+        top: { line: string; size_kb: number; count: number }[];
+    };
+    gc?: {
+        collections: number;
+        by_generation: number[];
+        pause_ms: number;
+        max_pause_ms: number;
+        collected: number;
+    };
+    // hooks another profiled step was already using
+    skipped?: string[];
+}
+
+export interface StepMetadata {
+    retention?: RetentionSummary;
+    sampled?: boolean;
+    live?: LiveProgress;
+    cache?: CacheInfo;
+    profile?: StepProfile;
+    [key: string]: unknown;
+}
+
 export interface Step {
     name: string;
     step_type: string;
@@ -39,7 +116,33 @@ export interface Step {
     started_at: string | null;
     completed_at: string | null;
     error: string | null;
-    metadata: Record<string, unknown>;
+    metadata: StepMetadata;
+    step_id: string;
+    parent_id: string | null;
+    sequence: number;
+    worker: string | null;
+    start_ns: number | null;
+    end_ns: number | null;
+    duration_ns: number | null;
+    self_ns: number | null;
+    child_ns: number;
+    cpu_ns: number | null;
+    children: Step[];
+    // set on the server's outline, where evaluations are paged instead of embedded
+    evaluation_count?: number;
+    query?: StepQueryInfo;
+}
+
+export interface StepQueryInfo {
+    filters: string[];
+    fields: string[];
+}
+
+export interface EvaluationPage {
+    evaluations: Evaluation[];
+    rows: number[];
+    total: number;
+    next_cursor: string | null;
 }
 
 export interface Trace {
@@ -50,3 +153,30 @@ export interface Trace {
     metadata: Record<string, unknown>;
     steps: Step[];
 }
+
+export interface TraceSummary {
+    trace_id: string;
+    name: string;
+    filepath: string;
+    started_at: string | null;
+    completed_at: string | null;
+    step_count: number;
+    status: string;
+    evaluated: number;
+    qualified: number;
+    rejected: number;
+}
+
+export interface TraceListing {
+    traces: TraceSummary[];
+    total: number;
+}
+
+export type LiveEvent =
+    | { type: 'session'; trace_id: string; name: string; started_at: string; metadata: Record<string, unknown> }
+    | { type: 'step_start'; trace_id: string; step_id: string; parent_id: string | null; name: string;
+        step_type: string; started_at: string | null; sequence: number }
+    | { type: 'evaluations'; trace_id: string; step_id: string; evaluated: number; qualified: number;
+        rows: Evaluation[]; skipped: number }
+    | ({ type: 'step'; trace_id: string; evaluation_count: number } & Omit<Step, 'evaluations' | 'children'>)
+    | { type: 'session_end'; trace_id: string; completed_at: string | null };
@@ -12,6 +12,10 @@ export default defineConfig({
   server: {
     fs: {
       allow: ['..']
+    },
+    // xray-server: saved traces and the live feed
+    proxy: {
+      '/api': 'http://127.0.0.1:8765'
     }
   }
 })
@@ -0,0 +1,220 @@
+# Batch runner: CompetitorSelectionPipeline for many reference products at once.
+#
+# Keyword generation (LLM) and candidate search (API) are network-bound, so up to `concurrency`
+# runs await them at the same time on one event loop. Filtering and ranking are CPU-bound and go
+# to a worker pool shared by all runs, as does the BackgroundExporter writing the traces. Every
+# product gets its own XRaySession; results are yielded as runs finish, in completion order.
+#
+#   python -m demo.batch --products 1000 --concurrency 64 --llm-latency 0.2 --search-latency 0.1
+#   python -m demo.batch --products 200 --trace-dir traces/batch
+#   python -m demo.batch --products 5000 --sample-rate 0.01 --metrics-port 9464
+
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import AsyncIterator, Awaitable, Callable, Iterable, Optional, Union
+
+from xray import BackgroundExporter
+from xray.exporter import BLOCK, DirectoryWriter
+from xray.metrics import Metrics
+from demo.competitor_selection import CompetitorSelectionPipeline
+from demo.mock_data import CANDIDATE_PRODUCTS, GENERATED_KEYWORDS, REFERENCE_PRODUCT
+
+
+def simulated_llm(latency: float = 0.0, jitter: float = 0.0) -> Callable[[dict], Awaitable[list[str]]]:
+    # Stand-in for the keyword LLM call: the demo's keywords after latency +- jitter seconds.
+    async def generate(reference: dict) -> list[str]:
+        await asyncio.sleep(max(0.0, latency + random.uniform(-jitter, jitter)))
+        return GENERATED_KEYWORDS
+    return generate
+
+
+def simulated_search(latency: float = 0.0, jitter: float = 0.0) -> Callable[[list[str]], Awaitable[list[dict]]]:
+    # Stand-in for the catalog search API: the demo's 50 candidates after latency +- jitter seconds.
+    async def search(keywords: list[str]) -> list[dict]:
+        await asyncio.sleep(max(0.0, latency + random.uniform(-jitter, jitter)))
+        return CANDIDATE_PRODUCTS
+    return search
+
+
+def synthetic_catalog(count: int, seed: int = 7) -> Iterable[dict]:
+    # count reference products around the demo's, each with its own asin and price.
+    rng = random.Random(seed)
+    for i in range(count):
+        yield {
+            **REFERENCE_PRODUCT,
+            "asin": f"B0REF{i:06d}",
+            "title": f"{REFERENCE_PRODUCT['title']} #{i}",
+            "price": round(REFERENCE_PRODUCT["price"] * rng.uniform(0.5, 1.5)),
+        }
+
+
+def _percentile(values: list[float], q: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class BatchRunner:
+    # Runs the pipeline for an iterable of reference products.
+    #
+    # llm and search default to the demo's mock data with no latency. executor is "process",
+    # "thread" or an Executor for the filter step (workers: pool size, default CPU count).
+    # timeout bounds each run; a run that times out or raises is failed in the step it was in
+    # and still produces its trace. With trace_dir (or an exporter), every session is written in
+    # the background as it finishes; with metrics, every run is counted even at a low sample_rate.
+
+    def __init__(self, llm: Optional[Callable] = None, search: Optional[Callable] = None,
+                 concurrency: int = 32, executor: Union[str, Executor] = "process", workers: Optional[int] = None,
+                 timeout: Optional[float] = 30.0, trace_dir: Optional[str] = None,
+                 exporter: Optional[BackgroundExporter] = None, sample_rate: float = 1.0, cache=None,
+                 metrics: Optional[Metrics] = None):
+        if concurrency < 1:
+            raise ValueError("concurrency must be at least 1")
+        if isinstance(executor, str) and executor not in ("process", "thread"):
+            raise ValueError(f"executor must be 'process', 'thread' or an Executor, not {executor!r}")
+        self.llm = llm or simulated_llm()
+        self.search = search or simulated_search()
+        self.concurrency = concurrency
+        self.executor = executor
+        self.workers = workers or os.cpu_count() or 1
+        self.timeout = timeout
+        if exporter is None and trace_dir is not None:
+            # blocks rather than drops: a batch should keep every trace
+            exporter = BackgroundExporter(DirectoryWriter(trace_dir), policy=BLOCK)
+        self.exporter = exporter
+        self.sample_rate = sample_rate
+        self.cache = cache
+        self.metrics = metrics
+
+    async def _run_one(self, reference: dict, pool: Executor) -> dict:
+        started = time.perf_counter()
+        pipeline = CompetitorSelectionPipeline(reference, sample_rate=self.sample_rate, exporter=self.exporter,
+                                               cache=self.cache, metrics=self.metrics, trace_path=None)
+        result = await pipeline.run_async(self.llm, self.search, executor=pool, timeout=self.timeout)
+        result["reference_asin"] = reference["asin"]
+        result["seconds"] = time.perf_counter() - started
+        return result
+
+    async def iter_results(self, references: Iterable[dict]) -> AsyncIterator[dict]:
+        # Each run's result as it finishes: run_async()'s dict plus reference_asin and seconds.
+        # Products are drawn from references only as slots free up, so it may be a generator
+        # over a very large catalog.
+        pool = self.executor
+        if self.executor == "process":
+            pool = ProcessPoolExecutor(self.workers)
+        elif self.executor == "thread":
+            pool = ThreadPoolExecutor(self.workers)
+        products = iter(references)
+        running: set[asyncio.Task] = set()
+        try:
+            while True:
+                for reference in products:
+                    running.add(asyncio.ensure_future(self._run_one(reference, pool)))
+                    if len(running) >= self.concurrency:
+                        break
+                if not running:
+                    break
+                done, running = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    yield task.result()
+        finally:
+            for task in running:
+                task.cancel()
+            if pool is not self.executor:
+                pool.shutdown(wait=False, cancel_futures=True)
+
+    async def run(self, references: Iterable[dict], on_result: Optional[Callable[[dict], None]] = None) -> dict:
+        # Every run; on_result sees each result as it finishes. Returns the throughput report.
+        started = time.perf_counter()
+        latencies, failures, timeouts, selected = [], 0, 0, 0
+        async for result in self.iter_results(references):
+            latencies.append(result["seconds"])
+            if result["error"] is not None:
+                failures += 1
+                timeouts += result["error"].startswith("TimeoutError")
+            elif result["selected_competitor"] is not None:
+                selected += 1
+            if on_result is not None:
+                on_result(result)
+        if self.exporter is not None:
+            self.exporter.flush()
+        elapsed = time.perf_counter() - started
+        return {
+            "runs": len(latencies),
+            "failed": failures,
+            "timed_out": timeouts,
+            "selected": selected,
+            "seconds": elapsed,
+            "runs_per_s": len(latencies) / elapsed if elapsed else 0.0,
+            "latency_p50_s": _percentile(latencies, 0.5),
+            "latency_p95_s": _percentile(latencies, 0.95),
+            "concurrency": self.concurrency,
+            "exported": self.exporter.stats()["exported"] if self.exporter is not None else 0,
+        }
+
+
+def format_report(report: dict) -> str:
+    lines = [
+        f"{report['runs']} runs in {report['seconds']:.2f}s: {report['runs_per_s']:.1f} runs/s "
+        f"at concurrency {report['concurrency']}",
+        f"  selected {report['selected']}, failed {report['failed']} ({report['timed_out']} timed out)",
+    ]
+    if report["latency_p50_s"] is not None:
+        lines.append(f"  latency p50 {report['latency_p50_s'] * 1e3:.0f} ms, p95 {report['latency_p95_s'] * 1e3:.0f} ms")
+    if report["exported"]:
+        lines.append(f"  {report['exported']} traces exported")
+    return "\n".join(lines)
+
+
+def main(argv=None) -> dict:
+    parser = argparse.ArgumentParser(prog="python -m demo.batch",
+                                     description="Run the competitor selection pipeline for many products.")
+    parser.add_argument("--products", type=int, default=200, help="synthetic reference products to run")
+    parser.add_argument("--concurrency", type=int, default=32, help="runs in flight at once")
+    parser.add_argument("--executor", choices=("process", "thread"), default="process",
+                        help="pool for the CPU-bound filter step")
+    parser.add_argument("--workers", type=int, help="filter step pool size (default: CPU count)")
+    parser.add_argument("--timeout", type=float, default=30.0, help="seconds allowed per run")
+    parser.add_argument("--llm-latency", type=float, default=0.2, help="simulated keyword LLM latency, seconds")
+    parser.add_argument("--search-latency", type=float, default=0.1, help="simulated search API latency, seconds")
+    parser.add_argument("--jitter", type=float, default=0.0, help="+- seconds added to each simulated call")
+    parser.add_argument("--trace-dir", help="write one trace per run here")
+    parser.add_argument("--sample-rate", type=float, default=1.0, help="fraction of runs that record evaluations")
+    parser.add_argument("--metrics-port", type=int, help="serve Prometheus metrics on this port while running")
+    parser.add_argument("--quiet", action="store_true", help="print only the report")
+    args = parser.parse_args(argv)
+
+    metrics = None
+    if args.metrics_port is not None:
+        metrics = Metrics()
+        print(f"metrics at {metrics.serve(args.metrics_port)}", file=sys.stderr)
+    runner = BatchRunner(
+        llm=simulated_llm(args.llm_latency, args.jitter), search=simulated_search(args.search_latency, args.jitter),
+        concurrency=args.concurrency, executor=args.executor, workers=args.workers, timeout=args.timeout,
+        trace_dir=args.trace_dir, sample_rate=args.sample_rate, metrics=metrics
+    )
+
+    def show(result: dict) -> None:
+        if args.quiet:
+            return
+        selected = result["selected_competitor"]
+        outcome = result["error"] or (selected["asin"] if selected else "no competitor")
+        print(f"{result['reference_asin']}  {result['seconds'] * 1e3:7.0f} ms  {outcome}", file=sys.stderr)
+
+    report = asyncio.run(runner.run(synthetic_catalog(args.products), on_result=show))
+    if runner.exporter is not None:
+        runner.exporter.close()
+    print(format_report(report))
+    if metrics is not None:
+        metrics.stop()
+    return report
+
+
+if __name__ == "__main__":
+    main()
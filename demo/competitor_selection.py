@@ -3,16 +3,121 @@ import os
 
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from xray import XRaySession, FilterResult, Evaluation
+import asyncio
+from concurrent.futures import Executor
+from typing import Any, Awaitable, Callable, Optional
+
+from xray import XRaySession, RetentionPolicy, BackgroundExporter, LivePublisher, StepProfiler
 from xray.serializer import save_trace
+from xray.engine import FilterRankEngine, FilterSpec, ScoreComponent, record_short_circuit
+from xray.parallel import map_candidates
+from xray.cache import memoize, memoize_async
+from xray.metrics import Metrics
+from xray.store import TraceStore
+from xray.columnar import EvaluationTable
 from demo.mock_data import REFERENCE_PRODUCT, CANDIDATE_PRODUCTS, GENERATED_KEYWORDS
 
 
+def price_detail(price: float, min_price: float, max_price: float) -> str:
+    if price < min_price:
+        return f"INR {price:.0f} is below minimum INR {min_price:.0f}"
+    if price > max_price:
+        return f"INR {price:.0f} exceeds maximum INR {max_price:.0f}"
+    return f"INR {price:.0f} is within INR {min_price:.0f} - INR {max_price:.0f} range"
+
+
+def rating_detail(rating: float, min_rating: float) -> str:
+    if rating < min_rating:
+        return f"Rating {rating} is below {min_rating} threshold"
+    return f"Rating {rating} meets {min_rating} minimum"
+
+
+def reviews_detail(reviews: int, min_reviews: int) -> str:
+    if reviews < min_reviews:
+        return f"{reviews} reviews is below {min_reviews} minimum"
+    return f"{reviews} reviews meets {min_reviews} minimum"
+
+
+def build_engine(reference: dict, config: dict) -> FilterRankEngine:
+    # The 4 filters and the 40/35/25 weighted score, declared once.
+    min_price = reference["price"] * config["price_multiplier_min"]
+    max_price = reference["price"] * config["price_multiplier_max"]
+    reference_price = reference["price"]
+    # detail strings are rendered only when the trace is serialized
+    return FilterRankEngine(
+        filters=[
+            FilterSpec("price_range", "price", "between", (min_price, max_price),
+                       expected=f"INR {min_price:.0f} - INR {max_price:.0f}", actual_format="INR {:.0f}",
+                       detail=lambda price, passed: price_detail(price, min_price, max_price)),
+            FilterSpec("min_rating", "rating", ">=", config["min_rating"],
+                       expected=f">= {config['min_rating']}", actual_format="{}",
+                       detail=lambda rating, passed: rating_detail(rating, config["min_rating"])),
+            FilterSpec("min_reviews", "reviews", ">=", config["min_reviews"],
+                       expected=f">= {config['min_reviews']}", actual_format="{}",
+                       detail=lambda count, passed: reviews_detail(count, config["min_reviews"])),
+            FilterSpec("category_match", "category", "contains", "Water Bottles",
+                       expected="Water Bottles category",
+                       detail=("Product is in Water Bottles category", "Product is an accessory, not a water bottle")),
+        ],
+        scores=[
+            ScoreComponent("review_score", "reviews", 0.40, lambda reviews: min(reviews / 10000, 1.0)),
+            ScoreComponent("rating_score", "rating", 0.35, lambda rating: (rating - 3.5) / 1.5),
+            ScoreComponent("price_proximity", "price", 0.25,
+                           lambda price: max(0, 1 - abs(price - reference_price) / reference_price)),
+        ],
+        id_field="asin",
+        fields=("asin", "title", "price", "rating", "reviews", "category")
+    )
+
+
+def record_filters(recorder, candidates: list[dict], reference: dict, config: dict) -> range:
+    # Record one shard's filters; module-level so xray.parallel can run it in worker processes.
+    return build_engine(reference, config).filter(recorder, candidates, explain=True)["rows"]
+
+
+def filter_and_rank(candidates: list[dict], reference: dict, config: dict, capture: bool) -> tuple:
+    # Step 3's CPU-bound work for CompetitorSelectionPipeline.run_async, recorded into a fresh
+    # table that the caller appends with Step.add_table; module-level so a process pool can run
+    # it. Returns (table, top 3 as (candidate, score), the engine's filter() result).
+    table = EvaluationTable()
+    table.capture = capture
+    engine = build_engine(reference, config)
+    filtered = engine.filter(table, candidates)
+    top_candidates = engine.rank(table, candidates, filtered, top_k=3)
+    table.compact()
+    # callable details cannot be pickled back to the parent process
+    table.render_callables()
+    return table, top_candidates, filtered
+
+
 class CompetitorSelectionPipeline:
     # 3-step pipeline for selecting competitor products with X-Ray tracing.
     
-    def __init__(self, reference_product: dict):
+    def __init__(self, reference_product: dict, retention: Optional[RetentionPolicy] = None,
+                 sample_rate: float = 1.0, exporter: Optional[BackgroundExporter] = None,
+                 live: Optional[LivePublisher] = None, workers: int = 1, cache=None,
+                 trace_path: Optional[str] = "traces/competitor_selection.json",
+                 profile: Optional[StepProfiler] = None, metrics: Optional[Metrics] = None,
+                 store: Optional[TraceStore] = None):
         self.reference_product = reference_product
+        self.retention = retention
+        self.sample_rate = sample_rate
+        # with an exporter, the trace is written in the background after the session closes
+        self.exporter = exporter
+        # with a live publisher, progress streams to a running xray-server as steps execute
+        self.live = live
+        # with workers > 1, the filter step is sharded across a process pool
+        self.workers = workers
+        # with a cache (see xray.cache), the keyword and search calls are memoized on their inputs
+        self.cache = cache
+        # where run() saves the trace when there is no exporter; None skips saving
+        self.trace_path = trace_path
+        # with a trace store (see xray.store), each run is saved to its own compressed file instead
+        self.store = store
+        # with a profiler (see xray.profiling), each step's profile is stored in its metadata
+        self.profile = profile
+        # with a metrics registry (see xray.metrics), every run is counted, sampled or not
+        self.metrics = metrics
         self.filter_config = {
             "price_multiplier_min": 0.5,
             "price_multiplier_max": 2.0,
@@ -20,86 +125,201 @@ class CompetitorSelectionPipeline:
             "min_reviews": 100
         }
         
-    def run(self) -> dict:
-        # Execute pipeline and return selected competitor with trace.
-        with XRaySession(
+    def _session(self) -> XRaySession:
+        return XRaySession(
             name="competitor_selection",
             metadata={
                 "reference_asin": self.reference_product["asin"],
                 "reference_title": self.reference_product["title"]
-            }
-        ) as session:
+            },
+            retention=self.retention,
+            sample_rate=self.sample_rate,
+            exporter=self.exporter,
+            live=self.live,
+            profile=self.profile,
+            metrics=self.metrics
+        )
+    
+    def _trace_path(self, session: XRaySession) -> Optional[str]:
+        if not session.enabled:
+            return None
+        if self.exporter is None and self.store is not None:
+            return self.store.save(session)
+        if self.exporter is None:
+            return save_trace(session, self.trace_path) if self.trace_path else None
+        path_for = getattr(self.exporter.writer, "path_for", None)
+        return str(path_for(session).absolute()) if path_for else None
+        
+    def run(self) -> dict:
+        # Execute pipeline and return selected competitor with trace.
+        with self._session() as session:
             
             keywords = self._step1_generate_keywords(session)
             candidates = self._step2_search_candidates(session, keywords)
             selected = self._step3_apply_filters_and_rank(session, candidates)
             
-            trace_path = save_trace(session, "traces/competitor_selection.json")
-            
             return {
                 "selected_competitor": selected,
-                "trace_path": trace_path,
+                "trace_path": self._trace_path(session),
                 "session": session
             }
     
+    async def run_async(self, llm: Callable[[dict], Awaitable[list[str]]],
+                        search: Callable[[list[str]], Awaitable[list[dict]]],
+                        executor: Optional[Executor] = None, timeout: Optional[float] = None) -> dict:
+        # run() with network-bound steps awaited: llm(reference) returns keywords and
+        # search(keywords) candidates. Filtering and ranking run on executor (the loop's default
+        # thread pool when None). A timeout or an exception fails the step it happened in; the
+        # result then has "error" set and selected_competitor None, and the trace is still kept.
+        loop = asyncio.get_running_loop()
+        deadline = None if timeout is None else loop.time() + timeout
+        
+        async def within(awaitable: Awaitable) -> Any:
+            if deadline is None:
+                return await awaitable
+            try:
+                return await asyncio.wait_for(awaitable, max(deadline - loop.time(), 0))
+            except asyncio.TimeoutError:
+                raise asyncio.TimeoutError(f"run timed out after {timeout}s") from None
+        
+        selected, error = None, None
+        session = self._session()
+        try:
+            async with session:
+                with session.step("keyword_generation", step_type="llm") as step:
+                    step.set_input(self._keyword_input())
+                    keywords = await within(memoize_async(step, self.cache, lambda: llm(self.reference_product)))
+                    self._record_keywords(step, keywords)
+                
+                with session.step("candidate_search", step_type="api") as step:
+                    step.set_input(self._search_input(keywords))
+                    candidates = await within(memoize_async(step, self.cache, lambda: search(keywords)))
+                    self._record_search(step, keywords, candidates)
+                
+                with session.step("apply_filters_and_rank", step_type="filter") as step:
+                    step.set_input(lambda: self._filter_input(candidates))
+                    table, top_candidates, filtered = await within(loop.run_in_executor(
+                        executor, filter_and_rank, candidates, self.reference_product, self.filter_config,
+                        step.evaluations.capture
+                    ))
+                    step.add_table(table)
+                    if filtered["rows"] is None:
+                        # unsampled: the worker's short-circuit pass left counts, not rows
+                        record_short_circuit(step, filtered)
+                    selected = self._record_selection(step, candidates, top_candidates, filtered["passed"])
+        except Exception as exc:
+            selected, error = None, f"{type(exc).__name__}: {exc}"
+        
+        return {
+            "selected_competitor": selected,
+            "trace_path": self._trace_path(session),
+            "session": session,
+            "error": error
+        }
+    
+    def _keyword_input(self) -> dict:
+        return {
+            "product_title": self.reference_product["title"],
+            "category": self.reference_product["category"],
+            "model": "gpt-4"
+        }
+    
+    def _record_keywords(self, step, keywords: list[str]) -> None:
+        step.set_output({
+            "keywords": keywords,
+            "keyword_count": len(keywords)
+        })
+        
+        step.set_reasoning(
+            "Analyzed product title to extract key attributes: "
+            "material (stainless steel), capacity (1000ml), "
+            "feature (insulated). Generated keyword variations "
+            "combining these attributes with common search patterns."
+        )
+    
+    def _search_input(self, keywords: list[str]) -> dict:
+        return {
+            "keywords": keywords,
+            "primary_keyword": keywords[0],
+            "limit": 50
+        }
+    
+    def _record_search(self, step, keywords: list[str], candidates: list[dict]) -> None:
+        step.set_output(lambda: {
+            "total_results_available": 2847,
+            "candidates_fetched": len(candidates),
+            "sample_candidates": [
+                {
+                    "asin": c["asin"],
+                    "title": c["title"],
+                    "price": c["price"],
+                    "rating": c["rating"],
+                    "reviews": c["reviews"]
+                }
+                for c in candidates[:5]
+            ]
+        })
+        
+        step.set_reasoning(
+            f"Searched using primary keyword '{keywords[0]}'. "
+            f"Found 2,847 total matches in the catalog. "
+            f"Retrieved top {len(candidates)} results ranked by relevance score. "
+            "Results include a mix of branded and generic products."
+        )
+    
+    def _filter_input(self, candidates: list[dict]) -> dict:
+        ref = self.reference_product
+        config = self.filter_config
+        
+        min_price = ref["price"] * config["price_multiplier_min"]
+        max_price = ref["price"] * config["price_multiplier_max"]
+        
+        return {
+            "candidates_count": len(candidates),
+            "reference_product": {
+                "asin": ref["asin"],
+                "title": ref["title"],
+                "price": ref["price"],
+                "rating": ref["rating"],
+                "reviews": ref["reviews"]
+            },
+            "filter_config": {
+                "price_range": {
+                    "min": round(min_price, 2),
+                    "max": round(max_price, 2),
+                    "rule": f"{config['price_multiplier_min']}x - {config['price_multiplier_max']}x of reference price"
+                },
+                "min_rating": {
+                    "value": config["min_rating"],
+                    "rule": f"Must be at least {config['min_rating']} stars"
+                },
+                "min_reviews": {
+                    "value": config["min_reviews"],
+                    "rule": f"Must have at least {config['min_reviews']} reviews"
+                }
+            }
+        }
+    
     def _step1_generate_keywords(self, session: XRaySession) -> list[str]:
         # Step 1: Generate search keywords using LLM.
         with session.step("keyword_generation", step_type="llm") as step:
-            step.set_input({
-                "product_title": self.reference_product["title"],
-                "category": self.reference_product["category"],
-                "model": "gpt-4"
-            })
-            
-            keywords = GENERATED_KEYWORDS
-            
-            step.set_output({
-                "keywords": keywords,
-                "keyword_count": len(keywords)
-            })
+            step.set_input(self._keyword_input())
             
-            step.set_reasoning(
-                "Analyzed product title to extract key attributes: "
-                "material (stainless steel), capacity (1000ml), "
-                "feature (insulated). Generated keyword variations "
-                "combining these attributes with common search patterns."
-            )
+            # the LLM call
+            keywords = memoize(step, self.cache, lambda: GENERATED_KEYWORDS)
             
+            self._record_keywords(step, keywords)
             return keywords
     
     def _step2_search_candidates(self, session: XRaySession, keywords: list[str]) -> list[dict]:
         # Step 2: Search for candidates using API.
         with session.step("candidate_search", step_type="api") as step:
-            step.set_input({
-                "keywords": keywords,
-                "primary_keyword": keywords[0],
-                "limit": 50
-            })
+            step.set_input(self._search_input(keywords))
             
-            candidates = CANDIDATE_PRODUCTS
-            
-            step.set_output({
-                "total_results_available": 2847,
-                "candidates_fetched": len(candidates),
-                "sample_candidates": [
-                    {
-                        "asin": c["asin"],
-                        "title": c["title"],
-                        "price": c["price"],
-                        "rating": c["rating"],
-                        "reviews": c["reviews"]
-                    }
-                    for c in candidates[:5]
-                ]
-            })
-            
-            step.set_reasoning(
-                f"Searched using primary keyword '{keywords[0]}'. "
-                f"Found 2,847 total matches in the catalog. "
-                f"Retrieved top {len(candidates)} results ranked by relevance score. "
-                "Results include a mix of branded and generic products."
-            )
+            # the catalog API call
+            candidates = memoize(step, self.cache, lambda: CANDIDATE_PRODUCTS)
             
+            self._record_search(step, keywords, candidates)
             return candidates
     
     def _step3_apply_filters_and_rank(self, session: XRaySession, candidates: list[dict]) -> dict:
@@ -108,179 +328,74 @@ class CompetitorSelectionPipeline:
             ref = self.reference_product
             config = self.filter_config
             
-            min_price = ref["price"] * config["price_multiplier_min"]
-            max_price = ref["price"] * config["price_multiplier_max"]
+            # built only when the run is traced
+            step.set_input(lambda: self._filter_input(candidates))
             
-            step.set_input({
-                "candidates_count": len(candidates),
-                "reference_product": {
-                    "asin": ref["asin"],
-                    "title": ref["title"],
-                    "price": ref["price"],
-                    "rating": ref["rating"],
-                    "reviews": ref["reviews"]
+            engine = build_engine(ref, config)
+            # sharding spreads the recording; with tracing disabled there is none to spread
+            if self.workers > 1 and step.enabled:
+                # shards are recorded in worker processes and merged back in candidate order
+                rows = map_candidates(step, candidates, record_filters, ref, config, workers=self.workers)["rows"]
+                filtered = {"rows": rows, "qualified": step.evaluations.qualified[rows.start:rows.stop]}
+            else:
+                filtered = engine.filter(step, candidates)
+            
+            # ranking runs in its own span nested under the filter step and keeps only the top 3
+            top_candidates = engine.rank(step, candidates, filtered, top_k=3)
+            
+            passed_count = filtered["qualified"].count(1)
+            return self._record_selection(step, candidates, top_candidates, passed_count)
+    
+    def _record_selection(self, step, candidates: list[dict], top_candidates: list[tuple[dict, float]],
+                          passed_count: int) -> Optional[dict]:
+        failed_count = len(candidates) - passed_count
+        
+        if top_candidates:
+            selected = top_candidates[0][0]
+            
+            step.set_output({
+                "total_evaluated": len(candidates),
+                "passed": passed_count,
+                "failed": failed_count,
+                "selected_competitor": {
+                    "asin": selected["asin"],
+                    "title": selected["title"],
+                    "price": selected["price"],
+                    "rating": selected["rating"],
+                    "reviews": selected["reviews"],
+                    "score": top_candidates[0][1]
                 },
-                "filter_config": {
-                    "price_range": {
-                        "min": round(min_price, 2),
-                        "max": round(max_price, 2),
-                        "rule": f"{config['price_multiplier_min']}x - {config['price_multiplier_max']}x of reference price"
-                    },
-                    "min_rating": {
-                        "value": config["min_rating"],
-                        "rule": f"Must be at least {config['min_rating']} stars"
-                    },
-                    "min_reviews": {
-                        "value": config["min_reviews"],
-                        "rule": f"Must have at least {config['min_reviews']} reviews"
+                "top_3_candidates": [
+                    {
+                        "rank": i + 1,
+                        "asin": c[0]["asin"],
+                        "title": c[0]["title"],
+                        "score": round(c[1], 3)
                     }
-                }
+                    for i, c in enumerate(top_candidates)
+                ]
             })
             
-            qualified_candidates = []
+            step.set_reasoning(
+                f"Applied 4 filters to {len(candidates)} candidates. "
+                f"{passed_count} passed all filters, {failed_count} were eliminated. "
+                f"Selected '{selected['title']}' as the best competitor based on "
+                f"composite score (reviews: {selected['reviews']}, "
+                f"rating: {selected['rating']}, price proximity to reference)."
+            )
             
-            for candidate in candidates:
-                evaluation = Evaluation(
-                    candidate_id=candidate["asin"],
-                    candidate_data={
-                        "asin": candidate["asin"],
-                        "title": candidate["title"],
-                        "price": candidate["price"],
-                        "rating": candidate["rating"],
-                        "reviews": candidate["reviews"],
-                        "category": candidate.get("category", "Unknown")
-                    }
-                )
-                
-                price_passed = min_price <= candidate["price"] <= max_price
-                evaluation.add_filter_result(FilterResult(
-                    filter_name="price_range",
-                    passed=price_passed,
-                    detail=self._get_price_detail(candidate["price"], min_price, max_price),
-                    expected=f"INR {min_price:.0f} - INR {max_price:.0f}",
-                    actual=f"INR {candidate['price']:.0f}"
-                ))
-                
-                rating_passed = candidate["rating"] >= config["min_rating"]
-                evaluation.add_filter_result(FilterResult(
-                    filter_name="min_rating",
-                    passed=rating_passed,
-                    detail=self._get_rating_detail(candidate["rating"], config["min_rating"]),
-                    expected=f">= {config['min_rating']}",
-                    actual=str(candidate["rating"])
-                ))
-                
-                reviews_passed = candidate["reviews"] >= config["min_reviews"]
-                evaluation.add_filter_result(FilterResult(
-                    filter_name="min_reviews",
-                    passed=reviews_passed,
-                    detail=self._get_reviews_detail(candidate["reviews"], config["min_reviews"]),
-                    expected=f">= {config['min_reviews']}",
-                    actual=str(candidate["reviews"])
-                ))
-                
-                is_actual_product = "Water Bottles" in candidate.get("category", "")
-                evaluation.add_filter_result(FilterResult(
-                    filter_name="category_match",
-                    passed=is_actual_product,
-                    detail="Product is in Water Bottles category" if is_actual_product else "Product is an accessory, not a water bottle",
-                    expected="Water Bottles category",
-                    actual=candidate.get("category", "Unknown")
-                ))
-                
-                all_passed = price_passed and rating_passed and reviews_passed and is_actual_product
-                evaluation.qualified = all_passed
-                
-                if all_passed:
-                    score = self._calculate_score(candidate, ref)
-                    evaluation.metadata = {
-                        "score": round(score, 3),
-                        "score_breakdown": {
-                            "review_score": round(min(candidate["reviews"] / 10000, 1.0), 3),
-                            "rating_score": round((candidate["rating"] - 3.5) / 1.5, 3),
-                            "price_proximity": round(1 - abs(candidate["price"] - ref["price"]) / ref["price"], 3)
-                        }
-                    }
-                    qualified_candidates.append((candidate, score, evaluation))
-                
-                step.add_evaluation(evaluation)
+            return selected
+        else:
+            step.set_output({
+                "total_evaluated": len(candidates),
+                "passed": 0,
+                "failed": len(candidates),
+                "selected_competitor": None
+            })
             
-            passed_count = len(qualified_candidates)
-            failed_count = len(candidates) - passed_count
+            step.set_reasoning(
+                f"Applied 4 filters to {len(candidates)} candidates. "
+                "No candidates passed all filters. Consider relaxing filter criteria."
+            )
             
-            if qualified_candidates:
-                qualified_candidates.sort(key=lambda x: x[1], reverse=True)
-                selected = qualified_candidates[0][0]
-                
-                step.set_output({
-                    "total_evaluated": len(candidates),
-                    "passed": passed_count,
-                    "failed": failed_count,
-                    "selected_competitor": {
-                        "asin": selected["asin"],
-                        "title": selected["title"],
-                        "price": selected["price"],
-                        "rating": selected["rating"],
-                        "reviews": selected["reviews"],
-                        "score": qualified_candidates[0][1]
-                    },
-                    "top_3_candidates": [
-                        {
-                            "rank": i + 1,
-                            "asin": c[0]["asin"],
-                            "title": c[0]["title"],
-                            "score": round(c[1], 3)
-                        }
-                        for i, c in enumerate(qualified_candidates[:3])
-                    ]
-                })
-                
-                step.set_reasoning(
-                    f"Applied 4 filters to {len(candidates)} candidates. "
-                    f"{passed_count} passed all filters, {failed_count} were eliminated. "
-                    f"Selected '{selected['title']}' as the best competitor based on "
-                    f"composite score (reviews: {selected['reviews']}, "
-                    f"rating: {selected['rating']}, price proximity to reference)."
-                )
-                
-                return selected
-            else:
-                step.set_output({
-                    "total_evaluated": len(candidates),
-                    "passed": 0,
-                    "failed": len(candidates),
-                    "selected_competitor": None
-                })
-                
-                step.set_reasoning(
-                    f"Applied 4 filters to {len(candidates)} candidates. "
-                    "No candidates passed all filters. Consider relaxing filter criteria."
-                )
-                
-                return None
-    
-    def _get_price_detail(self, price: float, min_price: float, max_price: float) -> str:
-        if price < min_price:
-            return f"INR {price:.0f} is below minimum INR {min_price:.0f}"
-        if price > max_price:
-            return f"INR {price:.0f} exceeds maximum INR {max_price:.0f}"
-        return f"INR {price:.0f} is within INR {min_price:.0f} - INR {max_price:.0f} range"
-    
-    def _get_rating_detail(self, rating: float, min_rating: float) -> str:
-        if rating < min_rating:
-            return f"Rating {rating} is below {min_rating} threshold"
-        return f"Rating {rating} meets {min_rating} minimum"
-    
-    def _get_reviews_detail(self, reviews: int, min_reviews: int) -> str:
-        if reviews < min_reviews:
-            return f"{reviews} reviews is below {min_reviews} minimum"
-        return f"{reviews} reviews meets {min_reviews} minimum"
-    
-    def _calculate_score(self, candidate: dict, reference: dict) -> float:
-        # Calculate composite score: 40% reviews, 35% rating, 25% price (weighted).
-        review_score = min(candidate["reviews"] / 10000, 1.0)
-        rating_score = (candidate["rating"] - 3.5) / 1.5
-        price_diff = abs(candidate["price"] - reference["price"]) / reference["price"]
-        price_proximity = max(0, 1 - price_diff)
-        
-        return round(review_score * 0.40 + rating_score * 0.35 + price_proximity * 0.25, 3)
+            return None
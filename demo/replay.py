@@ -0,0 +1,133 @@
+# Replay: re-run the filter step of saved competitor_selection traces with other thresholds.
+# Keywords and candidates come from each trace (xray.ReplayCache) instead of the LLM and the
+# search API, so only filtering and ranking run again.
+#
+#   python -m demo.replay traces/                                   # the current thresholds
+#   python -m demo.replay traces/ --set min_rating=3.8,4.0,4.3 --set min_reviews=100,1000
+
+import argparse
+import itertools
+import json
+import time
+from pathlib import Path
+from typing import Iterable, Iterator, Optional
+
+from xray import ReplayCache, load_trace
+from xray.serializer import list_traces
+from demo.competitor_selection import CompetitorSelectionPipeline
+
+FILTER_STEP = "apply_filters_and_rank"
+
+
+def _step(trace: dict, name: str) -> dict:
+    for step in trace["steps"]:
+        if step["name"] == name:
+            return step
+    raise ValueError(f"trace {trace.get('trace_id')} has no {name!r} step")
+
+
+def _candidates(step: dict, trace: dict) -> list[dict]:
+    # The search step's output keeps only a sample; the filter step recorded every candidate.
+    expected = step["output_data"]["candidates_fetched"]
+    evaluations = _step(trace, FILTER_STEP)["evaluations"]
+    if len(evaluations) != expected:
+        raise ValueError(f"trace {trace.get('trace_id')} recorded {len(evaluations)} of {expected} candidates "
+                         "(sampled or retained), so it cannot be replayed")
+    return [evaluation["candidate_data"] for evaluation in evaluations]
+
+
+# what the memoized call in each upstream step returned, rebuilt from its trace
+EXTRACT = {
+    "keyword_generation": lambda step, trace: step["output_data"]["keywords"],
+    "candidate_search": _candidates,
+}
+
+
+def reference_product(trace: dict) -> dict:
+    # The reference product as the run saw it: the filter step's copy plus step 1's category.
+    reference = dict(_step(trace, FILTER_STEP)["input_data"]["reference_product"])
+    reference["category"] = _step(trace, "keyword_generation")["input_data"]["category"]
+    return reference
+
+
+def replay(trace: dict, overrides: Optional[dict] = None, trace_path: Optional[str] = None) -> dict:
+    # CompetitorSelectionPipeline.run() on a saved run's inputs; overrides update filter_config.
+    # Upstream steps are served from the trace (a miss raises KeyError rather than calling out).
+    pipeline = CompetitorSelectionPipeline(reference_product(trace), cache=ReplayCache(trace, EXTRACT),
+                                           trace_path=trace_path)
+    pipeline.filter_config.update(overrides or {})
+    return pipeline.run()
+
+
+def iter_traces(paths: Iterable[str]) -> Iterator[dict]:
+    # Saved competitor_selection runs from trace files and directories, loaded one at a time.
+    for path in map(Path, paths):
+        if path.is_dir():
+            for entry in list_traces(path, name="competitor_selection", descending=False):
+                yield load_trace(entry["filepath"])
+        else:
+            yield load_trace(path)
+
+
+def sweep(traces: Iterable[dict], grid: dict[str, list]) -> list[dict]:
+    # One row per trace and combination of grid values: the overrides, how many candidates
+    # passed, what was selected and whether that differs from the recorded run.
+    names = list(grid)
+    rows = []
+    for trace in traces:
+        recorded = (_step(trace, FILTER_STEP)["output_data"] or {}).get("selected_competitor")
+        for values in itertools.product(*(grid[name] for name in names)):
+            overrides = dict(zip(names, values))
+            result = replay(trace, overrides)
+            output = next(step for step in result["session"].steps if step.name == FILTER_STEP).output_data
+            selected = result["selected_competitor"]
+            rows.append({
+                "trace_id": trace["trace_id"],
+                **overrides,
+                "passed": output["passed"],
+                "selected": selected["asin"] if selected else None,
+                "changed": (selected["asin"] if selected else None) != (recorded["asin"] if recorded else None),
+            })
+    return rows
+
+
+def _parse_setting(text: str) -> tuple[str, list]:
+    name, _, values = text.partition("=")
+    if not name or not values:
+        raise argparse.ArgumentTypeError(f"expected NAME=V1,V2,..., got {text!r}")
+    return name, [json.loads(value) for value in values.split(",")]
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(prog="python -m demo.replay",
+                                     description="Re-run saved competitor_selection traces with other thresholds.")
+    parser.add_argument("paths", nargs="+", help="trace files or directories of traces")
+    parser.add_argument("--set", dest="settings", action="append", type=_parse_setting, default=[],
+                        metavar="NAME=V1,V2", help="filter_config values to sweep, e.g. min_rating=3.8,4.2")
+    parser.add_argument("--json", action="store_true", help="print every row as JSON")
+    args = parser.parse_args(argv)
+
+    grid = dict(args.settings)
+    started = time.perf_counter()
+    rows = sweep(iter_traces(args.paths), grid)
+    elapsed = time.perf_counter() - started
+    if args.json:
+        print(json.dumps(rows, indent=2))
+        return
+
+    by_config: dict[tuple, list[dict]] = {}
+    for row in rows:
+        by_config.setdefault(tuple(row[name] for name in grid), []).append(row)
+    header = "".join(f"{name:>14}" for name in grid)
+    print(f"{header}{'runs':>8}{'avg passed':>12}{'changed':>9}  most selected")
+    for config, group in by_config.items():
+        selected = max({row["selected"] for row in group}, key=[row["selected"] for row in group].count)
+        print("".join(f"{value:>14}" for value in config)
+              + f"{len(group):>8}{sum(row['passed'] for row in group) / len(group):>12.1f}"
+              + f"{sum(row['changed'] for row in group):>9}  {selected}")
+    runs = len({row["trace_id"] for row in rows})
+    print(f"\n{len(rows)} replays of {runs} run(s) in {elapsed:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,24 @@
 # Demo Runner
 # entry point for running the competitor selection pipeline.
 
+import argparse
+
+from xray import LivePublisher, StepProfiler, TraceStore, set_enabled
 from demo.competitor_selection import CompetitorSelectionPipeline
 from demo.mock_data import REFERENCE_PRODUCT
 
 
-def main():
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="xray-demo")
+    parser.add_argument("--live", metavar="URL", help="stream progress to a running xray-server, e.g. http://127.0.0.1:8765")
+    parser.add_argument("--workers", type=int, default=1, help="processes for the filter step")
+    parser.add_argument("--profile", action="store_true", help="profile every step (view with xray-profile or the dashboard)")
+    parser.add_argument("--store", metavar="DIR", help="save each run to its own compressed trace in DIR")
+    parser.add_argument("--no-trace", action="store_true", help="run with tracing disabled (same as XRAY_ENABLED=0)")
+    args = parser.parse_args(argv)
+    if args.no_trace:
+        set_enabled(False)
+
     print("X-Ray Demo: Competitor Selection Pipeline")
 
     
@@ -17,8 +30,14 @@ def main():
     
     print("\nRunning pipeline...")
     
-    pipeline = CompetitorSelectionPipeline(REFERENCE_PRODUCT)
+    live = LivePublisher(args.live) if args.live else None
+    profile = StepProfiler() if args.profile else None
+    store = TraceStore(args.store) if args.store else None
+    pipeline = CompetitorSelectionPipeline(REFERENCE_PRODUCT, live=live, workers=args.workers, profile=profile,
+                                           store=store)
     result = pipeline.run()
+    if live is not None:
+        live.close()
     
     print("\nPipeline completed!")
     
@@ -32,8 +51,11 @@ def main():
     else:
         print("\nNo competitor found matching all criteria.")
     
+    if result["trace_path"] is None:
+        print("\nX-Ray tracing was disabled; no trace saved.")
+        return result
     print(f"\nX-Ray trace saved to: {result['trace_path']}")
-    print("\nTo view the trace, start the dashboard and open the trace file.")
+    print("\nTo view the trace, start xray-server and the dashboard, then pick the run from the list.")
     
     return result
 
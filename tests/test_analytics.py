@@ -0,0 +1,54 @@
+from xray import Evaluation, FilterResult, XRaySession, save_trace
+from xray.analytics import TraceAnalytics, distribution, percentile
+
+
+def make_session(region: str, count: int, cheap: int) -> XRaySession:
+    with XRaySession("pipeline", metadata={"region": region}) as session:
+        with session.step("filter") as step:
+            for i in range(count):
+                evaluation = Evaluation(f"c{i}", {"price": i})
+                evaluation.add_filter_result(FilterResult("cheap", i < cheap, f"${i}"))
+                evaluation.qualified = i < cheap
+                step.add_evaluation(evaluation)
+    return session
+
+
+def test_percentiles_and_histogram():
+    assert percentile([], 50) is None
+    assert percentile([1, 2, 3, 4], 50) == 2 and percentile([1, 2, 3, 4], 99) == 4
+    result = distribution([5, 1, 3, 50], buckets=(2, 10))
+    assert (result["count"], result["min"], result["max"], result["mean"]) == (4, 1, 50, 14.75)
+    assert result["histogram"] == [[2, 1], [10, 2], [None, 1]]
+
+
+def test_filter_rates_by_metadata(tmp_path):
+    for i, (region, count, cheap) in enumerate([("eu", 10, 4), ("eu", 10, 6), ("us", 20, 5)]):
+        save_trace(make_session(region, count, cheap), tmp_path / f"t{i}.json")
+    analytics = TraceAnalytics(tmp_path, workers=1)
+    report = analytics.report(group_by="region")
+    assert report["traces"] == 3
+    rates = {row["group"]["region"]: row for row in report["filters"]}
+    assert (rates["eu"]["passed"], rates["eu"]["failed"], rates["eu"]["traces"]) == (10, 10, 2)
+    assert rates["us"]["fail_rate"] == 0.75
+    qualified = {row["group"]["region"]: row for row in report["qualified"]}
+    assert (qualified["eu"]["min"], qualified["eu"]["max"]) == (4, 6)
+    latency = analytics.step_latency(step="filter")
+    assert latency[0]["count"] == 3 and latency[0]["p50"] > 0
+    # only the eu traces
+    [eu] = analytics.filter_rates(metadata={"region": "eu"})
+    assert eu["passed"] == 10
+
+
+def test_refresh_reads_only_new_files(tmp_path):
+    save_trace(make_session("eu", 5, 2), tmp_path / "a.json")
+    analytics = TraceAnalytics(tmp_path, workers=1)
+    assert analytics.refresh() == 1
+    assert analytics.refresh() == 0
+    # saving into a cataloged directory indexes the trace right away
+    save_trace(make_session("eu", 5, 3), tmp_path / "b.json")
+    assert analytics.refresh() == 0
+    assert analytics.filter_rates()[0]["passed"] == 5
+    # a file written by something else is read on the next refresh
+    (tmp_path / "c.json").write_bytes((tmp_path / "a.json").read_bytes())
+    assert analytics.refresh() == 1
+    assert analytics.filter_rates()[0]["passed"] == 7
@@ -0,0 +1,62 @@
+import pytest
+
+from xray import Evaluation, FilterResult, XRaySession
+
+PRICES = [5.0, 25.0, 60.0, 12.5, 99.0]
+RATINGS = [4.5, 3.0, 4.8, 4.1, 2.5]
+
+
+def record_per_evaluation(session: XRaySession) -> None:
+    with session.step("filter") as step:
+        for i, (price, rating) in enumerate(zip(PRICES, RATINGS)):
+            evaluation = Evaluation(f"c{i}", {"price": price, "rating": rating})
+            evaluation.add_filter_result(FilterResult("price", price <= 50, f"${price}", "<= 50", price))
+            evaluation.add_filter_result(FilterResult("rating", rating >= 4, "passed" if rating >= 4 else "failed",
+                                                      ">= 4", rating))
+            evaluation.qualified = price <= 50 and rating >= 4
+            step.add_evaluation(evaluation)
+
+
+def record_batch(session: XRaySession) -> None:
+    ids = [f"c{i}" for i in range(len(PRICES))]
+    with session.step("filter") as step:
+        rows = step.add_candidates(ids, columns={"price": PRICES, "rating": RATINGS})
+        assert rows == range(5)
+        step.add_threshold_filter("price", ids, PRICES, maximum=50, detail="${actual}")
+        step.add_threshold_filter("rating", ids, RATINGS, minimum=4)
+
+
+def test_batch_rows_match_single_evaluations():
+    with XRaySession("single") as single:
+        record_per_evaluation(single)
+    with XRaySession("batch") as batch:
+        record_batch(batch)
+    assert batch.to_dict()["steps"][0]["evaluations"] == single.to_dict()["steps"][0]["evaluations"]
+    assert batch.steps[0].evaluations.filter_counts() == {
+        "price": {"passed": 3, "failed": 2},
+        "rating": {"passed": 3, "failed": 2},
+    }
+
+
+def test_batch_arguments_are_checked():
+    with XRaySession("batch") as session:
+        with session.step("filter") as step:
+            ids = ["a", "b"]
+            with pytest.raises(ValueError):
+                step.add_candidates(ids, columns={"price": [1]})
+            with pytest.raises(ValueError):
+                step.add_candidates(ids, candidate_data=[{}, {}], columns={})
+            step.add_candidates(ids)
+            with pytest.raises(ValueError):
+                step.add_filter_batch("f", ids, [True])
+            step.add_filter_batch("f", ids, [True, False])
+            with pytest.raises(ValueError):
+                step.add_filter_batch("f", ids, [True, True])
+
+
+def test_filters_for_unknown_ids_add_their_rows():
+    with XRaySession("batch") as session:
+        with session.step("filter") as step:
+            rows = step.add_filter_batch("f", ["x", "y", "z"], [1, 0, 1])
+    assert rows == range(3)
+    assert [e["qualified"] for e in session.to_dict()["steps"][0]["evaluations"]] == [True, False, True]
@@ -0,0 +1,103 @@
+import asyncio
+import json
+
+import pytest
+
+from demo.batch import BatchRunner, simulated_llm, simulated_search, synthetic_catalog
+from demo.competitor_selection import CompetitorSelectionPipeline
+from demo.mock_data import REFERENCE_PRODUCT
+from xray import MemoryCache, Metrics
+
+
+def evaluations(session) -> list:
+    return [step["evaluations"] for step in session.to_dict()["steps"]]
+
+
+def test_async_run_records_the_sync_trace():
+    sync = CompetitorSelectionPipeline(REFERENCE_PRODUCT, trace_path=None).run()
+    result = asyncio.run(CompetitorSelectionPipeline(REFERENCE_PRODUCT, trace_path=None)
+                         .run_async(simulated_llm(), simulated_search()))
+    assert result["error"] is None
+    assert result["selected_competitor"] == sync["selected_competitor"]
+    assert evaluations(result["session"]) == evaluations(sync["session"])
+
+
+def test_runs_overlap_up_to_the_concurrency():
+    in_flight, peak = 0, 0
+
+    async def llm(reference: dict) -> list[str]:
+        nonlocal in_flight, peak
+        in_flight += 1
+        peak = max(peak, in_flight)
+        await asyncio.sleep(0.01)
+        in_flight -= 1
+        return ["bottle"]
+
+    runner = BatchRunner(llm=llm, concurrency=4, executor="thread", workers=2)
+    report = asyncio.run(runner.run(synthetic_catalog(12)))
+    assert peak == 4
+    assert (report["runs"], report["failed"]) == (12, 0)
+    assert report["latency_p50_s"] <= report["latency_p95_s"]
+
+
+def test_products_are_drawn_as_slots_free_up():
+    drawn = []
+
+    def catalog():
+        for reference in synthetic_catalog(10):
+            drawn.append(reference["asin"])
+            yield reference
+
+    async def first_result(runner: BatchRunner) -> dict:
+        async for result in runner.iter_results(catalog()):
+            return result
+
+    result = asyncio.run(first_result(BatchRunner(concurrency=3, executor="thread")))
+    assert result["reference_asin"] in drawn and len(drawn) == 3
+
+
+def test_a_timeout_fails_its_step_and_keeps_the_trace():
+    runner = BatchRunner(search=simulated_search(latency=1.0), concurrency=2, executor="thread", timeout=0.05)
+    results = []
+    report = asyncio.run(runner.run(synthetic_catalog(2), on_result=results.append))
+    assert (report["failed"], report["timed_out"], report["selected"]) == (2, 2, 0)
+    for result in results:
+        assert result["error"].startswith("TimeoutError")
+        steps = result["session"].steps
+        assert [step.status.value for step in steps] == ["completed", "failed"]
+
+
+def test_an_exception_is_recorded_without_stopping_the_batch():
+    async def search(keywords: list[str]) -> list[dict]:
+        raise ConnectionError("search unavailable")
+
+    report = asyncio.run(BatchRunner(search=search, executor="thread").run(synthetic_catalog(3)))
+    assert (report["runs"], report["failed"], report["timed_out"]) == (3, 3, 0)
+
+
+@pytest.mark.parametrize("executor", ["process", "thread"])
+def test_every_trace_is_exported(tmp_path, executor):
+    metrics = Metrics()
+    runner = BatchRunner(concurrency=3, executor=executor, workers=2, trace_dir=tmp_path, metrics=metrics)
+    results = []
+    report = asyncio.run(runner.run(synthetic_catalog(5), on_result=results.append))
+    runner.exporter.close()
+    assert report["exported"] == 5
+    for result in results:
+        trace = json.loads(open(result["trace_path"]).read())
+        assert trace["metadata"]["reference_asin"] == result["reference_asin"]
+    [rows] = [row for row in metrics.snapshot()["evaluations"] if row["step"] == "apply_filters_and_rank"]
+    assert rows["evaluated"] == 5 * 50
+
+
+def test_the_cache_is_shared_across_runs():
+    calls = []
+
+    async def llm(reference: dict) -> list[str]:
+        calls.append(reference["asin"])
+        return ["bottle"]
+
+    reference = next(iter(synthetic_catalog(1)))
+    runner = BatchRunner(llm=llm, concurrency=1, executor="thread", cache=MemoryCache())
+    asyncio.run(runner.run([reference, reference]))
+    assert calls == [reference["asin"]]
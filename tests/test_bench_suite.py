@@ -0,0 +1,34 @@
+from benchmarks.suite import OPERATIONS, compare, parse_size, run_size
+from benchmarks.synthetic import iter_candidates, iter_chunks
+
+
+def test_sizes_parse():
+    assert [parse_size(text) for text in ("1k", "10M", " 2.5k ", "300")] == [1_000, 10_000_000, 2_500, 300]
+
+
+def test_chunks_follow_the_candidate_stream():
+    chunks = list(iter_chunks(25, 10))
+    assert [len(chunk) for chunk in chunks] == [10, 10, 5]
+    assert [c for chunk in chunks for c in chunk] == list(iter_candidates(25))
+
+
+def entry(operation: str, seconds: float, rss: float = 50.0) -> dict:
+    return {"operation": operation, "size": 1000, "seconds": seconds, "peak_rss_mb": rss}
+
+
+def test_compare_flags_regressions_above_the_noise_floor():
+    baseline = {"results": [entry("save_trace", 1.0), entry("load_trace", 0.001), entry("list_traces", 0.5)]}
+    current = {"results": [entry("save_trace", 1.5), entry("load_trace", 0.01), entry("list_traces", 0.55),
+                           entry("new_operation", 9.0)]}
+    rows = {(row["operation"], row["metric"]): row for row in compare(current, baseline, threshold=0.2)}
+    assert rows["save_trace", "seconds"]["regression"] is True
+    assert rows["list_traces", "seconds"]["regression"] is False
+    # below the timer floor, and not in the baseline
+    assert ("load_trace", "seconds") not in rows
+    assert not any(operation == "new_operation" for operation, _ in rows)
+
+
+def test_every_operation_is_measured(tmp_path):
+    results = run_size(200, allocations=False, workdir=tmp_path)
+    assert set(results) == set(OPERATIONS)
+    assert all(metrics["seconds"] >= 0 for metrics in results.values())
@@ -0,0 +1,47 @@
+import pytest
+
+from xray import Evaluation, FilterResult, XRaySession, load_trace, open_trace, save_trace
+from xray.streaming import trace_to_records
+
+
+def make_session() -> XRaySession:
+    with XRaySession("binary", metadata={"run": 1}) as session:
+        with session.step("search") as step:
+            step.set_output({"count": 3})
+            with session.step("filter") as child:
+                for i, value in enumerate([1, -5, 2 ** 70, 1.5, None, "text", [1, {"a": True}]]):
+                    evaluation = Evaluation(f"c{i}", {"value": value, "name": "ünïcode"},
+                                            metadata={"score": i / 10})
+                    evaluation.add_filter_result(FilterResult("kept", i % 2 == 0, "detail", ">= 0", value))
+                    evaluation.qualified = i % 2 == 0
+                    child.add_evaluation(evaluation)
+    return session
+
+
+def test_round_trip_matches_to_dict(tmp_path):
+    session = make_session()
+    path = tmp_path / "trace.xrb"
+    save_trace(session, path)
+    assert load_trace(path) == session.to_dict()
+    assert list(load_trace(path, lazy=True)) == list(trace_to_records(session.to_dict()))
+
+
+def test_steps_are_read_on_demand(tmp_path):
+    path = tmp_path / "trace.xrb"
+    save_trace(make_session(), path)
+    with open_trace(path) as trace:
+        assert [step.name for step in trace.steps()] == ["search", "filter"]
+        step = trace.step("filter")
+        assert len(step) == 7
+        assert step[-1]["candidate_data"]["value"] == [1, {"a": True}]
+        assert step[2]["candidate_data"]["value"] == 2 ** 70
+        assert step.find("c3")["metadata"] == {"score": 0.3}
+        assert step.find("missing") is None
+        assert "evaluations" not in step.info
+        with pytest.raises(IndexError):
+            step[7]
+
+
+def test_binary_traces_cannot_be_compressed(tmp_path):
+    with pytest.raises(ValueError):
+        save_trace(make_session(), tmp_path / "trace.xrb", compression="gzip")
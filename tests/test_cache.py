@@ -0,0 +1,92 @@
+import asyncio
+import os
+
+import pytest
+
+from xray import DiskCache, MemoryCache, ReplayCache, XRaySession, load_trace, memoize, save_trace
+from xray.cache import memoize_async, stable_hash
+
+
+def run(cache, query: str, calls: list) -> tuple[XRaySession, list]:
+    def search() -> list:
+        calls.append(query)
+        return [f"{query}-{i}" for i in range(3)]
+
+    with XRaySession("cached") as session:
+        with session.step("search") as step:
+            step.set_input({"query": query, "limit": 3})
+            results = memoize(step, cache, search)
+    return session, results
+
+
+def test_stable_hash_ignores_key_order_and_tuples():
+    assert stable_hash({"a": 1, "b": (1, 2)}) == stable_hash({"b": [1, 2], "a": 1})
+    assert stable_hash({"a": 1}) != stable_hash({"a": 2})
+
+
+@pytest.mark.parametrize("backend", ["memory", "disk"])
+def test_repeated_inputs_hit(tmp_path, backend):
+    cache = MemoryCache() if backend == "memory" else DiskCache(tmp_path)
+    calls = []
+    first, results = run(cache, "bottle", calls)
+    second, again = run(cache, "bottle", calls)
+    run(cache, "flask", calls)
+    assert calls == ["bottle", "flask"] and again == results
+    assert first.steps[0].metadata["cache"]["hit"] is False
+    assert second.steps[0].metadata["cache"]["hit"] is True
+    assert second.steps[0].metadata["cache"]["backend"] == backend
+
+
+def test_memory_cache_evicts_least_recently_used():
+    cache = MemoryCache(max_entries=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+    assert cache.get("b") is None and cache.get("a")[0] == 1 and len(cache) == 2
+
+
+def test_disk_cache_expires_and_stays_in_budget(tmp_path):
+    cache = DiskCache(tmp_path, ttl=60, max_bytes=200)
+    cache.set("old", "x" * 50)
+    os.utime(tmp_path / "old.json", (1, 1))
+    for key in ("b", "c", "d"):
+        cache.set(key, "y" * 50)
+    assert cache.get("old") is None
+    assert sum(path.stat().st_size for path in tmp_path.glob("*.json")) <= 200
+    (tmp_path / "torn.json").write_text('{"stored_at": 1')
+    assert cache.get("torn") is None
+
+
+def test_replay_serves_the_recorded_step(tmp_path):
+    calls = []
+    session, results = run(MemoryCache(), "bottle", calls)
+    path = tmp_path / "trace.json"
+    save_trace(session, path)
+    replay = ReplayCache(load_trace(path), {"search": lambda step, trace: step["metadata"]["cache"]["key"]})
+    key = session.steps[0].metadata["cache"]["key"]
+    assert replay.get(key)[0] == key
+    with pytest.raises(KeyError):
+        run(replay, "flask", calls)
+    lenient = ReplayCache(load_trace(path), {}, strict=False)
+    assert lenient.get(key) is None
+
+
+def test_memoize_async_awaits_only_on_a_miss():
+    calls = []
+
+    async def fetch() -> int:
+        calls.append(1)
+        return 42
+
+    async def main() -> list:
+        cache = MemoryCache()
+        values = []
+        async with XRaySession("async") as session:
+            for _ in range(2):
+                with session.step("fetch") as step:
+                    step.set_input({"id": 7})
+                    values.append(await memoize_async(step, cache, fetch))
+        return values
+
+    assert asyncio.run(main()) == [42, 42] and calls == [1]
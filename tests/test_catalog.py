@@ -0,0 +1,75 @@
+import json
+import os
+
+from xray import Evaluation, NDJSONSink, XRaySession, save_trace
+from xray.catalog import TraceCatalog
+from xray.serializer import list_traces
+
+
+def make_session(name: str, count: int = 3) -> XRaySession:
+    with XRaySession(name) as session:
+        with session.step("filter") as step:
+            for i in range(count):
+                step.add_evaluation(Evaluation(f"c{i}", {"i": i}, qualified=i % 2 == 0))
+    return session
+
+
+def touch_later(path) -> None:
+    # move the mtime on even where the clock is coarse
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+
+def test_lists_saved_and_copied_traces(tmp_path):
+    save_trace(make_session("first"), tmp_path / "first.json", catalog=True)
+    # written without the catalog knowing, as a copy from elsewhere would be
+    save_trace(make_session("second", count=5), tmp_path / "second.json", catalog=False)
+    traces = {trace["name"]: trace for trace in list_traces(tmp_path)}
+    assert set(traces) == {"first", "second"}
+    assert traces["second"]["evaluated"] == 5
+    assert traces["second"]["qualified"] == 3
+    assert traces["second"]["status"] == "completed"
+
+
+def test_removed_files_drop_out(tmp_path):
+    for name in ("a", "b"):
+        save_trace(make_session(name), tmp_path / f"{name}.json", catalog=True)
+    assert len(list_traces(tmp_path)) == 2
+    (tmp_path / "a.json").unlink()
+    assert [trace["name"] for trace in list_traces(tmp_path)] == ["b"]
+
+
+def test_unchanged_directory_reads_nothing(tmp_path):
+    save_trace(make_session("a"), tmp_path / "a.json", catalog=True)
+    catalog = TraceCatalog(tmp_path)
+    catalog.refresh()
+    assert catalog.refresh() == 0
+    catalog.close()
+
+
+def test_running_sink_trace_is_rechecked(tmp_path):
+    path = tmp_path / "live.ndjson"
+    session = XRaySession("live", sink=NDJSONSink(path))
+    session.__enter__()
+    with session.step("filter") as step:
+        step.add_evaluation(Evaluation("c0", {}))
+    [trace] = list_traces(tmp_path)
+    assert trace["status"] == "running"
+    session.__exit__(None, None, None)
+    # the sink appended to the file in place; the directory itself did not change
+    touch_later(path)
+    [trace] = list_traces(tmp_path)
+    assert trace["status"] == "completed"
+    assert trace["evaluated"] == 1
+
+
+def test_finished_trace_rewritten_in_place_needs_rescan(tmp_path):
+    path = tmp_path / "a.json"
+    save_trace(make_session("a"), path, catalog=True)
+    list_traces(tmp_path)
+    data = json.loads(path.read_text())
+    data["name"] = "renamed"
+    path.write_text(json.dumps(data))
+    touch_later(path)
+    assert [trace["name"] for trace in list_traces(tmp_path)] == ["a"]
+    assert [trace["name"] for trace in list_traces(tmp_path, rescan=True)] == ["renamed"]
@@ -0,0 +1,159 @@
+import tracemalloc
+
+from xray import Evaluation, FilterResult, Step, XRaySession
+from xray.columnar import EvaluationTable
+
+
+def make_evaluation(i: int, passed: bool = True) -> Evaluation:
+    return Evaluation(
+        candidate_id=f"c{i}",
+        candidate_data={"title": f"item {i}", "price": 10 + i, "rating": 4.5},
+        filter_results=[
+            FilterResult("price", passed, f"${10 + i}", "<= $100", 10 + i),
+            FilterResult("rating", True, "ok"),
+        ],
+        qualified=passed,
+        metadata={"score": i / 10} if i % 2 else {},
+    )
+
+
+def test_round_trip_after_compact():
+    evaluations = [make_evaluation(i, passed=i % 3 != 0) for i in range(10)]
+    expected = [e.to_dict() for e in evaluations]
+    table = EvaluationTable(evaluations)
+    table.compact()
+    assert table.to_dicts() == expected
+    assert [table.row(row).to_dict() for row in range(len(table))] == expected
+    assert table.filter_counts() == {
+        "price": {"passed": 6, "failed": 4},
+        "rating": {"passed": 10, "failed": 0},
+    }
+
+
+def test_irregular_rows_round_trip():
+    odd = Evaluation("x", {1: "non-str key"}, [FilterResult("f", True, "a"), FilterResult("f", False, "b")])
+    evaluations = [make_evaluation(0), odd, Evaluation("bare", {})]
+    table = EvaluationTable(evaluations)
+    table.compact()
+    assert table.to_dicts() == [e.to_dict() for e in evaluations]
+    assert table.filter_counts()["f"] == {"passed": 1, "failed": 1}
+
+
+def test_changes_after_add_evaluation_are_kept():
+    with XRaySession("test") as session:
+        with session.step("filter") as step:
+            evaluation = Evaluation("c1", {"price": 20})
+            step.add_evaluation(evaluation)
+            evaluation.add_filter_result(FilterResult("price", True, "$20"))
+            evaluation.qualified = True
+            evaluation.metadata["score"] = 0.9
+    record = session.steps[0].evaluations.to_dicts()[0]
+    assert record["filter_results"] == [
+        {"filter_name": "price", "passed": True, "detail": "$20", "expected": None, "actual": None}
+    ]
+    assert record["qualified"] is True
+    assert record["metadata"] == {"score": 0.9}
+
+
+def test_changes_through_evaluations_index_are_kept():
+    with XRaySession("test") as session:
+        with session.step("filter") as step:
+            for i in range(4):
+                step.add_evaluation(make_evaluation(i))
+    step = session.steps[0]
+    step.evaluations[2].metadata["rank"] = 1
+    step.evaluations[3].qualified = False
+    for evaluation in step.evaluations:
+        evaluation.metadata["seen"] = True
+    records = step.to_dict()["evaluations"]
+    assert records[2]["metadata"] == {"rank": 1, "seen": True}
+    assert records[3]["qualified"] is False
+    assert all(record["metadata"]["seen"] for record in records)
+    # the qualified mask catches up with attached rows on compact()
+    step.evaluations.compact()
+    assert step.evaluations.qualified.count(1) == 3
+
+
+def test_list_semantics():
+    assert Step(name="s").evaluations == []
+    table = EvaluationTable(make_evaluation(i) for i in range(5))
+    table.compact()
+    assert len(table) == 5 and table[-1].candidate_id == "c4"
+    assert [e.candidate_id for e in table[1:3]] == ["c1", "c2"]
+
+    table.sort(key=lambda e: e.candidate_data["price"], reverse=True)
+    assert [e.candidate_id for e in table] == ["c4", "c3", "c2", "c1", "c0"]
+    del table[0]
+    table.insert(1, make_evaluation(9))
+    table[0] = make_evaluation(7)
+    assert [e.candidate_id for e in table] == ["c7", "c9", "c2", "c1", "c0"]
+    assert table.pop().candidate_id == "c0"
+    table.reverse()
+    assert [e.candidate_id for e in table] == ["c1", "c2", "c9", "c7"]
+    assert table == [make_evaluation(i) for i in (1, 2, 9, 7)]
+    table.compact()
+    assert table.to_dicts() == [make_evaluation(i).to_dict() for i in (1, 2, 9, 7)]
+
+
+def test_batch_rows_read_as_evaluations():
+    table = EvaluationTable()
+    table.add_candidates(["a", "b", "c"], columns={"price": [5, 50, 500]})
+    table.add_threshold_filter("price", ["a", "b", "c"], [5, 50, 500], maximum=100)
+    assert [e.qualified for e in table] == [True, True, False]
+    table[1].add_filter_result(FilterResult("manual", False, "rejected"))
+    table[1].qualified = False
+    table.compact()
+    assert table.qualified == bytearray([1, 0, 0])
+    assert table.filter_counts() == {
+        "price": {"passed": 2, "failed": 1},
+        "manual": {"passed": 0, "failed": 1},
+    }
+
+
+def batch_table(count: int) -> EvaluationTable:
+    table = EvaluationTable()
+    ids = [f"c{i}" for i in range(count)]
+    table.add_candidates(ids, columns={"price": list(range(count)), "title": [f"item {i}" for i in range(count)]})
+    table.add_threshold_filter("price", ids, list(range(count)), maximum=count // 2)
+    table.compact()
+    return table
+
+
+def test_reading_rows_does_not_keep_them_as_objects():
+    table = batch_table(20000)
+    expected = table.to_dicts()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    total = 0
+    for evaluation in table:
+        total += evaluation.candidate_data["price"]
+    grown = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    assert total == sum(range(20000))
+    # only the last row read is still attached; 20000 Evaluation objects would be several MB
+    assert len(table._objects) <= 1
+    assert grown < 200_000
+    del evaluation
+    table.compact()
+    assert not table._objects
+    assert table.to_dicts() == expected
+
+
+def test_written_rows_are_released_at_compact():
+    table = batch_table(10)
+    kept = table[3]
+    for evaluation in table:
+        evaluation.metadata["seen"] = True
+    del evaluation
+    table[5].qualified = True
+    table[6].add_filter_result(FilterResult("manual", False, "rejected"))
+    table.compact()
+    # the caller still holds row 3, and row 6 has a filter result the columns can't hold
+    assert sorted(table._objects) == [3, 6]
+    del kept
+    table.compact()
+    assert sorted(table._objects) == [6]
+    records = table.to_dicts()
+    assert all(record["metadata"] == {"seen": True} for record in records)
+    assert [record["qualified"] for record in records] == [i <= 5 for i in range(6)] + [False] * 4
+    assert table.filter_counts()["manual"] == {"passed": 0, "failed": 1}
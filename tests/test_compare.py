@@ -0,0 +1,67 @@
+import pytest
+
+from xray import Evaluation, FilterResult, NDJSONSink, XRaySession, load_trace, save_trace
+from xray.compare import TraceDiff, diff
+from xray.serializer import _JSONStream, iter_json_records
+from xray.store import blob_store_for
+from xray.streaming import trace_to_records
+
+
+def make_session(threshold: int, count: int = 40, sink=None) -> XRaySession:
+    with XRaySession("pipeline", sink=sink) as session:
+        with session.step("search", step_type="retrieval") as step:
+            step.set_reasoning("found candidates " + "x" * 300)
+        with session.step("filter", step_type="filter") as step:
+            ids = [f"c{i}" for i in range(count)]
+            prices = [i * 5 for i in range(count)]
+            step.add_candidates(ids, columns={"price": prices, "notes": ["long note " * 40] * count})
+            step.add_threshold_filter("price", ids, prices, maximum=threshold, detail="${actual} vs {expected}")
+            with session.step("score", step_type="rank") as child:
+                for i in range(5):
+                    evaluation = Evaluation(f"s{i}", {"title": f"item {i}"}, metadata={"score": (i * 3) % 5 / 5})
+                    evaluation.add_filter_result(FilterResult("rating", i != 2, "rating"))
+                    evaluation.qualified = i != 2
+                    child.add_evaluation(evaluation)
+    return session
+
+
+def test_filter_flips_are_reported(tmp_path):
+    a, b = tmp_path / "a.json", tmp_path / "b.ndjson"
+    save_trace(make_session(threshold=100), a)
+    make_session(threshold=50, sink=NDJSONSink(b))
+    report = diff(a, b, limit=None)
+    [step] = [step for step in report["steps"] if step["step"] == "filter"]
+    # prices 55..100 no longer pass
+    assert step["filter_flips"] == {"price": 10}
+    assert step["flipped_to_rejected"] == 10 and step["flipped_to_qualified"] == 0
+    assert step["matched"] == 40 and step["added"] == step["removed"] == 0
+    flipped = sorted(change["candidate_id"] for change in report["changes"])
+    assert flipped == sorted(f"c{i}" for i in range(11, 21))
+    assert all(change["qualified"] == [True, False] for change in report["changes"])
+
+
+def test_json_and_ndjson_baselines_diff_the_same(tmp_path):
+    session_a, session_b = make_session(threshold=100), make_session(threshold=50)
+    save_trace(session_a, tmp_path / "a.json", indent=2, render=False)
+    make_session(threshold=100, sink=NDJSONSink(tmp_path / "a.ndjson"))
+    save_trace(session_b, tmp_path / "b.xrb")
+    with TraceDiff(tmp_path / "a.json", tmp_path / "b.xrb", spill_rows=7) as from_json:
+        changes = sorted(from_json.changes(), key=lambda change: change["candidate_id"])
+        summary = from_json.summary()
+    report = diff(tmp_path / "a.ndjson", tmp_path / "b.xrb", limit=None, spill_rows=7)
+    assert changes == sorted(report["changes"], key=lambda change: change["candidate_id"])
+    # the NDJSON baseline is a second recording of the same run; only its timings differ
+    for step in summary["steps"] + report["steps"]:
+        del step["duration_ns"]
+    assert summary["steps"] == report["steps"]
+
+
+@pytest.mark.parametrize("indent", [None, 2])
+def test_json_records_match_the_loaded_trace(tmp_path, monkeypatch, indent):
+    # a tiny read size puts chunk boundaries inside keys, strings and numbers
+    monkeypatch.setattr(_JSONStream, "CHUNK", 5)
+    path = tmp_path / "trace.json.gz"
+    save_trace(make_session(threshold=60), path, indent=indent, render=False,
+               blobs=blob_store_for(tmp_path))
+    assert '"$blob"' not in str(list(iter_json_records(path, tmp_path)))
+    assert list(iter_json_records(path, tmp_path)) == list(trace_to_records(load_trace(path)))
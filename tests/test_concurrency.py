@@ -0,0 +1,92 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+from xray import Evaluation, FilterResult, NDJSONSink, XRaySession, load_trace
+from xray.core import propagate_context
+from xray.serializer import iter_steps
+
+THREADS = 8
+TASKS = 40
+PER_STEP = 100
+
+
+def record(step, prefix: str, count: int) -> None:
+    for i in range(count):
+        evaluation = Evaluation(candidate_id=f"{prefix}-{i}", candidate_data={"i": i})
+        evaluation.add_filter_result(FilterResult("even", i % 2 == 0, "parity"))
+        step.add_evaluation(evaluation)
+
+
+def thread_worker(session: XRaySession, shared_step, index: int) -> None:
+    with session.step(f"thread_{index}", step_type="worker") as step:
+        record(step, f"t{index}", PER_STEP)
+        # and into the shared parent step from every thread at once
+        record(shared_step, f"shared-t{index}", PER_STEP)
+
+
+async def task_worker(session: XRaySession, index: int) -> None:
+    with session.step(f"task_{index}", step_type="worker") as step:
+        for chunk in range(4):
+            record(step, f"a{index}-{chunk}", PER_STEP // 4)
+            await asyncio.sleep(0)
+
+
+def fan_out_threads(session: XRaySession) -> None:
+    with session.step("thread_fan_out") as fan_out:
+        with ThreadPoolExecutor(max_workers=THREADS) as pool:
+            work = propagate_context(thread_worker)
+            for future in [pool.submit(work, session, fan_out, i) for i in range(THREADS)]:
+                future.result()
+
+
+def run_session() -> XRaySession:
+    with XRaySession("stress") as session:
+        fan_out_threads(session)
+
+        async def gather_all():
+            with session.step("task_fan_out"):
+                await asyncio.gather(*(task_worker(session, i) for i in range(TASKS)))
+        asyncio.run(gather_all())
+    return session
+
+
+def test_threads_and_tasks_keep_every_step():
+    session = run_session()
+    steps = list(session.iter_steps())
+    assert len(steps) == THREADS + TASKS + 2
+    assert sorted(step.sequence for step in steps) == list(range(len(steps)))
+    assert [step.name for step in session.steps] == ["thread_fan_out", "task_fan_out"]
+    for step in steps:
+        assert step.start_ns is not None and step.end_ns is not None
+        assert step.start_ns <= step.end_ns
+
+
+def test_children_hang_off_their_fan_out_step():
+    session = run_session()
+    fan_out, gather = session.steps
+    assert sorted(child.name for child in fan_out.children) == sorted(f"thread_{i}" for i in range(THREADS))
+    assert sorted(child.name for child in gather.children) == sorted(f"task_{i}" for i in range(TASKS))
+    for parent in (fan_out, gather):
+        for child in parent.children:
+            assert child.parent_id == parent.step_id
+            assert len(child.evaluations) == PER_STEP
+            counts = child.evaluations.filter_counts()["even"]
+            assert counts["passed"] + counts["failed"] == PER_STEP
+    assert gather.child_ns <= gather.duration_ns
+
+
+def test_shared_step_loses_no_evaluations():
+    session = run_session()
+    shared_ids = session.steps[0].evaluations.candidate_ids
+    assert len(shared_ids) == THREADS * PER_STEP
+    assert len(set(shared_ids)) == len(shared_ids)
+
+
+def test_streamed_session_rebuilds_every_record(tmp_path):
+    path = tmp_path / "stress.ndjson"
+    with XRaySession("stress", sink=NDJSONSink(path)) as session:
+        fan_out_threads(session)
+    counts = {step["name"]: len(step["evaluations"]) for step in iter_steps(load_trace(path))}
+    assert len(counts) == THREADS + 1
+    assert counts["thread_fan_out"] == THREADS * PER_STEP
+    assert all(counts[f"thread_{i}"] == PER_STEP for i in range(THREADS))
@@ -0,0 +1,51 @@
+import pytest
+
+from xray import Evaluation, XRaySession, save_trace, set_enabled, tracing_enabled
+from xray.engine import FilterRankEngine, FilterSpec
+from xray.store import TraceStore
+
+
+@pytest.fixture
+def disabled():
+    previous = tracing_enabled()
+    set_enabled(False)
+    yield
+    set_enabled(previous)
+
+
+def never_called():
+    raise AssertionError("lazy argument built while tracing is off")
+
+
+def test_disabled_sessions_record_nothing(tmp_path, disabled):
+    session = XRaySession("off")
+    assert session is XRaySession("other") and not session.enabled
+    with session as active:
+        with active.step("filter") as step:
+            step.set_input(never_called)
+            step.set_reasoning(never_called)
+            step.add_evaluation(Evaluation("c1", {}))
+            assert step.add_candidates(["a", "b"]) == range(0)
+            step.metadata["note"] = 1
+    assert session.steps == () and step.metadata == {}
+    assert save_trace(session, tmp_path / "off.json") is None
+    assert TraceStore(tmp_path).save(session) is None
+    assert list(tmp_path.glob("*.json*")) == []
+
+
+def test_enabled_argument_overrides_the_switch(disabled):
+    with XRaySession("forced", enabled=True) as session:
+        with session.step("filter") as step:
+            step.add_evaluation(Evaluation("c1", {}))
+    assert session.enabled and len(session.steps[0].evaluations) == 1
+    set_enabled(True)
+    assert not XRaySession("off", enabled=False).enabled
+    assert XRaySession("on").enabled
+
+
+def test_engine_still_filters_when_disabled(disabled):
+    engine = FilterRankEngine([FilterSpec("min", "x", ">=", 2)])
+    with XRaySession("off") as session:
+        with session.step("filter") as step:
+            result = engine.filter(step, [{"id": f"c{i}", "x": i} for i in range(4)])
+    assert result["rows"] is None and list(result["qualified"]) == [0, 0, 1, 1]
@@ -0,0 +1,50 @@
+import io
+import json
+
+import pytest
+
+from xray import Evaluation, FilterResult, XRaySession, load_trace, save_trace
+from xray.encoder import iter_session_json, orjson, write_session_json
+
+
+def make_session() -> XRaySession:
+    with XRaySession("encoder", metadata={"note": "ünïcode \"quoted\"", "empty": {}, "list": []}) as session:
+        with session.step("search") as step:
+            step.set_input({"query": "bottle", "limit": 10})
+            with session.step("filter") as child:
+                ids = [f"b{i}" for i in range(20)]
+                child.add_candidates(ids, columns={"price": [i * 2.5 for i in range(20)]})
+                child.add_threshold_filter("price", ids, [i * 2.5 for i in range(20)], maximum=30,
+                                           detail="${actual}")
+                for i in range(3):
+                    evaluation = Evaluation(f"e{i}", {"nested": {"a": [1, None, True]}, "big": 2 ** 70},
+                                            metadata={"score": i / 3})
+                    evaluation.add_filter_result(FilterResult("manual", i > 0, "checked"))
+                    child.add_evaluation(evaluation)
+        with session.step("empty"):
+            pass
+    return session
+
+
+def test_json_backend_bytes_match_json_dump():
+    session = make_session()
+    encoded = b"".join(iter_session_json(session, indent=2, backend="json"))
+    assert encoded == json.dumps(session.to_dict(), indent=2).encode("utf-8")
+
+
+@pytest.mark.parametrize("backend", ["json"] + (["orjson"] if orjson is not None else []))
+@pytest.mark.parametrize("indent", [None, 2])
+def test_output_parses_to_to_dict(backend, indent):
+    session = make_session()
+    f = io.BytesIO()
+    written = write_session_json(session, f, indent=indent, backend=backend)
+    assert written == len(f.getvalue())
+    assert json.loads(f.getvalue()) == session.to_dict()
+
+
+@pytest.mark.parametrize("render", [True, False])
+def test_saved_traces_load_back(tmp_path, render):
+    session = make_session()
+    path = tmp_path / "trace.json"
+    save_trace(session, path, render=render)
+    assert load_trace(path) == session.to_dict()
@@ -0,0 +1,73 @@
+import pytest
+
+from xray import XRaySession
+from xray.engine import FilterRankEngine, FilterSpec, ScoreComponent
+
+CANDIDATES = [
+    {"id": f"c{i}", "price": (i * 37) % 100, "rating": 3.0 + (i % 7) / 3, "tags": ["a"] if i % 3 else ["b"]}
+    for i in range(40)
+]
+
+
+def make_engine() -> FilterRankEngine:
+    return FilterRankEngine(
+        [
+            FilterSpec("price", "price", "between", (10, 70)),
+            FilterSpec("rating", "rating", ">=", 3.5),
+            FilterSpec("tagged", "tags", "contains", "a"),
+            FilterSpec("custom", "price", lambda value, threshold: value % threshold != 0, 5),
+        ],
+        scores=[ScoreComponent("rating", "rating", 1.0), ScoreComponent("cheap", "price", -0.01)],
+    )
+
+
+def expected_mask() -> list[int]:
+    return [int(10 <= c["price"] <= 70 and c["rating"] >= 3.5 and "a" in c["tags"] and c["price"] % 5 != 0)
+            for c in CANDIDATES]
+
+
+def test_explain_and_short_circuit_agree():
+    engine = make_engine()
+    with XRaySession("engine") as session:
+        with session.step("explain") as step:
+            explained = engine.run(step, CANDIDATES, explain=True, top_k=3)
+        with session.step("short") as step:
+            short = engine.run(step, CANDIDATES, explain=False, top_k=3)
+    assert list(explained["qualified"]) == list(short["qualified"]) == expected_mask()
+    assert explained["passed"] == short["passed"] == sum(expected_mask())
+    assert [c["id"] for c, _ in explained["ranked"]] == [c["id"] for c, _ in short["ranked"]]
+
+    # explain counts every filter over every candidate; short-circuit only the first failure
+    for spec in engine.filters:
+        mask = spec.mask([c.get(spec.field) for c in CANDIDATES])
+        assert explained["rejected"][spec.name] == len(mask) - sum(mask)
+    assert sum(short["rejected"].values()) == len(CANDIDATES) - short["passed"]
+    assert sorted(short["order"]) == sorted(spec.name for spec in engine.filters)
+
+    explain_step, short_step = session.steps
+    assert [child.name for child in explain_step.children] == ["score_and_rank"]
+    assert len(explain_step.evaluations) == 40
+    assert len(short_step.evaluations) == 0
+    assert short_step.metadata["filters"]["rejected"] == short["rejected"]
+
+
+def test_ranked_rows_carry_score_and_rank():
+    engine = make_engine()
+    with XRaySession("engine") as session:
+        with session.step("filter") as step:
+            result = engine.run(step, CANDIDATES, top_k=2)
+    records = {e["candidate_id"]: e["metadata"] for e in session.to_dict()["steps"][0]["evaluations"]}
+    (best, best_score), (second, _) = result["ranked"]
+    assert records[best["id"]]["rank"] == 1 and records[second["id"]]["rank"] == 2
+    assert records[best["id"]]["score"] == best_score == engine.score(best)[0]
+    left_out = [metadata for metadata in records.values() if "score" in metadata and "rank" not in metadata]
+    assert left_out and all("rank_reason" in metadata for metadata in left_out)
+
+
+def test_filter_specs_are_checked():
+    with pytest.raises(ValueError):
+        FilterSpec("bad", "price", "~=", 1)
+    with pytest.raises(ValueError):
+        FilterSpec("bad", "price", "between", 5)
+    with pytest.raises(ValueError):
+        FilterRankEngine([FilterSpec("a", "x", ">=", 1), FilterSpec("a", "y", ">=", 1)])
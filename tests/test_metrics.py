@@ -0,0 +1,70 @@
+from xray import Evaluation, FilterResult, Metrics, XRaySession
+from xray.engine import FilterRankEngine, FilterSpec
+
+CANDIDATES = [{"id": f"c{i}", "rating": 3.0 + (i % 10) / 5, "reviews": i * 10} for i in range(50)]
+
+
+def make_engine() -> FilterRankEngine:
+    return FilterRankEngine([
+        FilterSpec("min_rating", "rating", ">=", 3.6),
+        FilterSpec("min_reviews", "reviews", ">=", 100),
+    ])
+
+
+def run(metrics: Metrics, sample_rate: float) -> dict:
+    engine = make_engine()
+    with XRaySession("pipeline", metrics=metrics, sample_rate=sample_rate) as session:
+        with session.step("filter") as step:
+            filtered = engine.filter(step, CANDIDATES)
+    return filtered
+
+
+def filter_counts(metrics: Metrics) -> dict:
+    return {(row["filter"], row["mode"]): (row["passed"], row["failed"]) for row in metrics.snapshot()["filters"]}
+
+
+def test_explain_and_short_circuit_counts_are_kept_apart():
+    expected_rating = sum(c["rating"] >= 3.6 for c in CANDIDATES)
+    expected_reviews = sum(c["reviews"] >= 100 for c in CANDIDATES)
+
+    metrics = Metrics()
+    explained = run(metrics, sample_rate=1.0)
+    short_circuit = run(metrics, sample_rate=0.0)
+    assert explained["rows"] is not None and short_circuit["rows"] is None
+    assert explained["qualified"] == short_circuit["qualified"]
+
+    counts = filter_counts(metrics)
+    # every filter saw every candidate
+    assert counts["min_rating", "explain"] == (expected_rating, 50 - expected_rating)
+    assert counts["min_reviews", "explain"] == (expected_reviews, 50 - expected_reviews)
+    # each filter only saw what the ones before it in the order let through
+    order = short_circuit["order"]
+    first, second = order
+    assert sum(counts[first, "short_circuit"]) == 50
+    assert sum(counts[second, "short_circuit"]) == counts[first, "short_circuit"][0]
+    assert counts[second, "short_circuit"][0] == short_circuit["passed"]
+
+    [evaluations] = metrics.snapshot()["evaluations"]
+    assert evaluations["evaluated"] == 100
+    assert evaluations["qualified"] == 2 * explained["passed"]
+
+
+def test_rendered_series_carry_the_mode():
+    metrics = Metrics()
+    run(metrics, sample_rate=1.0)
+    run(metrics, sample_rate=0.0)
+    text = metrics.render()
+    assert 'filter="min_rating",mode="explain",result="pass"' in text
+    assert 'filter="min_rating",mode="short_circuit",result="pass"' in text
+
+
+def test_recorded_evaluations_count_as_explain():
+    metrics = Metrics()
+    with XRaySession("pipeline", metrics=metrics, sample_rate=0.0) as session:
+        with session.step("filter") as step:
+            for i in range(4):
+                evaluation = Evaluation(f"c{i}", {}, [FilterResult("even", i % 2 == 0, "parity")], qualified=i % 2 == 0)
+                step.add_evaluation(evaluation)
+    assert filter_counts(metrics) == {("even", "explain"): (2, 2)}
+    [evaluations] = metrics.snapshot()["evaluations"]
+    assert (evaluations["evaluated"], evaluations["qualified"]) == (4, 2)
@@ -0,0 +1,50 @@
+import pytest
+
+from xray import XRaySession
+from xray.parallel import map_candidates, shard_ranges
+
+CANDIDATES = [{"id": f"c{i}", "price": (i * 37) % 100, "score": ((i * 13) % 29) / 29} for i in range(60)]
+
+
+def record(table, candidates):
+    # module level, so a process pool can pickle it
+    ids = [c["id"] for c in candidates]
+    prices = [c["price"] for c in candidates]
+    table.add_candidates(ids, columns={"price": prices})
+    table.add_threshold_filter("price", ids, prices, maximum=60)
+    table.add_filter_batch("parity", ids, [c["price"] % 2 == 0 for c in candidates],
+                           detail=lambda actual, passed: "even" if passed else "odd")
+    for row, candidate in enumerate(candidates):
+        table.set_metadata(row, {"score": candidate["score"]})
+    return len(candidates)
+
+
+def run(**options) -> tuple[dict, dict]:
+    with XRaySession("parallel") as session:
+        with session.step("filter") as step:
+            result = map_candidates(step, CANDIDATES, record, top_k=5, **options)
+    return session.to_dict()["steps"][0]["evaluations"], result
+
+
+def test_shards_cover_every_candidate():
+    assert shard_ranges(10, 3) == [range(0, 4), range(4, 7), range(7, 10)]
+    assert shard_ranges(2, 8) == [range(0, 1), range(1, 2)]
+    assert shard_ranges(0, 4) == [range(0, 0)]
+
+
+@pytest.mark.parametrize("executor", ["thread", "process"])
+def test_parallel_output_matches_serial(executor):
+    serial, serial_result = run(workers=1, shards=1)
+    parallel, parallel_result = run(workers=2, shards=4, executor=executor)
+    assert parallel == serial
+    assert parallel_result["results"] == [15] * 4 and serial_result["results"] == [60]
+    for key in ("rows", "evaluated", "qualified", "top"):
+        assert parallel_result[key] == serial_result[key]
+    assert serial_result["top"][0][1] == max(c["score"] for c in CANDIDATES if c["price"] <= 60 and c["price"] % 2 == 0)
+
+
+def test_unknown_executor():
+    with XRaySession("parallel") as session:
+        with session.step("filter") as step:
+            with pytest.raises(ValueError):
+                map_candidates(step, CANDIDATES, record, executor="gpu")
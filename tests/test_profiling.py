@@ -0,0 +1,87 @@
+import time
+
+import pytest
+
+from xray import XRaySession, load_trace, save_trace
+from xray.profiling import StepProfiler, collapsed_stacks, main, profiled_steps, write_collapsed
+
+
+def busy(seconds: float) -> list:
+    held, deadline = [], time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        held.append(sum(range(200)))
+    return held
+
+
+def test_profile_is_stored_in_step_metadata():
+    with XRaySession("profiled", profile=StepProfiler(sample_interval=0.001)) as session:
+        with session.step("work") as step:
+            kept = busy(0.05)
+    profile = step.metadata["profile"]
+    assert profile["wall_ms"] >= 50
+    assert any(row["function"].startswith("busy (test_profiling.py") for row in profile["functions"])
+    # the profiler's own frames and the step exit are left out
+    assert not any("(profiling.py:" in row["function"] for row in profile["functions"])
+    assert profile["samples"] > 0 and any("busy" in stack for stack in profile["stacks"])
+    assert profile["memory"]["held_kb"] > 0 and profile["memory"]["peak_kb"] >= profile["memory"]["held_kb"]
+    assert profile["gc"]["collections"] >= 0 and "skipped" not in profile
+    del kept
+
+
+def test_a_nested_step_skips_what_its_parent_holds():
+    with XRaySession("nested", profile=StepProfiler(sample_interval=None)) as session:
+        with session.step("outer") as outer:
+            with session.step("inner") as inner:
+                busy(0.01)
+    assert sorted(inner.metadata["profile"]["skipped"]) == ["functions", "memory"]
+    assert "functions" in outer.metadata["profile"]
+    # both profilers were released
+    with XRaySession("again", profile=StepProfiler(sample_interval=None)) as session:
+        with session.step("work") as step:
+            busy(0.01)
+    assert "skipped" not in step.metadata["profile"]
+
+
+def test_every_picks_the_profiled_runs():
+    profiler = StepProfiler(cprofile=False, memory=False, sample_interval=None, every=3)
+    profiled = []
+    for _ in range(6):
+        with XRaySession("sampled", profile=profiler) as session:
+            with session.step("work") as step:
+                pass
+        profiled.append("profile" in step.metadata)
+    assert profiled == [True, False, False, True, False, False]
+    with pytest.raises(ValueError):
+        StepProfiler(every=0)
+
+
+def test_steps_opt_in_and_out():
+    with XRaySession("mixed", profile=StepProfiler(cprofile=False, memory=False, sample_interval=None)) as session:
+        with session.step("off", profile=False) as off:
+            pass
+        with session.step("on") as on:
+            pass
+    with XRaySession("plain") as plain:
+        with plain.step("forced", profile=True) as forced:
+            busy(0.005)
+    assert "profile" not in off.metadata and "gc" in on.metadata["profile"]
+    assert "functions" in forced.metadata["profile"]
+
+
+def test_profiles_round_trip_to_collapsed_stacks(tmp_path, capsys):
+    with XRaySession("flame", profile=StepProfiler(cprofile=False, memory=False, sample_interval=0.001)) as session:
+        with session.step("a;b") as step:
+            busy(0.03)
+        with session.step("quiet", profile=False):
+            pass
+    path = tmp_path / "trace.json"
+    save_trace(session, path)
+    trace = load_trace(path)
+    assert [s["name"] for s in profiled_steps(trace)] == ["a;b"]
+    lines = collapsed_stacks(trace)
+    assert lines and all(line.startswith("a:b;") for line in lines)
+    assert sum(int(line.rsplit(" ", 1)[1]) for line in lines) == step.metadata["profile"]["samples"]
+    folded = tmp_path / "flame.folded"
+    assert write_collapsed(trace, folded) == len(lines)
+    main([str(path)])
+    assert "a;b:" in capsys.readouterr().out
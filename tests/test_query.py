@@ -0,0 +1,103 @@
+import pytest
+
+from xray import Evaluation, FilterResult, XRaySession, save_trace
+from xray import query
+from xray.query import TraceQuery, query_for
+
+COUNT = 30
+
+
+def make_session() -> XRaySession:
+    with XRaySession("query") as session:
+        with session.step("filter") as step:
+            for i in range(COUNT):
+                evaluation = Evaluation(f"c{i}", {"title": f"Item {i}", "price": float(i)},
+                                        metadata={"score": (i * 7) % COUNT / COUNT})
+                evaluation.add_filter_result(FilterResult("cheap", i < 20, f"${i}"))
+                evaluation.add_filter_result(FilterResult("even", i % 2 == 0, "parity"))
+                evaluation.qualified = i < 20 and i % 2 == 0
+                step.add_evaluation(evaluation)
+            step.add_evaluation(Evaluation("odd\nid", {"title": "tab\there"}))
+    return session
+
+
+@pytest.fixture(params=["json", "xrb"])
+def trace_path(request, tmp_path):
+    path = tmp_path / f"trace.{request.param}"
+    save_trace(make_session(), path)
+    return path
+
+
+def page_ids(page: dict) -> list[str]:
+    return [evaluation["candidate_id"] for evaluation in page["evaluations"]]
+
+
+def test_pages_follow_the_cursor(trace_path):
+    with TraceQuery(trace_path) as trace:
+        seen, cursor = [], None
+        while True:
+            page = trace.evaluations("filter", limit=7, cursor=cursor)
+            assert page["total"] == COUNT + 1
+            seen += page_ids(page)
+            cursor = page["next_cursor"]
+            if cursor is None:
+                break
+    assert seen == [f"c{i}" for i in range(COUNT)] + ["odd\nid"]
+
+
+def test_filters_and_sorting(trace_path):
+    with TraceQuery(trace_path) as trace:
+        assert trace.evaluations("filter", qualified=True)["total"] == 10
+        assert trace.evaluations("filter", failed="cheap")["total"] == 10
+        assert trace.evaluations("filter", failed=["cheap", "even"])["total"] == 20
+        page = trace.evaluations("filter", ranges={"price": (5, 8)}, sort="price", descending=False)
+        assert page_ids(page) == ["c5", "c6", "c7", "c8"]
+        top = trace.evaluations("filter", sort="score", limit=1)
+        assert top["evaluations"][0]["metadata"]["score"] == max((i * 7) % COUNT / COUNT for i in range(COUNT))
+
+
+def test_search_keeps_separators_inside_their_row(trace_path):
+    with TraceQuery(trace_path) as trace:
+        assert page_ids(trace.evaluations("filter", search="ITEM 2")) == ["c2"] + [f"c{i}" for i in range(20, 30)]
+        assert page_ids(trace.evaluations("filter", search="odd\nid")) == ["odd\nid"]
+        assert page_ids(trace.evaluations("filter", search="tab\th")) == ["odd\nid"]
+        # the end of one row and the start of the next never match together
+        assert trace.evaluations("filter", search="29\nc")["total"] == 0
+
+
+def test_invalid_cursor(trace_path):
+    with TraceQuery(trace_path) as trace:
+        with pytest.raises(ValueError):
+            trace.evaluations("filter", cursor="x")
+        with pytest.raises(KeyError):
+            trace.evaluations("missing")
+
+
+def test_query_cache_is_bounded(tmp_path, monkeypatch):
+    monkeypatch.setattr(query, "MAX_OPEN_QUERIES", 2)
+    monkeypatch.setattr(query, "_queries", query.OrderedDict())
+    paths = [tmp_path / f"t{i}.json" for i in range(3)]
+    for path in paths:
+        save_trace(make_session(), path)
+    first = query_for(paths[0])
+    assert query_for(paths[0]) is first
+    query_for(paths[1])
+    query_for(paths[0])
+    query_for(paths[2])
+    # paths[1] was the least recently used
+    assert [key[0].name for key in query._queries] == ["t0.json", "t2.json"]
+    assert query_for(paths[0]) is first
+
+
+def test_query_cache_reopens_changed_files(tmp_path):
+    path = tmp_path / "t.json"
+    save_trace(make_session(), path)
+    before = query_for(path)
+    with XRaySession("query") as session:
+        with session.step("filter") as step:
+            step.add_evaluation(Evaluation("only", {}))
+    save_trace(session, path)
+    after = query_for(path)
+    assert after is not before
+    assert after.evaluations("filter")["total"] == 1
+    assert sum(key[0] == path.absolute() for key in query._queries) == 1
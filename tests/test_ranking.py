@@ -0,0 +1,34 @@
+import random
+
+import pytest
+
+from xray.ranking import TopK, rank_reason
+
+
+def test_matches_a_full_stable_sort():
+    rng = random.Random(7)
+    scores = [rng.randint(0, 20) for _ in range(500)]
+    top = TopK(25)
+    for i, score in enumerate(scores):
+        top.push(score, i)
+    expected = sorted(range(len(scores)), key=lambda i: -scores[i])[:25]
+    assert [item for item, _ in top.ranked()] == expected
+    assert top.count == 500
+    assert top.cutoff == scores[expected[-1]]
+
+
+def test_ties_keep_the_earlier_item():
+    top = TopK(2)
+    for item in ("a", "b", "c"):
+        top.push(1.0, item)
+    assert top.ranked() == [("a", 1.0), ("b", 1.0)]
+    assert rank_reason(1.0, top.cutoff, 2).endswith("ranked after earlier candidates")
+    assert rank_reason(0.5, top.cutoff, 2) == "not in top 2: score 0.5 < cutoff 1.0"
+
+
+def test_cutoff_needs_k_items():
+    top = TopK(3)
+    top.push(5, "x")
+    assert top.cutoff is None and top.ranked() == [("x", 5)]
+    with pytest.raises(ValueError):
+        TopK(0)
@@ -0,0 +1,40 @@
+from xray import Evaluation, FilterResult, RetentionPolicy, XRaySession
+
+
+def test_rejects_are_sampled_per_filter():
+    policy = RetentionPolicy(rejects_per_filter=5, top_k=0, seed=1)
+    with XRaySession("retention", retention=policy) as session:
+        with session.step("filter") as step:
+            for i in range(100):
+                evaluation = Evaluation(f"c{i}", {"i": i})
+                evaluation.add_filter_result(FilterResult("even", i % 2 == 0, "parity"))
+                evaluation.add_filter_result(FilterResult("small", i < 30, "size"))
+                evaluation.qualified = i % 2 == 0 and i < 30
+                step.add_evaluation(evaluation)
+    step = session.steps[0]
+    retention = step.metadata["retention"]
+    assert (retention["evaluated"], retention["qualified"]) == (100, 15)
+    assert [retention["filters"]["even"][key] for key in ("passed", "failed")] == [50, 50]
+    assert [retention["filters"]["small"][key] for key in ("passed", "failed")] == [30, 70]
+    kept = step.evaluations.to_dicts()
+    assert sum(e["qualified"] for e in kept) == 15
+    # at most five rejects per failing filter, possibly shared between the two
+    assert 5 <= len(kept) - 15 <= 10
+    assert retention["retained"] == len(kept)
+
+
+def test_batch_counts_follow_each_rows_filters():
+    policy = RetentionPolicy(rejects_per_filter=100, top_k=0, seed=1)
+    with XRaySession("retention", retention=policy) as session:
+        with session.step("filter") as step:
+            ids = [f"c{i}" for i in range(10)]
+            step.add_candidates(ids, columns={"price": list(range(10))})
+            step.add_threshold_filter("price", ids, list(range(10)), maximum=5)
+            # rows given an extra result by hand, including the first row of the batch
+            for row in (0, 7):
+                step.evaluations[row].add_filter_result(FilterResult("manual", False, "rejected"))
+                step.evaluations[row].qualified = False
+    filters = session.steps[0].metadata["retention"]["filters"]
+    assert filters["price"] == {"passed": 6, "failed": 4, "retained_failed": 4}
+    assert filters["manual"] == {"passed": 0, "failed": 2, "retained_failed": 2}
+    assert session.steps[0].metadata["retention"]["qualified"] == 5
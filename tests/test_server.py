@@ -0,0 +1,105 @@
+import json
+import urllib.error
+import urllib.request
+
+import pytest
+
+from xray import Evaluation, FilterResult, XRaySession, save_trace
+from xray.server import TraceServer, merge_evaluations
+
+
+def make_session(name: str, count: int = 12) -> XRaySession:
+    with XRaySession(name) as session:
+        with session.step("filter") as step:
+            for i in range(count):
+                evaluation = Evaluation(f"c{i}", {"price": float(i)})
+                evaluation.add_filter_result(FilterResult("cheap", i < 6, f"${i}"))
+                evaluation.qualified = i < 6
+                step.add_evaluation(evaluation)
+    return session
+
+
+@pytest.fixture
+def server(tmp_path):
+    sessions = [make_session(f"run{i}") for i in range(3)]
+    for i, session in enumerate(sessions):
+        save_trace(session, tmp_path / f"run{i}.json")
+    server = TraceServer(tmp_path, port=0).start()
+    server.sessions = sessions
+    yield server
+    server.stop()
+
+
+def get(server: TraceServer, path: str) -> tuple[int, dict]:
+    try:
+        with urllib.request.urlopen(server.url + path) as response:
+            return response.status, json.load(response)
+    except urllib.error.HTTPError as error:
+        return error.code, json.load(error)
+
+
+def test_listing_pages(server):
+    status, first = get(server, "/api/traces?limit=2&sort=name&descending=false")
+    assert status == 200 and first["total"] == 3
+    assert [trace["name"] for trace in first["traces"]] == ["run0", "run1"]
+    _, rest = get(server, "/api/traces?limit=2&offset=2&sort=name&descending=false")
+    assert [trace["name"] for trace in rest["traces"]] == ["run2"]
+    _, named = get(server, "/api/traces?name=run1")
+    assert named["total"] == 1
+
+
+def test_bad_parameters_are_400(server):
+    for path in ("/api/traces?sort=bogus", "/api/traces?limit=x", "/api/traces?offset=-1"):
+        status, body = get(server, path)
+        assert status == 400 and "error" in body
+    trace_id = server.sessions[0].trace_id
+    status, _ = get(server, f"/api/traces/{trace_id}/steps/filter/evaluations?min.price=cheap")
+    assert status == 400
+    status, _ = get(server, f"/api/traces/{trace_id}/steps/filter/evaluations?cursor=bogus")
+    assert status == 400
+
+
+def test_unknown_traces_and_steps_are_404(server):
+    assert get(server, "/api/traces/missing")[0] == 404
+    trace_id = server.sessions[0].trace_id
+    assert get(server, f"/api/traces/{trace_id}/steps/missing/evaluations")[0] == 404
+    assert get(server, "/api/nothing")[0] == 404
+
+
+def test_evaluation_pages_follow_the_cursor(server):
+    trace_id = server.sessions[1].trace_id
+    status, trace = get(server, f"/api/traces/{trace_id}")
+    assert status == 200 and trace["name"] == "run1"
+    seen, cursor = [], ""
+    while cursor is not None:
+        _, page = get(server, f"/api/traces/{trace_id}/steps/filter/evaluations?limit=5&qualified=true"
+                              + (f"&cursor={cursor}" if cursor else ""))
+        assert page["total"] == 6
+        seen += [evaluation["candidate_id"] for evaluation in page["evaluations"]]
+        cursor = page["next_cursor"]
+    assert seen == [f"c{i}" for i in range(6)]
+
+
+def test_posted_events_are_in_the_live_snapshot(server):
+    events = [
+        {"type": "session", "trace_id": "live", "name": "running"},
+        {"type": "step_start", "trace_id": "live", "step_id": "s1", "name": "filter"},
+    ]
+    body = "\n".join(json.dumps(event) for event in events).encode("utf-8")
+    request = urllib.request.Request(server.url + "/api/events", data=body, method="POST")
+    with urllib.request.urlopen(request) as response:
+        assert json.load(response) == {"accepted": 2}
+    assert [event["type"] for event in server.snapshot()] == ["session", "step_start"]
+    server._loop.call_soon_threadsafe(server._dispatch, [{"type": "session_end", "trace_id": "live"}])
+    request = urllib.request.Request(server.url + "/api/events", data=b"not json", method="POST")
+    with pytest.raises(urllib.error.HTTPError) as error:
+        urllib.request.urlopen(request)
+    assert error.value.code == 400
+    assert server.snapshot() == []
+
+
+def test_evaluation_batches_merge_for_slow_clients():
+    previous = {"step_id": "s", "rows": [1, 2, 3], "skipped": 1, "count": 4}
+    event = {"step_id": "s", "rows": [4, 5], "skipped": 0, "count": 6}
+    merged = merge_evaluations(previous, event, max_rows=4)
+    assert merged == {"step_id": "s", "rows": [2, 3, 4, 5], "skipped": 2, "count": 6}
@@ -0,0 +1,131 @@
+import os
+import re
+import time
+
+import pytest
+
+from xray import BackgroundExporter, XRaySession, load_trace
+from xray.exporter import BLOCK
+from xray.serializer import list_traces
+from xray.store import TraceStore
+
+
+def make_session(name: str, count: int = 20) -> XRaySession:
+    with XRaySession(name) as session:
+        with session.step("filter") as step:
+            ids = [f"c{i}" for i in range(count)]
+            step.add_candidates(ids, [{"title": f"item {i}", "description": "shared text " * 10} for i in range(count)])
+            step.add_threshold_filter("rank", ids, list(range(count)), maximum=count // 2)
+    return session
+
+
+def save_aged(store: TraceStore, count: int) -> list:
+    # traces saved a minute apart, oldest first
+    paths = []
+    for i in range(count):
+        path = store.save(make_session(f"run{i}"))
+        os.utime(path, (1000 + 60 * i, 1000 + 60 * i))
+        paths.append(path)
+    return paths
+
+
+@pytest.mark.parametrize("compression", [None, "gzip", "zstd"])
+def test_saved_traces_load_back(tmp_path, compression):
+    store = TraceStore(tmp_path, compression=compression, dedupe=True)
+    session = make_session("run")
+    path = store.save(session)
+    assert load_trace(path) == session.to_dict()
+    assert store.blobs.stats()["blobs"] == 20
+
+
+def test_purge_by_age_removes_the_oldest(tmp_path):
+    store = TraceStore(tmp_path, compression=None, max_age=150)
+    paths = save_aged(store, 5)
+    result = store.purge(now=1000 + 60 * 4 + 1)
+    # saved at 0s, 60s, ... 240s; older than 150s at 241s: the first two
+    assert result["removed"] == 2
+    assert [os.path.exists(path) for path in paths] == [False, False, True, True, True]
+
+
+def test_purge_by_size_keeps_the_newest_that_fit(tmp_path):
+    store = TraceStore(tmp_path, compression=None)
+    paths = save_aged(store, 6)
+    sizes = [os.path.getsize(path) for path in paths]
+    store.max_bytes = sum(sizes[3:]) + sizes[2] // 2
+    result = store.purge(now=2000)
+    assert result["removed"] == 3
+    assert result["bytes_freed"] == sum(sizes[:3])
+    assert [os.path.exists(path) for path in paths] == [False] * 3 + [True] * 3
+    assert store.purge(now=2000)["removed"] == 0
+
+
+def test_purge_drops_blobs_only_removed_traces_used(tmp_path):
+    store = TraceStore(tmp_path, compression="gzip", dedupe=True, max_age=30)
+    old = store.save(make_session("old", count=30))
+    os.utime(old, (1000, 1000))
+    new = store.save(make_session("new", count=10))
+    result = store.purge(now=os.path.getmtime(new) + 1)
+    assert result["removed"] == 1 and not os.path.exists(old)
+    # rows 10..29 were only in the old trace
+    assert result["blobs_removed"] == 20
+    assert load_trace(new)["steps"][0]["evaluations"][9]["candidate_data"]["title"] == "item 9"
+
+
+@pytest.mark.parametrize("compression,suffix", [(None, ".json"), ("gzip", ".json.gz"), ("zstd", ".json.zst")])
+def test_one_sortable_file_per_run(tmp_path, compression, suffix):
+    store = TraceStore(tmp_path, compression=compression)
+    first, second = make_session("run"), make_session("run")
+    paths = [store.path_for(first), store.path_for(second)]
+    assert paths[0] != paths[1]
+    assert re.fullmatch(rf"run_\d{{8}}T\d{{6}}_{first.trace_id[:8]}{re.escape(suffix)}", paths[0].name)
+    assert store.save(first) == str(paths[0])
+    assert store.save(XRaySession("off", enabled=False)) is None
+
+
+def test_usage_counts_traces_and_blobs(tmp_path):
+    store = TraceStore(tmp_path, compression="gzip", dedupe=True)
+    assert store.usage()["traces"] == 0
+    paths = [store.save(make_session(f"run{i}")) for i in range(3)]
+    usage = store.usage()
+    assert usage["traces"] == 3
+    assert usage["trace_bytes"] == sum(os.path.getsize(path) for path in paths)
+    assert usage["blob_bytes"] == store.blobs.size() > 0
+    assert usage["total_bytes"] == usage["trace_bytes"] + usage["blob_bytes"]
+
+
+def test_purged_traces_leave_the_catalog(tmp_path):
+    store = TraceStore(tmp_path, compression=None, max_age=150)
+    save_aged(store, 3)
+    assert len(list_traces(tmp_path)) == 3
+    # saved at 0s, 60s, 120s; older than 150s at 220s: the first two
+    store.purge(now=1000 + 60 * 2 + 100)
+    assert [trace["name"] for trace in list_traces(tmp_path)] == ["run2"]
+
+
+def test_store_as_exporter_writer(tmp_path):
+    store = TraceStore(tmp_path, compression="gzip", dedupe=True)
+    exporter = BackgroundExporter(store, policy=BLOCK)
+    sessions = []
+    for i in range(5):
+        with XRaySession(f"run{i}", exporter=exporter) as session:
+            with session.step("filter") as step:
+                step.add_candidates([f"c{j}" for j in range(4)], [{"title": f"item {j}"} for j in range(4)])
+        sessions.append(session)
+    assert exporter.flush(timeout=10)
+    exporter.close()
+    assert exporter.stats()["exported"] == 5
+    for session in sessions:
+        assert load_trace(store.path_for(session)) == session.to_dict()
+
+
+def test_purge_interval_runs_in_the_background(tmp_path):
+    store = TraceStore(tmp_path, compression=None, max_age=60, purge_interval=0.05)
+    try:
+        paths = save_aged(store, 2)
+        deadline = time.monotonic() + 5
+        while any(os.path.exists(path) for path in paths) and time.monotonic() < deadline:
+            time.sleep(0.02)
+        assert not any(os.path.exists(path) for path in paths)
+    finally:
+        store.close()
+    assert store._purger is None
@@ -0,0 +1,118 @@
+import json
+
+from xray import Evaluation, FilterResult, Metrics, NDJSONSink, XRaySession, load_trace
+from xray.columnar import EvaluationTable
+from xray.serializer import iter_steps
+
+
+def record(session: XRaySession) -> None:
+    with session.step("single") as step:
+        for i in range(5):
+            evaluation = Evaluation(f"s{i}", {"title": f"item {i}", "price": i * 1.5})
+            evaluation.add_filter_result(FilterResult("cheap", i < 3, f"${i * 1.5}", "< $4.5", i * 1.5))
+            evaluation.qualified = i < 3
+            step.add_evaluation(evaluation)
+        with session.step("nested", step_type="filter") as child:
+            ids = [f"n{i}" for i in range(6)]
+            child.add_candidates(ids, columns={"price": list(range(6))})
+            child.add_threshold_filter("price", ids, list(range(6)), maximum=3)
+
+
+def evaluations_by_step(trace: dict) -> dict:
+    return {step["name"]: step["evaluations"] for step in iter_steps(trace)}
+
+
+def test_sink_round_trip_matches_to_dict(tmp_path):
+    with XRaySession("plain") as plain:
+        record(plain)
+    path = tmp_path / "run.ndjson"
+    with XRaySession("streamed", sink=NDJSONSink(path)) as streamed:
+        record(streamed)
+    loaded = load_trace(path)
+    assert evaluations_by_step(loaded) == evaluations_by_step(plain.to_dict())
+    assert [step["name"] for step in loaded["steps"]] == ["single"]
+    assert [child["name"] for child in loaded["steps"][0]["children"]] == ["nested"]
+    # the sink has the rows; the step no longer holds them
+    assert len(streamed.steps[0].evaluations) == 0
+
+
+def records(path) -> list[dict]:
+    return [json.loads(line) for line in path.read_text().splitlines()]
+
+
+def test_batches_are_written_as_the_next_one_starts(tmp_path):
+    path = tmp_path / "run.ndjson"
+    sink = NDJSONSink(path)
+    with XRaySession("batches", sink=sink) as session:
+        with session.step("filter") as step:
+            for batch in range(4):
+                ids = [f"b{batch}-{i}" for i in range(10)]
+                rows = step.add_candidates(ids, columns={"i": list(range(10))})
+                step.add_filter_batch("even", ids, [i % 2 == 0 for i in range(10)])
+                # only the current batch is in memory
+                assert rows == range(10) and len(step.evaluations) == 10
+                sink._flush()
+                written = [r for r in records(path) if r["type"] == "evaluation"]
+                assert len(written) == 10 * batch
+    evaluations = load_trace(path)["steps"][0]["evaluations"]
+    assert [e["candidate_id"] for e in evaluations] == [f"b{b}-{i}" for b in range(4) for i in range(10)]
+    assert sum(e["qualified"] for e in evaluations) == 20
+    [step_record] = [r for r in records(path) if r["type"] == "step"]
+    assert step_record["evaluation_count"] == 40
+
+
+def test_tables_are_written_as_the_next_one_is_added(tmp_path):
+    path = tmp_path / "run.ndjson"
+    metrics = Metrics()
+    with XRaySession("tables", sink=NDJSONSink(path), metrics=metrics) as session:
+        with session.step("filter") as step:
+            for shard in range(3):
+                table = EvaluationTable()
+                ids = [f"t{shard}-{i}" for i in range(8)]
+                table.add_candidates(ids)
+                table.add_filter_batch("keep", ids, [i < 2 for i in range(8)])
+                step.add_table(table)
+                assert len(step.evaluations) == 8
+    evaluations = load_trace(path)["steps"][0]["evaluations"]
+    assert len(evaluations) == 24
+    [counts] = metrics.snapshot()["evaluations"]
+    assert (counts["evaluated"], counts["qualified"]) == (24, 6)
+
+
+def test_evaluations_are_frozen_once_written(tmp_path):
+    def run(session: XRaySession) -> None:
+        with session.step("filter") as step:
+            evaluation = Evaluation("c1", {"price": 20})
+            step.add_evaluation(evaluation)
+            evaluation.add_filter_result(FilterResult("price", True, "$20"))
+            evaluation.qualified = True
+
+    with XRaySession("live") as live:
+        run(live)
+    assert live.to_dict()["steps"][0]["evaluations"][0]["qualified"] is True
+
+    path = tmp_path / "run.ndjson"
+    with XRaySession("streamed", sink=NDJSONSink(path)) as streamed:
+        run(streamed)
+    [written] = load_trace(path)["steps"][0]["evaluations"]
+    assert written["qualified"] is False
+    assert written["filter_results"] == []
+
+
+def test_batch_rows_stay_writable_until_written(tmp_path):
+    path = tmp_path / "run.ndjson"
+    with XRaySession("scores", sink=NDJSONSink(path)) as session:
+        with session.step("rank") as step:
+            rows = step.add_candidates(["a", "b"])
+            step.evaluations.set_metadata(rows[1], {"score": 0.9})
+    evaluations = load_trace(path)["steps"][0]["evaluations"]
+    assert [e["metadata"] for e in evaluations] == [{}, {"score": 0.9}]
+
+
+def test_torn_last_line_is_ignored(tmp_path):
+    path = tmp_path / "run.ndjson"
+    with XRaySession("torn", sink=NDJSONSink(path)) as session:
+        record(session)
+    with open(path, "a") as f:
+        f.write('{"type":"evaluation","step_id":')
+    assert evaluations_by_step(load_trace(path))["single"][0]["candidate_id"] == "s0"
@@ -9,8 +9,19 @@ from xray.core import (
     StepStatus,
     Evaluation,
     FilterResult,
+    set_enabled,
+    tracing_enabled,
 )
-from xray.serializer import save_trace, load_trace
+from xray.serializer import save_trace, load_trace, open_trace
+from xray.streaming import NDJSONSink, iter_trace_records
+from xray.retention import RetentionPolicy
+from xray.exporter import BackgroundExporter
+from xray.live import LivePublisher
+from xray.compare import diff
+from xray.cache import MemoryCache, DiskCache, ReplayCache, memoize
+from xray.profiling import StepProfiler
+from xray.metrics import Metrics
+from xray.store import TraceStore
 
 __version__ = "1.0.0"
 
@@ -21,6 +32,22 @@ __all__ = [
     "StepStatus",
     "Evaluation",
     "FilterResult",
+    "set_enabled",
+    "tracing_enabled",
     "save_trace",
     "load_trace",
+    "open_trace",
+    "NDJSONSink",
+    "iter_trace_records",
+    "RetentionPolicy",
+    "BackgroundExporter",
+    "LivePublisher",
+    "diff",
+    "MemoryCache",
+    "DiskCache",
+    "ReplayCache",
+    "memoize",
+    "StepProfiler",
+    "Metrics",
+    "TraceStore",
 ]
@@ -0,0 +1,223 @@
+# X-Ray lib - analytics module
+# Aggregates across every trace in a directory: filter rejection rates, step latency
+# percentiles and qualified-count distributions, optionally grouped by session metadata.
+#
+# All numbers come from the per-step facts the TraceCatalog stores for each file, so a query
+# only reads SQLite. refresh() summarizes new or changed files and nothing else; the first scan
+# of a large directory runs in a process pool.
+#
+#   xray-stats [--directory traces] [--group-by KEY] [--step NAME] [--metadata KEY=VALUE] [--json]
+
+import argparse
+import json
+import math
+import os
+import sys
+from bisect import bisect_left
+from typing import Optional, Sequence, Union
+
+from xray.catalog import catalog_for
+
+# 1-2-5 steps from 100us to 100s
+DURATION_BUCKETS_NS = tuple(int(base * 10 ** exp) for exp in range(5, 11) for base in (1, 2, 5))
+QUALIFIED_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 10_000, 100_000)
+
+PERCENTILES = (50, 95, 99)
+
+
+def percentile(sorted_values: Sequence[float], pct: float) -> Optional[float]:
+    # Nearest-rank percentile of an ascending sequence.
+    if not sorted_values:
+        return None
+    rank = max(1, math.ceil(pct / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+def distribution(values: list[float], buckets: Sequence[float]) -> dict:
+    # count/min/max/mean, p50/p95/p99 and a histogram of [upper bound, count] (None = above the last).
+    values = sorted(values)
+    histogram = [0] * (len(buckets) + 1)
+    for value in values:
+        histogram[bisect_left(buckets, value)] += 1
+    result = {
+        "count": len(values),
+        "min": values[0] if values else None,
+        "max": values[-1] if values else None,
+        "mean": sum(values) / len(values) if values else None,
+    }
+    for pct in PERCENTILES:
+        result[f"p{pct}"] = percentile(values, pct)
+    result["histogram"] = [[bound, count] for bound, count in zip(list(buckets) + [None], histogram) if count]
+    return result
+
+
+class TraceAnalytics:
+    # Cross-run aggregates over one trace directory.
+
+    def __init__(self, directory: Union[str, os.PathLike] = "traces", workers: Optional[int] = None):
+        self.catalog = catalog_for(directory)
+        self.workers = workers or os.cpu_count() or 1
+
+    def refresh(self, full: bool = False) -> int:
+        # Index new and changed traces; returns how many files were read.
+        return self.catalog.refresh(full=full, workers=self.workers)
+
+    def _groups(self, group_by: Union[str, Sequence[str], None], table: str) -> tuple[list[str], str, list]:
+        # (group keys, LEFT JOINs on trace_metadata, their params) for grouping by metadata keys.
+        keys = [group_by] if isinstance(group_by, str) else list(group_by or [])
+        joins = "".join(
+            f" LEFT JOIN trace_metadata m{i} ON m{i}.filename = {table}.filename AND m{i}.key = ?"
+            for i in range(len(keys))
+        )
+        return keys, joins, list(keys)
+
+    def _where(self, table: str, step: Optional[str], where: dict) -> tuple[str, list]:
+        condition, params = self.catalog.selection(**where)
+        condition = f"{table}.{condition}"
+        if step is not None:
+            condition += f" AND {table}.step = ?"
+            params.append(step)
+        return condition, params
+
+    def filter_rates(self, step: Optional[str] = None, group_by: Union[str, Sequence[str], None] = None,
+                     **where) -> list[dict]:
+        # Per filter (and step): passed/failed totals over the selected traces, and the fail rate.
+        # where takes TraceCatalog.query() filters: name, since, until, status, metadata.
+        keys, joins, params = self._groups(group_by, "f")
+        condition, where_params = self._where("f", step, where)
+        group_columns = "".join(f"m{i}.value, " for i in range(len(keys)))
+        rows = self.catalog.fetch(
+            f"SELECT {group_columns}f.step, f.filter, SUM(f.passed), SUM(f.failed), COUNT(DISTINCT f.filename) "
+            f"FROM trace_filters f{joins} WHERE {condition} "
+            f"GROUP BY {group_columns}f.step, f.filter ORDER BY {group_columns}f.step, f.filter",
+            params + where_params
+        )
+        results = []
+        for row in rows:
+            group, (step_name, filter_name, passed, failed, traces) = row[:len(keys)], row[len(keys):]
+            total = passed + failed
+            results.append({
+                "group": dict(zip(keys, group)),
+                "step": step_name,
+                "filter": filter_name,
+                "passed": passed,
+                "failed": failed,
+                "fail_rate": failed / total if total else None,
+                "traces": traces,
+            })
+        return results
+
+    def step_latency(self, step: Optional[str] = None, group_by: Union[str, Sequence[str], None] = None,
+                     buckets: Sequence[int] = DURATION_BUCKETS_NS, **where) -> list[dict]:
+        # Per step: duration_ns distribution (percentiles and histogram) over the selected traces.
+        keys, joins, params = self._groups(group_by, "s")
+        condition, where_params = self._where("s", step, where)
+        group_columns = "".join(f"m{i}.value, " for i in range(len(keys)))
+        rows = self.catalog.fetch(
+            f"SELECT {group_columns}s.step, s.duration_ns FROM trace_steps s{joins} "
+            f"WHERE {condition} AND s.duration_ns IS NOT NULL",
+            params + where_params
+        )
+        return self._distributions(rows, keys, buckets, "step")
+
+    def qualified_distribution(self, step: Optional[str] = None,
+                               group_by: Union[str, Sequence[str], None] = None,
+                               buckets: Sequence[int] = QUALIFIED_BUCKETS, **where) -> list[dict]:
+        # Distribution of qualified candidates per trace; per step when step is given, otherwise
+        # over whole traces.
+        keys, joins, params = self._groups(group_by, "t")
+        group_columns = "".join(f"m{i}.value, " for i in range(len(keys)))
+        condition, where_params = self.catalog.selection(**where)
+        if step is None:
+            sql = (f"SELECT {group_columns}NULL, t.qualified FROM traces t{joins} "
+                   f"WHERE t.{condition}")
+        else:
+            sql = (f"SELECT {group_columns}t.step, SUM(t.qualified) FROM trace_steps t{joins} "
+                   f"WHERE t.{condition} AND t.step = ? GROUP BY {group_columns}t.filename, t.step")
+            where_params.append(step)
+        rows = self.catalog.fetch(sql, params + where_params)
+        return self._distributions(rows, keys, buckets, "step")
+
+    def _distributions(self, rows: list[tuple], keys: list[str], buckets: Sequence, label: str) -> list[dict]:
+        grouped: dict[tuple, list] = {}
+        for row in rows:
+            grouped.setdefault(row[:-1], []).append(row[-1])
+        results = []
+        for group_key in sorted(grouped, key=lambda k: tuple("" if v is None else str(v) for v in k)):
+            result = {"group": dict(zip(keys, group_key[:len(keys)])), label: group_key[len(keys)]}
+            result.update(distribution(grouped[group_key], buckets))
+            results.append(result)
+        return results
+
+    def report(self, step: Optional[str] = None, group_by: Union[str, Sequence[str], None] = None,
+               refresh: bool = True, **where) -> dict:
+        # Everything above in one dict; refreshes the catalog first unless refresh=False.
+        if refresh:
+            self.refresh()
+        return {
+            "traces": self.catalog.count(**where),
+            "filters": self.filter_rates(step=step, group_by=group_by, **where),
+            "latency": self.step_latency(step=step, group_by=group_by, **where),
+            "qualified": self.qualified_distribution(step=step, group_by=group_by, **where),
+        }
+
+
+def _format_ns(ns: Optional[float]) -> str:
+    if ns is None:
+        return "-"
+    if ns >= 1e9:
+        return f"{ns / 1e9:.2f}s"
+    if ns >= 1e6:
+        return f"{ns / 1e6:.1f}ms"
+    return f"{ns / 1e3:.0f}us"
+
+
+def _group_label(group: dict) -> str:
+    return " ".join(f"{key}={value}" for key, value in group.items())
+
+
+def format_report(report: dict) -> str:
+    lines = [f"{report['traces']} traces", "", "Filter rejection rates"]
+    for row in report["filters"]:
+        rate = "-" if row["fail_rate"] is None else f"{row['fail_rate']:.1%}"
+        lines.append(f"  {_group_label(row['group']):<24} {row['step']:<28} {row['filter']:<20} "
+                     f"{rate:>7} of {row['passed'] + row['failed']:>10,} over {row['traces']} traces")
+    lines += ["", "Step latency"]
+    for row in report["latency"]:
+        lines.append(f"  {_group_label(row['group']):<24} {row['step']:<28} n={row['count']:<6} "
+                     f"p50 {_format_ns(row['p50']):>8}  p95 {_format_ns(row['p95']):>8}  "
+                     f"p99 {_format_ns(row['p99']):>8}  max {_format_ns(row['max']):>8}")
+    lines += ["", "Qualified per trace"]
+    for row in report["qualified"]:
+        lines.append(f"  {_group_label(row['group']):<24} {row['step'] or 'all steps':<28} n={row['count']:<6} "
+                     f"mean {row['mean'] or 0:>8.1f}  p50 {row['p50']}  p95 {row['p95']}  max {row['max']}")
+    return "\n".join(lines)
+
+
+def main(argv: Optional[list[str]] = None) -> None:
+    parser = argparse.ArgumentParser(prog="xray-stats", description="Aggregate statistics over X-Ray traces.")
+    parser.add_argument("--directory", default="traces")
+    parser.add_argument("--name")
+    parser.add_argument("--since")
+    parser.add_argument("--until")
+    parser.add_argument("--status")
+    parser.add_argument("--metadata", action="append", default=[], metavar="KEY=VALUE")
+    parser.add_argument("--group-by", action="append", default=[], metavar="KEY", help="session metadata key")
+    parser.add_argument("--step")
+    parser.add_argument("--workers", type=int, help="processes for scanning new traces (default: CPU count)")
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args(argv)
+
+    metadata = dict(item.split("=", 1) for item in args.metadata) or None
+    analytics = TraceAnalytics(args.directory, workers=args.workers)
+    report = analytics.report(step=args.step, group_by=args.group_by, name=args.name, since=args.since,
+                              until=args.until, status=args.status, metadata=metadata)
+    if args.json:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    else:
+        print(format_report(report))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,451 @@
+# X-Ray lib - binary module
+# Compact binary trace container that can be read in place through mmap.
+#
+# Layout (little endian):
+#   header   magic "XRAYBIN1" | u64 index offset | u64 index length
+#   body     encoded evaluations; after each step's evaluations, a u64 array of their offsets,
+#            a candidate lookup (u32 crc32 of each candidate_id, sorted, then the u32 row of
+#            each) and the step's query index sections (see xray.indexes)
+#   strings  u32 count | u64 offsets[count + 1] | utf-8 blob, every distinct string stored once
+#   index    JSON: session fields, the string table offset and the step tree, with each step's
+#            evaluations replaced by a [offsets position, count] block reference, the candidate
+#            lookup's position and its index sections by {name: [position, length]}
+#
+# A reader parses only the header and the index; a single step or candidate is decoded on demand.
+
+import json
+import mmap
+import struct
+import sys
+import zlib
+from array import array
+from pathlib import Path
+from typing import Any, Iterator, Optional, Union
+
+from xray.indexes import StepIndex, StepIndexBuilder
+
+MAGIC = b"XRAYBIN1"
+BINARY_SUFFIXES = (".xrb",)
+
+_HEADER = struct.Struct("<8sQQ")
+_INTERNAL = ("_block", "_ids", "_index", "evaluations", "children")
+
+_NONE, _FALSE, _TRUE, _INT, _FLOAT, _STR, _LIST, _DICT, _BIGINT = range(9)
+_INT64_MIN = -(2 ** 63)
+_INT64_MAX = 2 ** 63 - 1
+
+_pack_int = struct.Struct("<Bq").pack
+_pack_float = struct.Struct("<Bd").pack
+_pack_ref = struct.Struct("<BI").pack
+_pack_u32 = struct.Struct("<I").pack
+_unpack_u32 = struct.Struct("<I").unpack_from
+_unpack_i64 = struct.Struct("<q").unpack_from
+_unpack_f64 = struct.Struct("<d").unpack_from
+_unpack_u64 = struct.Struct("<Q").unpack_from
+_unpack_span = struct.Struct("<QQ").unpack_from
+
+
+def _candidate_hash(candidate_id: Any) -> int:
+    return zlib.crc32(str(candidate_id).encode("utf-8", "surrogatepass"))
+
+
+def _json_key(key: Any) -> str:
+    # Dict keys become strings the way json.dumps converts them.
+    if isinstance(key, str):
+        return key
+    if key is True:
+        return "true"
+    if key is False:
+        return "false"
+    if key is None:
+        return "null"
+    return str(key)
+
+
+class BinaryTraceWriter:
+    # Streams a trace into the binary container, one evaluation at a time.
+
+    def __init__(self, filepath: Union[str, Path]):
+        self.filepath = Path(filepath)
+        self.filepath.parent.mkdir(parents=True, exist_ok=True)
+        self._file = open(self.filepath, "wb")
+        self._file.write(_HEADER.pack(MAGIC, 0, 0))
+        self._strings: dict[str, int] = {}
+
+    def _ref(self, value: str) -> int:
+        index = self._strings.get(value)
+        if index is None:
+            index = len(self._strings)
+            self._strings[value] = index
+        return index
+
+    def _encode(self, value: Any, out: bytearray) -> None:
+        value_type = type(value)
+        if value_type is str:
+            out += _pack_ref(_STR, self._ref(value))
+        elif value is None:
+            out.append(_NONE)
+        elif value_type is bool:
+            out.append(_TRUE if value else _FALSE)
+        elif value_type is int:
+            if _INT64_MIN <= value <= _INT64_MAX:
+                out += _pack_int(_INT, value)
+            else:
+                out += _pack_ref(_BIGINT, self._ref(str(value)))
+        elif value_type is float:
+            out += _pack_float(_FLOAT, value)
+        elif value_type is dict:
+            out += _pack_ref(_DICT, len(value))
+            for key, item in value.items():
+                out += _pack_u32(self._ref(_json_key(key)))
+                self._encode(item, out)
+        elif value_type is list or value_type is tuple:
+            out += _pack_ref(_LIST, len(value))
+            for item in value:
+                self._encode(item, out)
+        elif isinstance(value, str):
+            self._encode(str(value), out)
+        elif isinstance(value, bool):
+            self._encode(bool(value), out)
+        elif isinstance(value, int):
+            self._encode(int(value), out)
+        elif isinstance(value, float):
+            self._encode(float(value), out)
+        elif isinstance(value, dict):
+            self._encode(dict(value), out)
+        elif isinstance(value, (list, tuple)):
+            self._encode(list(value), out)
+        else:
+            raise TypeError(f"Object of type {value_type.__name__} is not JSON serializable")
+
+    def write_step(self, meta: dict, evaluations: Iterator[dict], children: list) -> dict:
+        # Write one step's evaluations and return its index entry (children already written).
+        offsets = array("Q")
+        hashes = array("I")
+        write, tell = self._file.write, self._file.tell
+        index = StepIndexBuilder()
+        for evaluation in evaluations:
+            out = bytearray()
+            self._encode(evaluation, out)
+            offsets.append(tell())
+            write(out)
+            hashes.append(_candidate_hash(evaluation.get("candidate_id")))
+            index.add(evaluation)
+        block = tell()
+        write(offsets.tobytes())
+        # stable sort: rows sharing a hash stay in row order, so find() returns the first match
+        rows = array("I", sorted(range(len(hashes)), key=hashes.__getitem__))
+        ids = tell()
+        write(array("I", [hashes[row] for row in rows]).tobytes())
+        write(rows.tobytes())
+        sections = {}
+        for name, data in index.finish().sections().items():
+            sections[name] = [tell(), len(data)]
+            write(data)
+        entry = dict(meta)
+        entry["evaluations"] = []
+        if "children" in entry or children:
+            entry["children"] = children
+        entry["_block"] = [block, len(offsets)]
+        entry["_ids"] = ids
+        entry["_index"] = sections
+        return entry
+
+    def close(self, session_fields: dict, steps: list[dict]) -> None:
+        strings_at = self._file.tell()
+        encoded = [s.encode("utf-8", "surrogatepass") for s in self._strings]
+        offsets = array("Q", [0])
+        for data in encoded:
+            offsets.append(offsets[-1] + len(data))
+        self._file.write(_pack_u32(len(encoded)))
+        self._file.write(offsets.tobytes())
+        self._file.write(b"".join(encoded))
+
+        index = dict(session_fields)
+        index["steps"] = steps
+        index["_strings"] = strings_at
+        index_at = self._file.tell()
+        payload = json.dumps(index, separators=(",", ":")).encode("utf-8")
+        self._file.write(payload)
+        self._file.seek(0)
+        self._file.write(_HEADER.pack(MAGIC, index_at, len(payload)))
+        self._file.close()
+
+
+def _session_parts(trace) -> tuple[dict, list]:
+    # (session fields, top-level steps) for either an XRaySession or a loaded trace dict.
+    if isinstance(trace, dict):
+        fields = {k: v for k, v in trace.items() if k != "steps"}
+        return fields, trace.get("steps", [])
+    fields = {"trace_id": trace.trace_id, "name": trace.name, "started_at": trace.started_at,
+              "completed_at": trace.completed_at, "metadata": trace.metadata}
+    return fields, sorted(trace.steps, key=lambda s: s.sequence)
+
+
+def _write_steps(writer: BinaryTraceWriter, steps: list) -> list[dict]:
+    entries = []
+    for step in steps:
+        if isinstance(step, dict):
+            children = _write_steps(writer, step.get("children", []))
+            meta = {k: v for k, v in step.items()}
+            evaluations = iter(step.get("evaluations", []))
+        else:
+            children = _write_steps(writer, sorted(step.children, key=lambda s: s.sequence))
+            meta = step.to_dict(include_evaluations=False, include_children=False)
+            table = step.evaluations
+            evaluations = (table.row_dict(row) for row in range(len(table)))
+        entries.append(writer.write_step(meta, evaluations, children))
+    return entries
+
+
+def write_binary_trace(trace, filepath: Union[str, Path]) -> str:
+    # Write an XRaySession or a trace dict as a binary container.
+    writer = BinaryTraceWriter(filepath)
+    fields, steps = _session_parts(trace)
+    writer.close(fields, _write_steps(writer, steps))
+    return str(writer.filepath.absolute())
+
+
+def is_binary_trace(filepath: Union[str, Path]) -> bool:
+    with open(filepath, "rb") as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+
+class BinaryStep:
+    # One step of a BinaryTrace; evaluations are decoded only when indexed.
+
+    def __init__(self, trace: "BinaryTrace", entry: dict):
+        self._trace = trace
+        self._entry = entry
+        self._block, self._count = entry["_block"]
+
+    @property
+    def info(self) -> dict:
+        # The step's fields without evaluations or children.
+        return {k: v for k, v in self._entry.items() if k not in _INTERNAL}
+
+    @property
+    def name(self) -> str:
+        return self._entry.get("name")
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __getitem__(self, index: int) -> dict:
+        if index < 0:
+            index += self._count
+        if not 0 <= index < self._count:
+            raise IndexError("evaluation index out of range")
+        (offset,) = _unpack_u64(self._trace._mm, self._block + 8 * index)
+        return self._trace._decode(offset)[0]
+
+    def __iter__(self) -> Iterator[dict]:
+        for index in range(self._count):
+            yield self[index]
+
+    def index(self) -> Optional[StepIndex]:
+        # The query index stored with the step; None for files written before indexes existed.
+        sections = self._entry.get("_index")
+        if sections is None:
+            return None
+        mm = self._trace._mm
+        return StepIndex.from_sections(self._count, {
+            name: mm[position:position + length] for name, (position, length) in sections.items()
+        })
+
+    def find(self, candidate_id: str) -> Optional[dict]:
+        # The first evaluation for candidate_id: a binary search of the candidate lookup, then a
+        # decode of the rows sharing its hash. Files written before the lookup existed are scanned.
+        ids = self._entry.get("_ids")
+        if ids is None:
+            return next((evaluation for evaluation in self
+                         if evaluation.get("candidate_id") == candidate_id), None)
+        mm, count = self._trace._mm, self._count
+        key = _candidate_hash(candidate_id)
+        low, high = 0, count
+        while low < high:
+            middle = (low + high) >> 1
+            if _unpack_u32(mm, ids + 4 * middle)[0] < key:
+                low = middle + 1
+            else:
+                high = middle
+        rows = ids + 4 * count
+        while low < count and _unpack_u32(mm, ids + 4 * low)[0] == key:
+            evaluation = self[_unpack_u32(mm, rows + 4 * low)[0]]
+            if evaluation.get("candidate_id") == candidate_id:
+                return evaluation
+            low += 1
+        return None
+
+
+class BinaryTrace:
+    # Memory-mapped reader for a binary trace container.
+
+    def __init__(self, filepath: Union[str, Path]):
+        self.filepath = Path(filepath)
+        self._file = open(self.filepath, "rb")
+        self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, index_at, index_len = _HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC:
+            self.close()
+            raise ValueError(f"{filepath} is not an X-Ray binary trace")
+        self.index = json.loads(self._mm[index_at:index_at + index_len])
+        strings_at = self.index.pop("_strings")
+        (self._string_count,) = _unpack_u32(self._mm, strings_at)
+        self._string_offsets = strings_at + 4
+        self._string_blob = self._string_offsets + 8 * (self._string_count + 1)
+        self._string_cache: dict[int, str] = {}
+
+    def __enter__(self) -> "BinaryTrace":
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.close()
+
+    def close(self) -> None:
+        if not self._mm.closed:
+            self._mm.close()
+        self._file.close()
+
+    @property
+    def header(self) -> dict:
+        return {k: v for k, v in self.index.items() if k != "steps"}
+
+    def iter_step_entries(self) -> Iterator[dict]:
+        stack = list(reversed(self.index.get("steps", [])))
+        while stack:
+            entry = stack.pop()
+            yield entry
+            stack.extend(reversed(entry.get("children", [])))
+
+    def steps(self) -> list[BinaryStep]:
+        # Every step, depth first, without decoding any evaluations.
+        return [BinaryStep(self, entry) for entry in self.iter_step_entries()]
+
+    def step(self, key: Union[int, str]) -> BinaryStep:
+        # By position in steps(), by step_id or by name (first match).
+        entries = list(self.iter_step_entries())
+        if isinstance(key, int):
+            return BinaryStep(self, entries[key])
+        for entry in entries:
+            if entry.get("step_id") == key or entry.get("name") == key:
+                return BinaryStep(self, entry)
+        raise KeyError(key)
+
+    def _string(self, index: int) -> str:
+        value = self._string_cache.get(index)
+        if value is None:
+            start, end = _unpack_span(self._mm, self._string_offsets + 8 * index)
+            value = self._mm[self._string_blob + start:self._string_blob + end].decode("utf-8", "surrogatepass")
+            self._string_cache[index] = value
+        return value
+
+    def _decode(self, pos: int) -> tuple[Any, int]:
+        mm = self._mm
+        tag = mm[pos]
+        pos += 1
+        if tag == _STR:
+            return self._string(_unpack_u32(mm, pos)[0]), pos + 4
+        if tag == _INT:
+            return _unpack_i64(mm, pos)[0], pos + 8
+        if tag == _FLOAT:
+            return _unpack_f64(mm, pos)[0], pos + 8
+        if tag == _DICT:
+            (count,) = _unpack_u32(mm, pos)
+            pos += 4
+            result = {}
+            for _ in range(count):
+                key = self._string(_unpack_u32(mm, pos)[0])
+                result[key], pos = self._decode(pos + 4)
+            return result, pos
+        if tag == _LIST:
+            (count,) = _unpack_u32(mm, pos)
+            pos += 4
+            items = []
+            for _ in range(count):
+                item, pos = self._decode(pos)
+                items.append(item)
+            return items, pos
+        if tag == _NONE:
+            return None, pos
+        if tag == _TRUE:
+            return True, pos
+        if tag == _FALSE:
+            return False, pos
+        if tag == _BIGINT:
+            return int(self._string(_unpack_u32(mm, pos)[0])), pos + 4
+        raise ValueError(f"corrupt binary trace: unknown tag {tag} at offset {pos - 1}")
+
+    def _step_dict(self, entry: dict) -> dict:
+        step = {}
+        for key, value in entry.items():
+            if key in ("_block", "_ids", "_index"):
+                continue
+            if key == "evaluations":
+                value = list(BinaryStep(self, entry))
+            elif key == "children":
+                value = [self._step_dict(child) for child in value]
+            step[key] = value
+        return step
+
+    def to_dict(self) -> dict:
+        # The full trace in the same shape as XRaySession.to_dict().
+        trace = self.header
+        trace["steps"] = [self._step_dict(entry) for entry in self.index.get("steps", [])]
+        return trace
+
+    def iter_records(self) -> Iterator[dict]:
+        # The NDJSON record stream for this trace, decoding one evaluation at a time.
+        header = self.header
+        yield {"type": "session", "trace_id": header.get("trace_id"), "name": header.get("name"),
+               "started_at": header.get("started_at"), "metadata": header.get("metadata", {})}
+        for index, entry in enumerate(self._completion_order(self.index.get("steps", []))):
+            step_id = entry.get("step_id", str(index))
+            yield {"type": "step_start", "step_id": step_id, "name": entry.get("name"),
+                   "step_type": entry.get("step_type"), "started_at": entry.get("started_at")}
+            for evaluation in BinaryStep(self, entry):
+                yield {**evaluation, "type": "evaluation", "step_id": step_id}
+            record = {k: v for k, v in entry.items() if k not in ("_block", "_ids", "_index", "evaluations")}
+            if "children" in record:
+                record["children"] = []
+            record.update({"type": "step", "step_id": step_id, "evaluation_count": entry["_block"][1]})
+            yield record
+        yield {"type": "session_end", "trace_id": header.get("trace_id"),
+               "completed_at": header.get("completed_at")}
+
+    def _completion_order(self, entries: list[dict]) -> Iterator[dict]:
+        for entry in entries:
+            yield from self._completion_order(entry.get("children", []))
+            yield entry
+
+
+def json_to_binary(source: Union[str, Path], destination: Union[str, Path]) -> str:
+    # Convert a JSON (or NDJSON) trace file to the binary container.
+    from xray.serializer import load_trace
+    return write_binary_trace(load_trace(source), destination)
+
+
+def binary_to_json(source: Union[str, Path], destination: Union[str, Path], indent: Optional[int] = None) -> str:
+    # Convert a binary trace back to the JSON format save_trace writes: compact unless indent is given.
+    destination = Path(destination)
+    destination.parent.mkdir(parents=True, exist_ok=True)
+    with BinaryTrace(source) as trace, open(destination, "w") as f:
+        json.dump(trace.to_dict(), f, indent=indent, separators=(",", ":") if indent is None else None)
+    return str(destination.absolute())
+
+
+def main(argv: Optional[list[str]] = None) -> None:
+    # xray-convert SOURCE DESTINATION: the direction follows the source file's format.
+    argv = sys.argv[1:] if argv is None else argv
+    if len(argv) != 2:
+        print("usage: xray-convert SOURCE DESTINATION", file=sys.stderr)
+        sys.exit(2)
+    source, destination = argv
+    if is_binary_trace(source):
+        print(binary_to_json(source, destination))
+    else:
+        print(json_to_binary(source, destination))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,214 @@
+# X-Ray lib - cache module
+# Step-level memoization: an expensive call inside a step (an LLM or API request) is keyed by a
+# stable hash of the step's name and input_data, and served from a cache when the same inputs
+# come round again. Hits and misses are recorded in step.metadata["cache"].
+#
+# Backends share get(key) -> (value, stored_at) or None, and set(key, value):
+#   - MemoryCache: in-process LRU, bounded by entry count
+#   - DiskCache: one JSON file per entry, bounded by total bytes; survives restarts
+#   - ReplayCache: read-only, built from a saved trace, for re-running downstream steps
+
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Optional, Union
+
+from xray.serializer import iter_steps
+
+
+def stable_hash(data: Any) -> str:
+    # Same hash for equal JSON: key order, tuples vs lists and a save/load round trip don't matter.
+    encoded = json.dumps(data, sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=str)
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+def step_key(name: str, input_data: Any) -> str:
+    return stable_hash({"step": name, "input": input_data})
+
+
+class MemoryCache:
+    # Least recently used entries are evicted past max_entries; entries older than ttl seconds miss.
+    name = "memory"
+
+    def __init__(self, max_entries: int = 1024, ttl: Optional[float] = None):
+        if max_entries < 1:
+            raise ValueError("max_entries must be at least 1")
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: OrderedDict[str, tuple[Any, float]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[tuple[Any, float]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if self.ttl is not None and time.time() - entry[1] > self.ttl:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry
+
+    def set(self, key: str, value: Any) -> None:
+        with self._lock:
+            self._entries[key] = (value, time.time())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class DiskCache:
+    # Entries are JSON files in directory, so values must be JSON-serializable. A file's mtime is
+    # its last use: past max_bytes in total, the least recently used files are deleted.
+    name = "disk"
+
+    def __init__(self, directory: Union[str, Path], ttl: Optional[float] = None, max_bytes: int = 256 << 20):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+
+    def _path(self, key: str) -> Path:
+        return self.directory / f"{key}.json"
+
+    def get(self, key: str) -> Optional[tuple[Any, float]]:
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            # missing, or torn by a writer that crashed
+            return None
+        if self.ttl is not None and time.time() - entry["stored_at"] > self.ttl:
+            path.unlink(missing_ok=True)
+            return None
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return entry["value"], entry["stored_at"]
+
+    def set(self, key: str, value: Any) -> None:
+        path = self._path(key)
+        # written aside and renamed, so readers never see a partial entry
+        temporary = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        with open(temporary, "w", encoding="utf-8") as f:
+            json.dump({"stored_at": time.time(), "value": value}, f, separators=(",", ":"))
+        os.replace(temporary, path)
+        self._evict()
+
+    def _evict(self) -> None:
+        entries = []
+        for path in self.directory.glob("*.json"):
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries, key=lambda entry: entry[0]):
+            if total <= self.max_bytes:
+                break
+            path.unlink(missing_ok=True)
+            total -= size
+
+
+class ReplayCache:
+    # Step values rebuilt from a saved trace (a load_trace dict). extract maps a step name to
+    # fn(step, trace) returning what that step's memoized call returned; entries are keyed like
+    # live steps, so a re-run with the same inputs hits and nothing upstream is called again.
+    # With strict=True a miss raises KeyError instead of falling through to the live call.
+    name = "replay"
+
+    def __init__(self, trace: dict, extract: dict[str, Callable[[dict, dict], Any]], strict: bool = True):
+        self.trace = trace
+        self.strict = strict
+        self._steps = {
+            step_key(step["name"], step.get("input_data")): (step, extract[step["name"]])
+            for step in iter_steps(trace) if step["name"] in extract
+        }
+        # entries are as old as the run that recorded them
+        started_at = trace.get("started_at")
+        self._stored_at = datetime.fromisoformat(started_at).timestamp() if started_at else time.time()
+
+    def get(self, key: str) -> Optional[tuple[Any, float]]:
+        entry = self._steps.get(key)
+        if entry is None:
+            if self.strict:
+                raise KeyError(f"no step in trace {self.trace.get('trace_id')} has these inputs")
+            return None
+        step, extract = entry
+        return extract(step, self.trace), self._stored_at
+
+    def set(self, key: str, value: Any) -> None:
+        # read-only: the trace is the source of truth
+        pass
+
+
+def _key(step, cache, key_data: Any) -> Optional[str]:
+    if cache is None:
+        return None
+    if key_data is None:
+        if not step.enabled:
+            return None
+        key_data = step.input_data
+    return step_key(step.name, key_data)
+
+
+def _lookup(step, cache, key: str, started: float) -> Optional[tuple]:
+    # (value,) on a hit, recorded in the step's metadata; None on a miss.
+    entry = cache.get(key)
+    if entry is None:
+        return None
+    value, stored_at = entry
+    step.metadata["cache"] = {
+        "hit": True, "key": key, "backend": cache.name,
+        "age_s": round(time.time() - stored_at, 3), "lookup_ms": round((time.perf_counter() - started) * 1e3, 3),
+    }
+    return (value,)
+
+
+def _store(step, cache, key: str, value: Any, started: float) -> None:
+    step.metadata["cache"] = {
+        "hit": False, "key": key, "backend": cache.name,
+        "compute_ms": round((time.perf_counter() - started) * 1e3, 3),
+    }
+    cache.set(key, value)
+
+
+def memoize(step, cache, compute: Callable[[], Any], key_data: Any = None) -> Any:
+    # compute()'s result, from cache when an entry for this step and input exists. Call after
+    # step.set_input(); key_data overrides step.input_data as the key. A disabled step has no
+    # input to key on, so without key_data compute() always runs. cache=None just calls compute().
+    key = _key(step, cache, key_data)
+    if key is None:
+        return compute()
+    started = time.perf_counter()
+    hit = _lookup(step, cache, key, started)
+    if hit is not None:
+        return hit[0]
+    value = compute()
+    _store(step, cache, key, value, started)
+    return value
+
+
+async def memoize_async(step, cache, compute: Callable[[], Awaitable], key_data: Any = None) -> Any:
+    # memoize() for a coroutine: compute() returns an awaitable, awaited only on a miss.
+    key = _key(step, cache, key_data)
+    if key is None:
+        return await compute()
+    started = time.perf_counter()
+    hit = _lookup(step, cache, key, started)
+    if hit is not None:
+        return hit[0]
+    value = await compute()
+    _store(step, cache, key, value, started)
+    return value
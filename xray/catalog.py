@@ -0,0 +1,466 @@
+# X-Ray lib - catalog module
+# Persistent SQLite index of the traces in a directory, so listing doesn't reparse every file.
+#
+# save_trace() records each trace it writes into a directory that has a catalog (one is created
+# by the first list_traces() or TraceCatalog on the directory). Files that appear out-of-band (an
+# NDJSON sink, a copy, another process) are picked up by refresh(), which re-summarizes only files
+# whose mtime or size changed since they were indexed; see refresh() for which files it checks.
+#
+# Besides one row per trace, every step's duration, evaluated/qualified counts and per-filter
+# pass/fail counts are stored, so cross-run analytics (xray.analytics) are SQL over this file.
+
+import json
+import os
+import sqlite3
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from typing import Iterator, Optional, Sequence, Union
+
+from xray.binary import BINARY_SUFFIXES, BinaryTrace, is_binary_trace
+from xray.compression import DECOMPRESSION_ERRORS, SUFFIXES as COMPRESSION_SUFFIXES, open_read
+from xray.streaming import NDJSON_SUFFIXES, is_ndjson_trace, iter_trace_records, trace_to_records
+
+
+CATALOG_FILENAME = ".xray_catalog.sqlite"
+_TEXT_SUFFIXES = (".json",) + NDJSON_SUFFIXES
+# text traces may also be gzip/zstd compressed (see xray.compression)
+TRACE_SUFFIXES = _TEXT_SUFFIXES + BINARY_SUFFIXES + tuple(
+    suffix + compressed for suffix in _TEXT_SUFFIXES for compressed in COMPRESSION_SUFFIXES)
+
+# bump when the stored summary changes; older catalogs are re-indexed from scratch
+SCHEMA_VERSION = 2
+
+SORT_COLUMNS = ("started_at", "completed_at", "name", "step_count", "evaluated", "qualified", "rejected")
+
+_COLUMNS = ("trace_id", "name", "filename", "started_at", "completed_at", "step_count",
+            "status", "evaluated", "qualified", "rejected")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS traces (
+    filename TEXT PRIMARY KEY,
+    mtime_ns INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    trace_id TEXT,
+    name TEXT,
+    started_at TEXT,
+    completed_at TEXT,
+    step_count INTEGER,
+    status TEXT,
+    evaluated INTEGER,
+    qualified INTEGER,
+    rejected INTEGER
+);
+CREATE INDEX IF NOT EXISTS traces_started ON traces (started_at);
+CREATE INDEX IF NOT EXISTS traces_completed ON traces (completed_at);
+CREATE INDEX IF NOT EXISTS traces_name ON traces (name, started_at);
+CREATE INDEX IF NOT EXISTS traces_status ON traces (status, started_at);
+CREATE INDEX IF NOT EXISTS traces_trace_id ON traces (trace_id);
+CREATE TABLE IF NOT EXISTS trace_metadata (
+    filename TEXT NOT NULL,
+    key TEXT NOT NULL,
+    value TEXT
+);
+CREATE INDEX IF NOT EXISTS trace_metadata_lookup ON trace_metadata (key, value);
+CREATE INDEX IF NOT EXISTS trace_metadata_file ON trace_metadata (filename);
+CREATE TABLE IF NOT EXISTS trace_steps (
+    filename TEXT NOT NULL,
+    step TEXT NOT NULL,
+    step_type TEXT,
+    status TEXT,
+    duration_ns INTEGER,
+    evaluated INTEGER,
+    qualified INTEGER
+);
+CREATE INDEX IF NOT EXISTS trace_steps_file ON trace_steps (filename);
+CREATE INDEX IF NOT EXISTS trace_steps_step ON trace_steps (step);
+CREATE TABLE IF NOT EXISTS trace_filters (
+    filename TEXT NOT NULL,
+    step TEXT NOT NULL,
+    filter TEXT NOT NULL,
+    passed INTEGER,
+    failed INTEGER
+);
+CREATE INDEX IF NOT EXISTS trace_filters_file ON trace_filters (filename);
+CREATE TABLE IF NOT EXISTS skipped (
+    filename TEXT PRIMARY KEY,
+    mtime_ns INTEGER NOT NULL,
+    size INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS catalog_state (
+    key TEXT PRIMARY KEY,
+    value INTEGER
+);
+"""
+
+
+def _metadata_value(value) -> Optional[str]:
+    # Metadata is indexed as text: strings as-is, other scalars in their JSON spelling.
+    if isinstance(value, str):
+        return value
+    if value is None or isinstance(value, (bool, int, float)):
+        return json.dumps(value)
+    return None
+
+
+def _trace_status(statuses: list[str]) -> str:
+    if "failed" in statuses:
+        return "failed"
+    if "running" in statuses or "pending" in statuses:
+        return "running"
+    return "completed"
+
+
+def _step_summary(record: dict, evaluated: int, qualified: int, filters: dict) -> dict:
+    # Per-step facts; retention counts are exact where the rows themselves were sampled.
+    retention = (record.get("metadata") or {}).get("retention")
+    if retention:
+        evaluated, qualified = retention["evaluated"], retention["qualified"]
+        filters = retention["filters"]
+    return {
+        "step": record.get("name"),
+        "step_type": record.get("step_type"),
+        "status": record.get("status"),
+        "duration_ns": record.get("duration_ns"),
+        "evaluated": evaluated,
+        "qualified": qualified,
+        "filters": filters
+    }
+
+
+def _summary(fields: dict, step_count: int, statuses: list[str], steps: list[dict]) -> dict:
+    evaluated = sum(step["evaluated"] for step in steps)
+    qualified = sum(step["qualified"] for step in steps)
+    return {
+        "trace_id": fields.get("trace_id"),
+        "name": fields.get("name"),
+        "started_at": fields.get("started_at"),
+        "completed_at": fields.get("completed_at"),
+        "metadata": fields.get("metadata") or {},
+        "step_count": step_count,
+        "status": _trace_status(statuses),
+        "evaluated": evaluated,
+        "qualified": qualified,
+        "rejected": evaluated - qualified,
+        "steps": steps
+    }
+
+
+def summarize_session(session) -> dict:
+    # Catalog summary straight from a live session, without serializing its evaluations.
+    statuses = []
+    steps = []
+    for step in session.iter_steps():
+        statuses.append(step.status.value)
+        table = step.evaluations
+        record = {"name": step.name, "step_type": step.step_type, "status": step.status.value,
+                  "duration_ns": step.duration_ns, "metadata": step.metadata}
+        steps.append(_step_summary(record, len(table), table.qualified.count(1), table.filter_counts()))
+    fields = {"trace_id": session.trace_id, "name": session.name, "started_at": session.started_at,
+              "completed_at": session.completed_at, "metadata": session.metadata}
+    return _summary(fields, len(session.steps), statuses, steps)
+
+
+def summarize_records(records: Iterator[dict]) -> dict:
+    # Catalog summary from a trace record stream (see xray.streaming), one record at a time.
+    fields: dict = {}
+    # step_id -> [evaluated, qualified, {filter: {"passed": n, "failed": n}}]
+    counts: dict[str, list] = {}
+    open_steps: dict = {}
+    ended = False
+    statuses = []
+    steps = []
+    step_count = 0
+    for record in records:
+        record_type = record.get("type")
+        if record_type == "evaluation":
+            step_counts = counts.get(record.get("step_id"))
+            if step_counts is None:
+                step_counts = counts[record.get("step_id")] = [0, 0, {}]
+            step_counts[0] += 1
+            step_counts[1] += bool(record.get("qualified"))
+            filters = step_counts[2]
+            for result in record.get("filter_results") or ():
+                filter_counts = filters.get(result.get("filter_name"))
+                if filter_counts is None:
+                    filter_counts = filters[result.get("filter_name")] = {"passed": 0, "failed": 0}
+                filter_counts["passed" if result.get("passed") else "failed"] += 1
+        elif record_type == "session":
+            fields = record
+        elif record_type == "step_start":
+            open_steps[record.get("step_id")] = record
+        elif record_type == "step":
+            step_id = record.get("step_id")
+            open_steps.pop(step_id, None)
+            statuses.append(record.get("status"))
+            if record.get("parent_id") is None:
+                step_count += 1
+            steps.append(_step_summary(record, *counts.pop(step_id, [0, 0, {}])))
+        elif record_type == "session_end":
+            fields = {**fields, "completed_at": record.get("completed_at")}
+            ended = True
+    if not fields:
+        raise ValueError("trace has no session record")
+    # a stream without its footer, or with steps that never finished, is still being written
+    if open_steps or not ended:
+        statuses.append("running")
+    for step_id, record in open_steps.items():
+        steps.append(_step_summary({**record, "status": "running"}, *counts.pop(step_id, [0, 0, {}])))
+    for step_counts in counts.values():
+        # evaluations whose step_start was never written
+        steps.append(_step_summary({"status": "running"}, *step_counts))
+    return _summary(fields, step_count, statuses, steps)
+
+
+def summarize_file(filepath: Union[str, Path]) -> dict:
+    # Catalog summary of a trace file in any supported format.
+    if is_binary_trace(filepath):
+        with BinaryTrace(filepath) as trace:
+            return summarize_records(trace.iter_records())
+    if is_ndjson_trace(filepath):
+        return summarize_records(iter_trace_records(filepath))
+    with open_read(filepath) as f:
+        data = json.load(f)
+    if not isinstance(data, dict):
+        raise ValueError(f"{filepath} is not an X-Ray trace")
+    return summarize_records(trace_to_records(data))
+
+
+def _summarize_or_skip(filepath: Union[str, Path]) -> Optional[dict]:
+    # summarize_file for refresh(): None marks a file that is not a readable trace.
+    try:
+        return summarize_file(filepath)
+    except (ValueError, KeyError, TypeError, UnicodeDecodeError, OSError) + DECOMPRESSION_ERRORS:
+        return None
+
+
+class TraceCatalog:
+    # SQLite index over one trace directory, stored alongside the traces.
+
+    def __init__(self, directory: Union[str, Path], path: Union[str, Path, None] = None):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.path = Path(path) if path is not None else self.directory / CATALOG_FILENAME
+        # the exporter thread and the caller may share a catalog; every statement runs under the lock
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(str(self.path), timeout=30, check_same_thread=False)
+        with self._lock, self._db:
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.executescript(_SCHEMA)
+            version = self._db.execute("SELECT value FROM catalog_state WHERE key = 'schema'").fetchone()
+            if version is None or version[0] != SCHEMA_VERSION:
+                # indexed by an older version: forget every file so refresh() summarizes them again
+                for table in ("traces", "trace_metadata", "trace_steps", "trace_filters", "skipped"):
+                    self._db.execute(f"DELETE FROM {table}")
+                self._db.execute("DELETE FROM catalog_state")
+                self._db.execute("INSERT INTO catalog_state VALUES ('schema', ?)", (SCHEMA_VERSION,))
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+    def _key(self, filepath: Union[str, Path]) -> str:
+        # rows are keyed by file name, so the catalog survives the directory being moved
+        return Path(filepath).name
+
+    def add(self, filepath: Union[str, Path], summary: Optional[dict], stat: Optional[os.stat_result] = None) -> None:
+        # Index one trace file; summary=None records it as unreadable so it isn't re-parsed until it changes.
+        self.add_many([(filepath, summary, stat)])
+
+    def add_many(self, entries: list[tuple]) -> None:
+        # Index (filepath, summary, stat) entries in one transaction.
+        traces, metadata, steps, filters, skipped, keys = [], [], [], [], [], []
+        for filepath, summary, stat in entries:
+            key = self._key(filepath)
+            stat = stat or os.stat(self.directory / key)
+            keys.append((key,))
+            if summary is None:
+                skipped.append((key, stat.st_mtime_ns, stat.st_size))
+                continue
+            traces.append((key, stat.st_mtime_ns, stat.st_size, summary.get("trace_id"), summary.get("name"),
+                           summary.get("started_at"), summary.get("completed_at"), summary.get("step_count"),
+                           summary.get("status"), summary.get("evaluated"), summary.get("qualified"),
+                           summary.get("rejected")))
+            for name, value in summary.get("metadata", {}).items():
+                value = _metadata_value(value)
+                if value is not None:
+                    metadata.append((key, str(name), value))
+            for step in summary.get("steps", []):
+                steps.append((key, str(step["step"]), step["step_type"], step["status"], step["duration_ns"],
+                              step["evaluated"], step["qualified"]))
+                for name, filter_counts in step["filters"].items():
+                    filters.append((key, str(step["step"]), str(name),
+                                    filter_counts["passed"], filter_counts["failed"]))
+        with self._lock, self._db:
+            self._delete(keys)
+            self._db.executemany("INSERT INTO traces VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", traces)
+            self._db.executemany("INSERT INTO trace_metadata VALUES (?, ?, ?)", metadata)
+            self._db.executemany("INSERT INTO trace_steps VALUES (?, ?, ?, ?, ?, ?, ?)", steps)
+            self._db.executemany("INSERT INTO trace_filters VALUES (?, ?, ?, ?, ?)", filters)
+            self._db.executemany("INSERT INTO skipped VALUES (?, ?, ?)", skipped)
+
+    def _delete(self, keys: list[tuple]) -> None:
+        for table in ("traces", "trace_metadata", "trace_steps", "trace_filters", "skipped"):
+            self._db.executemany(f"DELETE FROM {table} WHERE filename = ?", keys)
+
+    def remove(self, filepath: Union[str, Path]) -> None:
+        with self._lock, self._db:
+            self._delete([(self._key(filepath),)])
+
+    def refresh(self, full: bool = False, workers: int = 1) -> int:
+        # Bring the index up to date with the directory; returns how many files were (re)indexed.
+        #
+        # Only files that can have changed are stat'ed, so an unchanged directory costs a query
+        # for its running traces rather than one stat() per trace:
+        #   - traces still marked running, since sinks append to them in place;
+        #   - when the directory's own mtime moved (a file added, removed or renamed over), the
+        #     directory is listed again and files not indexed yet are read, missing ones dropped.
+        # save_trace() updates the catalog itself, so a finished trace it rewrites is current. A
+        # finished trace rewritten in place by anything else is only seen with full=True, which
+        # lists the directory and stats every file. With workers > 1, changed files are
+        # summarized in a process pool (worth it for an initial scan of many files).
+        dir_mtime = os.stat(self.directory).st_mtime_ns
+        with self._lock:
+            seen = self._db.execute("SELECT value FROM catalog_state WHERE key = 'dir_mtime_ns'").fetchone()
+            listed = full or seen is None or seen[0] != dir_mtime
+            running = {filename: (mtime, size) for filename, mtime, size in self._db.execute(
+                "SELECT filename, mtime_ns, size FROM traces WHERE status = 'running'")}
+            if full:
+                indexed = {filename: (mtime, size) for filename, mtime, size in self._db.execute(
+                    "SELECT filename, mtime_ns, size FROM traces UNION ALL "
+                    "SELECT filename, mtime_ns, size FROM skipped")}
+                known = indexed.keys()
+            elif listed:
+                indexed = running
+                known = {filename for filename, in self._db.execute(
+                    "SELECT filename FROM traces UNION ALL SELECT filename FROM skipped")}
+            else:
+                indexed = running
+
+        if listed:
+            names = [entry.name for entry in os.scandir(self.directory)
+                     if entry.name.endswith(TRACE_SUFFIXES) and entry.is_file()]
+            missing = set(known).difference(names)
+            if missing:
+                with self._lock, self._db:
+                    self._delete([(filename,) for filename in missing])
+            scan = names if full else [name for name in names if name not in known or name in running]
+        else:
+            scan = list(running)
+
+        todo = []
+        gone = []
+        for filename in scan:
+            try:
+                stat = os.stat(self.directory / filename)
+            except FileNotFoundError:
+                gone.append((filename,))
+                continue
+            if indexed.get(filename) != (stat.st_mtime_ns, stat.st_size):
+                todo.append((filename, stat))
+        if gone:
+            with self._lock, self._db:
+                self._delete(gone)
+
+        paths = [str(self.directory / filename) for filename, _ in todo]
+        if workers > 1 and len(todo) > workers:
+            pool = ProcessPoolExecutor(max_workers=workers)
+            summaries = pool.map(_summarize_or_skip, paths, chunksize=max(1, min(64, len(paths) // (workers * 4))))
+        else:
+            pool = None
+            summaries = map(_summarize_or_skip, paths)
+        try:
+            pending = []
+            for (filename, stat), summary in zip(todo, summaries):
+                pending.append((filename, summary, stat))
+                if len(pending) >= 1000:
+                    self.add_many(pending)
+                    pending = []
+            self.add_many(pending)
+        finally:
+            if pool is not None:
+                pool.shutdown()
+        changed = len(todo)
+
+        with self._lock, self._db:
+            self._db.execute("INSERT OR REPLACE INTO catalog_state VALUES ('dir_mtime_ns', ?)", (dir_mtime,))
+        return changed
+
+    def _where(self, name: Optional[str], since, until, status: Optional[str],
+               metadata: Optional[dict], trace_id: Optional[str]) -> tuple[str, list]:
+        clauses = ["1"]
+        params: list = []
+        if name is not None:
+            clauses.append("name = ?")
+            params.append(name)
+        if trace_id is not None:
+            clauses.append("trace_id = ?")
+            params.append(trace_id)
+        if status is not None:
+            clauses.append("status = ?")
+            params.append(status)
+        if since is not None:
+            clauses.append("started_at >= ?")
+            params.append(since.isoformat() if isinstance(since, datetime) else since)
+        if until is not None:
+            clauses.append("started_at < ?")
+            params.append(until.isoformat() if isinstance(until, datetime) else until)
+        for key, value in (metadata or {}).items():
+            clauses.append("filename IN (SELECT filename FROM trace_metadata WHERE key = ? AND value = ?)")
+            params.extend([key, _metadata_value(value)])
+        return " AND ".join(clauses), params
+
+    def query(self, name: Optional[str] = None, since=None, until=None, status: Optional[str] = None,
+              metadata: Optional[dict] = None, trace_id: Optional[str] = None, sort: str = "started_at",
+              descending: bool = True, limit: Optional[int] = None, offset: int = 0) -> list[dict]:
+        # Indexed lookup; since/until bound started_at and accept datetimes or ISO strings.
+        if sort not in SORT_COLUMNS:
+            raise ValueError(f"cannot sort traces by {sort!r}, expected one of {SORT_COLUMNS}")
+        where, params = self._where(name, since, until, status, metadata, trace_id)
+        sql = (f"SELECT {', '.join(_COLUMNS)} FROM traces WHERE {where} "
+               f"ORDER BY {sort} {'DESC' if descending else 'ASC'} LIMIT ? OFFSET ?")
+        params.extend([-1 if limit is None else limit, offset])
+        with self._lock:
+            rows = self._db.execute(sql, params).fetchall()
+        traces = []
+        for row in rows:
+            trace = dict(zip(_COLUMNS, row))
+            trace["filepath"] = str(self.directory / trace.pop("filename"))
+            traces.append(trace)
+        return traces
+
+    def selection(self, name: Optional[str] = None, since=None, until=None, status: Optional[str] = None,
+                  metadata: Optional[dict] = None) -> tuple[str, list]:
+        # SQL condition on a `filename` column selecting the traces query() would return.
+        where, params = self._where(name, since, until, status, metadata, None)
+        return f"filename IN (SELECT filename FROM traces WHERE {where})", params
+
+    def fetch(self, sql: str, params: Sequence = ()) -> list[tuple]:
+        # Run a read-only statement against the catalog (see xray.analytics).
+        with self._lock:
+            return self._db.execute(sql, list(params)).fetchall()
+
+    def count(self, name: Optional[str] = None, since=None, until=None, status: Optional[str] = None,
+              metadata: Optional[dict] = None, trace_id: Optional[str] = None) -> int:
+        where, params = self._where(name, since, until, status, metadata, trace_id)
+        with self._lock:
+            return self._db.execute(f"SELECT COUNT(*) FROM traces WHERE {where}", params).fetchone()[0]
+
+
+_catalogs: dict[Path, TraceCatalog] = {}
+_catalogs_lock = threading.Lock()
+
+
+def has_catalog(directory: Union[str, Path]) -> bool:
+    return (Path(directory) / CATALOG_FILENAME).exists()
+
+
+def catalog_for(directory: Union[str, Path]) -> TraceCatalog:
+    # One shared catalog per trace directory in this process.
+    key = Path(directory).resolve()
+    with _catalogs_lock:
+        catalog = _catalogs.get(key)
+        if catalog is None:
+            catalog = _catalogs[key] = TraceCatalog(key)
+        return catalog
@@ -0,0 +1,1050 @@
+# X-Ray lib - columnar module
+# Compact column-oriented storage for a step's evaluations.
+#
+# Instead of one Evaluation + dicts + FilterResult objects per candidate, a table keeps:
+#   - candidate ids in a list and qualification in a byte-per-row mask
+#   - interned filter names, each with a pass/fail byte mask and detail/expected/actual columns
+#   - candidate_data split into typed columns (array('q') / array('d') for numbers)
+#   - interned key layouts so per-row dict/filter order round-trips exactly
+#   - metadata only for the rows that have any
+# Rows are rebuilt into Evaluation objects or dicts on demand.
+#
+# Evaluations passed to append() (Step.add_evaluation) are kept as they are, so changes the
+# caller makes afterwards still show up, until compact() moves them into the columns when the
+# step closes. Rows read through the sequence interface (table[i], iteration) are attached as
+# Evaluation objects, so changing them changes the table (the qualified mask catches up with
+# such rows on the next compact()). A row goes back into the columns once nothing outside the
+# table holds its Evaluation: iteration releases each row as the caller moves past it, and
+# compact() releases the rest, so a read pass over a large table doesn't keep every row as an
+# object. Rows whose filter results were changed stay attached.
+
+from array import array
+from bisect import bisect_right
+from collections import Counter
+from collections.abc import MutableSequence
+from itertools import groupby
+from operator import index as as_index
+from sys import getrefcount
+from typing import TYPE_CHECKING, Any, Callable, Iterable, Iterator, Optional, Sequence, Union
+
+try:
+    import numpy as np
+except ImportError:  # numpy is optional; the batch API falls back to plain sequences
+    np = None
+
+# core imports this module for Step, so the dataclasses are looked up through the module at call time
+from xray import core
+
+if TYPE_CHECKING:
+    from xray.core import Evaluation, FilterResult
+
+
+_INT64_MIN = -(2 ** 63)
+_INT64_MAX = 2 ** 63 - 1
+
+# layout id for rows held as Evaluation objects rather than in the columns
+_OVERFLOW = 0xFFFF
+
+
+def _unreferenced_count() -> int:
+    # getrefcount() of an object held only by a dict and one local, as EvaluationTable._release
+    # sees a row nobody else holds
+    holder = {0: object()}
+    value = holder[0]
+    return getrefcount(value)
+
+
+_UNREFERENCED = _unreferenced_count()
+
+
+class DataColumn:
+    # One candidate_data key. Starts typed and degrades to a plain list on a type mismatch.
+
+    __slots__ = ("kind", "values")
+
+    def __init__(self, kind: str, size: int):
+        self.kind = kind
+        if kind == "q":
+            self.values = array("q", bytes(8 * size))
+        elif kind == "d":
+            self.values = array("d", bytes(8 * size))
+        else:
+            self.values = [None] * size
+
+    @staticmethod
+    def kind_for(value: Any) -> str:
+        value_type = type(value)
+        if value_type is int and _INT64_MIN <= value <= _INT64_MAX:
+            return "q"
+        if value_type is float:
+            return "d"
+        return "o"
+
+    def set(self, row: int, value: Any) -> None:
+        if self.kind != "o" and self.kind_for(value) != self.kind:
+            self.values = list(self.values)
+            self.kind = "o"
+        self.values[row] = value
+
+    def append_missing(self) -> None:
+        self.values.append(0 if self.kind in ("q", "d") else None)
+
+    def extend(self, values: Sequence) -> None:
+        if self.kind != "o" and _sequence_kind(values) != self.kind:
+            self.values = list(self.values)
+            self.kind = "o"
+        if self.kind == "o":
+            self.values.extend(values.tolist() if _is_ndarray(values) else values)
+        elif _is_ndarray(values):
+            self.values.frombytes(values.astype(self.values.typecode).tobytes())
+        else:
+            self.values.extend(values)
+
+    def extend_missing(self, count: int) -> None:
+        if self.kind == "o":
+            self.values.extend([None] * count)
+        else:
+            self.values.frombytes(bytes(self.values.itemsize * count))
+
+    def nbytes(self) -> int:
+        if self.kind == "o":
+            return 8 * len(self.values)
+        return self.values.itemsize * len(self.values)
+
+
+def _is_ndarray(values: Any) -> bool:
+    return np is not None and isinstance(values, np.ndarray)
+
+
+def _sequence_kind(values: Sequence) -> str:
+    # Column kind for a whole sequence: typed only if every element has the same exact type.
+    if _is_ndarray(values):
+        if values.dtype.kind in "iu" and values.dtype.itemsize <= 8 and values.dtype != np.uint64:
+            return "q"
+        return "d" if values.dtype.kind == "f" else "o"
+    if isinstance(values, array):
+        return values.typecode if values.typecode in ("q", "d") else "o"
+    if not values:
+        return "o"
+    kind = DataColumn.kind_for(values[0])
+    if kind == "q" and all(type(v) is int and _INT64_MIN <= v <= _INT64_MAX for v in values):
+        return "q"
+    if kind == "d" and all(type(v) is float for v in values):
+        return "d"
+    return "o"
+
+
+# raw-values marker for a deferred FilterResult that has callables but no template values
+_CALLABLES = object()
+
+
+class _RowSegment:
+    # Filter values recorded one FilterResult at a time, for a contiguous run of rows.
+    # Deferred results keep their (interned) templates plus raw values and render on read.
+
+    __slots__ = ("start", "detail", "expected", "actual", "raw")
+
+    def __init__(self, start: int):
+        self.start = start
+        self.detail: list = []
+        self.expected: list = []
+        self.actual: list = []
+        self.raw: list = []
+
+    def __len__(self) -> int:
+        return len(self.detail)
+
+    def values(self, row: int, passed: bool) -> tuple:
+        i = row - self.start
+        raw = self.raw[i]
+        if raw is None:
+            return self.detail[i], self.expected[i], self.actual[i]
+        raw = None if raw is _CALLABLES else raw
+        return (core.render_field(self.detail[i], raw), core.render_field(self.expected[i], raw),
+                core.render_field(self.actual[i], raw))
+
+    def render_callables(self) -> None:
+        # Render rows that hold callables; template rows over plain values stay deferred.
+        for i, raw in enumerate(self.raw):
+            if raw is None:
+                continue
+            fields = (self.detail[i], self.expected[i], self.actual[i])
+            if raw is _CALLABLES or any(callable(value) for value in fields):
+                values = None if raw is _CALLABLES else raw
+                self.detail[i], self.expected[i], self.actual[i] = (core.render_field(v, values) for v in fields)
+                self.raw[i] = None
+
+    def template(self, row: int) -> Optional[tuple]:
+        # ((detail, expected, actual) templates, values) for a template-based row, else None.
+        i = row - self.start
+        raw = self.raw[i]
+        if raw is None or raw is _CALLABLES:
+            return None
+        fields = (self.detail[i], self.expected[i], self.actual[i])
+        if any(callable(value) for value in fields):
+            return None
+        return fields, raw
+
+
+class _BatchSegment:
+    # A whole filter recorded over a row range in one call. Strings are rendered only when read.
+
+    __slots__ = ("start", "count", "detail", "expected", "actual", "actual_format")
+
+    def __init__(self, start: int, count: int, detail: Any, expected: Any,
+                 actual: Optional[Sequence], actual_format: Optional[str]):
+        self.start = start
+        self.count = count
+        self.detail = detail
+        self.expected = expected
+        self.actual = actual
+        self.actual_format = actual_format
+
+    def __len__(self) -> int:
+        return self.count
+
+    def values(self, row: int, passed: bool) -> tuple:
+        i = row - self.start
+        raw = _scalar(self.actual[i]) if self.actual is not None else None
+        expected = self.expected
+        if isinstance(expected, _PerRow):
+            expected = _scalar(expected.values[i])
+        actual = raw if self.actual_format is None or raw is None else self.actual_format.format(raw)
+        if isinstance(self.detail, _PerRow):
+            return self.detail.values[i], expected, actual
+        return render_detail(self.detail, raw, expected, passed), expected, actual
+
+    def render_callables(self, passed: bytearray, strings: dict) -> None:
+        # Replace a callable detail with its rendered per-row strings.
+        detail = self.detail
+        if not (callable(detail) or isinstance(detail, tuple) and any(callable(d) for d in detail)):
+            return
+        rendered = [_intern(self.values(row, bool(passed[row]))[0], strings)
+                    for row in range(self.start, self.start + self.count)]
+        self.detail = _PerRow(rendered)
+
+
+class _PerRow:
+    # Marks a per-row expected sequence, as opposed to one expected value shared by the batch.
+
+    __slots__ = ("values",)
+
+    def __init__(self, values: Sequence):
+        self.values = values
+
+
+def _scalar(value: Any) -> Any:
+    # NumPy scalars -> plain Python values so they serialize like everything else.
+    item = getattr(value, "item", None)
+    return item() if item is not None and not isinstance(value, (str, bytes)) else value
+
+
+def render_detail(detail: Any, actual: Any, expected: Any, passed: bool) -> Any:
+    # detail may be a ready string, a str.format template over {actual}/{expected}/{passed},
+    # a (pass_template, fail_template) pair, or a callable(actual, passed) -> str.
+    if detail is None:
+        return "passed" if passed else "failed"
+    if isinstance(detail, tuple):
+        detail = detail[0] if passed else detail[1]
+    if callable(detail):
+        return detail(actual, passed)
+    if isinstance(detail, str) and "{" in detail:
+        return detail.format(actual=actual, expected=expected, passed=passed)
+    return detail
+
+
+class FilterColumn:
+    # One interned filter: a pass/fail mask aligned to table rows, plus value segments.
+    # Rows that never had this filter only get a mask byte; their layout does not reference it.
+
+    __slots__ = ("name", "passed", "_starts", "_segments")
+
+    def __init__(self, name: str, size: int):
+        self.name = name
+        self.passed = bytearray(size)
+        self._starts: list[int] = []
+        self._segments: list = []
+
+    def set(self, row: int, result: "FilterResult", strings: dict) -> None:
+        # Store one result for a row no segment covers yet (a padded row being compacted).
+        self.passed[row] = 1 if result.passed else 0
+        segments = self._segments
+        segment = segments[-1] if segments else None
+        # rows are compacted in order, so the result nearly always extends the last segment
+        if type(segment) is not _RowSegment or segment.start + len(segment.detail) != row:
+            index = bisect_right(self._starts, row)
+            segment = segments[index - 1] if index else None
+            if type(segment) is not _RowSegment or segment.start + len(segment.detail) != row:
+                segment = _RowSegment(row)
+                self._starts.insert(index, row)
+                segments.insert(index, segment)
+        segment.detail.append(_intern(result.detail, strings))
+        segment.expected.append(_intern(result.expected, strings))
+        segment.actual.append(_intern(result.actual, strings))
+        if result.values is not None:
+            segment.raw.append(result.values)
+        elif callable(result.detail) or callable(result.expected) or callable(result.actual):
+            segment.raw.append(_CALLABLES)
+        else:
+            segment.raw.append(None)
+
+    def append_missing(self) -> None:
+        self.passed.append(0)
+
+    def extend_missing(self, count: int) -> None:
+        self.passed.extend(bytes(count))
+
+    def add_batch(self, start: int, mask: bytearray, segment: _BatchSegment) -> None:
+        self.passed[start:start + len(mask)] = mask
+        index = bisect_right(self._starts, start)
+        self._starts.insert(index, start)
+        self._segments.insert(index, segment)
+
+    def _values(self, row: int) -> tuple:
+        segment = self._segments[bisect_right(self._starts, row) - 1]
+        return segment.values(row, bool(self.passed[row]))
+
+    def result(self, row: int) -> "FilterResult":
+        segment = self._segments[bisect_right(self._starts, row) - 1]
+        if isinstance(segment, _RowSegment) and segment.raw[row - segment.start] is not None:
+            # still deferred: hand back the templates so copying a row doesn't render it
+            i = row - segment.start
+            raw = segment.raw[i]
+            return core.FilterResult(
+                filter_name=self.name,
+                passed=bool(self.passed[row]),
+                detail=segment.detail[i],
+                expected=segment.expected[i],
+                actual=segment.actual[i],
+                values=None if raw is _CALLABLES else raw
+            )
+        detail, expected, actual = segment.values(row, bool(self.passed[row]))
+        return core.FilterResult(
+            filter_name=self.name,
+            passed=bool(self.passed[row]),
+            detail=detail,
+            expected=expected,
+            actual=actual
+        )
+
+    def result_dict(self, row: int) -> dict:
+        detail, expected, actual = self._values(row)
+        return {
+            "filter_name": self.name,
+            "passed": bool(self.passed[row]),
+            "detail": detail,
+            "expected": expected,
+            "actual": actual
+        }
+
+    def template_dict(self, row: int, templates: dict) -> dict:
+        # result_dict(), except a template-based row becomes a reference into templates
+        # ({template tuple: index}, shared by every row of this filter in the step).
+        segment = self._segments[bisect_right(self._starts, row) - 1]
+        ref = segment.template(row) if isinstance(segment, _RowSegment) else None
+        if ref is None:
+            return self.result_dict(row)
+        template, values = ref
+        return {
+            "filter_name": self.name,
+            "passed": bool(self.passed[row]),
+            "template": templates.setdefault(template, len(templates)),
+            "values": values
+        }
+
+
+def _remap(row_layouts: array, mapping: list[int]) -> array:
+    # Per-row layout ids translated through mapping (old id -> new id); overflow stays overflow.
+    if all(new == old for old, new in enumerate(mapping)):
+        return row_layouts
+    lookup = dict(enumerate(mapping))
+    lookup[_OVERFLOW] = _OVERFLOW
+    return array("H", map(lookup.__getitem__, row_layouts))
+
+
+def _intern(value: Any, strings: dict) -> Any:
+    # Share one object for repeated strings (expected ranges, category names, ...).
+    if type(value) is str:
+        return strings.setdefault(value, value)
+    return value
+
+
+# maps any non-zero byte to 1 so masks built from arbitrary truthy ints stay 0/1
+_NORMALIZE = bytes([0] + [1] * 255)
+
+
+def as_mask(passed: Sequence) -> bytearray:
+    # One 0/1 byte per candidate from a bool list, a bytes-like mask or a NumPy array.
+    if _is_ndarray(passed):
+        return bytearray(np.asarray(passed, dtype=bool).tobytes())
+    try:
+        mask = bytearray(passed)
+    except (TypeError, ValueError):
+        mask = bytearray(map(bool, passed))
+    return bytearray(mask.translate(_NORMALIZE))
+
+
+def and_masks(a: bytes, b: bytes) -> bytes:
+    # Element-wise AND of two 0/1 byte masks, done as one big-int operation.
+    return (int.from_bytes(a, "little") & int.from_bytes(b, "little")).to_bytes(len(a), "little")
+
+
+def threshold_mask(values: Sequence, minimum: Any = None, maximum: Any = None) -> bytearray:
+    # minimum <= value <= maximum, vectorized when values is a NumPy array.
+    if _is_ndarray(values):
+        mask = np.ones(len(values), dtype=bool)
+        if minimum is not None:
+            mask &= values >= minimum
+        if maximum is not None:
+            mask &= values <= maximum
+        return bytearray(mask.tobytes())
+    if minimum is not None and maximum is not None:
+        return bytearray(minimum <= v <= maximum for v in values)
+    if minimum is not None:
+        return bytearray(v >= minimum for v in values)
+    if maximum is not None:
+        return bytearray(v <= maximum for v in values)
+    return bytearray(b"\x01" * len(values))
+
+
+def threshold_expected(minimum: Any, maximum: Any) -> Optional[str]:
+    if minimum is not None and maximum is not None:
+        return f"{minimum} - {maximum}"
+    if minimum is not None:
+        return f">= {minimum}"
+    if maximum is not None:
+        return f"<= {maximum}"
+    return None
+
+
+class EvaluationTable(MutableSequence):
+    # Column-oriented list of evaluations; a MutableSequence of Evaluation like list[Evaluation].
+
+    def __init__(self, evaluations: Optional[Iterable["Evaluation"]] = None):
+        self.candidate_ids: list[str] = []
+        self.qualified = bytearray()
+        self.filters: list[FilterColumn] = []
+        self.filter_index: dict[str, int] = {}
+        self.columns: dict[str, DataColumn] = {}
+        self._filter_layouts: list[tuple] = []
+        self._filter_layout_ids: dict[tuple, int] = {}
+        self._row_filter_layout = array("H")
+        self._data_layouts: list[tuple] = []
+        self._data_layout_ids: dict[tuple, int] = {}
+        self._row_data_layout = array("H")
+        self._metadata: dict[int, dict] = {}
+        # rows held as Evaluation objects: appended and not yet compacted, read through the
+        # sequence interface, or not storable column-wise; their column slots are padding
+        self._objects: dict[int, "Evaluation"] = {}
+        # appended rows that compact() moves into the columns, in row order
+        self._pending: list[int] = []
+        # rows attached from the columns -> (filter layout id, data layout id, passed bits), what
+        # _release() needs to put them back
+        self._attached: dict[int, tuple[int, int, tuple]] = {}
+        self._strings: dict[str, str] = {}
+        self._batches: list[tuple[Sequence, range]] = []
+        # when False (an unsampled run), batch calls still compute masks but keep no values
+        self.capture = True
+        if evaluations is not None:
+            self.extend(evaluations)
+
+    # -- writing --
+
+    def append(self, evaluation: "Evaluation") -> None:
+        # Add an evaluation as it is; compact() stores it column-wise later.
+        row = self._append_object(evaluation)
+        self._pending.append(row)
+
+    def _append_object(self, evaluation: "Evaluation") -> int:
+        row = len(self.candidate_ids)
+        self._objects[row] = evaluation
+        self.candidate_ids.append(evaluation.candidate_id)
+        self.qualified.append(1 if evaluation.qualified else 0)
+        self._row_filter_layout.append(_OVERFLOW)
+        self._row_data_layout.append(_OVERFLOW)
+        for column in self.filters:
+            column.passed.append(0)
+        for column in self.columns.values():
+            column.append_missing()
+        return row
+
+    def extend(self, evaluations: Iterable["Evaluation"]) -> None:
+        for evaluation in evaluations:
+            self.append(evaluation)
+
+    def clear(self) -> None:
+        # Drop every row in place; the table keeps its capture setting.
+        capture = self.capture
+        self.__init__()
+        self.capture = capture
+
+    def compact(self) -> None:
+        # Move appended evaluations into the columns. The Evaluation objects are let go, so
+        # later changes to them no longer reach the table. Attached rows nothing else holds go
+        # back too; rows still held as objects get their qualified flag copied into the mask.
+        for row in list(self._attached):
+            self._release(row)
+        for row, evaluation in self._objects.items():
+            self.qualified[row] = 1 if evaluation.qualified else 0
+        for row in self._pending:
+            evaluation = self._objects.get(row)
+            if evaluation is not None and self._store_row(row, evaluation):
+                del self._objects[row]
+        self._pending = []
+
+    def _store_row(self, row: int, evaluation: "Evaluation") -> bool:
+        # Write an object row's values into its padded column slots; False if it can't be.
+        indices = []
+        for result in evaluation.filter_results:
+            index = self.filter_index.get(result.filter_name)
+            if index is None:
+                index = len(self.filters)
+                self.filter_index[result.filter_name] = index
+                self.filters.append(FilterColumn(result.filter_name, len(self.candidate_ids)))
+            indices.append(index)
+        filter_layout = tuple(indices)
+        data = evaluation.candidate_data
+        # the same filter twice on one candidate cannot live in a single column
+        if len(set(filter_layout)) != len(filter_layout) or any(type(key) is not str for key in data):
+            return False
+        filter_layout_id = self._intern_layout(filter_layout, self._filter_layouts, self._filter_layout_ids)
+        data_layout_id = self._intern_layout(tuple(data), self._data_layouts, self._data_layout_ids)
+        if filter_layout_id == _OVERFLOW or data_layout_id == _OVERFLOW:
+            return False
+
+        strings = self._strings
+        for index, result in zip(filter_layout, evaluation.filter_results):
+            self.filters[index].set(row, result, strings)
+        self._store_data(row, data)
+        self._row_filter_layout[row] = filter_layout_id
+        self._row_data_layout[row] = data_layout_id
+        self.qualified[row] = 1 if evaluation.qualified else 0
+        if evaluation.metadata:
+            self._metadata[row] = evaluation.metadata
+        return True
+
+    def _attach(self, row: int) -> "Evaluation":
+        # The row as an Evaluation that stays the row's storage, so changes to it are kept.
+        evaluation = self._objects.get(row)
+        if evaluation is not None:
+            return evaluation
+        evaluation = self.row(row)
+        self._objects[row] = evaluation
+        filter_layout = self._row_filter_layout[row]
+        if filter_layout != _OVERFLOW and self._row_data_layout[row] != _OVERFLOW:
+            passed = tuple(self.filters[index].passed[row] for index in self._filter_layouts[filter_layout])
+            self._attached[row] = (filter_layout, self._row_data_layout[row], passed)
+        self._row_filter_layout[row] = self._row_data_layout[row] = _OVERFLOW
+        self._metadata.pop(row, None)
+        # the row is counted from the object now, not the masks
+        for column in self.filters:
+            column.passed[row] = 0
+        return evaluation
+
+    def _release(self, row: int) -> None:
+        # Put an attached row back into the columns if nothing outside the table holds its
+        # Evaluation any more. Changes to its id, data, qualified flag and metadata are kept;
+        # changed filter results can't be written over their segments, so such rows stay attached.
+        saved = self._attached.get(row)
+        evaluation = self._objects.get(row)
+        if saved is None or evaluation is None or getrefcount(evaluation) > _UNREFERENCED:
+            return
+        filter_layout, data_layout, passed = saved
+        layout = self._filter_layouts[filter_layout]
+        results = evaluation.filter_results
+        data = evaluation.candidate_data
+        if len(results) != len(layout) or any(type(key) is not str for key in data):
+            return
+        # filter values render from the pass/fail bit, so compare with the bits back in place
+        for index, bit in zip(layout, passed):
+            self.filters[index].passed[row] = bit
+        if any(result != self.filters[index].result(row) for index, result in zip(layout, results)):
+            for index in layout:
+                self.filters[index].passed[row] = 0
+            return
+        if tuple(data) != self._data_layouts[data_layout]:
+            data_layout = self._intern_layout(tuple(data), self._data_layouts, self._data_layout_ids)
+            if data_layout == _OVERFLOW:
+                for index in layout:
+                    self.filters[index].passed[row] = 0
+                return
+        # the columns still hold the row's values from before it was attached; store what changed
+        columns = self.columns
+        changed = {
+            key: value for key, value in data.items()
+            if key not in columns or type(columns[key].values[row]) is not type(value) or columns[key].values[row] != value
+        }
+        if changed:
+            self._store_data(row, changed)
+        self._row_filter_layout[row] = filter_layout
+        self._row_data_layout[row] = data_layout
+        self.candidate_ids[row] = evaluation.candidate_id
+        self.qualified[row] = 1 if evaluation.qualified else 0
+        if evaluation.metadata:
+            self._metadata[row] = evaluation.metadata
+        del self._objects[row]
+        del self._attached[row]
+
+    # -- bulk writing --
+
+    def add_candidates(self, candidate_ids: Sequence[str], candidate_data: Optional[Sequence[dict]] = None,
+                       columns: Optional[dict[str, Sequence]] = None) -> range:
+        # Append one row per candidate in a single call and return their row range.
+        # candidate_data is one dict per candidate or, cheaper, columns={key: values}.
+        if candidate_data is not None and columns is not None:
+            raise ValueError("pass either candidate_data or columns, not both")
+        if not self.capture:
+            candidate_data = columns = None
+        start = len(self.candidate_ids)
+        ids = candidate_ids.tolist() if _is_ndarray(candidate_ids) else list(candidate_ids)
+        count = len(ids)
+
+        if candidate_data is not None:
+            if len(candidate_data) != count:
+                raise ValueError(f"got {len(candidate_data)} candidate_data rows for {count} candidates")
+            if any(type(key) is not str for data in candidate_data for key in data):
+                raise ValueError("candidate_data keys must be strings")
+            self.candidate_ids.extend(ids)
+            for column in self.columns.values():
+                column.extend_missing(count)
+            for row, data in enumerate(candidate_data, start):
+                self._store_data(row, data)
+                self._row_data_layout.append(
+                    self._intern_layout(tuple(data), self._data_layouts, self._data_layout_ids))
+        else:
+            columns = columns or {}
+            for key, values in columns.items():
+                if len(values) != count:
+                    raise ValueError(f"column {key!r} has {len(values)} values for {count} candidates")
+            for key, column in self.columns.items():
+                if key not in columns:
+                    column.extend_missing(count)
+            for key, values in columns.items():
+                column = self.columns.get(key)
+                if column is None:
+                    column = DataColumn(_sequence_kind(values), start)
+                    self.columns[key] = column
+                column.extend(values)
+            layout = self._intern_layout(tuple(columns), self._data_layouts, self._data_layout_ids)
+            self._row_data_layout.extend(array("H", [layout]) * count)
+            self.candidate_ids.extend(ids)
+
+        for column in self.filters:
+            column.extend_missing(count)
+        empty = self._intern_layout((), self._filter_layouts, self._filter_layout_ids)
+        self._row_filter_layout.extend(array("H", [empty]) * count)
+        self.qualified.extend(bytes(count))
+
+        rows = range(start, start + count)
+        self._batches.append((candidate_ids, rows))
+        return rows
+
+    def _find_batch(self, candidate_ids: Sequence[str]) -> range:
+        # Rows previously added for exactly these candidate ids; new rows if there are none.
+        for ids, rows in reversed(self._batches):
+            if ids is candidate_ids:
+                return rows
+        for ids, rows in reversed(self._batches):
+            if len(rows) == len(candidate_ids) and self.candidate_ids[rows.start:rows.stop] == list(candidate_ids):
+                return rows
+        return self.add_candidates(candidate_ids)
+
+    def add_filter_batch(self, filter_name: str, candidate_ids: Sequence[str], passed_mask: Sequence,
+                         expected: Any = None, actual: Optional[Sequence] = None, detail: Any = None,
+                         actual_format: Optional[str] = None) -> range:
+        # Record one filter over a whole batch of candidates. A candidate is qualified when every
+        # filter recorded for its batch passed. detail follows render_detail() and, like actual_format,
+        # is only applied when a row is read or serialized.
+        rows = self._find_batch(candidate_ids)
+        mask = as_mask(passed_mask)
+        if len(mask) != len(rows):
+            raise ValueError(f"passed_mask has {len(mask)} entries for {len(rows)} candidates")
+        if actual is not None and len(actual) != len(rows):
+            raise ValueError(f"actual has {len(actual)} entries for {len(rows)} candidates")
+        if not self.capture:
+            expected = actual = detail = None
+        if isinstance(expected, list) or _is_ndarray(expected):
+            expected = _PerRow(expected)
+        if not rows:
+            return rows
+
+        index = self.filter_index.get(filter_name)
+        if index is None:
+            index = len(self.filters)
+            self.filter_index[filter_name] = index
+            self.filters.append(FilterColumn(filter_name, len(self.candidate_ids)))
+        # rows already read as Evaluation objects get the result appended to the object
+        attached = sorted(row for row in self._objects if rows.start <= row < rows.stop)
+        first = next((row for row in rows if row not in self._objects), None)
+        layout = self._filter_layouts[self._row_filter_layout[first]] if first is not None else ()
+        if index in layout:
+            raise ValueError(f"filter {filter_name!r} is already recorded for these candidates")
+
+        new_layout = self._intern_layout(layout + (index,), self._filter_layouts, self._filter_layout_ids)
+        self._row_filter_layout[rows.start:rows.stop] = array("H", [new_layout]) * len(rows)
+        column = self.filters[index]
+        column.add_batch(
+            rows.start, mask, _BatchSegment(rows.start, len(rows), detail, expected, actual, actual_format)
+        )
+        current = self.qualified[rows.start:rows.stop]
+        self.qualified[rows.start:rows.stop] = and_masks(current, mask) if layout else mask
+        for row in attached:
+            evaluation = self._objects[row]
+            evaluation.filter_results.append(column.result(row))
+            evaluation.qualified = evaluation.qualified and bool(column.passed[row])
+            self.qualified[row] = 1 if evaluation.qualified else 0
+            self._row_filter_layout[row] = _OVERFLOW
+            column.passed[row] = 0
+        return rows
+
+    def add_threshold_filter(self, filter_name: str, candidate_ids: Sequence[str], values: Sequence,
+                             minimum: Any = None, maximum: Any = None, expected: Any = None,
+                             detail: Any = None, actual_format: Optional[str] = None) -> range:
+        # add_filter_batch for the common "minimum <= value <= maximum" predicate.
+        if expected is None:
+            expected = threshold_expected(minimum, maximum)
+        return self.add_filter_batch(
+            filter_name, candidate_ids, threshold_mask(values, minimum, maximum),
+            expected=expected, actual=values, detail=detail, actual_format=actual_format
+        )
+
+    def extend_table(self, other: "EvaluationTable") -> range:
+        # Append every row of another table (e.g. one a worker recorded) and return their rows.
+        # Columns, masks and value segments are moved over whole, so other must not be used
+        # afterwards.
+        start = len(self.candidate_ids)
+        count = len(other)
+        rows = range(start, start + count)
+        if not count:
+            return rows
+
+        data_map = [self._intern_layout(layout, self._data_layouts, self._data_layout_ids)
+                    for layout in other._data_layouts]
+        filter_map = []
+        for column in other.filters:
+            index = self.filter_index.get(column.name)
+            if index is None:
+                index = len(self.filters)
+                self.filter_index[column.name] = index
+                self.filters.append(FilterColumn(column.name, start))
+            filter_map.append(index)
+        layout_map = [
+            self._intern_layout(tuple(filter_map[i] for i in layout), self._filter_layouts, self._filter_layout_ids)
+            for layout in other._filter_layouts
+        ]
+        # rows whose layout no longer fits in the id space become overflow rows here too;
+        # read them before other's segments are moved
+        spilled = {}
+        if _OVERFLOW in data_map or _OVERFLOW in layout_map:
+            for row in range(count):
+                data_layout, filter_layout = other._row_data_layout[row], other._row_filter_layout[row]
+                if (data_layout != _OVERFLOW and data_map[data_layout] == _OVERFLOW
+                        or filter_layout != _OVERFLOW and layout_map[filter_layout] == _OVERFLOW):
+                    spilled[start + row] = other.row(row)
+        pending = [start + row for row in other._pending]
+
+        for key, column in self.columns.items():
+            if key not in other.columns:
+                column.extend_missing(count)
+        for key, theirs in other.columns.items():
+            column = self.columns.get(key)
+            if column is None:
+                column = self.columns[key] = DataColumn(theirs.kind, start)
+            column.extend(theirs.values)
+
+        merged = set(filter_map)
+        for index, column in enumerate(self.filters):
+            if index not in merged:
+                column.extend_missing(count)
+        for index, theirs in zip(filter_map, other.filters):
+            column = self.filters[index]
+            column.passed.extend(theirs.passed)
+            for segment in theirs._segments:
+                segment.start += start
+                column._starts.append(segment.start)
+                column._segments.append(segment)
+
+        self._row_data_layout.extend(_remap(other._row_data_layout, data_map))
+        self._row_filter_layout.extend(_remap(other._row_filter_layout, layout_map))
+        self.candidate_ids.extend(other.candidate_ids)
+        self.qualified.extend(other.qualified)
+        self._metadata.update((start + row, metadata) for row, metadata in other._metadata.items())
+        self._objects.update((start + row, evaluation) for row, evaluation in other._objects.items())
+        for row, (filter_layout, data_layout, passed) in other._attached.items():
+            filter_layout, data_layout = layout_map[filter_layout], data_map[data_layout]
+            if filter_layout != _OVERFLOW and data_layout != _OVERFLOW:
+                self._attached[start + row] = (filter_layout, data_layout, passed)
+        self._pending.extend(pending)
+        self._batches.extend((ids, range(start + batch.start, start + batch.stop)) for ids, batch in other._batches)
+        for row, evaluation in spilled.items():
+            self._objects[row] = evaluation
+            self._row_data_layout[row] = self._row_filter_layout[row] = _OVERFLOW
+            for column in self.filters:
+                column.passed[row] = 0
+        return rows
+
+    def render_callables(self) -> None:
+        # Render every callable filter value in place so the table can be pickled, e.g. to send
+        # it back from a worker process. Templates over plain values stay deferred.
+        for column in self.filters:
+            for segment in column._segments:
+                if isinstance(segment, _BatchSegment):
+                    segment.render_callables(column.passed, self._strings)
+                else:
+                    segment.render_callables()
+        for evaluation in self._objects.values():
+            evaluation.filter_results = [
+                core.FilterResult(result.filter_name, result.passed, *result.render())
+                if callable(result.detail) or callable(result.expected) or callable(result.actual) else result
+                for result in evaluation.filter_results
+            ]
+
+    def _intern_layout(self, layout: tuple, layouts: list, layout_ids: dict) -> int:
+        layout_id = layout_ids.get(layout)
+        if layout_id is None:
+            if len(layouts) >= _OVERFLOW:
+                return _OVERFLOW
+            layout_id = len(layouts)
+            layouts.append(layout)
+            layout_ids[layout] = layout_id
+        return layout_id
+
+    def _store_data(self, row: int, data: dict) -> None:
+        size = len(self.candidate_ids)
+        strings = self._strings
+        for key, value in data.items():
+            column = self.columns.get(key)
+            if column is None:
+                column = DataColumn(DataColumn.kind_for(value), size)
+                self.columns[key] = column
+            column.set(row, _intern(value, strings))
+
+    def take(self, rows: Iterable[int]) -> "EvaluationTable":
+        # A new table holding only the given rows, in the given order. Rows held as objects move
+        # over as the same objects.
+        table = EvaluationTable()
+        table.capture = self.capture
+        pending = set(self._pending)
+        for item in rows:
+            if not isinstance(item, int):
+                table.append(item)
+            elif item in self._objects:
+                row = table._append_object(self._objects[item])
+                if item in pending:
+                    table._pending.append(row)
+            else:
+                table.append(self.row(item))
+        return table
+
+    def _rebuild(self, items: Iterable[Union[int, "Evaluation"]]) -> None:
+        # Replace the contents with items: row numbers of this table or new evaluations.
+        table = self.take(items)
+        self.__dict__.clear()
+        self.__dict__.update(table.__dict__)
+
+    def set_metadata(self, row: int, metadata: dict) -> None:
+        if row in self._objects:
+            self._objects[row].metadata = metadata
+        elif metadata:
+            self._metadata[row] = metadata
+        else:
+            self._metadata.pop(row, None)
+
+    def set_qualified(self, row: int, qualified: bool) -> None:
+        if row in self._objects:
+            self._objects[row].qualified = qualified
+        self.qualified[row] = 1 if qualified else 0
+
+    # -- sequence interface --
+    # Rows read this way are attached: the table keeps the returned Evaluation as the row, so
+    # changes made to it show up in counts and output like those to a list item, until nothing
+    # else holds it (see the module comment). row() and row_dict() read without attaching.
+
+    def __len__(self) -> int:
+        return len(self.candidate_ids)
+
+    def __bool__(self) -> bool:
+        return bool(self.candidate_ids)
+
+    def __iter__(self) -> Iterator["Evaluation"]:
+        previous = None
+        for row in range(len(self.candidate_ids)):
+            fresh = row not in self._objects
+            yield self._attach(row)
+            # the caller holds this row now and has let go of the one before, unless it kept it
+            if previous is not None:
+                self._release(previous)
+            previous = row if fresh else None
+
+    def _index(self, index: int) -> int:
+        index = as_index(index)
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("evaluation index out of range")
+        return index
+
+    def __getitem__(self, index: Union[int, slice]) -> Union["Evaluation", list["Evaluation"]]:
+        if isinstance(index, slice):
+            return [self._attach(row) for row in range(*index.indices(len(self)))]
+        return self._attach(self._index(index))
+
+    def __setitem__(self, index: Union[int, slice], value: Any) -> None:
+        if isinstance(index, slice):
+            items: list = list(range(len(self)))
+            items[index] = list(value)
+            self._rebuild(items)
+            return
+        row = self._index(index)
+        self._attach(row)
+        self._objects[row] = value
+        self.candidate_ids[row] = value.candidate_id
+        self.qualified[row] = 1 if value.qualified else 0
+
+    def __delitem__(self, index: Union[int, slice]) -> None:
+        items = list(range(len(self)))
+        del items[index if isinstance(index, slice) else self._index(index)]
+        self._rebuild(items)
+
+    def insert(self, index: int, value: "Evaluation") -> None:
+        if index >= len(self):
+            self.append(value)
+            return
+        items: list = list(range(len(self)))
+        items.insert(index, value)
+        self._rebuild(items)
+
+    def sort(self, key: Optional[Callable] = None, reverse: bool = False) -> None:
+        rows = range(len(self))
+        if key is not None:
+            rows = sorted(rows, key=lambda row: key(self.row(row)), reverse=reverse)
+        elif reverse:
+            rows = rows[::-1]
+        self._rebuild(rows)
+
+    def reverse(self) -> None:
+        self._rebuild(range(len(self) - 1, -1, -1))
+
+    def __eq__(self, other: Any) -> bool:
+        if isinstance(other, EvaluationTable):
+            other = [other.row(row) for row in range(len(other))]
+        elif not isinstance(other, list):
+            return NotImplemented
+        return len(self) == len(other) and all(self.row(row) == item for row, item in enumerate(other))
+
+    __hash__ = None
+
+    def __repr__(self) -> str:
+        return f"EvaluationTable({[self.row(row) for row in range(len(self))]!r})"
+
+    # -- reading --
+
+    def candidate_data(self, row: int) -> dict:
+        if row in self._objects:
+            return self._objects[row].candidate_data
+        columns = self.columns
+        return {key: columns[key].values[row] for key in self._data_layouts[self._row_data_layout[row]]}
+
+    def filter_results(self, row: int) -> list["FilterResult"]:
+        if row in self._objects:
+            return self._objects[row].filter_results
+        filters = self.filters
+        return [filters[index].result(row) for index in self._filter_layouts[self._row_filter_layout[row]]]
+
+    def metadata(self, row: int) -> dict:
+        if row in self._objects:
+            return self._objects[row].metadata
+        return self._metadata.get(row, {})
+
+    def metadata_items(self, start: int = 0, stop: Optional[int] = None) -> Iterator[tuple[int, dict]]:
+        # (row, metadata) for rows in [start, stop) that have metadata, in row order.
+        stop = len(self) if stop is None else stop
+        items = [(row, metadata) for row, metadata in self._metadata.items() if start <= row < stop]
+        held = [(row, evaluation.metadata) for row, evaluation in self._objects.items()
+                if start <= row < stop and evaluation.metadata]
+        if held:
+            items.extend(held)
+            items.sort(key=lambda item: item[0])
+        return iter(items)
+
+    def filter_layout(self, row: int) -> tuple:
+        # Indices into self.filters recorded for a row, in order.
+        layout_id = self._row_filter_layout[row]
+        return () if layout_id == _OVERFLOW else self._filter_layouts[layout_id]
+
+    def filter_layout_runs(self, start: int, stop: int) -> Iterator[tuple[range, Optional[tuple]]]:
+        # Consecutive rows of start:stop sharing a filter layout, as (rows, layout); layout is
+        # None for rows held as objects, whose results are on the Evaluation.
+        row_layouts = self._row_filter_layout
+        for layout_id, run in groupby(range(start, stop), row_layouts.__getitem__):
+            first = next(run)
+            rows = range(first, first + 1 + sum(1 for _ in run))
+            yield rows, None if layout_id == _OVERFLOW else self._filter_layouts[layout_id]
+
+    def batch_ranges(self) -> list[range]:
+        return [rows for _, rows in self._batches]
+
+    def row(self, row: int) -> "Evaluation":
+        if row in self._objects:
+            return self._objects[row]
+        return core.Evaluation(
+            candidate_id=self.candidate_ids[row],
+            candidate_data=self.candidate_data(row),
+            filter_results=self.filter_results(row),
+            qualified=bool(self.qualified[row]),
+            metadata=self.metadata(row)
+        )
+
+    def row_dict(self, row: int, templates: Optional[dict] = None) -> dict:
+        # templates ({filter name: {template: index}}) switches deferred results to template references.
+        if row in self._objects:
+            return self._objects[row].to_dict()
+        filters = self.filters
+        layout = self._filter_layouts[self._row_filter_layout[row]]
+        if templates is None:
+            filter_results = [filters[index].result_dict(row) for index in layout]
+        else:
+            filter_results = [
+                filters[index].template_dict(row, templates.setdefault(filters[index].name, {}))
+                for index in layout
+            ]
+        columns = self.columns
+        return {
+            "candidate_id": self.candidate_ids[row],
+            "candidate_data": {key: columns[key].values[row]
+                               for key in self._data_layouts[self._row_data_layout[row]]},
+            "filter_results": filter_results,
+            "qualified": bool(self.qualified[row]),
+            "metadata": self._metadata.get(row, {})
+        }
+
+    def to_dicts(self, templates: Optional[dict] = None) -> list[dict]:
+        rows = [self.row_dict(row, templates) for row in range(len(self.candidate_ids))]
+        if templates:
+            for name in [name for name, ids in templates.items() if not ids]:
+                del templates[name]
+        return rows
+
+    def filter_counts(self, start: int = 0, stop: Optional[int] = None) -> dict[str, dict[str, int]]:
+        # Exact pass/fail totals per filter, read straight off the masks; rows start:stop only
+        # when given.
+        if stop is None:
+            stop = len(self.candidate_ids)
+        whole = start == 0 and stop == len(self.candidate_ids)
+        applied = [0] * len(self.filters)
+        layouts = self._row_filter_layout if whole else self._row_filter_layout[start:stop]
+        for layout_id, rows in Counter(layouts).items():
+            if layout_id != _OVERFLOW:
+                for index in self._filter_layouts[layout_id]:
+                    applied[index] += rows
+        counts = {}
+        for index, column in enumerate(self.filters):
+            passed = column.passed.count(1, start, stop)
+            counts[column.name] = {"passed": passed, "failed": applied[index] - passed}
+        for row, evaluation in self._objects.items():
+            if not start <= row < stop:
+                continue
+            for result in evaluation.filter_results:
+                entry = counts.setdefault(result.filter_name, {"passed": 0, "failed": 0})
+                entry["passed" if result.passed else "failed"] += 1
+        return counts
@@ -0,0 +1,448 @@
+# X-Ray lib - compare module
+# Diffs two pipeline runs: steps aligned by name, evaluations joined on candidate_id.
+#
+# Both traces are read as record streams (see xray.streaming), so no trace is held in memory
+# whole. A JSON trace is one document whose step ids come after their evaluations, so it is read
+# incrementally and its evaluations copied to NDJSON in the work directory first (see
+# serializer.iter_json_records): it costs a second pass and temporary disk about the size of its
+# evaluations, and memory bounded by its largest single evaluation. Evaluations are reduced to compact rows and hash-partitioned on
+# candidate_id; partitions spill to temporary files once more than spill_rows rows are buffered,
+# and the join then runs one partition at a time.
+#
+# A candidate's rank is the metadata["rank"] recorded with it (FilterEngine.rank records one for
+# the top k). Steps that recorded no ranks are ranked by metadata["score"] instead: scores are
+# written out as sorted runs of spill_rows, merged once reading is done, and the ranks are
+# partitioned like the rows, so memory stays bounded by the partition size.
+#
+# A change is reported for a candidate that was added, removed, flipped qualification, flipped
+# any filter, or moved in score or rank. Filter detail text that changed without the filter
+# flipping (e.g. after a threshold change) is counted per step, and only reported per candidate
+# with details=True.
+
+import argparse
+import heapq
+import json
+import pickle
+import sys
+import tempfile
+import zlib
+from pathlib import Path
+from typing import Any, Iterator, Optional, Union
+
+from xray.binary import is_binary_trace
+from xray.serializer import iter_json_records, load_trace
+from xray.streaming import is_ndjson_trace, trace_to_records
+
+_STEP_FIELDS = ("step_type", "status", "reasoning", "error")
+
+
+def _records(source, workdir: Path) -> Iterator[dict]:
+    if isinstance(source, dict):
+        return trace_to_records(source)
+    if hasattr(source, "to_dict"):
+        return trace_to_records(source.to_dict())
+    if is_binary_trace(source) or is_ndjson_trace(source):
+        return load_trace(source, lazy=True)
+    return iter_json_records(source, workdir)
+
+
+def _delta(a, b) -> Optional[float]:
+    if isinstance(a, (int, float)) and isinstance(b, (int, float)):
+        return b - a
+    return None
+
+
+def _dict_changes(a: Optional[dict], b: Optional[dict]) -> dict:
+    # Top-level keys whose values differ, as {key: [a, b]}.
+    a, b = a or {}, b or {}
+    return {key: [a.get(key), b.get(key)] for key in {**a, **b} if a.get(key) != b.get(key)}
+
+
+class _Partitions:
+    # Compact evaluation rows of one trace, hash-partitioned on candidate_id.
+
+    def __init__(self, count: int, spill_rows: int, workdir: Path, label: str):
+        self.count = count
+        self.spill_rows = spill_rows
+        self.workdir = workdir
+        self.label = label
+        self.buckets: list[list] = [[] for _ in range(count)]
+        self.spilled = [False] * count
+        self.buffered = 0
+
+    def add(self, row: tuple) -> None:
+        self.buckets[zlib.crc32(row[1].encode("utf-8", "surrogatepass")) % self.count].append(row)
+        self.buffered += 1
+        if self.buffered >= self.spill_rows:
+            self.spill()
+
+    def _path(self, partition: int) -> Path:
+        return self.workdir / f"{self.label}-{partition}.pickle"
+
+    def spill(self) -> None:
+        for partition, bucket in enumerate(self.buckets):
+            if bucket:
+                with open(self._path(partition), "ab") as f:
+                    pickle.dump(bucket, f, pickle.HIGHEST_PROTOCOL)
+                self.spilled[partition] = True
+                self.buckets[partition] = []
+        self.buffered = 0
+
+    def rows(self, partition: int) -> Iterator[tuple]:
+        if self.spilled[partition]:
+            with open(self._path(partition), "rb") as f:
+                while True:
+                    try:
+                        yield from pickle.load(f)
+                    except EOFError:
+                        break
+        yield from self.buckets[partition]
+
+
+class _Runs:
+    # Sorted runs of (step, -score, candidate_id) on disk, merged back in order.
+
+    def __init__(self, spill_rows: int, workdir: Path, label: str):
+        self.spill_rows = spill_rows
+        self.workdir = workdir
+        self.label = label
+        self.buffer: list[tuple] = []
+        self.paths: list[Path] = []
+
+    def add(self, row: tuple) -> None:
+        self.buffer.append(row)
+        if len(self.buffer) >= self.spill_rows:
+            self.spill()
+
+    def spill(self) -> None:
+        path = self.workdir / f"{self.label}-run-{len(self.paths)}.pickle"
+        self.buffer.sort()
+        with open(path, "wb") as f:
+            for start in range(0, len(self.buffer), 1000):
+                pickle.dump(self.buffer[start:start + 1000], f, pickle.HIGHEST_PROTOCOL)
+        self.paths.append(path)
+        self.buffer = []
+
+    def _read_run(self, path: Path) -> Iterator[tuple]:
+        with open(path, "rb") as f:
+            while True:
+                try:
+                    yield from pickle.load(f)
+                except EOFError:
+                    break
+
+    def merged(self) -> Iterator[tuple]:
+        self.buffer.sort()
+        return heapq.merge(*(self._read_run(path) for path in self.paths), self.buffer)
+
+
+class _Side:
+    # One trace read into partitions, plus its header, step records and ranks.
+
+    def __init__(self, source, partitions: _Partitions, ranks: _Partitions, scores: _Runs, workdir: Path):
+        self.header: dict = {}
+        self.steps: dict[str, dict] = {}
+        self.counts: dict[str, int] = {}
+        self.partitions = partitions
+        # (step, candidate_id, rank) rows, partitioned like the evaluation rows
+        self.ranks = ranks
+        self._scores = scores
+        # steps whose evaluations carry recorded ranks
+        self._recorded: set[str] = set()
+        self._read(source, workdir)
+        self._rank_by_score()
+
+    def _rank_by_score(self) -> None:
+        step, rank = None, 0
+        for row_step, _, candidate_id in self._scores.merged():
+            if row_step in self._recorded:
+                continue
+            if row_step != step:
+                step, rank = row_step, 0
+            rank += 1
+            self.ranks.add((step, candidate_id, rank))
+
+    def partition_ranks(self, partition: int) -> dict[tuple, int]:
+        return {(step, candidate_id): rank for step, candidate_id, rank in self.ranks.rows(partition)}
+
+    def _read(self, source, workdir: Path) -> None:
+        keys: dict[str, str] = {}
+        seen: dict[str, int] = {}
+        add = self.partitions.add
+        for record in _records(source, workdir):
+            record_type = record.get("type")
+            if record_type == "evaluation":
+                step = keys.get(record.get("step_id"))
+                if step is None:
+                    continue
+                self.counts[step] += 1
+                candidate_id = str(record.get("candidate_id"))
+                metadata = record.get("metadata") or {}
+                score = metadata.get("score")
+                if isinstance(score, (int, float)) and not isinstance(score, bool):
+                    self._scores.add((step, -score, candidate_id))
+                else:
+                    score = None
+                rank = metadata.get("rank")
+                if isinstance(rank, int) and not isinstance(rank, bool):
+                    self._recorded.add(step)
+                    self.ranks.add((step, candidate_id, rank))
+                filters = tuple(
+                    (result.get("filter_name"), bool(result.get("passed")), result.get("detail"))
+                    for result in record.get("filter_results") or ()
+                )
+                add((step, candidate_id, bool(record.get("qualified")), score, filters))
+            elif record_type == "step_start":
+                # steps align by name; repeated names are numbered in start order
+                name = record.get("name")
+                occurrence = seen.get(name, 0)
+                seen[name] = occurrence + 1
+                step = name if occurrence == 0 else f"{name}[{occurrence}]"
+                keys[record.get("step_id")] = step
+                self.counts[step] = 0
+                self.steps[step] = {}
+            elif record_type == "step":
+                step = keys.get(record.get("step_id"))
+                if step is not None:
+                    self.steps[step] = record
+            elif record_type == "session":
+                self.header = {k: record.get(k) for k in ("trace_id", "name", "started_at")}
+            elif record_type == "session_end":
+                self.header["completed_at"] = record.get("completed_at")
+
+
+class TraceDiff:
+    # The comparison of trace_a (before) with trace_b (after).
+    # changes() streams the per-candidate changes; summary() is complete once it is exhausted.
+
+    def __init__(self, trace_a, trace_b, details: bool = False, partitions: int = 64,
+                 spill_rows: int = 50_000, workdir: Optional[Union[str, Path]] = None):
+        self.details = details
+        self._tmp = tempfile.TemporaryDirectory(prefix="xray-diff-", dir=workdir)
+        tmp = Path(self._tmp.name)
+        self.a = _Side(trace_a, _Partitions(partitions, spill_rows, tmp, "a"),
+                       _Partitions(partitions, spill_rows, tmp, "a-rank"), _Runs(spill_rows, tmp, "a"), tmp)
+        self.b = _Side(trace_b, _Partitions(partitions, spill_rows, tmp, "b"),
+                       _Partitions(partitions, spill_rows, tmp, "b-rank"), _Runs(spill_rows, tmp, "b"), tmp)
+        # record streams list children before parents; report steps in start order instead
+        order = sorted(self.a.steps, key=lambda step: self.a.steps[step].get("sequence", 0))
+        order += sorted((step for step in self.b.steps if step not in self.a.steps),
+                        key=lambda step: self.b.steps[step].get("sequence", 0))
+        self._steps = {step: self._step_summary(step) for step in order}
+        self.change_count = 0
+        self._done = False
+
+    def __enter__(self) -> "TraceDiff":
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self._tmp.cleanup()
+
+    def _step_summary(self, step: str) -> dict:
+        a, b = self.a.steps.get(step), self.b.steps.get(step)
+        summary = {
+            "step": step,
+            "presence": "both" if a is not None and b is not None else ("a" if a is not None else "b"),
+            "evaluations": [self.a.counts.get(step, 0), self.b.counts.get(step, 0)],
+            "duration_ns": [(a or {}).get("duration_ns"), (b or {}).get("duration_ns")],
+            "fields": {field: [(a or {}).get(field), (b or {}).get(field)] for field in _STEP_FIELDS
+                       if (a or {}).get(field) != (b or {}).get(field)},
+            "input": _dict_changes((a or {}).get("input_data"), (b or {}).get("input_data")),
+            "output": _dict_changes((a or {}).get("output_data"), (b or {}).get("output_data")),
+            "matched": 0,
+            "added": 0,
+            "removed": 0,
+            "flipped_to_qualified": 0,
+            "flipped_to_rejected": 0,
+            "filter_flips": {},
+            "detail_changes": {},
+            "score_changes": 0,
+            "rank_changes": 0,
+        }
+        return summary
+
+    def _compare(self, step: str, candidate_id: str, a: tuple, b: tuple, rank_a: Optional[int],
+                 rank_b: Optional[int]) -> Optional[dict]:
+        summary = self._steps[step]
+        summary["matched"] += 1
+        qualified_a, score_a, filters_a = a
+        qualified_b, score_b, filters_b = b
+        changed = False
+        filters = []
+        if filters_a != filters_b:
+            results_a = {name: (passed, detail) for name, passed, detail in filters_a}
+            results_b = {name: (passed, detail) for name, passed, detail in filters_b}
+            for name in {**results_a, **results_b}:
+                result_a, result_b = results_a.get(name), results_b.get(name)
+                if result_a == result_b:
+                    continue
+                if result_a is None or result_b is None or result_a[0] != result_b[0]:
+                    summary["filter_flips"][name] = summary["filter_flips"].get(name, 0) + 1
+                    changed = True
+                else:
+                    summary["detail_changes"][name] = summary["detail_changes"].get(name, 0) + 1
+                    changed = changed or self.details
+                filters.append({
+                    "filter_name": name,
+                    "passed": [result_a and result_a[0], result_b and result_b[0]],
+                    "detail": [result_a and result_a[1], result_b and result_b[1]],
+                })
+        if qualified_a != qualified_b:
+            summary["flipped_to_qualified" if qualified_b else "flipped_to_rejected"] += 1
+            changed = True
+        if score_a != score_b:
+            summary["score_changes"] += 1
+            changed = True
+        if rank_a != rank_b:
+            summary["rank_changes"] += 1
+            changed = True
+        if not changed:
+            return None
+        return {
+            "step": step,
+            "candidate_id": candidate_id,
+            "status": "changed",
+            "qualified": [qualified_a, qualified_b],
+            "filters": filters,
+            "score": [score_a, score_b],
+            "score_delta": _delta(score_a, score_b),
+            "rank": [rank_a, rank_b],
+            "rank_delta": _delta(rank_a, rank_b),
+        }
+
+    def _one_sided(self, status: str, step: str, candidate_id: str, row: tuple, rank: Optional[int]) -> dict:
+        self._steps[step][status] += 1
+        qualified, score, _ = row
+        return {
+            "step": step,
+            "candidate_id": candidate_id,
+            "status": status,
+            "qualified": [qualified, None] if status == "removed" else [None, qualified],
+            "filters": [],
+            "score": [score, None] if status == "removed" else [None, score],
+            "score_delta": None,
+            "rank": [rank, None] if status == "removed" else [None, rank],
+            "rank_delta": None,
+        }
+
+    def changes(self) -> Iterator[dict]:
+        # Per-candidate changes, one partition at a time; may only be consumed once.
+        if self._done:
+            raise RuntimeError("changes() has already been consumed")
+        self._done = True
+        for partition in range(self.a.partitions.count):
+            before = {(row[0], row[1]): row[2:] for row in self.a.partitions.rows(partition)}
+            ranks_a = self.a.partition_ranks(partition)
+            ranks_b = self.b.partition_ranks(partition)
+            for row in self.b.partitions.rows(partition):
+                key = (row[0], row[1])
+                previous = before.pop(key, None)
+                if previous is None:
+                    change = self._one_sided("added", row[0], row[1], row[2:], ranks_b.get(key))
+                else:
+                    change = self._compare(row[0], row[1], previous, row[2:], ranks_a.get(key), ranks_b.get(key))
+                if change is not None:
+                    self.change_count += 1
+                    yield change
+            for key, previous in before.items():
+                self.change_count += 1
+                yield self._one_sided("removed", key[0], key[1], previous, ranks_a.get(key))
+
+    def summary(self) -> dict:
+        return {"a": self.a.header, "b": self.b.header, "steps": list(self._steps.values()),
+                "change_count": self.change_count}
+
+
+def diff(trace_a, trace_b, limit: Optional[int] = 1000, details: bool = False, **options: Any) -> dict:
+    # Compare two traces (file paths, trace dicts or sessions); trace_a is the baseline.
+    # Returns summary() plus the first `limit` changes (all with limit=None); options are passed
+    # to TraceDiff (partitions, spill_rows, workdir).
+    with TraceDiff(trace_a, trace_b, details=details, **options) as result:
+        changes = []
+        for change in result.changes():
+            if limit is None or len(changes) < limit:
+                changes.append(change)
+        report = result.summary()
+    report["changes"] = changes
+    report["truncated"] = limit is not None and report["change_count"] > limit
+    return report
+
+
+def format_report(report: dict, examples: int = 20) -> str:
+    # Human-readable summary of a diff() report.
+    a, b = report["a"], report["b"]
+    lines = [f"A: {a.get('name')} {a.get('trace_id')} ({a.get('started_at')})",
+             f"B: {b.get('name')} {b.get('trace_id')} ({b.get('started_at')})", ""]
+    for step in report["steps"]:
+        if step["presence"] != "both":
+            lines.append(f"{step['step']}: only in {step['presence'].upper()}")
+            continue
+        count_a, count_b = step["evaluations"]
+        lines.append(
+            f"{step['step']}: {count_a} -> {count_b} evaluations, {step['added']} added, {step['removed']} removed, "
+            f"{step['flipped_to_qualified']} now qualified, {step['flipped_to_rejected']} now rejected, "
+            f"{step['rank_changes']} rank changes"
+        )
+        for name, count in sorted(step["filter_flips"].items()):
+            lines.append(f"  filter {name}: {count} flipped")
+        for name, count in sorted(step["detail_changes"].items()):
+            lines.append(f"  filter {name}: {count} detail changes")
+        for label in ("fields", "input", "output"):
+            for key, (before, after) in step[label].items():
+                lines.append(f"  {label}.{key}: {json.dumps(before, default=str)[:60]} -> "
+                             f"{json.dumps(after, default=str)[:60]}")
+    lines.append("")
+    lines.append(f"{report['change_count']} candidate changes")
+    for change in report["changes"][:examples]:
+        qualified = " -> ".join(str(value) for value in change["qualified"])
+        flips = ", ".join(f["filter_name"] for f in change["filters"] if f["passed"][0] != f["passed"][1])
+        lines.append(
+            f"  {change['step']} {change['candidate_id']}: {change['status']}, qualified {qualified}"
+            + (f", flipped {flips}" if flips else "")
+            + (f", rank {change['rank'][0]} -> {change['rank'][1]}" if change["rank_delta"] else "")
+        )
+    return "\n".join(lines)
+
+
+def main(argv: Optional[list[str]] = None) -> None:
+    parser = argparse.ArgumentParser(
+        prog="xray-diff", description="Compare two X-Ray traces.",
+        epilog="Memory stays bounded by the partition size for every format. JSON traces are read "
+               "incrementally and their evaluations copied to a temporary NDJSON file first, which "
+               "needs free disk about the size of their evaluations and one evaluation in memory at a "
+               "time; save large traces as NDJSON or binary to skip that pass.")
+    parser.add_argument("trace_a", help="baseline trace (JSON, NDJSON or binary)")
+    parser.add_argument("trace_b", help="trace to compare against the baseline")
+    parser.add_argument("--limit", type=int, default=20, help="changes to show (default 20)")
+    parser.add_argument("--details", action="store_true", help="report filter detail text changes per candidate")
+    parser.add_argument("--changes", metavar="FILE", help="write every change to FILE as NDJSON")
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    args = parser.parse_args(argv)
+
+    with TraceDiff(args.trace_a, args.trace_b, details=args.details) as result:
+        examples = []
+        out = open(args.changes, "w", encoding="utf-8") if args.changes else None
+        try:
+            for change in result.changes():
+                if len(examples) < args.limit:
+                    examples.append(change)
+                if out is not None:
+                    out.write(json.dumps(change, separators=(",", ":"), default=str) + "\n")
+        finally:
+            if out is not None:
+                out.close()
+        report = result.summary()
+    report["changes"] = examples
+    report["truncated"] = report["change_count"] > len(examples)
+    if args.json:
+        json.dump(report, sys.stdout, indent=2, default=str)
+        print()
+    else:
+        print(format_report(report, examples=args.limit))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+# X-Ray lib - compression module
+# Transparent gzip/zstd for JSON and NDJSON trace files. A compressed trace keeps its format's
+# suffix plus .gz or .zst (competitor_selection.json.zst); readers detect compression by magic
+# bytes, so a renamed file still loads.
+#
+# gzip needs only the standard library. zstd uses the zstandard package, or compression.zstd on
+# Python 3.14+, when one of them is installed.
+
+import gzip
+import io
+from pathlib import Path
+from typing import BinaryIO, Optional, Union
+
+try:
+    from compression import zstd as _stdlib_zstd
+except ImportError:  # Python < 3.14
+    _stdlib_zstd = None
+try:
+    import zstandard
+except ImportError:  # zstd is optional; gzip and uncompressed traces work without it
+    zstandard = None
+
+SUFFIXES = {".gz": "gzip", ".zst": "zstd"}
+# raised for a truncated or corrupt compressed file, besides OSError (which gzip uses)
+DECOMPRESSION_ERRORS = (EOFError,) + tuple(
+    module.ZstdError for module in (_stdlib_zstd, zstandard) if module is not None)
+_MAGIC = {b"\x1f\x8b": "gzip", b"\x28\xb5\x2f\xfd": "zstd"}
+
+ZSTD_AVAILABLE = _stdlib_zstd is not None or zstandard is not None
+# what a TraceStore uses unless told otherwise
+DEFAULT_COMPRESSION = "zstd" if ZSTD_AVAILABLE else "gzip"
+# zstd level 10 and gzip level 6 write at tens of MB/s, well ahead of trace encoding
+LEVELS = {"gzip": 6, "zstd": 10}
+
+
+def suffix_compression(filepath: Union[str, Path]) -> Optional[str]:
+    # "gzip" or "zstd" from a .gz/.zst suffix, else None.
+    return SUFFIXES.get(Path(filepath).suffix)
+
+
+def format_suffix(filepath: Union[str, Path]) -> str:
+    # The suffix naming the trace format, under any compression suffix: .json for x.json.gz.
+    filepath = Path(filepath)
+    if filepath.suffix in SUFFIXES:
+        filepath = filepath.with_suffix("")
+    return filepath.suffix
+
+
+def detect_compression(filepath: Union[str, Path]) -> Optional[str]:
+    # "gzip" or "zstd" from the file's first bytes, else None.
+    with open(filepath, "rb") as f:
+        head = f.read(4)
+    return _MAGIC.get(head[:2]) or _MAGIC.get(head)
+
+
+def _check(compression: str) -> None:
+    if compression not in LEVELS:
+        raise ValueError(f"compression must be 'gzip' or 'zstd', not {compression!r}")
+    if compression == "zstd" and not ZSTD_AVAILABLE:
+        raise ValueError("zstd compression needs the zstandard package (pip install zstandard)")
+
+
+def open_read(filepath: Union[str, Path]) -> BinaryIO:
+    # The file's bytes, decompressed if it is compressed.
+    compression = detect_compression(filepath)
+    if compression is None:
+        return open(filepath, "rb")
+    _check(compression)
+    if compression == "gzip":
+        return gzip.open(filepath, "rb")
+    if _stdlib_zstd is not None:
+        return _stdlib_zstd.open(filepath, "rb")
+    # stream_reader has no readline; the buffer adds it for line-by-line NDJSON reads
+    return io.BufferedReader(zstandard.ZstdDecompressor().stream_reader(open(filepath, "rb")))
+
+
+def open_text(filepath: Union[str, Path]) -> io.TextIOBase:
+    return io.TextIOWrapper(open_read(filepath), encoding="utf-8")
+
+
+def open_write(filepath: Union[str, Path], compression: Optional[str], level: Optional[int] = None) -> BinaryIO:
+    # A binary file to write, compressing as it goes; closing it finishes the frame.
+    if compression is None:
+        return open(filepath, "wb")
+    _check(compression)
+    level = LEVELS[compression] if level is None else level
+    if compression == "gzip":
+        # mtime=0: the same trace compresses to the same bytes
+        return gzip.GzipFile(filepath, "wb", compresslevel=level, mtime=0)
+    if _stdlib_zstd is not None:
+        return _stdlib_zstd.open(filepath, "wb", level=level)
+    return zstandard.ZstdCompressor(level=level).stream_writer(open(filepath, "wb"))
@@ -1,12 +1,73 @@
 # X-Ray lib - core module
 # captures decision context at each pipeline step: inputs, outputs, reasoning, and filter evaluations.
 
+from contextvars import ContextVar, copy_context
 from dataclasses import dataclass, field
 from datetime import datetime
-from typing import Any, Optional
+from typing import Any, Callable, ClassVar, Optional, Sequence, Union
 from enum import Enum
+import asyncio
+import itertools
+import os
+import sys
+import threading
+import time
 import uuid
-import json
+
+from xray.encoder import iter_session_json
+from xray.metrics import EXPLAIN, StepTally
+from xray.profiling import StepProfiler
+from xray.retention import RetentionPolicy, head_sample
+
+
+# The active session and step for the current thread / asyncio task. asyncio tasks inherit a
+# copy of these when created; thread pools need propagate_context() to carry them over.
+_current_session: ContextVar[Optional["XRaySession"]] = ContextVar("xray_session", default=None)
+_current_step: ContextVar[Optional[tuple]] = ContextVar("xray_step", default=None)
+
+
+# Tracing on or off for the whole process. XRAY_ENABLED=0 turns it off at import; set_enabled()
+# at runtime. A disabled XRaySession is a shared no-op (see _NullSession) that records nothing.
+_enabled = os.environ.get("XRAY_ENABLED", "1").strip().lower() not in ("0", "false", "off", "no")
+
+
+def set_enabled(enabled: bool) -> None:
+    # Sessions created from now on are real (True) or no-ops (False); running ones are unaffected.
+    global _enabled
+    _enabled = bool(enabled)
+
+
+def tracing_enabled() -> bool:
+    return _enabled
+
+
+def current_session() -> Optional["XRaySession"]:
+    return _current_session.get()
+
+
+def current_step() -> Optional["Step"]:
+    entry = _current_step.get()
+    return entry[1] if entry is not None else None
+
+
+def propagate_context(fn: Callable) -> Callable:
+    # Bind fn to the caller's session/step context, e.g. before handing it to a thread pool.
+    context = copy_context()
+
+    def run(*args, **kwargs):
+        # each call gets its own copy: one Context cannot be entered by two threads at once
+        return context.copy().run(fn, *args, **kwargs)
+    return run
+
+
+def _worker_name() -> str:
+    # Thread name, plus the asyncio task name when called from inside a task.
+    name = threading.current_thread().name
+    try:
+        task = asyncio.current_task()
+    except RuntimeError:
+        task = None
+    return f"{name}/{task.get_name()}" if task is not None else name
 
 
 class StepStatus(Enum):
@@ -20,22 +81,47 @@ class StepStatus(Enum):
 @dataclass
 class FilterResult:
     # Result of applying a single filter to a candidate.
+    #
+    # Rendering can be deferred: with values set, string detail/expected/actual are str.format
+    # templates over those values, and any of the three may be a zero-argument callable. Nothing
+    # is formatted until render() or to_dict() is called.
     filter_name: str
     passed: bool
-    detail: str
+    detail: Any
     expected: Optional[Any] = None
     actual: Optional[Any] = None
-    
+    values: Optional[dict] = None
+
+    @property
+    def deferred(self) -> bool:
+        return self.values is not None or callable(self.detail) or callable(self.expected) or callable(self.actual)
+
+    def render(self) -> tuple:
+        # (detail, expected, actual) as display values.
+        values = self.values
+        return (render_field(self.detail, values), render_field(self.expected, values),
+                render_field(self.actual, values))
+
     def to_dict(self) -> dict:
+        detail, expected, actual = self.render() if self.deferred else (self.detail, self.expected, self.actual)
         return {
             "filter_name": self.filter_name,
             "passed": self.passed,
-            "detail": self.detail,
-            "expected": self.expected,
-            "actual": self.actual
+            "detail": detail,
+            "expected": expected,
+            "actual": actual
         }
 
 
+def render_field(value: Any, values: Optional[dict]) -> Any:
+    # One deferred FilterResult field: call callables, format templates when there are values.
+    if callable(value):
+        return value()
+    if values is not None and isinstance(value, str):
+        return value.format(**values)
+    return value
+
+
 @dataclass
 class Evaluation:
     # A candidate being evaluated through filters.
@@ -66,107 +152,551 @@ class Step:
     input_data: Optional[dict] = None
     output_data: Optional[dict] = None
     reasoning: Optional[str] = None
-    evaluations: list[Evaluation] = field(default_factory=list)
+    evaluations: "EvaluationTable" = field(default_factory=lambda: EvaluationTable())
     status: StepStatus = StepStatus.PENDING
     started_at: Optional[str] = None
     completed_at: Optional[str] = None
     error: Optional[str] = None
     metadata: dict = field(default_factory=dict)
+    step_id: str = field(default_factory=lambda: str(uuid.uuid4()))
+    parent_id: Optional[str] = None
+    sequence: int = 0
+    worker: Optional[str] = None
+    # monotonic perf_counter_ns timestamps, relative to the owning session's start
+    start_ns: Optional[int] = None
+    end_ns: Optional[int] = None
+    # CPU time spent on the step's own thread between start and end
+    cpu_ns: Optional[int] = None
+    children: list["Step"] = field(default_factory=list)
+    _cpu_start_ns: int = field(default=0, repr=False, compare=False)
+    _origin_ns: int = field(default=0, repr=False, compare=False)
+    _lock: Any = field(default_factory=threading.Lock, repr=False, compare=False)
+    _sink: Optional[Any] = field(default=None, repr=False, compare=False)
+    _live: Optional[Any] = field(default=None, repr=False, compare=False)
+    _retention: Optional[Any] = field(default=None, repr=False, compare=False)
+    _sampled: bool = field(default=True, repr=False, compare=False)
+    # evaluation counts for the session's Metrics, when it has any
+    _tally: Optional[StepTally] = field(default=None, repr=False, compare=False)
+    # False only for the shared no-op step of a disabled session
+    enabled: ClassVar[bool] = True
+    
+    def __post_init__(self) -> None:
+        # evaluations are stored column-wise; accept a plain list for convenience
+        if not isinstance(self.evaluations, EvaluationTable):
+            self.evaluations = EvaluationTable(self.evaluations)
     
-    def set_input(self, data: dict) -> None:
-        self.input_data = data
+    # set_input, set_output and set_reasoning also take a zero-argument callable building the
+    # value, so a disabled session skips building it.
+    def set_input(self, data: Any) -> None:
+        self.input_data = data() if callable(data) else data
         
-    def set_output(self, data: dict) -> None:
-        self.output_data = data
+    def set_output(self, data: Any) -> None:
+        self.output_data = data() if callable(data) else data
         
-    def set_reasoning(self, reasoning: str) -> None:
-        self.reasoning = reasoning
+    def set_reasoning(self, reasoning: Any) -> None:
+        self.reasoning = reasoning() if callable(reasoning) else reasoning
+        
+    def add_evaluation(self, evaluation: Any) -> None:
+        # evaluation may be a zero-argument callable returning the Evaluation; it is only called
+        # when the step records or counts evaluations (not in unsampled runs without metrics, nor
+        # in disabled runs).
+        tally = self._tally
+        if not self._sampled:
+            if tally is None:
+                return
+            if callable(evaluation):
+                evaluation = evaluation()
+            with self._lock:
+                tally.add(evaluation)
+            return
+        if callable(evaluation):
+            evaluation = evaluation()
+        if self._live is not None:
+            self._live.evaluation(self, evaluation)
+        with self._lock:
+            if tally is not None:
+                tally.add(evaluation)
+            # a retention policy may drop the evaluation or hold it back until the step finishes
+            if self._retention is not None and not self._retention.offer(evaluation):
+                return
+            # with a streaming sink attached, evaluations go straight to disk and are not kept
+            if self._sink is not None:
+                self._sink.write_evaluation(self, evaluation)
+                return
+            self.evaluations.append(evaluation)
+        
+    def _write_batch(self) -> None:
+        # With a streaming sink, write the rows held in the table before a new batch starts, so a
+        # step keeps at most one batch in memory (see xray.streaming). Called under the lock.
+        table = self.evaluations
+        if self._sink is None or self._retention is not None or not self._sampled or not len(table):
+            return
+        table.compact()
+        if self._tally is not None:
+            self._tally.count_rows(table)
+        self._sink.write_rows(self, table)
+        table.clear()
+
+    def add_candidates(self, candidate_ids: Sequence[str], candidate_data: Optional[Sequence[dict]] = None,
+                       columns: Optional[dict[str, Sequence]] = None) -> range:
+        # Bulk form of add_evaluation: one row per candidate, filters attached with add_filter_batch.
+        with self._lock:
+            self._write_batch()
+            rows = self.evaluations.add_candidates(candidate_ids, candidate_data=candidate_data, columns=columns)
+            if self._tally is not None:
+                self._tally.rows.add((rows.start, rows.stop))
+            return rows
         
-    def add_evaluation(self, evaluation: Evaluation) -> None:
-        self.evaluations.append(evaluation)
+    def add_filter_batch(self, filter_name: str, candidate_ids: Sequence[str], passed_mask: Sequence,
+                         expected: Any = None, actual: Optional[Sequence] = None, detail: Any = None,
+                         actual_format: Optional[str] = None) -> range:
+        # Record one filter over a batch of candidates; see EvaluationTable.add_filter_batch.
+        with self._lock:
+            rows = self.evaluations.add_filter_batch(
+                filter_name, candidate_ids, passed_mask,
+                expected=expected, actual=actual, detail=detail, actual_format=actual_format
+            )
+            if self._tally is not None:
+                self._tally.rows.add((rows.start, rows.stop))
+            return rows
         
+    def add_threshold_filter(self, filter_name: str, candidate_ids: Sequence[str], values: Sequence,
+                             minimum: Any = None, maximum: Any = None, expected: Any = None,
+                             detail: Any = None, actual_format: Optional[str] = None) -> range:
+        # Batch filter for "minimum <= value <= maximum"; vectorized when values is a NumPy array.
+        with self._lock:
+            rows = self.evaluations.add_threshold_filter(
+                filter_name, candidate_ids, values, minimum=minimum, maximum=maximum,
+                expected=expected, detail=detail, actual_format=actual_format
+            )
+            if self._tally is not None:
+                self._tally.rows.add((rows.start, rows.stop))
+            return rows
+        
+    def add_table(self, table: "EvaluationTable") -> range:
+        # Append rows recorded into a separate table, e.g. by xray.parallel workers.
+        with self._lock:
+            self._write_batch()
+            rows = self.evaluations.extend_table(table)
+            if self._tally is not None:
+                self._tally.rows.add((rows.start, rows.stop))
+            return rows
+
+    def add_counts(self, evaluated: int, qualified: int, filter_counts: dict[str, dict[str, int]],
+                   mode: str = EXPLAIN) -> None:
+        # Count evaluations that were not recorded as rows into the step's metrics (no-op with
+        # metrics off); filter_counts as EvaluationTable.filter_counts() returns them. mode is
+        # "short_circuit" when each filter only saw the candidates earlier ones let through.
+        if self._tally is None:
+            return
+        with self._lock:
+            self._tally.add_counts(evaluated, qualified, filter_counts, mode)
+
     def start(self) -> None:
         self.status = StepStatus.RUNNING
         self.started_at = datetime.now().isoformat()
+        self._cpu_start_ns = time.thread_time_ns()
+        self.start_ns = time.perf_counter_ns() - self._origin_ns
+        
+    def _stop_clock(self) -> None:
+        self.end_ns = time.perf_counter_ns() - self._origin_ns
+        self.cpu_ns = time.thread_time_ns() - self._cpu_start_ns
         
     def complete(self) -> None:
+        self._stop_clock()
         self.status = StepStatus.COMPLETED
         self.completed_at = datetime.now().isoformat()
         
     def fail(self, error: str) -> None:
+        self._stop_clock()
         self.status = StepStatus.FAILED
         self.completed_at = datetime.now().isoformat()
         self.error = error
         
-    def to_dict(self) -> dict:
-        return {
+    def add_child(self, step: "Step") -> None:
+        with self._lock:
+            self.children.append(step)
+            
+    def iter_steps(self):
+        # This step and all of its descendants, depth first in start order.
+        yield self
+        for child in sorted(self.children, key=lambda s: s.sequence):
+            yield from child.iter_steps()
+            
+    @property
+    def duration_ns(self) -> Optional[int]:
+        if self.start_ns is None or self.end_ns is None:
+            return None
+        return self.end_ns - self.start_ns
+        
+    @property
+    def child_ns(self) -> int:
+        # Wall time covered by at least one child; concurrent children are not double counted.
+        spans = sorted(
+            (child.start_ns, child.end_ns) for child in self.children
+            if child.start_ns is not None and child.end_ns is not None
+        )
+        covered, current_start, current_end = 0, None, None
+        for start, end in spans:
+            if current_end is None or start > current_end:
+                if current_end is not None:
+                    covered += current_end - current_start
+                current_start, current_end = start, end
+            else:
+                current_end = max(current_end, end)
+        if current_end is not None:
+            covered += current_end - current_start
+        return covered
+        
+    @property
+    def self_ns(self) -> Optional[int]:
+        duration = self.duration_ns
+        return None if duration is None else max(duration - self.child_ns, 0)
+        
+    def to_dict(self, include_evaluations: bool = True, include_children: bool = True,
+                render: bool = True) -> dict:
+        # render=False keeps deferred filter results as {"template": i, "values": ...} references
+        # into a per-step "templates" list, so each template is stored once per filter.
+        children = sorted(self.children, key=lambda s: s.sequence) if include_children else []
+        templates: Optional[dict] = None if render else {}
+        step = {
             "name": self.name,
             "step_type": self.step_type,
             "input_data": self.input_data,
             "output_data": self.output_data,
             "reasoning": self.reasoning,
-            "evaluations": [e.to_dict() for e in self.evaluations],
+            "evaluations": self.evaluations.to_dicts(templates) if include_evaluations else [],
             "status": self.status.value,
             "started_at": self.started_at,
             "completed_at": self.completed_at,
             "error": self.error,
-            "metadata": self.metadata
+            "metadata": self.metadata,
+            "step_id": self.step_id,
+            "parent_id": self.parent_id,
+            "sequence": self.sequence,
+            "worker": self.worker,
+            "start_ns": self.start_ns,
+            "end_ns": self.end_ns,
+            "duration_ns": self.duration_ns,
+            "self_ns": self.self_ns,
+            "child_ns": self.child_ns,
+            "cpu_ns": self.cpu_ns,
+            "children": [child.to_dict(include_evaluations, render=render) for child in children]
         }
+        if templates:
+            step["templates"] = {name: [list(template) for template in ids] for name, ids in templates.items()}
+        return step
 
 
 class XRaySession:
     # Context manager for collecting X-Ray traces from a pipeline execution.
+    #
+    # With tracing disabled (enabled=False, or the process-wide switch when enabled is None),
+    # the constructor returns the shared no-op session instead; check session.enabled.
+    enabled = True
+
+    def __new__(cls, *args, enabled: Optional[bool] = None, **kwargs):
+        if cls is XRaySession and not (_enabled if enabled is None else enabled):
+            return _NULL_SESSION
+        return super().__new__(cls)
     
-    def __init__(self, name: str, metadata: Optional[dict] = None):
+    def __init__(self, name: str, metadata: Optional[dict] = None, sink: Optional[Any] = None,
+                 retention: Optional[RetentionPolicy] = None, sample_rate: float = 1.0,
+                 exporter: Optional[Any] = None, live: Optional[Any] = None, enabled: Optional[bool] = None,
+                 profile: Optional[StepProfiler] = None, metrics: Optional[Any] = None):
         self.trace_id = str(uuid.uuid4())
         self.name = name
         self.steps: list[Step] = []
         self.started_at: Optional[str] = None
         self.completed_at: Optional[str] = None
         self.metadata = metadata or {}
-        self._current_step: Optional[Step] = None
+        self.sink = sink
+        self.retention = retention
+        self.exporter = exporter
+        # a LivePublisher streaming progress to a trace server (see xray.live)
+        self.live = live
+        # an xray.metrics.Metrics registry, fed by every run whether or not it is sampled
+        self.metrics = metrics
+        # head sampling: unsampled runs skip all per-candidate recording
+        self.sampled = head_sample(sample_rate)
+        # every step of a profiled run is profiled (see xray.profiling); profile.every picks the runs
+        self.profiler = profile if profile is not None and profile.sample() else None
+        # steps may finish on several threads or tasks at once
+        self._lock = threading.Lock()
+        self._sequence = itertools.count()
+        self._origin_ns = time.perf_counter_ns()
+        self._context_token = None
         
     def __enter__(self) -> "XRaySession":
         self.started_at = datetime.now().isoformat()
+        self._origin_ns = time.perf_counter_ns()
+        self._context_token = _current_session.set(self)
+        if self.sink is not None:
+            self.sink.write_session_start(self)
+        if self.live is not None:
+            self.live.session_started(self)
         return self
         
     def __exit__(self, exc_type, exc_val, exc_tb) -> None:
         self.completed_at = datetime.now().isoformat()
+        if self._context_token is not None:
+            try:
+                _current_session.reset(self._context_token)
+            except ValueError:
+                # exited from a different context than it was entered in
+                _current_session.set(None)
+            self._context_token = None
+        if self.metrics is not None:
+            self.metrics.record_session(self.name, (time.perf_counter_ns() - self._origin_ns) / 1e9, exc_type is not None)
+        if self.sink is not None:
+            self.sink.write_session_end(self)
+        if self.live is not None:
+            self.live.session_finished(self)
+        if self.exporter is not None:
+            self.exporter.submit(self)
+            
+    async def __aenter__(self) -> "XRaySession":
+        return self.__enter__()
+        
+    async def __aexit__(self, exc_type, exc_val, exc_tb) -> None:
+        # same as __exit__, but a blocking exporter queue is waited on off the event loop
+        exporter, self.exporter = self.exporter, None
+        try:
+            self.__exit__(exc_type, exc_val, exc_tb)
+        finally:
+            self.exporter = exporter
+        if exporter is not None:
+            await exporter.submit_async(self)
         
-    def step(self, name: str, step_type: str = "generic") -> "StepContext":
-        return StepContext(self, name, step_type)
+    def step(self, name: str, step_type: str = "generic", retention: Optional[RetentionPolicy] = None,
+             profile: Union[bool, StepProfiler, None] = None) -> "StepContext":
+        # profile: True or a StepProfiler to profile this step, False not to; None follows the session
+        return StepContext(self, name, step_type, retention or self.retention, profile)
         
     def add_step(self, step: Step) -> None:
-        self.steps.append(step)
+        with self._lock:
+            self.steps.append(step)
+            
+    def iter_steps(self):
+        # Every step in the session, depth first in start order.
+        for step in sorted(self.steps, key=lambda s: s.sequence):
+            yield from step.iter_steps()
         
-    def to_dict(self) -> dict:
+    def to_dict(self, render: bool = True) -> dict:
         return {
             "trace_id": self.trace_id,
             "name": self.name,
             "started_at": self.started_at,
             "completed_at": self.completed_at,
             "metadata": self.metadata,
-            "steps": [step.to_dict() for step in self.steps]
+            "steps": [step.to_dict(render=render) for step in sorted(self.steps, key=lambda s: s.sequence)]
         }
         
-    def to_json(self, indent: int = 2) -> str:
-        return json.dumps(self.to_dict(), indent=indent)
+    def to_json(self, indent: Optional[int] = None, render: bool = True) -> str:
+        # Compact unless indent is given; encoded straight from the steps (see xray.encoder).
+        return b"".join(iter_session_json(self, indent=indent, render=render)).decode("utf-8")
+
+
+# imported last: the columnar table builds Evaluation/FilterResult objects from this module
+from xray.columnar import EvaluationTable  # noqa: E402
 
 
 class StepContext:
     # Context manager for an individual step within an X-Ray session.
     
-    def __init__(self, session: XRaySession, name: str, step_type: str):
+    def __init__(self, session: XRaySession, name: str, step_type: str,
+                 retention: Optional[RetentionPolicy] = None, profile: Union[bool, StepProfiler, None] = None):
         self.session = session
         self.step = Step(name=name, step_type=step_type)
+        if not session.sampled:
+            self.step._sampled = False
+            self.step.evaluations.capture = False
+        elif retention is not None:
+            self.step._retention = retention.start()
+        if session.metrics is not None:
+            self.step._tally = StepTally()
+        self._context_token = None
+        self._parent: Optional[Step] = None
+        if profile is None:
+            self._profiler = session.profiler
+        elif profile is True:
+            self._profiler = StepProfiler()
+        elif profile is False or not profile.sample():
+            self._profiler = None
+        else:
+            self._profiler = profile
+        self._profile_run = None
         
     def __enter__(self) -> Step:
+        session = self.session
+        parent = _current_step.get()
+        self._parent = None
+        if parent is not None and parent[0] is session:
+            self._parent = parent[1]
+            self.step.parent_id = parent[1].step_id
+        self.step.sequence = next(session._sequence)
+        self.step.worker = _worker_name()
+        self.step._origin_ns = session._origin_ns
+        self._context_token = _current_step.set((session, self.step))
         self.step.start()
+        if self.session.sink is not None:
+            self.step._sink = self.session.sink
+            self.session.sink.write_step_start(self.step)
+        if self.session.live is not None:
+            self.step._live = self.session.live
+            self.session.live.step_started(self.session, self.step)
+        if self._profiler is not None:
+            # the sampler records stacks from the frame running the with-block down
+            self._profile_run = self._profiler.start(sys._getframe(1))
         return self.step
         
     def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        if self._profile_run is not None:
+            self.step.metadata["profile"] = self._profile_run.stop()
+            self._profile_run = None
+        # evaluations recorded one at a time move into the columns now that nothing adds to them
+        self.step.evaluations.compact()
+        if self.step._tally is not None:
+            # batch rows are counted from the table before an unsampled run drops it
+            self.step._tally.count_rows(self.step.evaluations)
+        if self._context_token is not None:
+            try:
+                _current_step.reset(self._context_token)
+            except ValueError:
+                _current_step.set(None)
+            self._context_token = None
+        if not self.step._sampled:
+            self.step.evaluations = EvaluationTable()
+            self.step.metadata["sampled"] = False
+        elif self.step._retention is not None:
+            # finish() may rebuild the table and append the evaluations it held back
+            self.step._retention.finish(self.step)
+            self.step.evaluations.compact()
         if exc_type is not None:
             self.step.fail(str(exc_val))
         else:
             self.step.complete()
-        self.session.add_step(self.step)
+        if self.step._sink is not None:
+            self.step._sink.write_step(self.step)
+        if self.step._live is not None:
+            self.step._live.step_finished(self.session, self.step)
+        if self.session.metrics is not None:
+            self.session.metrics.record_step(self.session.name, self.step)
+        if self.step._sink is not None:
+            # the sink has written every row; a streaming step keeps none of them
+            self.step.evaluations = EvaluationTable()
+        # nested steps hang off their parent; only top-level steps are listed on the session
+        if self._parent is not None:
+            self._parent.add_child(self.step)
+        else:
+            self.session.add_step(self.step)
+
+
+# -- disabled tracing --
+# One shared session, step context and step stand in for every disabled run. Their methods do
+# nothing and lazy (callable) arguments are never called, so the traced code pays only for the
+# calls themselves.
+
+class _NullStep(Step):
+    enabled = False
+
+    # writes are dropped, e.g. the filter engine's short-circuit counts
+    @property
+    def metadata(self) -> dict:
+        return {}
+
+    @metadata.setter
+    def metadata(self, value: dict) -> None:
+        pass
+
+    def set_input(self, data: Any) -> None:
+        pass
+
+    def set_output(self, data: Any) -> None:
+        pass
+
+    def set_reasoning(self, reasoning: Any) -> None:
+        pass
+
+    def add_evaluation(self, evaluation: Any) -> None:
+        pass
+
+    def add_candidates(self, candidate_ids: Sequence[str], candidate_data: Optional[Sequence[dict]] = None,
+                       columns: Optional[dict[str, Sequence]] = None) -> range:
+        return range(0)
+
+    def add_filter_batch(self, filter_name: str, candidate_ids: Sequence[str], passed_mask: Sequence,
+                         *args, **kwargs) -> range:
+        return range(0)
+
+    def add_threshold_filter(self, filter_name: str, candidate_ids: Sequence[str], values: Sequence,
+                             *args, **kwargs) -> range:
+        return range(0)
+
+    def add_table(self, table: "EvaluationTable") -> range:
+        return range(0)
+
+    def add_child(self, step: Step) -> None:
+        pass
+
+    def start(self) -> None:
+        pass
+
+    def complete(self) -> None:
+        pass
+
+    def fail(self, error: str) -> None:
+        pass
+
+
+class _NullStepContext:
+    def __enter__(self) -> Step:
+        return _NULL_STEP
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        pass
+
+
+class _NullSession(XRaySession):
+    enabled = False
+    trace_id = None
+    name = "disabled"
+    started_at = None
+    completed_at = None
+    sink = retention = exporter = live = profiler = metrics = None
+    sampled = False
+    steps: tuple = ()
+
+    def __init__(self, *args, **kwargs) -> None:
+        # XRaySession(...) returns the shared instance and Python then calls this with its arguments
+        pass
+
+    @property
+    def metadata(self) -> dict:
+        return {}
+
+    def __enter__(self) -> "XRaySession":
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        pass
+
+    async def __aenter__(self) -> "XRaySession":
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb) -> None:
+        pass
+
+    def step(self, name: str, step_type: str = "generic", retention: Optional[RetentionPolicy] = None,
+             profile: Union[bool, StepProfiler, None] = None) -> "StepContext":
+        return _NULL_STEP_CONTEXT
+
+    def add_step(self, step: Step) -> None:
+        pass
+
+
+_NULL_STEP = _NullStep(name="disabled")
+_NULL_STEP._sampled = False
+_NULL_STEP.evaluations.capture = False
+_NULL_STEP_CONTEXT = _NullStepContext()
+_NULL_SESSION = object.__new__(_NullSession)
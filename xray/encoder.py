@@ -0,0 +1,185 @@
+# X-Ray lib - encoder module
+# Streams a session as JSON straight from its steps and evaluation tables, without building the
+# nested to_dict() tree first. Evaluations are encoded a chunk of rows at a time, so peak memory
+# is one chunk rather than the whole trace.
+#
+# orjson is used when it is installed, the standard library otherwise. Output is compact by
+# default; indent=N pretty-prints. Both parse to exactly what XRaySession.to_dict() returns, and
+# with the standard library and indent=2 the bytes match json.dump(session.to_dict(), indent=2).
+
+import json
+from typing import Any, BinaryIO, Iterable, Iterator, Optional
+
+try:
+    import orjson
+except ImportError:  # orjson is optional; the standard library encoder is used instead
+    orjson = None
+
+BACKEND = "orjson" if orjson is not None else "json"
+# rows encoded per call; bounds memory while keeping per-call overhead low
+CHUNK_ROWS = 1000
+# bytes collected before each write to the file
+WRITE_BUFFER = 1 << 20
+
+
+class _Array:
+    # A JSON array whose items are produced while encoding.
+    def __init__(self, items: Iterable):
+        self.items = items
+
+
+class _Object:
+    # A JSON object whose values may be _Array/_Object; the rest are encoded as they are.
+    def __init__(self, items: Iterable[tuple[str, Any]]):
+        self.items = items
+
+
+class _Encoder:
+    def __init__(self, indent: Optional[int], backend: Optional[str]):
+        backend = backend or BACKEND
+        if backend == "orjson" and orjson is None:
+            raise ValueError("orjson is not installed")
+        if backend not in ("orjson", "json"):
+            raise ValueError(f"backend must be 'orjson' or 'json', not {backend!r}")
+        # orjson only pretty-prints with two spaces
+        self.orjson = backend == "orjson" and indent in (None, 2)
+        self.indent = indent
+        if indent is None:
+            self.item_separator, self.key_separator = b",", b":"
+        else:
+            self.item_separator, self.key_separator = b",", b": "
+
+    def _newline(self, level: int) -> bytes:
+        return b"" if self.indent is None else b"\n" + b" " * (self.indent * level)
+
+    def dumps(self, value: Any, level: int) -> bytes:
+        # One plain value, indented for the nesting level it is written at.
+        if self.orjson:
+            option = orjson.OPT_NON_STR_KEYS | (orjson.OPT_INDENT_2 if self.indent else 0)
+            try:
+                encoded = orjson.dumps(value, option=option)
+            except orjson.JSONEncodeError:
+                # integers beyond 64 bits, which the standard library encodes
+                encoded = self._json_dumps(value)
+        else:
+            encoded = self._json_dumps(value)
+        if self.indent and level:
+            # JSON strings never contain a raw newline, so every one starts a new line
+            encoded = encoded.replace(b"\n", self._newline(level))
+        return encoded
+
+    def _json_dumps(self, value: Any) -> bytes:
+        if self.indent is None:
+            return json.dumps(value, separators=(",", ":")).encode()
+        return json.dumps(value, indent=self.indent).encode()
+
+    def encode(self, value: Any, level: int = 0) -> Iterator[bytes]:
+        if isinstance(value, _Object):
+            yield from self._object(value, level)
+        elif isinstance(value, _Array):
+            yield from self._array(value, level)
+        else:
+            yield self.dumps(value, level)
+
+    def _object(self, value: _Object, level: int) -> Iterator[bytes]:
+        inner = self._newline(level + 1)
+        opened = False
+        for key, item in value.items:
+            yield (b"{" if not opened else self.item_separator) + inner + self.dumps(key, 0) + self.key_separator
+            opened = True
+            yield from self.encode(item, level + 1)
+        yield self._newline(level) + b"}" if opened else b"{}"
+
+    def _array(self, value: _Array, level: int) -> Iterator[bytes]:
+        # Runs of plain items are encoded as one list and spliced in without its brackets.
+        inner = self._newline(level + 1)
+        closing = len(self._newline(level)) + 1
+        opened = False
+        chunk = []
+        for item in value.items:
+            if isinstance(item, (_Array, _Object)):
+                if chunk:
+                    yield from self._splice(chunk, opened, level, closing)
+                    opened, chunk = True, []
+                yield (b"[" if not opened else self.item_separator) + inner
+                opened = True
+                yield from self.encode(item, level + 1)
+                continue
+            chunk.append(item)
+            if len(chunk) == CHUNK_ROWS:
+                yield from self._splice(chunk, opened, level, closing)
+                opened, chunk = True, []
+        if chunk:
+            yield from self._splice(chunk, opened, level, closing)
+            opened = True
+        yield self._newline(level) + b"]" if opened else b"[]"
+
+    def _splice(self, chunk: list, opened: bool, level: int, closing: int) -> Iterator[bytes]:
+        yield (b"[" if not opened else self.item_separator) + self.dumps(chunk, level)[1:-closing]
+
+
+def _rows(table, templates: Optional[dict], blobs) -> Iterator[dict]:
+    for row in range(len(table)):
+        evaluation = table.row_dict(row, templates)
+        if blobs is not None:
+            evaluation["candidate_data"] = blobs.ref(evaluation["candidate_data"])
+        yield evaluation
+    if templates:
+        # same as EvaluationTable.to_dicts: filters without deferred results need no entry
+        for name in [name for name, ids in templates.items() if not ids]:
+            del templates[name]
+
+
+def _step(step, render: bool, blobs) -> _Object:
+    def items() -> Iterator[tuple[str, Any]]:
+        templates = None if render else {}
+        # the header is cheap without evaluations and children; both are streamed in its place
+        for key, value in step.to_dict(include_evaluations=False, include_children=False).items():
+            if key == "evaluations":
+                value = _Array(_rows(step.evaluations, templates, blobs))
+            elif key == "children":
+                value = _Array(_step(child, render, blobs) for child in sorted(step.children, key=lambda s: s.sequence))
+            elif key == "reasoning" and blobs is not None and isinstance(value, str):
+                value = blobs.ref(value)
+            yield key, value
+        if templates:
+            yield "templates", {name: [list(template) for template in ids] for name, ids in templates.items()}
+    return _Object(items())
+
+
+def _session(session, render: bool, blobs) -> _Object:
+    items = [
+        ("trace_id", session.trace_id),
+        ("name", session.name),
+        ("started_at", session.started_at),
+        ("completed_at", session.completed_at),
+        ("metadata", session.metadata),
+        ("steps", _Array(_step(step, render, blobs) for step in sorted(session.steps, key=lambda s: s.sequence))),
+    ]
+    if blobs is not None:
+        # tells load_trace where to resolve the references (see xray.store)
+        items.append(("blobs", blobs.name))
+    return _Object(items)
+
+
+def iter_session_json(session, indent: Optional[int] = None, render: bool = True,
+                      backend: Optional[str] = None, blobs=None) -> Iterator[bytes]:
+    # The session as JSON, in pieces; their concatenation parses to session.to_dict(render).
+    # backend is "orjson" or "json"; by default orjson when installed. blobs (an
+    # xray.store.BlobRefs) swaps large candidate_data and reasoning values for blob references.
+    yield from _Encoder(indent, backend).encode(_session(session, render, blobs))
+
+
+def write_session_json(session, f: BinaryIO, indent: Optional[int] = None, render: bool = True,
+                       backend: Optional[str] = None, blobs=None) -> int:
+    # Write the session to a binary file object; returns the number of bytes written.
+    written, pending, size = 0, [], 0
+    for piece in iter_session_json(session, indent, render, backend, blobs):
+        pending.append(piece)
+        size += len(piece)
+        if size >= WRITE_BUFFER:
+            written += f.write(b"".join(pending))
+            pending, size = [], 0
+    if pending:
+        written += f.write(b"".join(pending))
+    return written
@@ -0,0 +1,340 @@
+# X-Ray lib - engine module
+# Declarative filter-and-rank: a pipeline lists FilterSpecs and weighted ScoreComponents instead
+# of hand-writing the filter loop, the scoring and their tracing calls.
+#
+# Two ways to filter:
+#   - explain (the default for sampled steps): every filter runs over every candidate and is
+#     recorded as one batch, so the trace shows each candidate's full set of results.
+#   - short-circuit: the filters are compiled into one pass that stops at a candidate's first
+#     failed filter, trying the cheapest and most selective filters first. Only per-filter
+#     rejection counts go into the step's metadata.
+# Selectivity is learned from earlier runs of the same engine.
+
+import operator
+import threading
+from dataclasses import dataclass
+from typing import Any, Callable, Optional, Sequence, Union
+
+from xray.columnar import threshold_expected, threshold_mask
+from xray.core import Step, current_session
+from xray.metrics import SHORT_CIRCUIT
+from xray.ranking import TopK, rank_reason
+
+
+OPS: dict[str, Callable[[Any, Any], bool]] = {
+    ">=": operator.ge,
+    ">": operator.gt,
+    "<=": operator.le,
+    "<": operator.lt,
+    "==": operator.eq,
+    "!=": operator.ne,
+    "contains": lambda value, threshold: value is not None and threshold in value,
+    "in": lambda value, threshold: value in threshold,
+}
+
+# relative per-candidate cost by op, for ordering short-circuit passes; callables default to 5
+COSTS = {"between": 1.0, ">=": 1.0, ">": 1.0, "<=": 1.0, "<": 1.0, "==": 1.0, "!=": 1.0,
+         "in": 1.5, "contains": 2.0}
+
+# Python source for one compiled condition over the candidate value v; {i} is the filter index
+_CONDITIONS = {
+    ">=": "v >= t{i}", ">": "v > t{i}", "<=": "v <= t{i}", "<": "v < t{i}", "==": "v == t{i}",
+    "!=": "v != t{i}", "contains": "v is not None and t{i} in v", "in": "v in t{i}",
+}
+
+
+@dataclass
+class FilterSpec:
+    # One filter: candidate[field] <op> threshold. op is a name from OPS, "between" (threshold is
+    # an inclusive (minimum, maximum) pair, either end may be None) or a callable(value, threshold).
+    name: str
+    field: str
+    op: Union[str, Callable[[Any, Any], bool]]
+    threshold: Any = None
+    # a render_detail() form: template, (pass, fail) pair or callable(actual, passed)
+    detail: Any = None
+    # defaults to the op and threshold, e.g. ">= 3.8"
+    expected: Any = None
+    actual_format: Optional[str] = None
+    cost: Optional[float] = None
+
+    def __post_init__(self) -> None:
+        if not callable(self.op) and self.op != "between" and self.op not in OPS:
+            raise ValueError(f"filter {self.name!r}: unknown op {self.op!r}")
+        if self.op == "between" and (not isinstance(self.threshold, (tuple, list)) or len(self.threshold) != 2):
+            raise ValueError(f"filter {self.name!r}: 'between' takes a (minimum, maximum) threshold")
+        if self.cost is None:
+            self.cost = 5.0 if callable(self.op) else COSTS[self.op]
+
+    def bounds(self) -> Optional[tuple]:
+        # (minimum, maximum) when the filter is a threshold_mask() range, else None.
+        if self.op == "between":
+            return tuple(self.threshold)
+        if self.op == ">=":
+            return self.threshold, None
+        if self.op == "<=":
+            return None, self.threshold
+        return None
+
+    def expected_value(self) -> Any:
+        if self.expected is not None:
+            return self.expected
+        bounds = self.bounds()
+        if bounds is not None:
+            return threshold_expected(*bounds)
+        return f"{getattr(self.op, '__name__', self.op)} {self.threshold}"
+
+    def mask(self, values: Sequence) -> bytearray:
+        if self.op == "between":
+            return threshold_mask(values, *self.threshold)
+        test = self.op if callable(self.op) else OPS[self.op]
+        threshold = self.threshold
+        return bytearray(bool(test(value, threshold)) for value in values)
+
+
+@dataclass
+class ScoreComponent:
+    # weight * transform(candidate[field]); transform defaults to the raw value.
+    name: str
+    field: str
+    weight: float
+    transform: Optional[Callable[[Any], float]] = None
+
+
+def record_short_circuit(step: Step, filtered: dict) -> None:
+    # Note a short-circuited filter() result on a step: the filter order and rejections in its
+    # metadata and, with metrics on, its evaluation counts. filter() does this when the recorder
+    # is the step; call it when the pass ran against a separate table (e.g. in a worker).
+    step.metadata["filters"] = {"mode": "short_circuit", "order": filtered["order"], "rejected": filtered["rejected"]}
+    # a filter only sees the candidates every earlier filter in the order let through
+    remaining = len(filtered["qualified"])
+    counts = {}
+    for name in filtered["order"]:
+        rejected = filtered["rejected"][name]
+        counts[name] = {"passed": remaining - rejected, "failed": rejected}
+        remaining -= rejected
+    step.add_counts(len(filtered["qualified"]), filtered["qualified"].count(1), counts, mode=SHORT_CIRCUIT)
+
+
+class FilterRankEngine:
+    # Filters candidates with FilterSpecs, scores the qualified ones and ranks them, tracing both.
+    #
+    # id_field names the candidate id; fields are the candidate keys stored as candidate_data
+    # (default: id_field plus every filtered and scored field). Scores are rounded to precision
+    # digits. rank_step names the nested span ranking runs in (None: no span).
+
+    def __init__(self, filters: Sequence[FilterSpec], scores: Sequence[ScoreComponent] = (),
+                 id_field: str = "id", fields: Optional[Sequence[str]] = None, precision: Optional[int] = 3,
+                 rank_step: Optional[str] = "score_and_rank"):
+        names = [spec.name for spec in filters]
+        if len(set(names)) != len(names):
+            raise ValueError("filter names must be unique")
+        self.filters = list(filters)
+        self.scores = list(scores)
+        self.id_field = id_field
+        if fields is None:
+            fields = [id_field] + [spec.field for spec in self.filters] + [score.field for score in self.scores]
+        self.fields = list(dict.fromkeys(fields))
+        self.precision = precision
+        self.rank_step = rank_step
+        # per filter: [candidates tested, candidates rejected], across runs
+        self._stats = {spec.name: [0, 0] for spec in self.filters}
+        self._lock = threading.Lock()
+        self._compiled: Optional[tuple] = None
+
+    # -- filtering --
+
+    def order(self) -> list[FilterSpec]:
+        # Short-circuit order: ascending cost / P(reject), the classic rule for independent
+        # predicates. Rejection rates start at 1/2 and follow the observed counts.
+        with self._lock:
+            stats = {name: list(counts) for name, counts in self._stats.items()}
+
+        def rank(spec: FilterSpec) -> float:
+            tested, rejected = stats[spec.name]
+            return spec.cost / ((rejected + 1) / (tested + 2))
+        return sorted(self.filters, key=rank)
+
+    def _record_stats(self, tested: dict[str, int], rejected: dict[str, int]) -> None:
+        with self._lock:
+            for name, count in tested.items():
+                self._stats[name][0] += count
+                self._stats[name][1] += rejected[name]
+
+    def _fused(self, order: list[FilterSpec]) -> Callable:
+        # One loop over the candidates with the filters inlined in order; returns the qualified
+        # mask and fills rejected[k] for the k-th filter of the order.
+        key = tuple(spec.name for spec in order)
+        compiled = self._compiled
+        if compiled is not None and compiled[0] == key:
+            return compiled[1]
+        namespace: dict[str, Any] = {}
+        lines = [
+            "def fused(candidates, rejected):",
+            "    qualified = bytearray(len(candidates))",
+            "    for row, c in enumerate(candidates):",
+        ]
+        for i, spec in enumerate(order):
+            namespace[f"f{i}"] = spec.field
+            if callable(spec.op):
+                namespace[f"op{i}"], namespace[f"t{i}"] = spec.op, spec.threshold
+                condition = f"op{i}(v, t{i})"
+            elif spec.op == "between":
+                low, high = spec.threshold
+                namespace[f"lo{i}"], namespace[f"hi{i}"] = low, high
+                parts = ([f"lo{i} <= v"] if low is not None else []) + ([f"v <= hi{i}"] if high is not None else [])
+                condition = " and ".join(parts) or "True"
+            else:
+                namespace[f"t{i}"] = spec.threshold
+                condition = _CONDITIONS[spec.op].format(i=i)
+            lines += [
+                f"        v = c.get(f{i})",
+                f"        if not ({condition}):",
+                f"            rejected[{i}] += 1",
+                "            continue",
+            ]
+        lines += ["        qualified[row] = 1", "    return qualified"]
+        exec("\n".join(lines), namespace)
+        self._compiled = (key, namespace["fused"])
+        return namespace["fused"]
+
+    def filter(self, recorder, candidates: Sequence[dict], explain: Optional[bool] = None) -> dict:
+        # Filter candidates into recorder, a Step or an EvaluationTable (e.g. an xray.parallel
+        # shard). explain defaults to whether the recorder captures values (sampled runs).
+        #
+        # Returns {"rows" (None when short-circuited), "qualified" (mask aligned with candidates),
+        # "evaluated", "passed", "rejected" ({filter: candidates it rejected})}, plus the filter
+        # "order" when short-circuited.
+        table = recorder.evaluations if isinstance(recorder, Step) else recorder
+        if isinstance(recorder, Step) and not recorder.enabled:
+            # tracing is off and nothing can be explained; only the short-circuit pass runs
+            explain = False
+        elif explain is None:
+            explain = table.capture
+        if explain:
+            result = self._explain(recorder, table, candidates)
+        else:
+            result = self._short_circuit(recorder, candidates)
+        result["evaluated"] = len(candidates)
+        result["passed"] = result["qualified"].count(1)
+        return result
+
+    def _explain(self, recorder, table, candidates: Sequence[dict]) -> dict:
+        ids = [c[self.id_field] for c in candidates]
+        columns = {name: [c.get(name) for c in candidates] for name in self.fields}
+        rows = recorder.add_candidates(ids, columns=columns)
+        rejected = {}
+        for spec in self.filters:
+            values = columns.get(spec.field)
+            if values is None:
+                values = [c.get(spec.field) for c in candidates]
+            bounds = spec.bounds()
+            if bounds is not None:
+                recorder.add_threshold_filter(
+                    spec.name, ids, values, minimum=bounds[0], maximum=bounds[1],
+                    expected=spec.expected_value(), detail=spec.detail, actual_format=spec.actual_format
+                )
+            else:
+                recorder.add_filter_batch(
+                    spec.name, ids, spec.mask(values), expected=spec.expected_value(), actual=values,
+                    detail=spec.detail, actual_format=spec.actual_format
+                )
+            passed = table.filters[table.filter_index[spec.name]].passed.count(1, rows.start, rows.stop)
+            rejected[spec.name] = len(rows) - passed
+        self._record_stats({spec.name: len(rows) for spec in self.filters}, rejected)
+        return {"rows": rows, "qualified": table.qualified[rows.start:rows.stop], "rejected": rejected}
+
+    def _short_circuit(self, recorder, candidates: Sequence[dict]) -> dict:
+        order = self.order()
+        with self._lock:
+            fused = self._fused(order)
+        counts = [0] * len(order)
+        qualified = fused(candidates, counts)
+        tested, remaining = {}, len(candidates)
+        for spec, count in zip(order, counts):
+            tested[spec.name] = remaining
+            remaining -= count
+        rejected = {spec.name: count for spec, count in zip(order, counts)}
+        self._record_stats(tested, rejected)
+        result = {"rows": None, "qualified": qualified, "rejected": rejected, "order": [spec.name for spec in order]}
+        if isinstance(recorder, Step):
+            record_short_circuit(recorder, result)
+        return result
+
+    # -- ranking --
+
+    def weights(self) -> dict[str, float]:
+        return {score.name: score.weight for score in self.scores}
+
+    def score(self, candidate: dict) -> tuple[float, dict[str, float]]:
+        # (weighted total, {component: value}), both rounded to precision.
+        total = 0
+        breakdown = {}
+        for component in self.scores:
+            value = candidate.get(component.field)
+            if component.transform is not None:
+                value = component.transform(value)
+            breakdown[component.name] = value
+            total += value * component.weight
+        if self.precision is not None:
+            total = round(total, self.precision)
+            breakdown = {name: round(value, self.precision) for name, value in breakdown.items()}
+        return total, breakdown
+
+    def rank(self, recorder, candidates: Sequence[dict], filtered: dict,
+             top_k: Optional[int] = None) -> list[tuple[dict, float]]:
+        # Score the candidates filter() qualified and return the best top_k (all when None) as
+        # (candidate, score), best first; equal scores keep candidate order. Recorded rows get
+        # score, score_breakdown and, in the top k, their rank. With top_k, every scored row also
+        # gets the k-th score as cutoff, and the rest a rank_reason. On a Step inside a session
+        # this runs in a nested rank_step span.
+        session = current_session() if isinstance(recorder, Step) and self.rank_step else None
+        if session is None:
+            return self._rank(recorder, candidates, filtered, top_k)[0]
+        with session.step(self.rank_step, step_type="rank") as span:
+            span.set_input({"qualified_count": filtered["qualified"].count(1), "weights": self.weights(),
+                            "top_k": top_k})
+            ranked, top = self._rank(recorder, candidates, filtered, top_k)
+            span.set_output({
+                "ranked": top.count,
+                "cutoff": top.cutoff if top_k is not None else None,
+                "best": {self.id_field: ranked[0][0][self.id_field], "score": ranked[0][1]} if ranked else None
+            })
+        return ranked
+
+    def _rank(self, recorder, candidates: Sequence[dict], filtered: dict, top_k: Optional[int]) -> tuple:
+        table = recorder.evaluations if isinstance(recorder, Step) else recorder
+        rows = filtered["rows"] if table.capture else None
+        qualified = filtered["qualified"]
+        top = TopK(top_k if top_k is not None else max(1, qualified.count(1)))
+        for i, candidate in enumerate(candidates):
+            if not qualified[i]:
+                continue
+            score, breakdown = self.score(candidate)
+            if rows is not None:
+                table.set_metadata(rows[i], {"score": score, "score_breakdown": breakdown})
+            top.push(score, i)
+
+        ranked = top.ranked()
+        if rows is not None:
+            cutoff = {"cutoff": top.cutoff} if top_k is not None else {}
+            for rank, (i, _) in enumerate(ranked, 1):
+                table.set_metadata(rows[i], {**table.metadata(rows[i]), "rank": rank, **cutoff})
+            if top.cutoff is not None and top.count > top.k:
+                # a second pass over the recorded rows explains the qualified candidates left out
+                selected = {i for i, _ in ranked}
+                for i in range(len(candidates)):
+                    if qualified[i] and i not in selected:
+                        metadata = table.metadata(rows[i])
+                        table.set_metadata(rows[i], {
+                            **metadata, "cutoff": top.cutoff,
+                            "rank_reason": rank_reason(metadata["score"], top.cutoff, top.k)
+                        })
+        return [(candidates[i], score) for i, score in ranked], top
+
+    def run(self, recorder, candidates: Sequence[dict], explain: Optional[bool] = None,
+            top_k: Optional[int] = None) -> dict:
+        # filter() then rank(); the filter() result plus "ranked".
+        filtered = self.filter(recorder, candidates, explain=explain)
+        filtered["ranked"] = self.rank(recorder, candidates, filtered, top_k=top_k) if self.scores else []
+        return filtered
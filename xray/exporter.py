@@ -0,0 +1,217 @@
+# X-Ray lib - exporter module
+# Background export of finished sessions, so trace serialization stays off the request path.
+
+import asyncio
+import atexit
+import logging
+import queue
+import threading
+import time
+import weakref
+from pathlib import Path
+from typing import Callable, Optional, Union
+
+from xray.serializer import save_trace
+
+logger = logging.getLogger(__name__)
+
+DROP = "drop"
+BLOCK = "block"
+
+# sentinel telling the worker thread to drain and exit
+_STOP = object()
+
+# Exporters not yet closed, and workers still draining for exporters that were garbage
+# collected. Neither set keeps an exporter alive; at exit the first are closed and the second
+# joined, so queued sessions are written before the interpreter goes.
+_open_exporters: "weakref.WeakSet[BackgroundExporter]" = weakref.WeakSet()
+_draining: set[threading.Thread] = set()
+
+
+@atexit.register
+def _drain_at_exit(timeout: float = 10.0) -> None:
+    for exporter in list(_open_exporters):
+        exporter.close(timeout)
+    for thread in list(_draining):
+        thread.join(timeout)
+
+
+def _release(work_queue: queue.Queue, thread: threading.Thread) -> None:
+    # An exporter was collected without close(): let its worker drain what is queued and exit.
+    _draining.add(thread)
+    work_queue.put(_STOP)
+
+
+def _run(exporter_ref: weakref.ref, work_queue: queue.Queue, writer: Callable[[list], None],
+         batch_size: int, flush_interval: float) -> None:
+    # The worker loop. It holds the exporter only while exporting a batch, so an exporter nobody
+    # references can still be collected.
+    while True:
+        try:
+            first = work_queue.get(timeout=flush_interval)
+        except queue.Empty:
+            continue
+        batch = [first]
+        while len(batch) < batch_size:
+            try:
+                batch.append(work_queue.get_nowait())
+            except queue.Empty:
+                break
+        stop = any(item is _STOP for item in batch)
+        items = [item for item in batch if item is not _STOP]
+        if items:
+            exporter = exporter_ref()
+            if exporter is not None:
+                exporter._export(items)
+            else:
+                try:
+                    writer([session for session, _ in items])
+                except Exception:
+                    logger.exception("exporting %d sessions failed", len(items))
+            del exporter
+        for _ in batch:
+            work_queue.task_done()
+        if stop:
+            _draining.discard(threading.current_thread())
+            return
+
+
+class DirectoryWriter:
+    # Default export target: one JSON file per session in a directory.
+
+    def __init__(self, directory: Union[str, Path] = "traces", filename: str = "{name}_{trace_id}.json"):
+        self.directory = Path(directory)
+        self.filename = filename
+
+    def path_for(self, session) -> Path:
+        return self.directory / self.filename.format(name=session.name, trace_id=session.trace_id)
+
+    def __call__(self, sessions: list) -> None:
+        for session in sessions:
+            save_trace(session, self.path_for(session))
+
+
+class BackgroundExporter:
+    # Hands finished sessions to a worker thread through a bounded queue.
+    #
+    # policy="drop" discards a session when the queue is full; policy="block" waits for space
+    # (up to block_timeout). The worker writes in batches of up to batch_size sessions and the
+    # queue is drained by close(), at interpreter exit, or when the exporter is garbage collected.
+    # A failing writer is logged and counted in stats() ("failed", "last_error").
+
+    def __init__(self, writer: Optional[Callable[[list], None]] = None, max_queue: int = 1000,
+                 policy: str = DROP, batch_size: int = 32, flush_interval: float = 0.5,
+                 block_timeout: Optional[float] = None):
+        if policy not in (DROP, BLOCK):
+            raise ValueError(f"unknown queue policy {policy!r}, expected {DROP!r} or {BLOCK!r}")
+        self.writer = writer or DirectoryWriter()
+        self.policy = policy
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.block_timeout = block_timeout
+        self._queue: queue.Queue = queue.Queue(maxsize=max_queue)
+        self._lock = threading.Lock()
+        # held while checking _closed and enqueueing, so close() can't slip its sentinel in
+        # between; separate from _lock, which the worker needs while a blocking put waits on it
+        self._submit_lock = threading.Lock()
+        self._closed = False
+        self.submitted = 0
+        self.exported = 0
+        self.dropped = 0
+        self.failed = 0
+        self.batches = 0
+        self.last_error: Optional[str] = None
+        self._latency_total = 0.0
+        self._latency_max = 0.0
+        self._latency_last = 0.0
+        self._thread = threading.Thread(
+            target=_run, args=(weakref.ref(self), self._queue, self.writer, batch_size, flush_interval),
+            name="xray-exporter", daemon=True
+        )
+        self._thread.start()
+        self._finalizer = weakref.finalize(self, _release, self._queue, self._thread)
+        self._finalizer.atexit = False
+        _open_exporters.add(self)
+
+    def submit(self, session) -> bool:
+        # Queue a finished session; False if it was dropped.
+        item = (session, time.perf_counter())
+        queued = False
+        with self._submit_lock:
+            if not self._closed:
+                try:
+                    if self.policy == BLOCK:
+                        self._queue.put(item, timeout=self.block_timeout)
+                    else:
+                        self._queue.put_nowait(item)
+                    queued = True
+                except queue.Full:
+                    pass
+        if not queued:
+            with self._lock:
+                self.dropped += 1
+            return False
+        with self._lock:
+            self.submitted += 1
+        return True
+
+    async def submit_async(self, session) -> bool:
+        # Like submit(), but a blocking put waits in the default executor, not on the event loop.
+        if self.policy == DROP:
+            return self.submit(session)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self.submit, session)
+
+    def _export(self, items: list) -> None:
+        try:
+            self.writer([session for session, _ in items])
+        except Exception as exc:
+            logger.exception("exporting %d sessions failed", len(items))
+            with self._lock:
+                self.failed += len(items)
+                self.last_error = f"{type(exc).__name__}: {exc}"
+            return
+        finished = time.perf_counter()
+        with self._lock:
+            self.batches += 1
+            for _, queued_at in items:
+                latency = finished - queued_at
+                self.exported += 1
+                self._latency_total += latency
+                self._latency_last = latency
+                self._latency_max = max(self._latency_max, latency)
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        # Wait until everything queued so far has been written; False on timeout.
+        # Queue.join() with a timeout: the queue notifies all_tasks_done as batches finish.
+        done = self._queue.all_tasks_done
+        with done:
+            return done.wait_for(lambda: not self._queue.unfinished_tasks, timeout)
+
+    def close(self, timeout: Optional[float] = 10.0) -> None:
+        # Drain the queue and stop the worker. Safe to call more than once.
+        with self._submit_lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._queue.put(_STOP)
+        self._finalizer.detach()
+        _open_exporters.discard(self)
+        self._thread.join(timeout)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "queue_depth": self._queue.qsize(),
+                "submitted": self.submitted,
+                "exported": self.exported,
+                "dropped": self.dropped,
+                "failed": self.failed,
+                "batches": self.batches,
+                "last_error": self.last_error,
+                "export_latency_ms": {
+                    "last": round(self._latency_last * 1000, 3),
+                    "mean": round(self._latency_total / self.exported * 1000, 3) if self.exported else 0.0,
+                    "max": round(self._latency_max * 1000, 3)
+                }
+            }
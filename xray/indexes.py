@@ -0,0 +1,262 @@
+# X-Ray lib - indexes module
+# Per-step query indexes over stored evaluations, built in one pass as the rows are written.
+#
+#   qualified       bitmap of qualified rows
+#   failed:<name>   bitmap of rows that failed filter <name>
+#   values:<field>  float64 per row (NaN when missing) for every numeric candidate_data field,
+#                   plus "score" from metadata.score
+#   order:<field>   rows with a value, sorted ascending by it; missing:<field> the rows without one
+#   search          lowercased "candidate_id<TAB>title" per row, newline separated, with
+#                   backslash, tab and newline in the fields escaped as \\, \t and \n so the
+#                   separators stay unambiguous; search_offsets holds where each row starts
+#
+# Bitmaps are Python ints (bit i = row i), so filters combine with & and | in C and a result
+# count is int.bit_count(). Every section serializes to bytes for the binary container.
+
+from array import array
+from bisect import bisect_left, bisect_right
+from typing import Any, Optional, Sequence, Union
+
+SCORE = "score"
+ROW = "row"
+
+_NAN = float("nan")
+
+
+def _escape(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("\t", "\\t").replace("\n", "\\n")
+
+
+def _inside_escape(text: str, position: int) -> bool:
+    # Whether position falls just after the backslash of an escape (an odd run of them).
+    start = position
+    while start and text[start - 1] == "\\":
+        start -= 1
+    return (position - start) % 2 == 1
+
+
+def bitmap(rows, count: int) -> int:
+    # Bitmap with the given row numbers set.
+    bits = bytearray((count + 7) >> 3)
+    for row in rows:
+        bits[row >> 3] |= 1 << (row & 7)
+    return int.from_bytes(bits, "little")
+
+
+class StepIndexBuilder:
+    # Fed one evaluation dict at a time (the to_dict() shape); finish() returns the StepIndex.
+
+    def __init__(self):
+        self.count = 0
+        self._qualified: list[int] = []
+        self._failed: dict[str, list[int]] = {}
+        self._values: dict[str, array] = {}
+        self._search: list[str] = []
+
+    def _value(self, field: str, row: int, value: float) -> None:
+        column = self._values.get(field)
+        if column is None:
+            column = self._values[field] = array("d", [_NAN]) * row
+        elif len(column) < row:
+            column.extend([_NAN] * (row - len(column)))
+        column.append(value)
+
+    def add(self, evaluation: dict) -> None:
+        row = self.count
+        self.count += 1
+        if evaluation.get("qualified"):
+            self._qualified.append(row)
+        for result in evaluation.get("filter_results") or ():
+            if not result.get("passed"):
+                self._failed.setdefault(result.get("filter_name"), []).append(row)
+        data = evaluation.get("candidate_data") or {}
+        for field, value in data.items():
+            value_type = type(value)
+            if value_type is int or value_type is float:
+                self._value(field, row, value)
+        score = (evaluation.get("metadata") or {}).get(SCORE)
+        if (type(score) is int or type(score) is float) and SCORE not in data:
+            self._value(SCORE, row, score)
+        candidate_id = _escape(str(evaluation.get("candidate_id", "")).lower())
+        self._search.append(f"{candidate_id}\t{_escape(str(data.get('title', '')).lower())}")
+
+    def finish(self) -> "StepIndex":
+        count = self.count
+        offsets = array("I")
+        position = 0
+        for text in self._search:
+            offsets.append(position)
+            position += len(text) + 1
+        for column in self._values.values():
+            column.extend([_NAN] * (count - len(column)))
+        return StepIndex(
+            count,
+            bitmap(self._qualified, count),
+            {name: bitmap(rows, count) for name, rows in self._failed.items()},
+            self._values,
+            "\n".join(self._search),
+            offsets,
+        )
+
+
+class StepIndex:
+    # Answers filter/sort/page queries over one step's rows without touching the rows themselves.
+
+    def __init__(self, count: int, qualified: int, failed: dict[str, int], values: dict[str, array],
+                 search: str, search_offsets: array, orders: Optional[dict[str, tuple[array, array]]] = None):
+        self.count = count
+        self.qualified = qualified
+        self.failed = failed
+        self.values = values
+        self.search_text = search
+        self.search_offsets = search_offsets
+        # field -> (rows sorted by value, rows without a value)
+        self._orders = orders if orders is not None else {}
+
+    @classmethod
+    def build(cls, evaluations) -> "StepIndex":
+        builder = StepIndexBuilder()
+        for evaluation in evaluations:
+            builder.add(evaluation)
+        return builder.finish()
+
+    @property
+    def filters(self) -> list[str]:
+        return sorted(self.failed)
+
+    @property
+    def fields(self) -> list[str]:
+        return sorted(self.values)
+
+    def _order(self, field: str) -> tuple[array, array]:
+        order = self._orders.get(field)
+        if order is None:
+            values = self.values[field]
+            present = array("I", [row for row in range(self.count) if values[row] == values[row]])
+            missing = array("I", [row for row in range(self.count) if values[row] != values[row]])
+            order = self._orders[field] = (array("I", sorted(present, key=values.__getitem__)), missing)
+        return order
+
+    # -- filters, each returning a bitmap --
+
+    def range(self, field: str, low: Optional[float] = None, high: Optional[float] = None) -> int:
+        # Rows whose value for field lies in [low, high]; either bound may be None.
+        if field not in self.values:
+            raise KeyError(f"no numeric field {field!r} in this step")
+        values = self.values[field]
+        order, _ = self._order(field)
+        start = 0 if low is None else bisect_left(order, low, key=values.__getitem__)
+        end = len(order) if high is None else bisect_right(order, high, key=values.__getitem__)
+        return bitmap(order[start:end], self.count)
+
+    def search(self, text: str) -> int:
+        # Rows whose candidate_id or title contains text, case-insensitively. The needle is
+        # escaped like the fields, so it can't match across a separator; a match starting inside
+        # an escape (the "n" of an escaped newline) is skipped.
+        needle = _escape(text.lower())
+        text = self.search_text
+        offsets = self.search_offsets
+        rows = []
+        position = text.find(needle)
+        while position != -1:
+            if _inside_escape(text, position):
+                position = text.find(needle, position + 1)
+                continue
+            row = bisect_right(offsets, position) - 1
+            rows.append(row)
+            if row + 1 >= self.count:
+                break
+            position = text.find(needle, offsets[row + 1])
+        return bitmap(rows, self.count)
+
+    def select(self, qualified: Optional[bool] = None, failed: Union[str, Sequence[str], None] = None,
+               ranges: Optional[dict[str, tuple]] = None, search: Optional[str] = None) -> Optional[int]:
+        # Bitmap of rows matching every given condition, or None when nothing filters.
+        # failed matches rows that failed any of the named filters.
+        mask = None
+        if qualified is not None:
+            mask = self.qualified if qualified else self.qualified ^ ((1 << self.count) - 1)
+        if failed:
+            names = [failed] if isinstance(failed, str) else failed
+            selected = 0
+            for name in names:
+                selected |= self.failed.get(name, 0)
+            mask = selected if mask is None else mask & selected
+        for field, (low, high) in (ranges or {}).items():
+            selected = self.range(field, low, high)
+            mask = selected if mask is None else mask & selected
+        if search:
+            selected = self.search(search)
+            mask = selected if mask is None else mask & selected
+        return mask
+
+    def ordering(self, sort: str = ROW, descending: bool = False) -> Sequence[int]:
+        # Row numbers in the requested order; rows without a value for the sort field come last.
+        if sort == ROW:
+            return range(self.count - 1, -1, -1) if descending else range(self.count)
+        if sort not in self.values:
+            raise KeyError(f"cannot sort by {sort!r}; numeric fields: {', '.join(self.fields)}")
+        order, missing = self._order(sort)
+        return (order[::-1] if descending else order) + missing
+
+    def page(self, mask: Optional[int], order: Sequence[int], start: int = 0,
+             limit: int = 50) -> tuple[list[int], Optional[int]]:
+        # Up to limit matching rows from position start in order, and the position to resume at.
+        if mask is None:
+            rows = list(order[start:start + limit])
+            end = start + len(rows)
+            return rows, end if end < len(order) else None
+        bits = mask.to_bytes((self.count + 7) >> 3, "little")
+        rows = []
+        for position in range(start, len(order)):
+            row = order[position]
+            if bits[row >> 3] >> (row & 7) & 1:
+                if len(rows) == limit:
+                    return rows, position
+                rows.append(row)
+        return rows, None
+
+    # -- serialization --
+
+    def sections(self) -> dict[str, bytes]:
+        size = (self.count + 7) >> 3
+        sections = {"qualified": self.qualified.to_bytes(size, "little")}
+        for name, bits in self.failed.items():
+            sections[f"failed:{name}"] = bits.to_bytes(size, "little")
+        for field, values in self.values.items():
+            order, missing = self._order(field)
+            sections[f"values:{field}"] = values.tobytes()
+            sections[f"order:{field}"] = order.tobytes()
+            sections[f"missing:{field}"] = missing.tobytes()
+        sections["search"] = self.search_text.encode("utf-8", "surrogatepass")
+        sections["search_offsets"] = self.search_offsets.tobytes()
+        return sections
+
+    @classmethod
+    def from_sections(cls, count: int, sections: dict[str, Any]) -> "StepIndex":
+        # Inverse of sections(); values may be bytes or any buffer (an mmap slice).
+        def typed(code: str, data) -> array:
+            column = array(code)
+            column.frombytes(data)
+            return column
+
+        failed, values, orders, missing = {}, {}, {}, {}
+        for name, data in sections.items():
+            kind, _, key = name.partition(":")
+            if kind == "failed":
+                failed[key] = int.from_bytes(data, "little")
+            elif kind == "values":
+                values[key] = typed("d", data)
+            elif kind == "order":
+                orders[key] = typed("I", data)
+            elif kind == "missing":
+                missing[key] = typed("I", data)
+        return cls(
+            count,
+            int.from_bytes(sections["qualified"], "little"),
+            failed,
+            values,
+            bytes(sections["search"]).decode("utf-8", "surrogatepass"),
+            typed("I", sections["search_offsets"]),
+            {field: (orders[field], missing[field]) for field in orders},
+        )
@@ -0,0 +1,190 @@
+# X-Ray lib - live module
+# Pushes session events from a running pipeline to a TraceServer as they happen.
+#
+# Events (JSON objects, all tagged with trace_id):
+#   session      -> a session started (name, started_at, metadata)
+#   step_start   -> a step started (step_id, parent_id, name, step_type, started_at, sequence)
+#   evaluations  -> progress of a step: cumulative evaluated/qualified counts plus the latest rows;
+#                   skipped counts rows that were recorded but not sent
+#   step         -> a step finished (step dict without evaluations or children)
+#   session_end  -> the session finished (completed_at)
+#
+# Recording an evaluation only appends it to a bounded per-step buffer. A background thread
+# serializes at most rows_per_flush rows per step every flush_interval, so the cost on the
+# pipeline's threads stays flat however fast evaluations arrive. Nothing on those threads waits
+# for the server: session_end is sent by the background thread too, and close() (also run at
+# interpreter exit) sends whatever is still queued.
+
+import atexit
+import json
+import threading
+import urllib.error
+import urllib.request
+import weakref
+from collections import deque
+from typing import Any, Union
+
+# publishers not yet closed, for the exit hook (which holds no reference to them itself)
+_open_publishers: "weakref.WeakSet[LivePublisher]" = weakref.WeakSet()
+
+
+@atexit.register
+def _close_open_publishers() -> None:
+    for publisher in list(_open_publishers):
+        publisher.close()
+
+
+class _StepBuffer:
+    __slots__ = ("trace_id", "rows", "evaluated", "qualified", "pending")
+
+    def __init__(self, trace_id: str, rows_per_flush: int):
+        self.trace_id = trace_id
+        self.rows: deque = deque(maxlen=rows_per_flush)
+        self.evaluated = 0
+        self.qualified = 0
+        # rows recorded since the last flush, sent or not
+        self.pending = 0
+
+
+class LivePublisher:
+    # Batches session events for a TraceServer in this process, or one reached over HTTP.
+
+    def __init__(self, target: Union[str, Any], rows_per_flush: int = 200, flush_interval: float = 0.1,
+                 timeout: float = 2.0):
+        # target: a TraceServer, or the base URL of one such as "http://127.0.0.1:8765"
+        if isinstance(target, str):
+            self.url = target.rstrip("/") + "/api/events"
+            self._send = self._post
+        else:
+            self.url = None
+            self._send = target.publish
+        self.rows_per_flush = rows_per_flush
+        self.flush_interval = flush_interval
+        self.timeout = timeout
+        self.sent = 0
+        self.failed = 0
+        self._lock = threading.Lock()
+        self._send_lock = threading.Lock()
+        self._events: list[dict] = []
+        self._steps: dict[str, _StepBuffer] = {}
+        self._wake = threading.Event()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="xray-live", daemon=True)
+        self._thread.start()
+        _open_publishers.add(self)
+
+    # -- hooks called by XRaySession / StepContext / Step --
+
+    def session_started(self, session) -> None:
+        self._queue({"type": "session", "trace_id": session.trace_id, "name": session.name,
+                     "started_at": session.started_at, "metadata": session.metadata})
+
+    def step_started(self, session, step) -> None:
+        with self._lock:
+            self._steps[step.step_id] = _StepBuffer(session.trace_id, self.rows_per_flush)
+        self._queue({"type": "step_start", "trace_id": session.trace_id, "step_id": step.step_id,
+                     "parent_id": step.parent_id, "name": step.name, "step_type": step.step_type,
+                     "started_at": step.started_at, "sequence": step.sequence})
+
+    def evaluation(self, step, evaluation) -> None:
+        with self._lock:
+            buffer = self._steps.get(step.step_id)
+            if buffer is None:
+                return
+            buffer.rows.append(evaluation)
+            buffer.evaluated += 1
+            buffer.pending += 1
+            if evaluation.qualified:
+                buffer.qualified += 1
+
+    def step_finished(self, session, step) -> None:
+        with self._lock:
+            buffer = self._steps.pop(step.step_id, None)
+            if buffer is not None:
+                batch = self._batch(step.step_id, buffer)
+                if batch is None and len(step.evaluations):
+                    # rows recorded with the batch API only exist in the step's table
+                    batch = self._table_batch(session, step)
+                if batch is not None:
+                    self._events.append(batch)
+            record = step.to_dict(include_evaluations=False, include_children=False)
+            del record["evaluations"]
+            del record["children"]
+            self._events.append({"type": "step", "trace_id": session.trace_id, **record,
+                                 "evaluation_count": len(step.evaluations)})
+        self._wake.set()
+
+    def session_finished(self, session) -> None:
+        self._queue({"type": "session_end", "trace_id": session.trace_id,
+                     "completed_at": session.completed_at})
+
+    # -- batching --
+
+    def _queue(self, event: dict) -> None:
+        with self._lock:
+            self._events.append(event)
+        self._wake.set()
+
+    def _batch(self, step_id: str, buffer: _StepBuffer):
+        if not buffer.pending:
+            return None
+        rows = list(buffer.rows)
+        skipped = buffer.pending - len(rows)
+        buffer.rows.clear()
+        buffer.pending = 0
+        return {"type": "evaluations", "trace_id": buffer.trace_id, "step_id": step_id,
+                "evaluated": buffer.evaluated, "qualified": buffer.qualified,
+                "rows": rows, "skipped": skipped}
+
+    def _table_batch(self, session, step) -> dict:
+        table = step.evaluations
+        retention = step.metadata.get("retention")
+        rows = [table.row_dict(row) for row in range(min(len(table), self.rows_per_flush))]
+        return {"type": "evaluations", "trace_id": session.trace_id, "step_id": step.step_id,
+                "evaluated": retention["evaluated"] if retention else len(table),
+                "qualified": retention["qualified"] if retention else table.qualified.count(1),
+                "rows": rows, "skipped": len(table) - len(rows)}
+
+    def flush(self) -> None:
+        # Send everything queued so far.
+        with self._send_lock:
+            with self._lock:
+                events, self._events = self._events, []
+                for step_id, buffer in self._steps.items():
+                    batch = self._batch(step_id, buffer)
+                    if batch is not None:
+                        events.append(batch)
+            if not events:
+                return
+            # evaluations are serialized here, off the pipeline's threads
+            for event in events:
+                if event["type"] == "evaluations":
+                    event["rows"] = [row if isinstance(row, dict) else row.to_dict() for row in event["rows"]]
+            try:
+                self._send(events)
+                self.sent += len(events)
+            except (OSError, urllib.error.URLError, ValueError):
+                # a missing or restarting server must never break the pipeline
+                self.failed += len(events)
+
+    def _post(self, events: list[dict]) -> None:
+        body = "".join(json.dumps(event, separators=(",", ":"), default=str) + "\n" for event in events)
+        request = urllib.request.Request(self.url, data=body.encode("utf-8"), method="POST",
+                                         headers={"Content-Type": "application/x-ndjson"})
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            response.read()
+
+    def _run(self) -> None:
+        while not self._closed:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            self.flush()
+
+    def close(self) -> None:
+        if self._closed:
+            return
+        self._closed = True
+        _open_publishers.discard(self)
+        self._wake.set()
+        self._thread.join(self.timeout)
+        self.flush()
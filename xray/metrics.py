@@ -0,0 +1,258 @@
+# X-Ray lib - metrics module
+# Counters and latency histograms aggregated from sessions as they run, for traffic where a full
+# trace per run is too much. XRaySession(metrics=registry) feeds:
+#   - xray_session_duration_seconds{pipeline,status}       histogram
+#   - xray_step_duration_seconds{pipeline,step,status}     histogram
+#   - xray_evaluations_total / xray_qualified_total{pipeline,step}
+#   - xray_filter_results_total{pipeline,step,filter,mode,result="pass|fail"}
+#
+# The filter counts mean different things per mode, so they are kept apart by the mode label:
+#   explain        every filter ran on every candidate (recorded rows, sampled engine runs)
+#   short_circuit  the engine's unsampled pass; a filter only counts the candidates that reached
+#                  it, i.e. that every earlier filter in its order let through
+#
+# Counting works for unsampled runs too, so metrics can cover all traffic while sample_rate keeps
+# only some traces. Each evaluation adds a handful of integer increments to a per-step tally under
+# the step's own lock; batch rows and the filter engine's short-circuit pass are counted once per
+# step. The registry's lock is taken once per finished step.
+#
+#   metrics = Metrics()
+#   metrics.serve(port=9464)      # GET /metrics in the Prometheus text format
+#   metrics.snapshot()            # the same numbers as plain dicts
+
+import threading
+from bisect import bisect_left
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional, Sequence
+
+# seconds; steps range from sub-millisecond filters to multi-second LLM calls
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+EXPLAIN = "explain"
+SHORT_CIRCUIT = "short_circuit"
+
+
+class StepTally:
+    # Evaluation counts for one running step. Step updates it under its lock; Metrics reads it
+    # once the step has finished.
+
+    __slots__ = ("evaluated", "qualified", "filters", "reached", "rows")
+
+    def __init__(self):
+        self.evaluated = 0
+        self.qualified = 0
+        # filter -> [passed, failed], for the explain and short_circuit modes
+        self.filters: dict[str, list[int]] = {}
+        self.reached: dict[str, list[int]] = {}
+        # (start, stop) row ranges recorded through the batch API, counted from the table at exit
+        self.rows: set[tuple[int, int]] = set()
+
+    def add(self, evaluation) -> None:
+        self.evaluated += 1
+        if evaluation.qualified:
+            self.qualified += 1
+        filters = self.filters
+        for result in evaluation.filter_results:
+            counts = filters.get(result.filter_name)
+            if counts is None:
+                counts = filters[result.filter_name] = [0, 0]
+            counts[0 if result.passed else 1] += 1
+
+    def add_counts(self, evaluated: int, qualified: int, filters: dict[str, dict[str, int]],
+                   mode: str = EXPLAIN) -> None:
+        # filters as EvaluationTable.filter_counts() returns them: {filter: {"passed", "failed"}}
+        self.evaluated += evaluated
+        self.qualified += qualified
+        tally = self.reached if mode == SHORT_CIRCUIT else self.filters
+        for name, result in filters.items():
+            if result["passed"] or result["failed"]:
+                counts = tally.setdefault(name, [0, 0])
+                counts[0] += result["passed"]
+                counts[1] += result["failed"]
+
+    def count_rows(self, table) -> None:
+        # Fold the batch rows of the step's EvaluationTable in; call before the table is dropped.
+        for start, stop in sorted(self.rows):
+            self.add_counts(stop - start, table.qualified.count(1, start, stop), table.filter_counts(start, stop))
+        self.rows.clear()
+
+
+class Histogram:
+    __slots__ = ("buckets", "counts", "sum")
+
+    def __init__(self, buckets: Sequence[float]):
+        self.buckets = buckets
+        # one count per bucket plus +Inf, not cumulative
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+    def snapshot(self) -> dict:
+        cumulative, total = {}, 0
+        for bound, count in zip((*self.buckets, float("inf")), self.counts):
+            total += count
+            cumulative[bound] = total
+        return {"count": total, "sum_s": self.sum, "buckets": cumulative}
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(**labels) -> str:
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels.items()) + "}"
+
+
+def _bound(value: float) -> str:
+    return "+Inf" if value == float("inf") else repr(value)
+
+
+class Metrics:
+    # In-process registry for XRaySession(metrics=...). Thread-safe; one per process is typical.
+
+    def __init__(self, buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self._lock = threading.Lock()
+        self._sessions: dict[tuple[str, str], Histogram] = {}
+        self._steps: dict[tuple[str, str, str], Histogram] = {}
+        # (pipeline, step) -> [evaluated, qualified]
+        self._evaluations: dict[tuple[str, str], list[int]] = {}
+        # (pipeline, step, filter, mode) -> [passed, failed]
+        self._filters: dict[tuple[str, str, str, str], list[int]] = {}
+        self._server: Optional[ThreadingHTTPServer] = None
+
+    # -- recording --
+
+    def _histogram(self, series: dict, key: tuple) -> Histogram:
+        histogram = series.get(key)
+        if histogram is None:
+            histogram = series[key] = Histogram(self.buckets)
+        return histogram
+
+    def record_step(self, pipeline: str, step) -> None:
+        # A finished step: its duration by status, and its tally if it has one.
+        duration = step.duration_ns
+        tally = step._tally
+        with self._lock:
+            if duration is not None:
+                self._histogram(self._steps, (pipeline, step.name, step.status.value)).observe(duration / 1e9)
+            if tally is None or not (tally.evaluated or tally.filters or tally.reached):
+                return
+            counts = self._evaluations.setdefault((pipeline, step.name), [0, 0])
+            counts[0] += tally.evaluated
+            counts[1] += tally.qualified
+            for mode, filters in ((EXPLAIN, tally.filters), (SHORT_CIRCUIT, tally.reached)):
+                for name, (passed, failed) in filters.items():
+                    counts = self._filters.setdefault((pipeline, step.name, name, mode), [0, 0])
+                    counts[0] += passed
+                    counts[1] += failed
+
+    def record_session(self, pipeline: str, seconds: float, failed: bool) -> None:
+        with self._lock:
+            self._histogram(self._sessions, (pipeline, "failed" if failed else "completed")).observe(seconds)
+
+    def reset(self) -> None:
+        with self._lock:
+            self._sessions.clear()
+            self._steps.clear()
+            self._evaluations.clear()
+            self._filters.clear()
+
+    # -- reading --
+
+    def snapshot(self) -> dict:
+        # Every series as plain dicts; histogram buckets are cumulative, keyed by upper bound.
+        with self._lock:
+            return {
+                "sessions": [
+                    {"pipeline": pipeline, "status": status, **histogram.snapshot()}
+                    for (pipeline, status), histogram in self._sessions.items()
+                ],
+                "steps": [
+                    {"pipeline": pipeline, "step": step, "status": status, **histogram.snapshot()}
+                    for (pipeline, step, status), histogram in self._steps.items()
+                ],
+                "evaluations": [
+                    {"pipeline": pipeline, "step": step, "evaluated": evaluated, "qualified": qualified}
+                    for (pipeline, step), (evaluated, qualified) in self._evaluations.items()
+                ],
+                "filters": [
+                    {"pipeline": pipeline, "step": step, "filter": name, "mode": mode,
+                     "passed": passed, "failed": failed}
+                    for (pipeline, step, name, mode), (passed, failed) in self._filters.items()
+                ],
+            }
+
+    def render(self) -> str:
+        # The Prometheus text exposition format (version 0.0.4).
+        snapshot = self.snapshot()
+        lines = []
+
+        def histogram(name: str, help_text: str, rows: list[dict], labels: tuple[str, ...]) -> None:
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} histogram")
+            for row in rows:
+                values = {label: row[label] for label in labels}
+                for bound, count in row["buckets"].items():
+                    lines.append(f"{name}_bucket{_labels(**values, le=_bound(bound))} {count}")
+                lines.append(f"{name}_sum{_labels(**values)} {row['sum_s']!r}")
+                lines.append(f"{name}_count{_labels(**values)} {row['count']}")
+
+        def counter(name: str, help_text: str, samples: list[tuple[dict, int]]) -> None:
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} counter")
+            for labels, value in samples:
+                lines.append(f"{name}{_labels(**labels)} {value}")
+
+        histogram("xray_session_duration_seconds", "Wall time of X-Ray sessions.",
+                  snapshot["sessions"], ("pipeline", "status"))
+        histogram("xray_step_duration_seconds", "Wall time of X-Ray steps.",
+                  snapshot["steps"], ("pipeline", "step", "status"))
+        counter("xray_evaluations_total", "Candidates evaluated by a step.",
+                [({"pipeline": row["pipeline"], "step": row["step"]}, row["evaluated"]) for row in snapshot["evaluations"]])
+        counter("xray_qualified_total", "Candidates that passed every filter of a step.",
+                [({"pipeline": row["pipeline"], "step": row["step"]}, row["qualified"]) for row in snapshot["evaluations"]])
+        counter("xray_filter_results_total",
+                "Filter outcomes; mode=short_circuit counts only the candidates that reached the filter.",
+                [({"pipeline": row["pipeline"], "step": row["step"], "filter": row["filter"], "mode": row["mode"],
+                   "result": result}, row[key])
+                 for row in snapshot["filters"] for result, key in (("pass", "passed"), ("fail", "failed"))])
+        return "\n".join(lines) + "\n"
+
+    # -- pull endpoint --
+
+    def serve(self, port: int = 9464, host: str = "127.0.0.1") -> str:
+        # Serve GET /metrics from a daemon thread; returns the URL. port=0 picks a free port.
+        if self._server is not None:
+            raise RuntimeError("metrics are already being served")
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self) -> None:
+                if self.path.split("?", 1)[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = metrics.render().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format: str, *args) -> None:
+                # scraped every few seconds; don't fill stderr
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, name="xray-metrics", daemon=True).start()
+        return f"http://{host}:{self._server.server_address[1]}/metrics"
+
+    def stop(self) -> None:
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
@@ -0,0 +1,105 @@
+# X-Ray lib - parallel module
+# Shards a step's candidates across a process or thread pool.
+#
+# The candidates are cut into contiguous shards. Each worker records its shard into a fresh
+# EvaluationTable with the batch API (add_candidates, add_threshold_filter, ...) and sends the
+# table back as columns: arrays, masks and interned strings, not Evaluation objects. The tables
+# are appended to the step in shard order, so rows and counts come out as in a serial run.
+
+import heapq
+import os
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Optional, Sequence, Union
+
+from xray.columnar import EvaluationTable
+
+
+def shard_ranges(count: int, shards: int) -> list[range]:
+    # count items cut into at most `shards` contiguous ranges of near-equal size.
+    shards = max(1, min(shards, count))
+    size, extra = divmod(count, shards)
+    ranges, start = [], 0
+    for i in range(shards):
+        stop = start + size + (i < extra)
+        ranges.append(range(start, stop))
+        start = stop
+    return ranges
+
+
+def _rank_key(entry: tuple) -> tuple:
+    # (row, score): higher score first, then the earlier row, whatever the sharding.
+    return entry[1], -entry[0]
+
+
+def _top_rows(table: EvaluationTable, top_k: int, score_key: str) -> list[tuple[int, float]]:
+    # The table's top_k qualified rows by metadata[score_key], as (row, score).
+    scored = (
+        (row, metadata.get(score_key)) for row, metadata in table.metadata_items() if table.qualified[row]
+    )
+    return heapq.nlargest(top_k, ((row, score) for row, score in scored
+                                  if type(score) is int or type(score) is float), key=_rank_key)
+
+
+def _record_shard(fn: Callable, candidates: Sequence, args: tuple, capture: bool, top_k: Optional[int],
+                  score_key: str, portable: bool) -> tuple:
+    table = EvaluationTable()
+    table.capture = capture
+    result = fn(table, candidates, *args)
+    table.compact()
+    top = _top_rows(table, top_k, score_key) if top_k else []
+    if portable:
+        # callables (lambdas, closures) cannot cross the process boundary; render them here
+        table.render_callables()
+    return table, result, top
+
+
+def map_candidates(step, candidates: Sequence, fn: Callable, *args: Any, workers: Optional[int] = None,
+                   executor: Union[str, Executor] = "process", shards: Optional[int] = None,
+                   top_k: Optional[int] = None, score_key: str = "score") -> dict:
+    # Run fn(table, shard, *args) for each shard of candidates and append the tables to step.
+    #
+    # fn records its shard into table with the batch API and may return a value. With a process
+    # pool, fn, args and that value must be picklable: a module-level function, not a lambda.
+    # executor is "process", "thread" or an Executor to reuse across calls; workers=1 runs
+    # inline. With top_k, the top_k qualified rows by metadata[score_key] come back as
+    # (row, score) pairs, highest first.
+    #
+    # Returns {"rows", "results" (fn's return value per shard), "evaluated", "qualified", "top"}.
+    workers = workers or os.cpu_count() or 1
+    if isinstance(executor, str) and executor not in ("process", "thread"):
+        raise ValueError(f"executor must be 'process', 'thread' or an Executor, not {executor!r}")
+    capture = step.evaluations.capture
+    ranges = shard_ranges(len(candidates), shards or workers)
+
+    if workers == 1 and isinstance(executor, str):
+        outputs = [_record_shard(fn, candidates[r.start:r.stop], args, capture, top_k, score_key, False)
+                   for r in ranges]
+    else:
+        pool = executor
+        if executor == "process":
+            pool = ProcessPoolExecutor(workers)
+        elif executor == "thread":
+            pool = ThreadPoolExecutor(workers)
+        portable = not isinstance(pool, ThreadPoolExecutor)
+        try:
+            futures = [pool.submit(_record_shard, fn, candidates[r.start:r.stop], args, capture, top_k,
+                                   score_key, portable) for r in ranges]
+            outputs = [future.result() for future in futures]
+        finally:
+            if pool is not executor:
+                pool.shutdown()
+
+    start = len(step.evaluations)
+    results, top = [], []
+    for table, result, shard_top in outputs:
+        rows = step.add_table(table)
+        results.append(result)
+        top.extend((rows.start + row, score) for row, score in shard_top)
+    rows = range(start, len(step.evaluations))
+    return {
+        "rows": rows,
+        "results": results,
+        "evaluated": len(rows),
+        "qualified": step.evaluations.qualified.count(1, rows.start, rows.stop),
+        "top": heapq.nlargest(top_k, top, key=_rank_key) if top_k else [],
+    }
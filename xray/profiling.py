@@ -0,0 +1,291 @@
+# X-Ray lib - profiling module
+# Opt-in per-step profiles, stored in step.metadata["profile"] next to the decisions they explain:
+#   - functions: top functions by cumulative time (cProfile)
+#   - stacks:    collapsed call stacks from a sampling thread ("a;b;c": samples), for flamegraphs
+#   - memory:    bytes allocated and still held, the peak, and the top allocating lines (tracemalloc)
+#   - gc:        collections, pause time and objects collected while the step ran
+#
+# Profiles cover the thread that entered the step. cProfile and tracemalloc are process-wide, so
+# a step nested in (or running concurrently with) a profiled step records only what is free, and
+# says which parts it skipped. Steps without a profiler pay nothing.
+#
+#   xray-profile TRACE                       # top functions of every profiled step
+#   xray-profile TRACE --step apply_filters_and_rank --collapsed filter.folded
+
+import argparse
+import cProfile
+import gc
+import itertools
+import os
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Optional, Union
+
+# cProfile allows one active profiler per process (sys.monitoring on 3.12+)
+_cprofile_lock = threading.Lock()
+_tracemalloc_lock = threading.Lock()
+
+
+def _label(filename: str, line: int, name: str) -> str:
+    if filename == "~":
+        return name
+    return f"{name} ({os.path.basename(filename)}:{line})"
+
+
+class StepProfiler:
+    # Profiling options for XRaySession(profile=...) or session.step(..., profile=...).
+    # every=N profiles one in N runs (sessions, or calls of that step), starting with the first.
+
+    def __init__(self, cprofile: bool = True, memory: bool = True, gc_stats: bool = True,
+                 sample_interval: Optional[float] = 0.001, top: int = 25, every: int = 1):
+        if every < 1:
+            raise ValueError("every must be at least 1")
+        self.cprofile = cprofile
+        self.memory = memory
+        self.gc_stats = gc_stats
+        self.sample_interval = sample_interval
+        self.top = top
+        self.every = every
+        self._runs = itertools.count()
+
+    def sample(self) -> bool:
+        return next(self._runs) % self.every == 0
+
+    def start(self, root_frame=None) -> "ProfileRun":
+        return ProfileRun(self, root_frame)
+
+
+class _Sampler(threading.Thread):
+    # Samples one thread's Python stack every interval seconds, from root_frame down.
+
+    def __init__(self, thread_id: int, root_frame, interval: float):
+        super().__init__(name="xray-profile-sampler", daemon=True)
+        self.thread_id = thread_id
+        self.root_frame = root_frame
+        self.interval = interval
+        self.stacks: dict[str, int] = {}
+        self.samples = 0
+        self._stop_event = threading.Event()
+
+    def run(self) -> None:
+        # a sample inside the gc callback is a collection pause
+        labels: dict = {ProfileRun._on_gc.__code__: "[gc]"}
+        while not self._stop_event.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                label = labels.get(code)
+                if label is None:
+                    label = labels[code] = _label(code.co_filename, code.co_firstlineno, code.co_name)
+                stack.append(label)
+                if frame is self.root_frame:
+                    break
+                frame = frame.f_back
+            else:
+                # the step's frame is not on the stack: in asyncio code, another task is running
+                if self.root_frame is not None:
+                    continue
+            key = ";".join(reversed(stack))
+            self.stacks[key] = self.stacks.get(key, 0) + 1
+            self.samples += 1
+
+    def stop(self) -> None:
+        self._stop_event.set()
+        self.join()
+
+
+class ProfileRun:
+    # One profiled step, from start() to stop().
+
+    def __init__(self, options: StepProfiler, root_frame=None):
+        self.options = options
+        self.skipped: list[str] = []
+        self._profile = None
+        self._sampler = None
+        self._owns_tracemalloc = False
+        self._memory = False
+        self._gc = {"collections": 0, "by_generation": [0, 0, 0], "pause_ns": 0, "max_pause_ns": 0, "collected": 0}
+        self._gc_started = 0
+        self._started = time.perf_counter_ns()
+
+        if options.gc_stats:
+            gc.callbacks.append(self._on_gc)
+        if options.memory:
+            if _tracemalloc_lock.acquire(blocking=False):
+                self._memory = True
+                self._owns_tracemalloc = not tracemalloc.is_tracing()
+                if self._owns_tracemalloc:
+                    tracemalloc.start()
+                else:
+                    tracemalloc.reset_peak()
+                self._memory_start = tracemalloc.get_traced_memory()[0]
+            else:
+                self.skipped.append("memory")
+        if options.sample_interval:
+            self._sampler = _Sampler(threading.get_ident(), root_frame, options.sample_interval)
+            self._sampler.start()
+        if options.cprofile:
+            if _cprofile_lock.acquire(blocking=False):
+                self._profile = cProfile.Profile()
+                try:
+                    self._profile.enable()
+                except ValueError:
+                    # another profiler (a debugger, coverage) is already active
+                    self._profile = None
+                    _cprofile_lock.release()
+                    self.skipped.append("functions")
+            else:
+                self.skipped.append("functions")
+
+    def _on_gc(self, phase: str, info: dict) -> None:
+        if phase == "start":
+            self._gc_started = time.perf_counter_ns()
+            return
+        pause = time.perf_counter_ns() - self._gc_started
+        stats = self._gc
+        stats["collections"] += 1
+        stats["by_generation"][info["generation"]] += 1
+        stats["pause_ns"] += pause
+        stats["max_pause_ns"] = max(stats["max_pause_ns"], pause)
+        stats["collected"] += info["collected"]
+
+    def stop(self) -> dict:
+        # Stop every hook and return the profile summary.
+        summary: dict = {"wall_ms": round((time.perf_counter_ns() - self._started) / 1e6, 3)}
+        if self._profile is not None:
+            self._profile.disable()
+        if self._sampler is not None:
+            self._sampler.stop()
+        # memory first, before building the summary allocates anything
+        memory = self._memory_summary() if self._memory else None
+        if self._profile is not None:
+            # the step's exit (the caller) ran under the profiler too; it is not the step's work
+            summary["functions"] = self._functions(sys._getframe(1).f_code)
+            _cprofile_lock.release()
+        if self._sampler is not None:
+            summary["sample_interval_ms"] = self.options.sample_interval * 1e3
+            summary["samples"] = self._sampler.samples
+            summary["stacks"] = self._sampler.stacks
+        if memory is not None:
+            summary["memory"] = memory
+        if self.options.gc_stats:
+            gc.callbacks.remove(self._on_gc)
+            stats = self._gc
+            summary["gc"] = {
+                "collections": stats["collections"],
+                "by_generation": stats["by_generation"],
+                "pause_ms": round(stats["pause_ns"] / 1e6, 3),
+                "max_pause_ms": round(stats["max_pause_ns"] / 1e6, 3),
+                "collected": stats["collected"],
+            }
+        if self.skipped:
+            summary["skipped"] = self.skipped
+        return summary
+
+    def _functions(self, exit_code) -> list[dict]:
+        stats = pstats.Stats(self._profile).stats
+        rows = []
+        for (filename, line, name), (primitive, calls, tottime, cumtime, _) in stats.items():
+            if filename == __file__ or name == "<method 'disable' of '_lsprof.Profiler' objects>":
+                continue
+            if (filename, line, name) == (exit_code.co_filename, exit_code.co_firstlineno, exit_code.co_name):
+                continue
+            rows.append({
+                "function": _label(filename, line, name),
+                "calls": calls,
+                "primitive_calls": primitive,
+                "tottime_ms": round(tottime * 1e3, 3),
+                "cumtime_ms": round(cumtime * 1e3, 3),
+            })
+        rows.sort(key=lambda row: row["cumtime_ms"], reverse=True)
+        return rows[:self.options.top]
+
+    def _memory_summary(self) -> dict:
+        current, peak = tracemalloc.get_traced_memory()
+        top = []
+        if self._owns_tracemalloc:
+            # everything traced was allocated during the step; what is left is still held
+            snapshot = tracemalloc.take_snapshot().filter_traces(
+                [tracemalloc.Filter(False, module.__file__) for module in (cProfile, threading, sys.modules[__name__])]
+            )
+            tracemalloc.stop()
+            for stat in snapshot.statistics("lineno")[:10]:
+                frame = stat.traceback[0]
+                top.append({"line": f"{os.path.basename(frame.filename)}:{frame.lineno}",
+                            "size_kb": round(stat.size / 1024, 1), "count": stat.count})
+        _tracemalloc_lock.release()
+        return {
+            "held_kb": round((current - self._memory_start) / 1024, 1),
+            "peak_kb": round((peak - self._memory_start) / 1024, 1),
+            "top": top,
+        }
+
+
+# -- reading profiles back --
+
+def profiled_steps(trace: dict, step: Optional[str] = None) -> list[dict]:
+    # Steps of a loaded trace that have a profile, optionally only those named step.
+    from xray.serializer import iter_steps
+    return [s for s in iter_steps(trace)
+            if (s.get("metadata") or {}).get("profile") and (step is None or s["name"] == step)]
+
+
+def collapsed_stacks(trace: dict, step: Optional[str] = None) -> list[str]:
+    # Collapsed-stack lines ("step;frame;frame count") for flamegraph.pl, speedscope or inferno.
+    lines = []
+    for s in profiled_steps(trace, step):
+        prefix = s["name"].replace(";", ":")
+        for stack, count in s["metadata"]["profile"].get("stacks", {}).items():
+            lines.append(f"{prefix};{stack} {count}")
+    return lines
+
+
+def write_collapsed(trace: dict, path: Union[str, Path], step: Optional[str] = None) -> int:
+    lines = collapsed_stacks(trace, step)
+    Path(path).write_text("".join(line + "\n" for line in lines))
+    return len(lines)
+
+
+def main(argv: Optional[list[str]] = None) -> None:
+    from xray.serializer import load_trace
+
+    parser = argparse.ArgumentParser(prog="xray-profile", description="Show or export step profiles from a trace.")
+    parser.add_argument("trace", help="trace file")
+    parser.add_argument("--step", help="only steps with this name")
+    parser.add_argument("--collapsed", metavar="PATH", help="write collapsed stacks for a flamegraph tool")
+    parser.add_argument("--top", type=int, default=15, help="functions to list per step")
+    args = parser.parse_args(argv)
+
+    trace = load_trace(args.trace)
+    steps = profiled_steps(trace, args.step)
+    if not steps:
+        print("no profiled steps in this trace", file=sys.stderr)
+        sys.exit(1)
+    if args.collapsed:
+        count = write_collapsed(trace, args.collapsed, args.step)
+        print(f"{count} stacks written to {args.collapsed}")
+        return
+    for s in steps:
+        profile = s["metadata"]["profile"]
+        print(f"{s['name']}: {profile['wall_ms']:.1f} ms")
+        if "gc" in profile:
+            gc_stats = profile["gc"]
+            print(f"  gc: {gc_stats['collections']} collections, {gc_stats['pause_ms']:.1f} ms paused, "
+                  f"{gc_stats['collected']} objects collected")
+        if "memory" in profile:
+            print(f"  memory: {profile['memory']['peak_kb']:.0f} KB peak, {profile['memory']['held_kb']:.0f} KB held")
+        functions = profile.get("functions", [])[:args.top]
+        if functions:
+            print(f"  {'cumulative ms':>13} {'own ms':>9} {'calls':>9}  function")
+            for row in functions:
+                print(f"  {row['cumtime_ms']:>13.2f} {row['tottime_ms']:>9.2f} {row['calls']:>9}  {row['function']}")
+        print()
+
+
+if __name__ == "__main__":
+    main()
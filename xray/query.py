@@ -0,0 +1,162 @@
+# X-Ray lib - query module
+# Filtered, sorted, paginated evaluation queries over a stored trace.
+#
+# Binary traces carry per-step indexes written at save time (see xray.indexes) and decode only
+# the rows of the requested page. JSON and NDJSON traces are loaded once and indexed per step on
+# first query: their rows have to be parsed to serve a page anyway, so an index stored beside
+# them would only save the pass over rows already in memory.
+
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional, Sequence, Union
+
+from xray.binary import BinaryTrace, is_binary_trace
+from xray.indexes import ROW, StepIndex
+from xray.serializer import iter_steps, load_trace
+
+
+class TraceQuery:
+    # Query interface over one trace file.
+
+    def __init__(self, filepath: Union[str, Path]):
+        self.filepath = Path(filepath)
+        self._binary: Optional[BinaryTrace] = None
+        self._trace: Optional[dict] = None
+        if is_binary_trace(self.filepath):
+            self._binary = BinaryTrace(self.filepath)
+            self._steps = self._binary.steps()
+        else:
+            self._trace = load_trace(self.filepath)
+            self._steps = list(iter_steps(self._trace))
+        self._indexes: dict[int, StepIndex] = {}
+        self._lock = threading.Lock()
+
+    def __enter__(self) -> "TraceQuery":
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.close()
+
+    def close(self) -> None:
+        if self._binary is not None:
+            self._binary.close()
+
+    def _position(self, key: Union[int, str]) -> int:
+        # By position (depth first), by step_id or by name (first match).
+        if isinstance(key, int):
+            if not -len(self._steps) <= key < len(self._steps):
+                raise KeyError(key)
+            return key % len(self._steps)
+        for position, step in enumerate(self._steps):
+            info = step.info if self._binary is not None else step
+            if info.get("step_id") == key or info.get("name") == key:
+                return position
+        raise KeyError(key)
+
+    def _rows(self, position: int):
+        step = self._steps[position]
+        return step if self._binary is not None else step.get("evaluations", [])
+
+    def index(self, key: Union[int, str]) -> StepIndex:
+        position = self._position(key)
+        with self._lock:
+            index = self._indexes.get(position)
+            if index is None:
+                if self._binary is not None:
+                    index = self._steps[position].index()
+                if index is None:
+                    index = StepIndex.build(self._rows(position))
+                self._indexes[position] = index
+        return index
+
+    def outline(self) -> dict:
+        # The trace without evaluations; each step gets evaluation_count plus the filter names and
+        # numeric fields its evaluations can be queried by.
+        trace = self._binary.header if self._binary is not None else {
+            k: v for k, v in self._trace.items() if k != "steps"
+        }
+        entries = {}
+        for position, step in enumerate(self._steps):
+            info = dict(step.info) if self._binary is not None else {
+                k: v for k, v in step.items() if k not in ("evaluations", "children")
+            }
+            index = self.index(position)
+            info["evaluations"] = []
+            info["evaluation_count"] = index.count
+            info["query"] = {"filters": index.filters, "fields": index.fields}
+            entries[position] = info
+        # rebuild the tree from parent_id, as iter_steps flattened it depth first
+        by_id = {info.get("step_id"): info for info in entries.values()}
+        trace["steps"] = []
+        for info in entries.values():
+            parent = by_id.get(info.get("parent_id")) if info.get("parent_id") else None
+            if parent is not None:
+                parent.setdefault("children", []).append(info)
+            else:
+                trace["steps"].append(info)
+        return trace
+
+    def evaluations(self, step: Union[int, str], qualified: Optional[bool] = None,
+                    failed: Union[str, Sequence[str], None] = None, ranges: Optional[dict[str, tuple]] = None,
+                    search: Optional[str] = None, sort: str = ROW, descending: Optional[bool] = None,
+                    cursor: Optional[str] = None, limit: int = 50) -> dict:
+        # One page of a step's evaluations.
+        #   qualified   True/False to keep only qualified/rejected rows
+        #   failed      filter name(s); rows that failed any of them
+        #   ranges      {field: (low, high)} over numeric candidate_data fields or "score",
+        #               inclusive, either bound may be None
+        #   search      case-insensitive substring of candidate_id or title
+        #   sort        "row" (recording order), "score" or a numeric field; descending defaults
+        #               to True for anything but "row"
+        #   cursor      next_cursor from the previous page
+        # Returns {"evaluations", "rows", "total", "next_cursor"}; rows are the row numbers.
+        position = self._position(step)
+        index = self.index(position)
+        if descending is None:
+            descending = sort != ROW
+        try:
+            start = int(cursor) if cursor else 0
+        except ValueError:
+            raise ValueError(f"invalid cursor {cursor!r}") from None
+        if start < 0 or limit < 1:
+            raise ValueError("cursor and limit must be positive")
+        mask = index.select(qualified=qualified, failed=failed, ranges=ranges, search=search)
+        rows, resume = index.page(mask, index.ordering(sort, descending), start, limit)
+        source = self._rows(position)
+        return {
+            "evaluations": [source[row] for row in rows],
+            "rows": rows,
+            "total": index.count if mask is None else mask.bit_count(),
+            "next_cursor": None if resume is None else str(resume),
+        }
+
+
+# open TraceQuery objects kept by query_for(), least recently used first; a JSON or NDJSON trace
+# is held in memory whole while it is open, so a long-running server keeps only a few
+MAX_OPEN_QUERIES = 8
+
+_queries: "OrderedDict[tuple[Path, int, int], TraceQuery]" = OrderedDict()
+_queries_lock = threading.Lock()
+
+
+def query_for(filepath: Union[str, Path]) -> TraceQuery:
+    # A per-process TraceQuery for a trace file, reopened when the file changes. At most
+    # MAX_OPEN_QUERIES stay open; the least recently used one is closed to make room.
+    filepath = Path(filepath).absolute()
+    stat = filepath.stat()
+    key = (filepath, stat.st_mtime_ns, stat.st_size)
+    with _queries_lock:
+        query = _queries.get(key)
+        if query is not None:
+            _queries.move_to_end(key)
+            return query
+    query = TraceQuery(filepath)
+    with _queries_lock:
+        closed = [_queries.pop(cached) for cached in list(_queries) if cached[0] == filepath]
+        _queries[key] = query
+        while len(_queries) > MAX_OPEN_QUERIES:
+            closed.append(_queries.popitem(last=False)[1])
+    for previous in closed:
+        previous.close()
+    return query
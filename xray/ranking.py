@@ -0,0 +1,44 @@
+# X-Ray lib - ranking module
+# Streaming top-K: a bounded heap of the best candidates instead of collecting and sorting every
+# qualified one, so ranking n candidates takes O(n log k) time and O(k) memory.
+
+import heapq
+from typing import Any, Optional
+
+
+class TopK:
+    # The k highest-scoring items pushed so far. On equal scores the earlier push ranks higher.
+
+    def __init__(self, k: int):
+        if k < 1:
+            raise ValueError("k must be at least 1")
+        self.k = k
+        self.count = 0
+        # min-heap of (score, -push order, item): the root is the entry the next better push evicts
+        self._heap: list[tuple] = []
+
+    def push(self, score: float, item: Any) -> None:
+        entry = (score, -self.count, item)
+        self.count += 1
+        heap = self._heap
+        if len(heap) < self.k:
+            heapq.heappush(heap, entry)
+        # a later push never wins a tie, so only a strictly higher score gets in
+        elif score > heap[0][0]:
+            heapq.heapreplace(heap, entry)
+
+    @property
+    def cutoff(self) -> Optional[float]:
+        # The k-th best score, once k items have been pushed; a score must beat it to get in.
+        return self._heap[0][0] if len(self._heap) == self.k else None
+
+    def ranked(self) -> list[tuple[Any, float]]:
+        # (item, score), best first.
+        return [(item, score) for score, _, item in sorted(self._heap, reverse=True)]
+
+
+def rank_reason(score: float, cutoff: float, k: int) -> str:
+    # Why a qualified candidate with this score is not in the top k.
+    if score < cutoff:
+        return f"not in top {k}: score {score} < cutoff {cutoff}"
+    return f"not in top {k}: score {score} ties cutoff {cutoff}, ranked after earlier candidates"
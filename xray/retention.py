@@ -0,0 +1,205 @@
+# X-Ray lib - retention module
+# Evaluation retention policies, so tracing cost scales with the interesting candidates.
+#
+# A policy keeps every qualified candidate, a uniform reservoir sample of N rejects per failing
+# filter and the top-K candidates by metadata score. Exact per-filter pass/fail counters are kept
+# for every candidate, and the step's metadata["retention"] records what was sampled.
+
+import heapq
+import random
+from collections import Counter
+from typing import Any, Optional
+
+
+class RetentionPolicy:
+    # Configuration for which evaluations a step keeps.
+
+    def __init__(self, keep_qualified: bool = True, rejects_per_filter: int = 50, top_k: int = 10,
+                 score_key: str = "score", seed: Optional[int] = None):
+        self.keep_qualified = keep_qualified
+        self.rejects_per_filter = rejects_per_filter
+        self.top_k = top_k
+        self.score_key = score_key
+        self.seed = seed
+
+    def start(self) -> "RetentionState":
+        return RetentionState(self)
+
+    def to_dict(self) -> dict:
+        return {
+            "keep_qualified": self.keep_qualified,
+            "rejects_per_filter": self.rejects_per_filter,
+            "top_k": self.top_k,
+            "score_key": self.score_key
+        }
+
+
+class RetentionState:
+    # Per-step bookkeeping for a RetentionPolicy.
+    #
+    # Candidates offered one at a time are either kept straight away (qualified) or held back
+    # while they sit in a reservoir or the top-K heap. Rows recorded with the batch API are
+    # sampled from their masks when the step finishes. Items are ("e", seq) for held-back
+    # evaluations and ("r", row) for batch rows of the step's table.
+
+    def __init__(self, policy: RetentionPolicy):
+        self.policy = policy
+        self.rng = random.Random(policy.seed)
+        self.evaluated = 0
+        self.qualified = 0
+        self.kept_directly = 0
+        self.counts: dict[str, list[int]] = {}
+        self.reservoirs: dict[str, list] = {}
+        self.top: list[tuple] = []
+        self.held: dict[int, Any] = {}
+        self.refs: Counter = Counter()
+
+    def offer(self, evaluation) -> bool:
+        # True when the evaluation should be recorded now; otherwise it is dropped or held
+        # back until finish().
+        seq = self.evaluated
+        self.evaluated += 1
+        failed = []
+        for result in evaluation.filter_results:
+            counts = self.counts.setdefault(result.filter_name, [0, 0])
+            if result.passed:
+                counts[0] += 1
+            else:
+                counts[1] += 1
+                failed.append(result.filter_name)
+
+        if evaluation.qualified:
+            self.qualified += 1
+            if self.policy.keep_qualified:
+                self.kept_directly += 1
+                return True
+
+        item = ("e", seq)
+        self.held[seq] = evaluation
+        for filter_name in failed:
+            self._sample(filter_name, item)
+        self._rank(item, evaluation.metadata.get(self.policy.score_key), seq)
+        if not self.refs[item]:
+            del self.refs[item]
+            del self.held[seq]
+        return False
+
+    def _retain(self, item: tuple) -> None:
+        self.refs[item] += 1
+
+    def _release(self, item: tuple) -> None:
+        self.refs[item] -= 1
+        if self.refs[item] <= 0:
+            del self.refs[item]
+            if item[0] == "e":
+                del self.held[item[1]]
+
+    def _sample(self, filter_name: str, item: tuple) -> None:
+        # Algorithm R over the candidates failing this filter.
+        limit = self.policy.rejects_per_filter
+        if limit <= 0:
+            return
+        reservoir = self.reservoirs.setdefault(filter_name, [])
+        if len(reservoir) < limit:
+            reservoir.append(item)
+            self._retain(item)
+            return
+        slot = self.rng.randrange(self.counts[filter_name][1])
+        if slot < limit:
+            self._release(reservoir[slot])
+            reservoir[slot] = item
+            self._retain(item)
+
+    def _rank(self, item: tuple, score: Any, order: int) -> None:
+        # Min-heap of the K best scores; on ties the earlier candidate wins.
+        if self.policy.top_k <= 0 or isinstance(score, bool) or not isinstance(score, (int, float)):
+            return
+        entry = (score, -order, item)
+        if len(self.top) < self.policy.top_k:
+            heapq.heappush(self.top, entry)
+            self._retain(item)
+        elif entry > self.top[0]:
+            self._release(heapq.heapreplace(self.top, entry)[2])
+            self._retain(item)
+
+    def _offer_batch(self, table, rows: range) -> set[int]:
+        # Count and sample rows recorded with the batch API; returns rows kept unconditionally.
+        if not rows:
+            return set()
+        self.evaluated += len(rows)
+        start, stop = rows.start, rows.stop
+        # a later add_filter_batch may cover only part of the batch, so the filters recorded
+        # can change from row to row
+        for run, layout in table.filter_layout_runs(start, stop):
+            if layout is None:
+                for row in run:
+                    for result in table.filter_results(row):
+                        counts = self.counts.setdefault(result.filter_name, [0, 0])
+                        if result.passed:
+                            counts[0] += 1
+                        else:
+                            counts[1] += 1
+                            self._sample(result.filter_name, ("r", row))
+                continue
+            for index in layout:
+                column = table.filters[index]
+                mask = column.passed[run.start:run.stop]
+                counts = self.counts.setdefault(column.name, [0, 0])
+                counts[0] += mask.count(1)
+                for offset, bit in enumerate(mask):
+                    if not bit:
+                        counts[1] += 1
+                        self._sample(column.name, ("r", run.start + offset))
+
+        qualified = table.qualified[start:stop]
+        self.qualified += qualified.count(1)
+        keep = set()
+        if self.policy.keep_qualified:
+            keep = {start + offset for offset, bit in enumerate(qualified) if bit}
+        for row, metadata in table.metadata_items(start, stop):
+            if row not in keep:
+                self._rank(("r", row), metadata.get(self.policy.score_key), row)
+        return keep
+
+    def finish(self, step) -> None:
+        # Apply the policy to the step's table and record what was sampled.
+        table = step.evaluations
+        batches = table.batch_ranges()
+        if batches:
+            keep = set(range(len(table)))
+            for rows in batches:
+                keep.difference_update(rows)
+                keep.update(self._offer_batch(table, rows))
+            keep.update(row for kind, row in self.refs if kind == "r")
+            if len(keep) != len(table):
+                table = table.take(sorted(keep))
+
+        # held-back rejects follow the rows that were recorded as they arrived
+        for seq in sorted(self.held):
+            table.append(self.held[seq])
+        step.evaluations = table
+
+        retained_counts = table.filter_counts()
+        step.metadata["retention"] = {
+            "policy": self.policy.to_dict(),
+            "evaluated": self.evaluated,
+            "qualified": self.qualified,
+            "retained": len(table) + (self.kept_directly if step._sink is not None else 0),
+            "filters": {
+                name: {
+                    "passed": passed,
+                    "failed": failed,
+                    "retained_failed": retained_counts.get(name, {}).get("failed", 0)
+                }
+                for name, (passed, failed) in self.counts.items()
+            }
+        }
+
+
+def head_sample(sample_rate: float, rng: Optional[random.Random] = None) -> bool:
+    # Session-level sampling decision: trace roughly one in 1/sample_rate runs.
+    if sample_rate >= 1.0:
+        return True
+    if sample_rate <= 0.0:
+        return False
+    return (rng or random).random() < sample_rate
@@ -1,49 +1,352 @@
 # X-Ray lib - serializer module
 # Handles saving/loading traces to JSON files.
 
+import io
 import json
+import os
+import re
+import tempfile
 from pathlib import Path
-from typing import Union
+from typing import Any, BinaryIO, Iterator, Optional, Union
 
+from xray.binary import BINARY_SUFFIXES, BinaryTrace, is_binary_trace, write_binary_trace
+from xray.catalog import catalog_for, has_catalog, summarize_session
+from xray.compression import open_read, open_text, open_write, suffix_compression
+from xray.core import render_field
+from xray.encoder import write_session_json
+from xray.streaming import is_ndjson_trace, iter_trace_records, rebuild_trace, trace_to_records
 
-def save_trace(session, filepath: Union[str, Path]) -> str:
-    # Save an X-Ray session trace to a JSON file.
+try:
+    import orjson
+except ImportError:  # orjson is optional; the standard library decoder is used instead
+    orjson = None
+
+_INFER = object()
+
+
+def save_trace(session, filepath: Union[str, Path], format: Optional[str] = None, catalog: Optional[bool] = None,
+               render: bool = True, indent: Optional[int] = None, compression: Optional[str] = _INFER,
+               level: Optional[int] = None, blobs=None) -> Optional[str]:
+    # Save an X-Ray session trace to a JSON file, compact unless indent is given. The JSON is
+    # streamed from the session (see xray.encoder) rather than built as one dict first.
+    # format="binary" (or a .xrb suffix) writes the memory-mappable container from xray.binary.
+    # render=False stores deferred filter details as per-step templates (see Step.to_dict);
+    # load_trace renders them back. The trace is also recorded in its directory's catalog if the
+    # directory has one; catalog=True creates it, catalog=False skips it.
+    # compression is "gzip", "zstd" or None, by default from a .gz/.zst suffix (see
+    # xray.compression). blobs (an xray.store.BlobStore) moves repeated values to the side store;
+    # the file is then written under a temporary name and renamed once its blobs are committed.
+    # A disabled session has nothing to save: no file is written and None is returned.
+    if not getattr(session, "enabled", True):
+        return None
     filepath = Path(filepath)
-    filepath.parent.mkdir(parents=True, exist_ok=True)
-    
-    with open(filepath, 'w') as f:
-        json.dump(session.to_dict(), f, indent=2)
-        
+    if compression is _INFER:
+        compression = suffix_compression(filepath)
+    if format == "binary" or (format is None and filepath.suffix in BINARY_SUFFIXES):
+        if compression is not None or blobs is not None:
+            raise ValueError("binary traces cannot be compressed or deduplicated")
+        write_binary_trace(session, filepath)
+    else:
+        filepath.parent.mkdir(parents=True, exist_ok=True)
+        refs = blobs.refs() if blobs is not None else None
+        target = filepath.with_name(filepath.name + ".tmp") if refs is not None else filepath
+        try:
+            with open_write(target, compression, level) as f:
+                write_session_json(session, f, indent=indent, render=render, blobs=refs)
+            if refs is not None:
+                blobs.commit(filepath.name, refs, lambda: os.replace(target, filepath))
+        except BaseException:
+            if refs is not None:
+                target.unlink(missing_ok=True)
+            raise
+
+    if catalog or (catalog is None and has_catalog(filepath.parent)):
+        catalog_for(filepath.parent).add(filepath, summarize_session(session))
     return str(filepath.absolute())
 
 
-def load_trace(filepath: Union[str, Path]) -> dict:
-    # Load an X-Ray trace from a JSON file.
-    with open(filepath, 'r') as f:
-        return json.load(f)
+def load_trace(filepath: Union[str, Path], lazy: bool = False) -> Union[dict, Iterator[dict]]:
+    # Load an X-Ray trace from a JSON or NDJSON file, gzip/zstd compressed or not.
+    # With lazy=True, returns an iterator over the trace's records instead (see xray.streaming).
+    # Binary traces are detected by their magic bytes; use open_trace() for random access.
+    # Values a TraceStore moved to its side store are put back (see xray.store).
+    if is_binary_trace(filepath):
+        if lazy:
+            return _binary_records(filepath)
+        with BinaryTrace(filepath) as trace:
+            return trace.to_dict()
+    if is_ndjson_trace(filepath):
+        records = iter_trace_records(filepath)
+        return records if lazy else rebuild_trace(records)
+    with open_read(filepath) as f:
+        data = json.load(f)
+    if isinstance(data, dict) and "blobs" in data:
+        from xray.store import resolve_blobs
+        resolve_blobs(data, Path(filepath).parent)
+    data = render_templates(data)
+    return trace_to_records(data) if lazy else data
+
+
+def open_trace(filepath: Union[str, Path]) -> BinaryTrace:
+    # Memory-map a binary trace; steps and candidates are decoded only when accessed.
+    return BinaryTrace(filepath)
+
+
+def _binary_records(filepath: Union[str, Path]) -> Iterator[dict]:
+    with BinaryTrace(filepath) as trace:
+        yield from trace.iter_records()
+
+
+def render_templates(trace: dict) -> dict:
+    # Expand {"template": i, "values": ...} filter results written with render=False, in place.
+    for step in iter_steps(trace):
+        templates = step.pop("templates", None)
+        if not templates:
+            continue
+        for evaluation in step.get("evaluations", []):
+            _render_evaluation(evaluation, templates)
+    return trace
+
+
+def _render_evaluation(evaluation: dict, templates: dict) -> None:
+    for result in evaluation.get("filter_results", []):
+        if "template" not in result:
+            continue
+        values = result.pop("values")
+        template = templates[result["filter_name"]][result.pop("template")]
+        result["detail"], result["expected"], result["actual"] = (
+            render_field(field, values) for field in template
+        )
+
+
+class _JSONStream:
+    # Reads one JSON document a value at a time: objects and arrays are walked with items() and
+    # elements(), and value() decodes the next value whole, so only that value is in memory.
+
+    CHUNK = 1 << 20
+
+    def __init__(self, f: io.TextIOBase):
+        self.f = f
+        self.buffer = ""
+        self.position = 0
+        # where the last value read by value() starts
+        self.start = 0
+        self.eof = False
+        self.decoder = json.JSONDecoder()
+
+    def _fill(self) -> bool:
+        # read at least as much again as is buffered, so a large value takes few retries
+        chunk = self.f.read(max(self.CHUNK, len(self.buffer) - self.position))
+        if not chunk:
+            self.eof = True
+            return False
+        self.buffer = self.buffer[self.position:] + chunk
+        self.position = 0
+        return True
+
+    def peek(self) -> str:
+        while True:
+            self.position = _WHITESPACE.match(self.buffer, self.position).end()
+            if self.position < len(self.buffer):
+                return self.buffer[self.position]
+            if not self._fill():
+                raise ValueError("JSON trace ends early")
+
+    def take(self, char: str) -> None:
+        if self.peek() != char:
+            raise ValueError(f"expected {char!r} in JSON trace, found {self.buffer[self.position]!r}")
+        self.position += 1
+
+    def value(self) -> Any:
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.position)
+            except json.JSONDecodeError:
+                if not self._fill():
+                    raise
+                continue
+            # a number at the end of the buffer may continue in the next chunk
+            if end == len(self.buffer) and not self.eof and self._fill():
+                continue
+            self.start, self.position = self.position, end
+            return value
 
+    def raw(self) -> str:
+        # The next value's JSON text, on one line.
+        self.value()
+        text = self.buffer[self.start:self.position]
+        # newlines can only be indentation: JSON strings escape them
+        return text.replace("\n", " ") if "\n" in text else text
 
-def list_traces(directory: Union[str, Path]) -> list[dict]:
-    # List all trace files in a directory with basic metadata.
+    def items(self) -> Iterator[str]:
+        # Yields each key of an object; the caller reads its value before resuming.
+        self.take("{")
+        if self.peek() == "}":
+            self.position += 1
+            return
+        while True:
+            key = self.value()
+            self.take(":")
+            yield key
+            if self.peek() == ",":
+                self.position += 1
+                continue
+            self.take("}")
+            return
+
+    def elements(self) -> Iterator[None]:
+        # Yields once per element of an array; the caller reads the element before resuming.
+        self.take("[")
+        if self.peek() == "]":
+            self.position += 1
+            return
+        while True:
+            yield
+            if self.peek() == ",":
+                self.position += 1
+                continue
+            self.take("]")
+            return
+
+
+_WHITESPACE = re.compile(r"[ \t\n\r]*")
+
+
+def _loads(line: bytes) -> Any:
+    if orjson is not None:
+        try:
+            return orjson.loads(line)
+        except orjson.JSONDecodeError:
+            # NaN and Infinity, which the standard library encoder writes
+            pass
+    return json.loads(line)
+
+
+class _SpilledStep:
+    __slots__ = ("fields", "templates", "offset", "count", "children")
+
+    def __init__(self):
+        self.fields: dict = {}
+        self.templates: Optional[dict] = None
+        self.offset = 0
+        self.count = 0
+        self.children: list["_SpilledStep"] = []
+
+
+def _spill_step(stream: _JSONStream, out: BinaryIO) -> _SpilledStep:
+    step = _SpilledStep()
+    for key in stream.items():
+        if key == "evaluations":
+            step.offset = out.tell()
+            for _ in stream.elements():
+                out.write(stream.raw().encode("utf-8") + b"\n")
+                step.count += 1
+        elif key == "children":
+            # kept in place so step records list their keys in the usual order
+            step.fields["children"] = []
+            step.children = [_spill_step(stream, out) for _ in stream.elements()]
+        elif key == "templates":
+            step.templates = stream.value()
+        else:
+            step.fields[key] = stream.value()
+    return step
+
+
+def _flatten_spilled(steps: list[_SpilledStep]) -> Iterator[_SpilledStep]:
+    for step in steps:
+        yield from _flatten_spilled(step.children)
+        yield step
+
+
+def iter_json_records(filepath: Union[str, Path], workdir: Optional[Union[str, Path]] = None) -> Iterator[dict]:
+    # The records of a JSON trace, like trace_to_records(load_trace(filepath)), without holding
+    # the document in memory. A step's id, templates and the trace's blob store come after its
+    # evaluations in the file, so evaluations are first copied one per line to a temporary file
+    # in workdir and read back from there; memory holds one evaluation and the step headers.
+    header: dict = {}
+    steps: list[_SpilledStep] = []
+    with tempfile.TemporaryFile(dir=workdir) as spilled:
+        with open_text(filepath) as f:
+            stream = _JSONStream(f)
+            for key in stream.items():
+                if key == "steps":
+                    steps = [_spill_step(stream, spilled) for _ in stream.elements()]
+                else:
+                    header[key] = stream.value()
+        blobs = header.get("blobs")
+        resolve = None
+        if blobs is not None:
+            from xray.store import resolve_blob_slots
+            directory = Path(filepath).parent
+
+            def resolve(slots: list[tuple[dict, str]]) -> None:
+                resolve_blob_slots([(holder, key) for holder, key in slots
+                                    if isinstance(holder.get(key), dict) and "$blob" in holder[key]],
+                                   directory, blobs)
+
+        yield {
+            "type": "session",
+            "trace_id": header.get("trace_id"),
+            "name": header.get("name"),
+            "started_at": header.get("started_at"),
+            "metadata": header.get("metadata", {})
+        }
+        spilled.flush()
+        for index, step in enumerate(_flatten_spilled(steps)):
+            fields = step.fields
+            if resolve is not None:
+                resolve([(fields, "reasoning")])
+            step_id = fields.get("step_id", str(index))
+            yield {
+                "type": "step_start",
+                "step_id": step_id,
+                "name": fields.get("name"),
+                "step_type": fields.get("step_type"),
+                "started_at": fields.get("started_at")
+            }
+            spilled.seek(step.offset)
+            remaining = step.count
+            while remaining:
+                # blob references are looked up a chunk of evaluations at a time
+                chunk = [_loads(spilled.readline()) for _ in range(min(remaining, 1000))]
+                remaining -= len(chunk)
+                if resolve is not None:
+                    resolve([(evaluation, "candidate_data") for evaluation in chunk])
+                for evaluation in chunk:
+                    if step.templates:
+                        _render_evaluation(evaluation, step.templates)
+                    yield {**evaluation, "type": "evaluation", "step_id": step_id}
+            yield {**fields, "type": "step", "step_id": step_id, "evaluation_count": step.count}
+        yield {
+            "type": "session_end",
+            "trace_id": header.get("trace_id"),
+            "completed_at": header.get("completed_at")
+        }
+
+
+def iter_steps(trace: dict) -> Iterator[dict]:
+    # Every step dict in a loaded trace, depth first, including nested children.
+    stack = list(reversed(trace.get("steps", [])))
+    while stack:
+        step = stack.pop()
+        yield step
+        stack.extend(reversed(step.get("children", [])))
+
+
+def list_traces(directory: Union[str, Path], name: Optional[str] = None, since=None, until=None,
+                status: Optional[str] = None, metadata: Optional[dict] = None, sort: str = "started_at",
+                descending: bool = True, limit: Optional[int] = None, offset: int = 0,
+                rescan: bool = False) -> list[dict]:
+    # List trace files in a directory with basic metadata, newest first.
+    # Backed by the directory's TraceCatalog: only new files and traces still running are checked
+    # (see TraceCatalog.refresh); rescan=True stats every file, to catch finished traces rewritten
+    # in place by another writer. Filters, sorting and pagination are passed through to
+    # TraceCatalog.query().
     directory = Path(directory)
-    traces = []
-    
     if not directory.exists():
-        return traces
-        
-    for filepath in directory.glob("*.json"):
-        try:
-            with open(filepath, 'r') as f:
-                data = json.load(f)
-                traces.append({
-                    "trace_id": data.get("trace_id"),
-                    "name": data.get("name"),
-                    "filepath": str(filepath),
-                    "started_at": data.get("started_at"),
-                    "completed_at": data.get("completed_at"),
-                    "step_count": len(data.get("steps", []))
-                })
-        except (json.JSONDecodeError, KeyError):
-            continue
-            
-    return sorted(traces, key=lambda x: x.get("started_at", ""), reverse=True)
+        return []
+    catalog = catalog_for(directory)
+    catalog.refresh(full=rescan)
+    return catalog.query(name=name, since=since, until=until, status=status, metadata=metadata,
+                         sort=sort, descending=descending, limit=limit, offset=offset)
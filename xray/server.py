@@ -0,0 +1,428 @@
+# X-Ray lib - server module
+# Local trace server: REST listing of saved traces plus a live Server-Sent Events feed.
+#
+#   GET  /api/traces             list_traces() with name/status/since/until/sort/descending/limit/offset
+#                                and metadata.<key>=<value> filters; returns {"traces", "total"}
+#   GET  /api/traces/<trace_id>  one saved trace, in the to_dict() shape; with ?evaluations=false
+#                                the TraceQuery outline instead (no rows, per-step counts)
+#   GET  /api/traces/<trace_id>/steps/<step>/evaluations
+#                                one page of a step's evaluations: qualified=true|false, failed=<filter>
+#                                (repeatable), q=<text>, min.<field>=, max.<field>=, sort=row|score|<field>,
+#                                descending=true|false, cursor, limit
+#   GET  /api/live               SSE stream of live session events (see xray.live), starting with a
+#                                snapshot of the sessions currently running
+#   POST /api/events             NDJSON events from a LivePublisher in another process
+#
+# Errors come back as {"error": ...}: 400 for bad parameters, 404 for unknown traces or steps,
+# 500 (logged) for anything else, such as a corrupt trace file.
+#
+# Each SSE client has its own pending buffer. Evaluation batches for a step are merged while the
+# client is still writing the previous ones, so a slow client gets fewer, larger updates and never
+# holds up the pipeline or other clients.
+#
+#   xray-server [--directory traces] [--host 127.0.0.1] [--port 8765]
+
+import argparse
+import asyncio
+import itertools
+import json
+import logging
+import threading
+from functools import partial
+from pathlib import Path
+from typing import Any, Optional, Union
+from urllib.parse import parse_qs, unquote, urlsplit
+
+from xray.catalog import SORT_COLUMNS, catalog_for
+from xray.query import query_for
+from xray.serializer import list_traces, load_trace
+
+
+logger = logging.getLogger(__name__)
+
+_MAX_PAGE = 500
+
+_REASONS = {200: "OK", 204: "No Content", 400: "Bad Request", 404: "Not Found",
+            405: "Method Not Allowed", 500: "Internal Server Error"}
+
+_CORS = (b"Access-Control-Allow-Origin: *\r\n"
+         b"Access-Control-Allow-Methods: GET, POST, OPTIONS\r\n"
+         b"Access-Control-Allow-Headers: Content-Type\r\n")
+
+
+def merge_evaluations(previous: dict, event: dict, max_rows: int) -> dict:
+    # Coalesce two progress events for the same step: newest counts, newest rows, skipped adds up.
+    rows = previous["rows"] + event["rows"]
+    merged = dict(event)
+    merged["rows"] = rows[-max_rows:]
+    merged["skipped"] = previous["skipped"] + event["skipped"] + max(0, len(rows) - max_rows)
+    return merged
+
+
+class _Client:
+    # One SSE connection's pending events, keyed so evaluation batches coalesce.
+
+    def __init__(self, max_rows: int, max_pending: int):
+        self.max_rows = max_rows
+        self.max_pending = max_pending
+        self.pending: dict[Any, dict] = {}
+        self.ready = asyncio.Event()
+        self.overflowed = False
+        self._keys = itertools.count()
+
+    def push(self, event: dict) -> None:
+        if event["type"] == "evaluations":
+            key = ("evaluations", event["trace_id"], event["step_id"])
+            previous = self.pending.get(key)
+            if previous is not None:
+                event = merge_evaluations(previous, event, self.max_rows)
+        else:
+            key = next(self._keys)
+        self.pending[key] = event
+        if len(self.pending) > self.max_pending:
+            # too far behind even after coalescing; drop the connection, the client reconnects
+            # and starts again from a snapshot
+            self.overflowed = True
+        self.ready.set()
+
+    def take(self) -> list[dict]:
+        events = list(self.pending.values())
+        self.pending.clear()
+        self.ready.clear()
+        return events
+
+
+class TraceServer:
+    # Serves a trace directory and fans live session events out to dashboard clients.
+
+    def __init__(self, directory: Union[str, Path] = "traces", host: str = "127.0.0.1", port: int = 8765,
+                 max_rows: int = 200, max_pending: int = 10_000, keepalive: float = 15.0):
+        self.directory = Path(directory)
+        self.host = host
+        self.port = port
+        self.max_rows = max_rows
+        self.max_pending = max_pending
+        self.keepalive = keepalive
+        self._clients: set[_Client] = set()
+        self._connections: set[asyncio.Task] = set()
+        # trace_id -> {"session": event, "steps": {step_id: event}, "evaluations": {step_id: event}}
+        self._live: dict[str, dict] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._thread: Optional[threading.Thread] = None
+
+    # -- lifecycle --
+
+    async def start_serving(self) -> None:
+        self._loop = asyncio.get_running_loop()
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+
+    async def serve_forever(self) -> None:
+        await self.start_serving()
+        async with self._server:
+            await self._server.serve_forever()
+
+    def start(self) -> "TraceServer":
+        # Run the server on its own event loop in a daemon thread; returns once it is listening.
+        started = threading.Event()
+        failure: list[BaseException] = []
+
+        def run() -> None:
+            loop = asyncio.new_event_loop()
+            try:
+                loop.run_until_complete(self.start_serving())
+            except BaseException as exc:
+                failure.append(exc)
+                started.set()
+                loop.close()
+                return
+            started.set()
+            loop.run_forever()
+            loop.close()
+
+        self._thread = threading.Thread(target=run, name="xray-server", daemon=True)
+        self._thread.start()
+        started.wait()
+        if failure:
+            raise failure[0]
+        return self
+
+    def stop(self) -> None:
+        if self._loop is None or self._server is None:
+            return
+        loop = self._loop
+
+        async def shutdown() -> None:
+            self._server.close()
+            for task in list(self._connections):
+                task.cancel()
+            await asyncio.gather(*self._connections, return_exceptions=True)
+            await self._server.wait_closed()
+            loop.stop()
+
+        asyncio.run_coroutine_threadsafe(shutdown(), loop)
+        if self._thread is not None:
+            self._thread.join(5)
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    # -- live events --
+
+    def publish(self, events: list[dict]) -> None:
+        # Thread-safe entry point for LivePublisher.
+        if self._loop is None:
+            raise RuntimeError("trace server is not running")
+        self._loop.call_soon_threadsafe(self._dispatch, events)
+
+    def _dispatch(self, events: list[dict]) -> None:
+        for event in events:
+            trace_id = event.get("trace_id")
+            event_type = event.get("type")
+            if event_type == "session":
+                self._live[trace_id] = {"session": event, "steps": {}, "evaluations": {}}
+            state = self._live.get(trace_id)
+            if state is not None:
+                if event_type in ("step_start", "step"):
+                    state["steps"][event["step_id"]] = event
+                elif event_type == "evaluations":
+                    previous = state["evaluations"].get(event["step_id"])
+                    state["evaluations"][event["step_id"]] = (
+                        event if previous is None else merge_evaluations(previous, event, self.max_rows)
+                    )
+                elif event_type == "session_end":
+                    # finished sessions are served from disk by /api/traces from here on
+                    del self._live[trace_id]
+            for client in self._clients:
+                client.push(event)
+
+    def snapshot(self) -> list[dict]:
+        # Events that rebuild the state of every running session.
+        events = []
+        for state in self._live.values():
+            events.append(state["session"])
+            events.extend(state["steps"].values())
+            events.extend(state["evaluations"].values())
+        return events
+
+    # -- HTTP --
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        task = asyncio.current_task()
+        self._connections.add(task)
+        try:
+            try:
+                request = await self._read_request(reader)
+            except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+                # a dropped connection or a malformed request line or headers
+                return
+            if request is None:
+                return
+            method, target, body = request
+            url = urlsplit(target)
+            try:
+                await self._route(method, unquote(url.path), parse_qs(url.query), body, writer)
+            except ConnectionError:
+                pass
+            except Exception as exc:
+                logger.exception("error handling %s %s", method, target)
+                await self._respond(writer, 500, {"error": f"{type(exc).__name__}: {exc}"})
+        except ConnectionError:
+            pass
+        except asyncio.CancelledError:
+            # stop() cancels open connections; end the handler quietly
+            pass
+        finally:
+            self._connections.discard(task)
+            writer.close()
+
+    async def _read_request(self, reader: asyncio.StreamReader) -> Optional[tuple[str, str, bytes]]:
+        # (method, target, body) of one request, or None if the client sent nothing.
+        request_line = await reader.readline()
+        if not request_line:
+            return None
+        method, target, _ = request_line.decode("latin-1").split(" ", 2)
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+        body = b""
+        if "content-length" in headers:
+            body = await reader.readexactly(int(headers["content-length"]))
+        return method, target, body
+
+    async def _route(self, method: str, path: str, query: dict, body: bytes,
+                     writer: asyncio.StreamWriter) -> None:
+        if method == "OPTIONS":
+            await self._respond(writer, 204, None)
+        elif path == "/api/live" and method == "GET":
+            await self._stream(writer)
+        elif path == "/api/events" and method == "POST":
+            try:
+                events = [json.loads(line) for line in body.decode("utf-8").splitlines() if line.strip()]
+            except (UnicodeDecodeError, json.JSONDecodeError):
+                await self._respond(writer, 400, {"error": "body must be NDJSON events"})
+                return
+            self._dispatch(events)
+            await self._respond(writer, 200, {"accepted": len(events)})
+        elif path == "/api/traces" and method == "GET":
+            try:
+                result = await self._in_executor(self._list, query)
+            except ValueError as exc:
+                await self._respond(writer, 400, {"error": str(exc)})
+                return
+            await self._respond(writer, 200, result)
+        elif path.startswith("/api/traces/") and method == "GET":
+            parts = path[len("/api/traces/"):].split("/")
+            if len(parts) == 1:
+                outline = query.get("evaluations", ["true"])[0] == "false"
+                result = await self._in_executor(self._load, parts[0], outline)
+            elif len(parts) == 4 and parts[1] == "steps" and parts[3] == "evaluations":
+                try:
+                    result = await self._in_executor(self._page, parts[0], parts[2], query)
+                except ValueError as exc:
+                    await self._respond(writer, 400, {"error": str(exc)})
+                    return
+            else:
+                result = None
+            if result is None:
+                await self._respond(writer, 404, {"error": "trace or step not found"})
+            else:
+                await self._respond(writer, 200, result)
+        else:
+            await self._respond(writer, 404, {"error": f"no route for {method} {path}"})
+
+    async def _in_executor(self, fn, *args):
+        # the catalog and trace files are blocking I/O; keep them off the event loop
+        return await asyncio.get_running_loop().run_in_executor(None, partial(fn, *args))
+
+    def _list(self, query: dict) -> dict:
+        first = {key: values[0] for key, values in query.items()}
+        filters = {
+            "name": first.get("name"),
+            "status": first.get("status"),
+            "since": first.get("since"),
+            "until": first.get("until"),
+            "metadata": {key[len("metadata."):]: value for key, value in first.items()
+                         if key.startswith("metadata.")} or None
+        }
+        sort = first.get("sort", "started_at")
+        if sort not in SORT_COLUMNS:
+            raise ValueError(f"sort must be one of {', '.join(SORT_COLUMNS)}")
+        try:
+            limit = int(first["limit"]) if "limit" in first else None
+            offset = int(first.get("offset", 0))
+        except ValueError:
+            raise ValueError("limit and offset must be integers") from None
+        if (limit is not None and limit < 0) or offset < 0:
+            raise ValueError("limit and offset must not be negative")
+        traces = list_traces(
+            self.directory, sort=sort, descending=first.get("descending", "true") != "false",
+            limit=limit, offset=offset, **filters
+        )
+        return {"traces": traces, "total": catalog_for(self.directory).count(**filters)}
+
+    def _find(self, trace_id: str) -> Optional[str]:
+        if not self.directory.exists():
+            return None
+        catalog = catalog_for(self.directory)
+        catalog.refresh()
+        found = catalog.query(trace_id=trace_id, limit=1)
+        return found[0]["filepath"] if found else None
+
+    def _load(self, trace_id: str, outline: bool = False) -> Optional[dict]:
+        filepath = self._find(trace_id)
+        if filepath is None:
+            return None
+        return query_for(filepath).outline() if outline else load_trace(filepath)
+
+    def _page(self, trace_id: str, step: str, query: dict) -> Optional[dict]:
+        filepath = self._find(trace_id)
+        if filepath is None:
+            return None
+        first = {key: values[0] for key, values in query.items()}
+        ranges: dict[str, list] = {}
+        try:
+            for key, value in first.items():
+                bound, _, field = key.partition(".")
+                if bound in ("min", "max") and field:
+                    ranges.setdefault(field, [None, None])[bound == "max"] = float(value)
+            limit = min(int(first.get("limit", 50)), _MAX_PAGE)
+        except ValueError:
+            raise ValueError("min.*, max.* and limit must be numbers") from None
+        qualified = first.get("qualified")
+        try:
+            return query_for(filepath).evaluations(
+                step,
+                qualified=None if qualified is None else qualified == "true",
+                failed=query.get("failed"),
+                ranges={field: tuple(bounds) for field, bounds in ranges.items()},
+                search=first.get("q"),
+                sort=first.get("sort", "row"),
+                descending=None if "descending" not in first else first["descending"] == "true",
+                cursor=first.get("cursor"),
+                limit=limit,
+            )
+        except KeyError as exc:
+            # unknown step, or a sort/range field the step does not have
+            if exc.args and exc.args[0] == step:
+                return None
+            raise ValueError(str(exc.args[0]) if exc.args else "unknown field") from None
+
+    async def _respond(self, writer: asyncio.StreamWriter, status: int, payload: Any) -> None:
+        body = b"" if payload is None else json.dumps(payload, default=str).encode("utf-8")
+        head = (f"HTTP/1.1 {status} {_REASONS.get(status, '')}\r\n"
+                f"Content-Type: application/json\r\nContent-Length: {len(body)}\r\n"
+                f"Connection: close\r\n").encode("latin-1")
+        writer.write(head + _CORS + b"\r\n" + body)
+        await writer.drain()
+
+    async def _stream(self, writer: asyncio.StreamWriter) -> None:
+        writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\nCache-Control: no-cache\r\n"
+                     b"Connection: keep-alive\r\n" + _CORS + b"\r\n")
+        client = _Client(self.max_rows, self.max_pending)
+        for event in self.snapshot():
+            client.push(event)
+        self._clients.add(client)
+        try:
+            while not client.overflowed:
+                try:
+                    await asyncio.wait_for(client.ready.wait(), self.keepalive)
+                except asyncio.TimeoutError:
+                    writer.write(b": keepalive\n\n")
+                    await writer.drain()
+                    continue
+                if client.overflowed:
+                    break
+                events = client.take()
+                writer.write(b"".join(
+                    f"event: {event['type']}\ndata: {json.dumps(event, separators=(',', ':'), default=str)}\n\n"
+                    .encode("utf-8") for event in events
+                ))
+                # while this waits on a slow socket, new batches merge in client.pending
+                await writer.drain()
+        finally:
+            self._clients.discard(client)
+
+
+def main(argv: Optional[list[str]] = None) -> None:
+    parser = argparse.ArgumentParser(prog="xray-server", description="Serve X-Ray traces and live sessions.")
+    parser.add_argument("--directory", default="traces")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args(argv)
+    server = TraceServer(args.directory, host=args.host, port=args.port)
+    print(f"X-Ray trace server on http://{args.host}:{args.port} serving {Path(args.directory).absolute()}")
+    try:
+        asyncio.run(server.serve_forever())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,332 @@
+# X-Ray lib - store module
+# Trace storage lifecycle for long-running services: one compressed file per run, a
+# content-addressed side store for values repeated across runs, and size/age retention.
+#
+#   store = TraceStore("traces", max_bytes=2 << 30, max_age=30 * 86400, purge_interval=600)
+#   store.save(session)                       # traces/competitor_selection_20261018T091500_1a2b3c4d.json.zst
+#   BackgroundExporter(store)                 # or as an exporter's writer
+#   load_trace(path)                          # decompresses and puts the blobs back
+#
+# With dedupe on, each evaluation's candidate_data and each step's reasoning (when their JSON is
+# at least MIN_BLOB_BYTES) are written to .xray_blobs.sqlite in the trace directory once, keyed
+# by a hash of that JSON, and the trace holds {"$blob": hash} in their place. The trace's
+# top-level "blobs" key names the side store so load_trace can resolve the references; a trace
+# whose candidate_data was itself exactly {"$blob": ...} would be misread, which no X-Ray pipeline
+# produces.
+#
+# The side store records when each trace was committed and when each blob was last used. A trace
+# is committed there before its file is renamed into place, and purge() removes files first and
+# then only blobs last used before the oldest remaining trace, so a reader never finds a
+# reference to a missing blob. Retention runs in one process per directory: purge() assumes no
+# other process is saving into it at the same time.
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Iterable, Optional, Union
+
+from xray.catalog import TRACE_SUFFIXES, catalog_for
+from xray.compression import DEFAULT_COMPRESSION
+from xray.serializer import iter_steps, save_trace
+
+try:
+    import orjson
+except ImportError:  # orjson is optional; the standard library encoder is used instead
+    orjson = None
+
+BLOBS_FILENAME = ".xray_blobs.sqlite"
+# smaller values cost less inline than as a reference
+MIN_BLOB_BYTES = 64
+# hex digits of the SHA-256 kept as the blob key; 80 bits keeps collisions out of reach for
+# billions of blobs, and every reference in a trace costs these bytes
+HASH_CHARS = 20
+# bound on the number of SQL variables in one IN (...) lookup
+_LOOKUP_BATCH = 500
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS blobs (hash TEXT PRIMARY KEY, data BLOB NOT NULL, used REAL NOT NULL);
+CREATE TABLE IF NOT EXISTS traces (filename TEXT PRIMARY KEY, saved REAL NOT NULL) WITHOUT ROWID;
+"""
+
+
+def _dumps(value) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(value, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(value, separators=(",", ":")).encode()
+
+
+class BlobRefs:
+    # Collects the blobs of one trace while it is encoded (see xray.encoder); passed to BlobStore.commit.
+
+    def __init__(self, name: str = BLOBS_FILENAME, min_bytes: int = MIN_BLOB_BYTES):
+        self.name = name
+        self.min_bytes = min_bytes
+        # hash -> encoded value
+        self.blobs: dict[str, bytes] = {}
+
+    def ref(self, value):
+        # value itself when it is small or empty, else {"$blob": hash}
+        if not value:
+            return value
+        data = _dumps(value)
+        if len(data) < self.min_bytes:
+            return value
+        key = hashlib.sha256(data).hexdigest()[:HASH_CHARS]
+        self.blobs.setdefault(key, data)
+        return {"$blob": key}
+
+
+class BlobStore:
+    # The SQLite side store of one trace directory.
+
+    def __init__(self, directory: Union[str, Path], name: str = BLOBS_FILENAME):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.name = name
+        self.path = self.directory / name
+        # the exporter thread, the purge thread and the caller may share a store
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(str(self.path), timeout=30, check_same_thread=False)
+        with self._lock:
+            # auto_vacuum only takes effect on an empty database, so set it before the tables exist
+            self._db.execute("PRAGMA auto_vacuum=INCREMENTAL")
+            self._db.execute("PRAGMA journal_mode=WAL")
+            # checkpoint every 256 KB of log, and shrink the log back to that afterwards
+            self._db.execute("PRAGMA wal_autocheckpoint=64")
+            self._db.execute(f"PRAGMA journal_size_limit={1 << 18}")
+            with self._db:
+                self._db.executescript(_SCHEMA)
+            self._clock = self._db.execute("SELECT COALESCE(MAX(saved), 0) FROM traces").fetchone()[0]
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+    def refs(self) -> BlobRefs:
+        return BlobRefs(self.name)
+
+    def commit(self, filename: str, refs: BlobRefs, publish=None) -> None:
+        # Record the trace's blobs, then call publish() (which renames the file into place) under
+        # the same lock, so purge() never sees the file before its blobs.
+        with self._lock:
+            # never earlier than a previous commit, even if the wall clock steps back
+            self._clock = max(time.time(), self._clock)
+            with self._db:
+                self._db.executemany(
+                    "INSERT INTO blobs VALUES (?, ?, ?) ON CONFLICT (hash) DO UPDATE SET used = excluded.used",
+                    ((key, data, self._clock) for key, data in refs.blobs.items()))
+                self._db.execute("INSERT OR REPLACE INTO traces VALUES (?, ?)", (filename, self._clock))
+            if publish is not None:
+                publish()
+
+    def get_many(self, keys: Iterable[str]) -> dict[str, bytes]:
+        # hash -> encoded value; unknown hashes are left out
+        keys = list(keys)
+        found = {}
+        with self._lock:
+            for start in range(0, len(keys), _LOOKUP_BATCH):
+                batch = keys[start:start + _LOOKUP_BATCH]
+                found.update(self._db.execute(
+                    f"SELECT hash, data FROM blobs WHERE hash IN ({','.join('?' * len(batch))})", batch))
+        return found
+
+    def forget(self, filenames: Iterable[str]) -> None:
+        # Drop removed traces; blobs only they used go at the next collect().
+        with self._lock, self._db:
+            self._db.executemany("DELETE FROM traces WHERE filename = ?", ((filename,) for filename in filenames))
+
+    def filenames(self) -> set[str]:
+        with self._lock:
+            return {filename for filename, in self._db.execute("SELECT filename FROM traces")}
+
+    def collect(self) -> int:
+        # Delete blobs last used before the oldest remaining trace was committed, which no
+        # remaining trace can reference, and return their pages to the filesystem. Returns how
+        # many were deleted. A blob is kept while any trace older than its last use remains, so
+        # one long-kept old trace holds back collection of everything newer.
+        with self._lock:
+            with self._db:
+                oldest = self._db.execute("SELECT MIN(saved) FROM traces").fetchone()[0]
+                if oldest is None:
+                    deleted = self._db.execute("DELETE FROM blobs").rowcount
+                else:
+                    deleted = self._db.execute("DELETE FROM blobs WHERE used < ?", (oldest,)).rowcount
+            if deleted:
+                self._db.execute("PRAGMA incremental_vacuum").fetchall()
+            # fold the write-ahead log back in, so size() reflects what the blobs take
+            self._db.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchall()
+            return deleted
+
+    def stats(self) -> dict:
+        with self._lock:
+            blobs, data = self._db.execute("SELECT COUNT(*), COALESCE(SUM(LENGTH(data)), 0) FROM blobs").fetchone()
+            traces = self._db.execute("SELECT COUNT(*) FROM traces").fetchone()[0]
+        return {"blobs": blobs, "blob_bytes": data, "traces": traces, "file_bytes": self.size()}
+
+    def size(self) -> int:
+        # bytes on disk, including the write-ahead log
+        return sum(os.path.getsize(path) for path in (self.path, Path(f"{self.path}-wal")) if path.exists())
+
+
+_stores: dict[Path, BlobStore] = {}
+_stores_lock = threading.Lock()
+
+
+def blob_store_for(directory: Union[str, Path], name: str = BLOBS_FILENAME) -> BlobStore:
+    # One shared side store per trace directory in this process.
+    key = Path(directory).resolve() / Path(name).name
+    with _stores_lock:
+        store = _stores.get(key)
+        if store is None:
+            store = _stores[key] = BlobStore(key.parent, key.name)
+        return store
+
+
+def resolve_blobs(trace: dict, directory: Union[str, Path]) -> dict:
+    # Replace {"$blob": hash} references in a loaded trace with their values, in place.
+    name = trace.pop("blobs", None)
+    if name is None:
+        return trace
+    slots = []
+    for step in iter_steps(trace):
+        if isinstance(step.get("reasoning"), dict):
+            slots.append((step, "reasoning"))
+        for evaluation in step.get("evaluations", []):
+            data = evaluation.get("candidate_data")
+            if isinstance(data, dict) and "$blob" in data:
+                slots.append((evaluation, "candidate_data"))
+    resolve_blob_slots(slots, directory, name)
+    return trace
+
+
+def resolve_blob_slots(slots: list[tuple[dict, str]], directory: Union[str, Path], name: str) -> None:
+    # Replace holder[key] = {"$blob": hash} for each (holder, key) with the value from the side
+    # store called name in directory.
+    if not slots:
+        return
+    found = blob_store_for(directory, name).get_many({holder[key]["$blob"] for holder, key in slots})
+    loads = orjson.loads if orjson is not None else json.loads
+    for holder, key in slots:
+        ref = holder[key]["$blob"]
+        if ref not in found:
+            raise ValueError(f"blob {ref} is missing from {Path(directory) / name}")
+        # decoded per reference: evaluations must not share one dict
+        holder[key] = loads(found[ref])
+
+
+def _seconds(value: Union[float, timedelta, None]) -> Optional[float]:
+    return value.total_seconds() if isinstance(value, timedelta) else value
+
+
+class TraceStore:
+    # A directory of per-run traces with compression, deduplication and retention. Usable as a
+    # BackgroundExporter writer. The store owns its directory: purge() considers every trace file
+    # in it, whichever way it was written.
+    #
+    # max_bytes bounds the traces plus the side store; max_age (seconds or a timedelta) bounds
+    # file age by mtime. Either runs on purge(), which a daemon thread calls every purge_interval
+    # seconds when one is given.
+
+    def __init__(self, directory: Union[str, Path] = "traces", compression: Optional[str] = DEFAULT_COMPRESSION,
+                 level: Optional[int] = None, dedupe: bool = False, max_bytes: Optional[int] = None,
+                 max_age: Union[float, timedelta, None] = None, purge_interval: Optional[float] = None):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.compression = compression
+        self.level = level
+        self.blobs = blob_store_for(self.directory) if dedupe else None
+        self.max_bytes = max_bytes
+        self.max_age = _seconds(max_age)
+        self._stop = threading.Event()
+        self._purger = None
+        if purge_interval is not None:
+            self._purger = threading.Thread(target=self._purge_every, args=(purge_interval,),
+                                            name="xray-store-purge", daemon=True)
+            self._purger.start()
+
+    def path_for(self, session) -> Path:
+        # name, start time and the first trace_id characters: unique per run and sortable by time.
+        # A session that was never entered has no start time; the current time stands in.
+        started = datetime.fromisoformat(session.started_at) if session.started_at else datetime.now()
+        suffix = {None: "", "gzip": ".gz", "zstd": ".zst"}[self.compression]
+        return self.directory / f"{session.name}_{started:%Y%m%dT%H%M%S}_{str(session.trace_id)[:8]}.json{suffix}"
+
+    def save(self, session) -> Optional[str]:
+        # The saved path, or None for a disabled session, which has nothing to save.
+        if not session.enabled:
+            return None
+        return save_trace(session, self.path_for(session), compression=self.compression, level=self.level,
+                          blobs=self.blobs, catalog=True)
+
+    def __call__(self, sessions: list) -> None:
+        for session in sessions:
+            self.save(session)
+
+    def _files(self) -> list[tuple[Path, os.stat_result]]:
+        files = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(TRACE_SUFFIXES) and entry.is_file():
+                try:
+                    files.append((Path(entry.path), entry.stat()))
+                except FileNotFoundError:
+                    pass
+        return files
+
+    def usage(self) -> dict:
+        files = self._files()
+        trace_bytes = sum(stat.st_size for _, stat in files)
+        blob_bytes = self.blobs.size() if self.blobs is not None else 0
+        return {"traces": len(files), "trace_bytes": trace_bytes, "blob_bytes": blob_bytes,
+                "total_bytes": trace_bytes + blob_bytes}
+
+    def purge(self, now: Optional[float] = None) -> dict:
+        # Apply max_age, then max_bytes oldest first. Returns what was removed.
+        now = time.time() if now is None else now
+        # traces committed after this snapshot are left alone even if the scan below misses them
+        known = self.blobs.filenames() if self.blobs is not None else set()
+        files = sorted(self._files(), key=lambda item: item[1].st_mtime)
+        # files[:first] go, oldest first
+        first = 0
+        if self.max_age is not None:
+            cutoff = now - self.max_age
+            while first < len(files) and files[first][1].st_mtime < cutoff:
+                first += 1
+        if self.max_bytes is not None:
+            total = sum(stat.st_size for _, stat in files[first:]) + (self.blobs.size() if self.blobs is not None else 0)
+            while first < len(files) and total > self.max_bytes:
+                total -= files[first][1].st_size
+                first += 1
+        removed, files = files[:first], files[first:]
+        catalog = catalog_for(self.directory)
+        for path, _ in removed:
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                pass
+            catalog.remove(path)
+        blobs_removed = 0
+        if self.blobs is not None:
+            # also forgets traces deleted by hand since the last purge
+            self.blobs.forget(known - {path.name for path, _ in files})
+            blobs_removed = self.blobs.collect()
+        return {"removed": len(removed), "bytes_freed": sum(stat.st_size for _, stat in removed),
+                "blobs_removed": blobs_removed}
+
+    def _purge_every(self, interval: float) -> None:
+        while not self._stop.wait(interval):
+            try:
+                self.purge()
+            except (OSError, sqlite3.Error):
+                # a full or read-only disk; try again next interval
+                continue
+
+    def close(self) -> None:
+        self._stop.set()
+        if self._purger is not None:
+            self._purger.join()
+            self._purger = None
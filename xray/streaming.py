@@ -0,0 +1,271 @@
+# X-Ray lib - streaming module
+# Append-only NDJSON sink so steps and evaluations hit disk as they complete.
+#
+# Record types, one JSON object per line:
+#   session     -> trace header (trace_id, name, started_at, metadata)
+#   step_start  -> a step began (step_id, name, step_type, started_at)
+#   evaluation  -> one candidate evaluation, tagged with its step_id
+#   step        -> a step finished (full step dict minus evaluations)
+#   session_end -> trace footer (completed_at)
+#
+# Rows are frozen once written. An evaluation passed to Step.add_evaluation is written as it is
+# added, so changes made to it afterwards are not saved. Rows recorded with the batch API stay in
+# the step's table while the caller may still attach filters and metadata to them: each batch
+# (add_candidates, add_table) is written when the next one starts and the last when the step
+# closes, so a step holds at most one batch in memory. Once written, rows are dropped from the
+# step and the row ranges returned for them no longer index step.evaluations; filters can only
+# be added to the latest batch. Under a retention policy, batch rows are sampled, and written,
+# when the step closes.
+
+import json
+import threading
+from pathlib import Path
+from typing import Iterator, Optional, Union
+
+from xray.compression import format_suffix, open_read, open_text
+
+
+NDJSON_SUFFIXES = (".ndjson", ".jsonl")
+
+
+class NDJSONSink:
+    # Writes trace records to an append-only newline-delimited JSON file.
+
+    def __init__(self, filepath: Union[str, Path], flush_every: int = 1000):
+        self.filepath = Path(filepath)
+        self.filepath.parent.mkdir(parents=True, exist_ok=True)
+        self.flush_every = flush_every
+        self._file = open(self.filepath, "a", encoding="utf-8")
+        self._evaluation_counts: dict[str, int] = {}
+        self._pending = 0
+        # steps on different threads share the file; one line is written under the lock
+        self._lock = threading.Lock()
+
+    def _write(self, record: dict) -> None:
+        line = json.dumps(record, separators=(",", ":")) + "\n"
+        with self._lock:
+            self._file.write(line)
+
+    def _flush(self) -> None:
+        with self._lock:
+            self._file.flush()
+
+    def write_session_start(self, session) -> None:
+        self._write({
+            "type": "session",
+            "trace_id": session.trace_id,
+            "name": session.name,
+            "started_at": session.started_at,
+            "metadata": session.metadata
+        })
+        self._flush()
+
+    def write_step_start(self, step) -> None:
+        self._evaluation_counts[step.step_id] = 0
+        self._write({
+            "type": "step_start",
+            "step_id": step.step_id,
+            "name": step.name,
+            "step_type": step.step_type,
+            "started_at": step.started_at,
+            "parent_id": step.parent_id,
+            "sequence": step.sequence,
+            "worker": step.worker,
+            "start_ns": step.start_ns
+        })
+
+    def _write_evaluation_record(self, step, record: dict) -> None:
+        record["type"] = "evaluation"
+        record["step_id"] = step.step_id
+        self._write(record)
+        self._evaluation_counts[step.step_id] = self._evaluation_counts.get(step.step_id, 0) + 1
+        self._pending += 1
+        if self._pending >= self.flush_every:
+            self._flush()
+            self._pending = 0
+
+    def write_evaluation(self, step, evaluation) -> None:
+        self._write_evaluation_record(step, evaluation.to_dict())
+
+    def write_rows(self, step, table) -> None:
+        # Write every row of a step's table (its batch rows), one record at a time.
+        for row in range(len(table)):
+            self._write_evaluation_record(step, table.row_dict(row))
+
+    def write_step(self, step) -> None:
+        # the rows still in the step's table: its last batch, or what retention kept
+        self.write_rows(step, step.evaluations)
+        # children are written as their own records and re-nested by parent_id on load
+        record = step.to_dict(include_evaluations=False, include_children=False)
+        del record["evaluations"]
+        record = {"type": "step", **record}
+        record["evaluation_count"] = self._evaluation_counts.pop(step.step_id, 0)
+        self._write(record)
+        self._flush()
+        self._pending = 0
+
+    def write_session_end(self, session) -> None:
+        self._write({
+            "type": "session_end",
+            "trace_id": session.trace_id,
+            "completed_at": session.completed_at
+        })
+        self.close()
+
+    def close(self) -> None:
+        with self._lock:
+            if not self._file.closed:
+                self._file.flush()
+                self._file.close()
+
+
+def is_ndjson_trace(filepath: Union[str, Path]) -> bool:
+    # NDJSON traces are recognised by suffix, or by a first line that is a session record.
+    if format_suffix(filepath) in NDJSON_SUFFIXES:
+        return True
+    # only the prefix is read: a compact JSON trace is one (possibly very long) line
+    prefix = b'{"type":"session"'
+    with open_read(filepath) as f:
+        return f.read(len(prefix)) == prefix
+
+
+def iter_trace_records(filepath: Union[str, Path]) -> Iterator[dict]:
+    # Lazily yield records from an NDJSON trace, one line at a time.
+    with open_text(filepath) as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                # a torn final line from a crashed writer; everything before it is valid
+                return
+
+
+def trace_to_records(trace: dict) -> Iterator[dict]:
+    # Flatten a nested trace dict into the record stream an NDJSONSink would have written.
+    yield {
+        "type": "session",
+        "trace_id": trace.get("trace_id"),
+        "name": trace.get("name"),
+        "started_at": trace.get("started_at"),
+        "metadata": trace.get("metadata", {})
+    }
+    for index, step in enumerate(_flatten_steps(trace.get("steps", []))):
+        step_id = step.get("step_id", str(index))
+        yield {
+            "type": "step_start",
+            "step_id": step_id,
+            "name": step.get("name"),
+            "step_type": step.get("step_type"),
+            "started_at": step.get("started_at")
+        }
+        evaluations = step.get("evaluations", [])
+        for evaluation in evaluations:
+            yield {**evaluation, "type": "evaluation", "step_id": step_id}
+        record = {k: v for k, v in step.items() if k != "evaluations"}
+        if "children" in record:
+            record["children"] = []
+        record.update({"type": "step", "step_id": step_id, "evaluation_count": len(evaluations)})
+        yield record
+    yield {
+        "type": "session_end",
+        "trace_id": trace.get("trace_id"),
+        "completed_at": trace.get("completed_at")
+    }
+
+
+def _flatten_steps(steps: list[dict]) -> Iterator[dict]:
+    # Children before their parent, matching the order a sink writes finished steps in.
+    for step in steps:
+        yield from _flatten_steps(step.get("children", []))
+        yield step
+
+
+def rebuild_trace(records: Iterator[dict]) -> dict:
+    # Fold a record stream back into the nested dict shape produced by XRaySession.to_dict().
+    trace: Optional[dict] = None
+    steps: list[dict] = []
+    open_steps: dict[str, dict] = {}
+    evaluations: dict[str, list[dict]] = {}
+
+    for record in records:
+        record_type = record.pop("type", None)
+        if record_type == "session":
+            trace = {
+                "trace_id": record.get("trace_id"),
+                "name": record.get("name"),
+                "started_at": record.get("started_at"),
+                "completed_at": None,
+                "metadata": record.get("metadata", {}),
+                "steps": steps
+            }
+        elif record_type == "step_start":
+            open_steps[record["step_id"]] = record
+            evaluations.setdefault(record["step_id"], [])
+        elif record_type == "evaluation":
+            evaluations.setdefault(record.pop("step_id"), []).append(record)
+        elif record_type == "step":
+            step_id = record["step_id"]
+            record.pop("evaluation_count", None)
+            open_steps.pop(step_id, None)
+            steps.append(_step_dict(record, evaluations.pop(step_id, [])))
+        elif record_type == "session_end" and trace is not None:
+            trace["completed_at"] = record.get("completed_at")
+
+    # steps that never finished (the writer died mid-step) are kept as still running
+    for step_id, start in open_steps.items():
+        steps.append(_step_dict({
+            "name": start.get("name"),
+            "step_type": start.get("step_type", "generic"),
+            "input_data": None,
+            "output_data": None,
+            "reasoning": None,
+            "status": "running",
+            "started_at": start.get("started_at"),
+            "completed_at": None,
+            "error": None,
+            "metadata": {},
+            "step_id": step_id,
+            "parent_id": start.get("parent_id"),
+            "sequence": start.get("sequence", 0),
+            "worker": start.get("worker"),
+            "start_ns": start.get("start_ns"),
+            "end_ns": None,
+            "duration_ns": None,
+            "self_ns": None,
+            "child_ns": 0,
+            "cpu_ns": None,
+            "children": []
+        }, evaluations.pop(step_id, [])))
+
+    if trace is None:
+        raise ValueError("NDJSON trace has no session record")
+    trace["steps"] = _nest_steps(steps)
+    return trace
+
+
+def _nest_steps(steps: list[dict]) -> list[dict]:
+    # Re-attach child step records to their parents; records arrive in completion order,
+    # traces list siblings in start order.
+    by_id = {step.get("step_id"): step for step in steps}
+    roots = []
+    for step in sorted(steps, key=lambda s: s.get("sequence", 0)):
+        parent = by_id.get(step.get("parent_id"))
+        if parent is not None and parent is not step:
+            parent.setdefault("children", []).append(step)
+        else:
+            roots.append(step)
+    return roots
+
+
+def _step_dict(record: dict, evaluations: list[dict]) -> dict:
+    # Re-insert evaluations where Step.to_dict() puts them so key order round-trips.
+    step = {}
+    for key, value in record.items():
+        step[key] = value
+        if key == "reasoning":
+            step["evaluations"] = evaluations
+    step.setdefault("evaluations", evaluations)
+    return step